@@ -0,0 +1,92 @@
+"""azentcoder 命令行入口
+
+    azentcoder serve --socket /tmp/azentcoder.sock --backend docker --workers 4
+    AZENTCODER_TOKEN=... python -m azentcoder serve --port 8765 --tenant-limit 2
+"""
+import argparse
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional
+
+
+def _parse_tenant_limits(values: List[str]) -> Dict[str, int]:
+    limits = {}
+    for value in values:
+        tenant, _, limit = value.partition("=")
+        if not limit:
+            raise argparse.ArgumentTypeError(f"Invalid tenant limit {value}, use TENANT=N.")
+        limits[tenant] = int(limit)
+    return limits
+
+
+def serve(args: argparse.Namespace) -> None:
+    from .coding.server import ExecutionServer
+    from .coding.workspace import WorkspaceManager
+
+    workspace_manager = WorkspaceManager(args.work_dir, tmpfs=args.tmpfs)
+
+    # 每个租户使用自己的会话目录，租户名由客户端提供，哈希后才用作目录名
+    def executor_factory(tenant: str):
+        session_id = "tenant-" + hashlib.sha256(tenant.encode("utf-8")).hexdigest()[:32]
+        if args.backend == "docker":
+            from .coding.docker_commandline_code_executor import DockerCommandLineCodeExecutor
+
+            return DockerCommandLineCodeExecutor(
+                image=args.image, timeout=args.timeout, workspace_manager=workspace_manager, session_id=session_id
+            )
+        from .coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+
+        return LocalCommandLineCodeExecutor(
+            timeout=args.timeout, workspace_manager=workspace_manager, session_id=session_id
+        )
+
+    server = ExecutionServer(
+        executor_factory,
+        num_workers=args.workers,
+        socket_path=args.socket,
+        host=args.host,
+        port=args.port,
+        token=args.token or os.environ.get("AZENTCODER_TOKEN"),
+        tenant_limits=_parse_tenant_limits(args.tenant_limits),
+        default_tenant_limit=args.tenant_limit,
+        max_queued=args.max_queued,
+    )
+    try:
+        server.serve_forever()
+    finally:
+        workspace_manager.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="azentcoder")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run a local code execution server.")
+    serve_parser.add_argument("--socket", help="The Unix socket to listen on, private to the current user.")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="The host to listen on with --port.")
+    serve_parser.add_argument("--port", type=int, help="Listen on this TCP port instead of a Unix socket.")
+    serve_parser.add_argument(
+        "--token", help="The token that the clients must send, also read from AZENTCODER_TOKEN. Use it with --port."
+    )
+    serve_parser.add_argument("--backend", choices=["local", "docker"], default="local")
+    serve_parser.add_argument("--image", default="python:3-slim", help="The image of the docker backend.")
+    serve_parser.add_argument("--workers", type=int, default=4, help="The number of executors.")
+    serve_parser.add_argument("--timeout", type=int, default=60, help="The timeout of each code block in seconds.")
+    serve_parser.add_argument("--work-dir", help="The directory of the session workspaces.")
+    serve_parser.add_argument("--tmpfs", action="store_true", help="Keep the workspaces in /dev/shm.")
+    serve_parser.add_argument("--tenant-limit", type=int, help="The running jobs allowed per tenant.")
+    serve_parser.add_argument(
+        "--tenant-limits", nargs="*", default=[], metavar="TENANT=N", help="The running jobs allowed per tenant."
+    )
+    serve_parser.add_argument("--max-queued", type=int, help="Reject jobs when this many are waiting.")
+    serve_parser.add_argument("--log-level", default="INFO")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+    if args.command == "serve":
+        serve(args)
+
+
+if __name__ == "__main__":
+    main()
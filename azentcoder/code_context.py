@@ -0,0 +1,260 @@
+import ast
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+from .compile_cache import parse_ast
+from .token_count_utils import count_token
+
+__all__ = ("CodeContextSlicer", "CodeSlice")
+
+ELLIPSIS_LINE = "# ..."
+
+
+class CodeSlice(BaseModel):
+    """(Experimental) 从源文件中切出的代码上下文"""
+
+    text: str = Field(description="The sliced source code.")
+    tokens_full: int = Field(description="The number of tokens of the whole file.")
+    tokens_sliced: int = Field(description="The number of tokens of the sliced source code.")
+    symbols: List[str] = Field(default_factory=list, description="The symbols included in the slice, in source order.")
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_full - self.tokens_sliced
+
+
+class _ParsedModule:
+    """The parsed source of a file and the index of its top-level symbols."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.lines = source.splitlines()
+        self.tree = parse_ast(source)
+        self._tokens_full: Optional[int] = None
+        # 顶层名字 -> 定义它的语句
+        self.definitions: Dict[str, ast.stmt] = {}
+        for node in self.tree.body:
+            for name in _bound_names(node):
+                self.definitions.setdefault(name, node)
+
+    @property
+    def tokens_full(self) -> int:
+        if self._tokens_full is None:
+            self._tokens_full = count_token(self.source)
+        return self._tokens_full
+
+    def segment(self, node: ast.AST) -> Tuple[int, int]:
+        """The 1-based inclusive line range of a node, including its decorators."""
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        return start, node.end_lineno
+
+    def text(self, start: int, end: int) -> str:
+        return "\n".join(self.lines[start - 1 : end])
+
+    def find(self, func_name: str) -> Tuple[Optional[ast.ClassDef], Optional[ast.AST]]:
+        """Find a function by `name` or `Class.name`, returning the enclosing class and the function."""
+        class_name, _, name = func_name.rpartition(".")
+        for node in self.tree.body:
+            if not class_name and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name:
+                return None, node
+        for node in self.tree.body:
+            if isinstance(node, ast.ClassDef) and class_name in ("", node.name):
+                for child in node.body:
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and child.name == name:
+                        return node, child
+        return None, None
+
+
+def _bound_names(node: ast.stmt) -> List[str]:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return [(alias.asname or alias.name).split(".")[0] for alias in node.names]
+    if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        return [n.id for target in targets for n in ast.walk(target) if isinstance(n, ast.Name)]
+    return []
+
+
+def _referenced_names(node: ast.AST) -> Set[str]:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+
+
+def _self_attributes(node: ast.AST) -> Set[str]:
+    """The attributes accessed through `self` or `cls` inside a method."""
+    return {
+        n.attr
+        for n in ast.walk(node)
+        if isinstance(n, ast.Attribute) and isinstance(n.value, ast.Name) and n.value.id in ("self", "cls")
+    }
+
+
+class CodeContextSlicer:
+    """(Experimental) Slice the code context of a function out of its source file.
+
+    The slice contains the target function, the enclosing class header for methods, and the top-level
+    symbols that the function references (imports, helper functions and classes, constants) together with
+    the symbols they reference in turn, closest first, until the token budget is used up. Parsed files are
+    cached and re-parsed only when their modification time or size changes.
+
+    Args:
+        max_files (int): The number of parsed files kept in the cache.
+    """
+
+    def __init__(self, max_files: int = 128):
+        self._max_files = max_files
+        self._cache: "OrderedDict[str, Tuple[Tuple[int, int], _ParsedModule]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.num_calls = 0
+        self.tokens_saved = 0
+
+    def _parse(self, file_name: Union[str, os.PathLike]) -> _ParsedModule:
+        path = os.path.realpath(file_name)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(path)
+                return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            module = _ParsedModule(f.read())
+        with self._lock:
+            self._cache[path] = (version, module)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self._max_files:
+                self._cache.popitem(last=False)
+        return module
+
+    def slice(
+        self, file_name: Union[str, os.PathLike], func_name: str, token_budget: Optional[int] = None
+    ) -> CodeSlice:
+        """(Experimental) Slice the context of a function out of a file.
+
+        Args:
+            file_name (str): The source file.
+            func_name (str): The name of the function, or `Class.method` for a method.
+            token_budget (Optional, int): The maximum number of tokens of the slice. The target function is
+                always included, even when it alone exceeds the budget. No limit if None.
+
+        Returns:
+            CodeSlice: The slice. If the function is not found, the whole file is returned.
+        """
+        module = self._parse(file_name)
+        class_node, func_node = module.find(func_name)
+        if func_node is None:
+            full = module.tokens_full
+            return self._record(CodeSlice(text=module.source, tokens_full=full, tokens_sliced=full))
+
+        # (起始行, 结束行) -> 符号名
+        segments: Dict[Tuple[int, int], str] = {}
+        segments[module.segment(func_node)] = func_name
+        used = count_token(module.text(*module.segment(func_node)))
+        budget = float("inf") if token_budget is None else token_budget
+
+        references = _referenced_names(func_node)
+        if class_node is not None:
+            used += self._add_class_context(module, class_node, func_node, segments, references, budget - used)
+
+        # 按引用距离由近到远加入顶层符号
+        queue: List[Tuple[int, int, str]] = []
+        seen: Set[str] = set()
+        for name in references:
+            self._push(module, queue, seen, name, 1)
+        while queue:
+            depth, _, name = heapq.heappop(queue)
+            node = module.definitions[name]
+            segment = module.segment(node)
+            # 跳过已经加入的语句，以及包含目标函数的类
+            if any(start <= segment[1] and segment[0] <= end for start, end in segments):
+                continue
+            tokens = count_token(module.text(*segment))
+            if used + tokens > budget:
+                continue
+            segments[segment] = name
+            used += tokens
+            for ref in _referenced_names(node):
+                self._push(module, queue, seen, ref, depth + 1)
+
+        ordered = sorted(segments.items())
+        parts: List[str] = []
+        last_end = 0
+        for (start, end), _ in ordered:
+            if parts and start > last_end + 1:
+                gap = module.text(last_end + 1, start - 1)
+                if gap.strip():
+                    # 省略的代码用与下一段相同缩进的 "# ..." 表示
+                    first_line = module.lines[start - 1]
+                    parts.append(first_line[: len(first_line) - len(first_line.lstrip())] + ELLIPSIS_LINE)
+                else:
+                    parts.append(gap)
+            parts.append(module.text(start, end))
+            last_end = end
+        text = "\n".join(parts)
+        return self._record(
+            CodeSlice(
+                text=text,
+                tokens_full=module.tokens_full,
+                tokens_sliced=count_token(text),
+                symbols=[name for _, name in ordered],
+            )
+        )
+
+    @staticmethod
+    def _push(module: _ParsedModule, queue: List[Tuple[int, int, str]], seen: Set[str], name: str, depth: int) -> None:
+        if name in seen or name not in module.definitions:
+            return
+        seen.add(name)
+        heapq.heappush(queue, (depth, module.definitions[name].lineno, name))
+
+    @staticmethod
+    def _add_class_context(
+        module: _ParsedModule,
+        class_node: ast.ClassDef,
+        func_node: ast.AST,
+        segments: Dict[Tuple[int, int], str],
+        references: Set[str],
+        budget: float,
+    ) -> int:
+        """Add the class header, the class-level statements and the sibling methods used through `self`.
+
+        The names referenced by the added code are added to `references`.
+        """
+        for node in class_node.bases + class_node.keywords + class_node.decorator_list:
+            references |= _referenced_names(node)
+        start, _ = module.segment(class_node)
+        first = class_node.body[0]
+        has_docstring = isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant)
+        header_end = max(first.end_lineno if has_docstring else module.segment(first)[0] - 1, class_node.lineno)
+        segments[(start, header_end)] = class_node.name
+        used = count_token(module.text(start, header_end))
+
+        attributes = _self_attributes(func_node)
+        for child in class_node.body:
+            if child is func_node or child is first and header_end >= child.lineno:
+                continue
+            is_method = isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+            if is_method and child.name not in attributes:
+                continue
+            if not is_method and not isinstance(child, (ast.Assign, ast.AnnAssign)):
+                continue
+            segment = module.segment(child)
+            tokens = count_token(module.text(*segment))
+            if used + tokens > budget:
+                continue
+            names = [child.name] if is_method else _bound_names(child)
+            segments[segment] = ".".join([class_node.name] + names[:1])
+            references |= _referenced_names(child)
+            used += tokens
+        return used
+
+    def _record(self, code_slice: CodeSlice) -> CodeSlice:
+        with self._lock:
+            self.num_calls += 1
+            self.tokens_saved += code_slice.tokens_saved
+        return code_slice
@@ -1,18 +1,34 @@
+import bisect
+import itertools
 import logging
+import operator
 import os
 import pathlib
 import re
 import string
 import subprocess
 import sys
+import tempfile
+import threading
 import time
 
+from collections import OrderedDict
+from contextlib import nullcontext
+from hashlib import md5
 from pydantic import BaseModel
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 import docker
 
-from azentcoder import oai
+from azentcoder import oai_mock as oai
+from azentcoder.code_context import CodeContextSlicer
+from azentcoder.compile_cache import DEFAULT_COMPILE_CACHE
+
+if TYPE_CHECKING:
+    from azentcoder.coding.error_channel import ExecutionStatus
+    from azentcoder.coding.docker_backend import ShardedDockerBackend
+    from azentcoder.coding.image_manager import ImageManager
+    from azentcoder.coding.resources import ResourceLimits
 
 SENTINEL = object()
 DEFAULT_MODEL = "gpt-4"
@@ -32,27 +48,122 @@ logger = logging.getLogger(__name__)
 # import rich
 UNKNOWN = "unknown"
 
+class ContentSpan(NamedTuple):
+    """The characters [start, end) of a `MessageContentView` that come from the part at `index` of the content."""
+
+    start: int
+    end: int
+    index: int
+
+
+class MessageContentView(str):
+    """(Experimental) The text of a list of message content parts, rendered once.
+
+    The view is the `str` that `content_str` has always returned, text parts joined and images rendered as
+    `<image>`, so it can be used wherever the text is. It also keeps the offset of each part in the text, so a
+    match in the text (e.g. a code block) can be mapped back to the index of the part it came from. The view
+    does not reference the content list or its parts, so it never keeps image payloads alive.
+    """
+
+    def __new__(cls, content: List[Dict[str, Any]]) -> "MessageContentView":
+        texts = []
+        for item in content:
+            if not isinstance(item, dict):
+                raise TypeError("Wrong content format: every element should be dict if the content is a list.")
+            assert "type" in item, "Wrong content format. Missing 'type' key in content's dict."
+            kind = item["type"]
+            if kind == "text":
+                texts.append(item["text"])
+            elif kind == "image_url":
+                texts.append("<image>")
+            else:
+                raise ValueError(f"Wrong content format: unknown type {kind} within the content")
+        view = super().__new__(cls, "".join(texts))
+        # 每个片段的类型和文本的引用，用来判断内容是否被修改，不引用片段本身
+        view._types = list(map(dict.get, content, itertools.repeat("type")))
+        view._texts = list(map(dict.get, content, itertools.repeat("text")))
+        view._starts = list(itertools.accumulate(map(len, texts), initial=0))[:-1]
+        return view
+
+    @property
+    def spans(self) -> List[ContentSpan]:
+        """The span of every part in the text, in the order of the parts."""
+        ends = self._starts[1:] + [len(self)]
+        return [ContentSpan(start, end, index) for index, (start, end) in enumerate(zip(self._starts, ends))]
+
+    def part_index(self, offset: int) -> int:
+        """(Experimental) The index of the content part that the character at `offset` comes from."""
+        if not 0 <= offset < len(self):
+            raise IndexError(f"offset {offset} is out of range")
+        # 空的文本片段和下一个片段的起点相同，bisect_right 会越过它们
+        return bisect.bisect_right(self._starts, offset) - 1
+
+    def locate(self, start: int, end: int) -> List[ContentSpan]:
+        """(Experimental) The parts that the characters [start, end) come from, with offsets within each part."""
+        if start >= end:
+            return []
+        located = []
+        for index in range(self.part_index(start), self.part_index(end - 1) + 1):
+            part_start = self._starts[index]
+            part_end = self._starts[index + 1] if index + 1 < len(self._starts) else len(self)
+            if part_end > part_start:
+                located.append(ContentSpan(max(start, part_start) - part_start, min(end, part_end) - part_start, index))
+        return located
+
+    def is_view_of(self, content: List[Dict[str, Any]]) -> bool:
+        """Whether the view renders the content: the parts have the same types and the very same text objects."""
+        # 文本由视图持有，同一个对象就是同样的文本；只比较对象的同一性，不读取文本和图片内容
+        if len(content) != len(self._texts) or not all(isinstance(item, dict) for item in content):
+            return False
+        texts = map(dict.get, content, itertools.repeat("text"))
+        types = map(dict.get, content, itertools.repeat("type"))
+        return all(map(operator.is_, texts, self._texts)) and list(types) == self._types
+
+
+class _ContentViewCache:
+    """A small LRU cache of the views of the content lists, keyed by identity.
+
+    Lists cannot be weakly referenced, so the cache is keyed by `id` and holds only the views. A view is
+    returned only if it still renders the list (`is_view_of`), so a new list that reuses the id of a collected
+    one is rendered again unless it renders to the same text.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._capacity = capacity
+        self._views: "OrderedDict[int, MessageContentView]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content: List[Dict[str, Any]]) -> MessageContentView:
+        with self._lock:
+            view = self._views.get(id(content))
+            if view is not None and view.is_view_of(content):
+                self._views.move_to_end(id(content))
+                return view
+        view = MessageContentView(content)
+        with self._lock:
+            self._views[id(content)] = view
+            self._views.move_to_end(id(content))
+            while len(self._views) > self._capacity:
+                self._views.popitem(last=False)
+        return view
+
+
+_CONTENT_VIEWS = _ContentViewCache()
+
+
 def content_str(content: Union[str, List[Dict[str, Any]], None]) -> str:
+    """Return the text of a message content: the string, or a `MessageContentView` of a list of parts.
+
+    The view of a list is cached while the list and its parts are the same objects, so extracting from the
+    same message again does not render it again.
+    """
     if content is None:
         return ""
     if isinstance(content, str):
         return content
     if not isinstance(content, list):
         raise TypeError(f"content must be None, str, or list, but got {type(content)}")
-
-    rst = ""
-    for item in content:
-        if not isinstance(item, dict):
-            raise TypeError("Wrong content format: every element should be dict if the content is a list.")
-        assert "type" in item, "Wrong content format. Missing 'type' key in content's dict."
-        if item["type"] == "text":
-            rst += item["text"]
-        elif item["type"] == "image_url":
-            rst += "<image>"
-        else:
-            raise ValueError(f"Wrong content format: unknown type {item['type']} within the content")
-    return rst
-
+    return _CONTENT_VIEWS.get(content)
 
 
 def infer_lang(code):
@@ -64,7 +175,7 @@ def infer_lang(code):
 
     # check if code is a valid python code
     try:
-        compile(code, "test", "exec")
+        DEFAULT_COMPILE_CACHE.compile(code)
         return "python"
     except SyntaxError:
         # not a valid python code
@@ -128,23 +239,42 @@ def _cmd(lang):
         return lang
     if lang in ["shell"]:
         return "sh"
+    if lang in ["javascript", "js", "node"]:
+        return "node"
     if lang in ["ps1", "pwsh", "powershell"]:
         return powershell_command
 
     raise NotImplementedError(f"{lang} not recognized in code execution")
 
-def improve_function(file_name, func_name, objective, **config):
-    """(openai<1) Improve the function to achieve the objective."""
+_CODE_CONTEXT_SLICER = CodeContextSlicer()
+
+def improve_function(file_name, func_name, objective, slice_context=True, token_budget=None, **config):
+    """(openai<1) Improve the function to achieve the objective.
+
+    With `slice_context`, only the function and the code it references are sent to the model, up to
+    `token_budget` tokens, instead of the entire file.
+    """
     params = {**_IMPROVE_FUNCTION_CONFIG, **config}
-    # read the entire file into a str
-    with open(file_name, "r") as f:
-        file_string = f.read()
+    if slice_context:
+        code_slice = _CODE_CONTEXT_SLICER.slice(file_name, func_name, token_budget)
+        file_string = code_slice.text
+        logger.info(
+            "Sliced %s for %s: %d of %d tokens, %d tokens saved",
+            file_name,
+            func_name,
+            code_slice.tokens_sliced,
+            code_slice.tokens_full,
+            code_slice.tokens_saved,
+        )
+    else:
+        # read the entire file into a str
+        with open(file_name, "r") as f:
+            file_string = f.read()
 
-    return ""
-    # response = oai.Completion.create(
-    #     {"func_name": func_name, "objective": objective, "file_string": file_string}, **params
-    # )
-    # return oai.Completion.extract_text(response)[0], response["cost"]
+    response = oai.Completion.create(
+        {"func_name": func_name, "objective": objective, "file_string": file_string}, **params
+    )
+    return oai.Completion.extract_text(response)[0], response["cost"]
 
 _IMPROVE_CODE_CONFIG = {
     "prompt": """Analyze the code in the following files and return a list of suggestions for improvement{followup}, to achieve the objective of '{objective}'.
@@ -235,6 +365,19 @@ def check_can_use_docker_or_throw(use_docker) -> None:
                 '- Set AUTOGEN_USE_DOCKER to "0/False/no" in your environment variables'
             )
 
+# 超时后先发送 SIGTERM，给进程留出写出现场的时间，再强制结束
+TERMINATE_GRACE = 2
+
+
+def _terminate(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.communicate(timeout=TERMINATE_GRACE)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+
+
 # 执行代码
 def execute_code(
     code: Optional[str] = None,
@@ -243,19 +386,107 @@ def execute_code(
     work_dir: Optional[str] = None,
     use_docker: Union[List[str], str, bool] = SENTINEL,
     lang: Optional[str] = "python",
+    env: Optional[Dict[str, str]] = None,
+    flight_recorder: bool = False,
+    cpus: Optional[List[int]] = None,
+    image_manager: Optional["ImageManager"] = None,
+    docker_backend: Optional["ShardedDockerBackend"] = None,
+    limits: Optional["ResourceLimits"] = None,
 ) -> Tuple[int, str, Optional[str]]:
+    """Execute code in a local subprocess or a docker container.
+
+    See `run_code` for the arguments, and for the separate output streams and the parsed Python traceback.
+
+    Returns:
+        Tuple[int, str, Optional[str]]: The exit code, the logs and the docker image used, if any.
+    """
+    status = run_code(
+        code,
+        timeout,
+        filename,
+        work_dir,
+        use_docker,
+        lang,
+        env,
+        flight_recorder,
+        cpus,
+        image_manager,
+        docker_backend,
+        limits,
+        # 返回值里没有资源统计，不需要采样
+        stats_interval=None,
+    )
+    return status.exit_code, status.output, status.image
+
+
+def run_code(
+    code: Optional[str] = None,
+    timeout: Optional[int] = None,
+    filename: Optional[str] = None,
+    work_dir: Optional[str] = None,
+    use_docker: Union[List[str], str, bool] = SENTINEL,
+    lang: Optional[str] = "python",
+    env: Optional[Dict[str, str]] = None,
+    flight_recorder: bool = False,
+    cpus: Optional[List[int]] = None,
+    image_manager: Optional["ImageManager"] = None,
+    docker_backend: Optional["ShardedDockerBackend"] = None,
+    limits: Optional["ResourceLimits"] = None,
+    stats_interval: Optional[float] = 0.5,
+) -> "ExecutionStatus":
+    """(Experimental) Execute code in a local subprocess or a docker container and return a structured status.
+
+    The exit code is the one of the process, and stdout and stderr are kept apart. Python code runs under an
+    `ErrorChannel` runner, which reports an uncaught exception (its type, message, file and line) in a side
+    file and prints the traceback with paths relative to `work_dir`, so the logs are never scanned.
+
+    Args:
+        code (Optional, str): The code to execute. The code in `filename` if None.
+        timeout (Optional, int): The timeout in seconds, `DEFAULT_TIMEOUT` if None.
+        filename (Optional, str): The file of the code, relative to `work_dir`. Generated if None, and hidden from
+            the traceback.
+        work_dir (Optional, str): The working directory, `WORKING_DIR` if None.
+        use_docker (list, str or bool): The docker images to try, True for the default python images, False to run
+            in a local subprocess.
+        lang (Optional, str): The language of the code.
+        env (Optional, dict): Environment variables added to the execution.
+        flight_recorder (bool): Whether to sample the stack of a Python block while it runs. If the block times
+            out, the stacks where the time went are appended to the logs, see `FlightRecorder`.
+        cpus (Optional, list): Run the code on these CPUs only, with `sched_setaffinity` for a local subprocess
+            and `cpuset_cpus` for a container, see `CpuSlotPool`.
+        image_manager (Optional, ImageManager): Resolves the docker image from its cache, so a started manager
+            that prefetched the images keeps the pulls off the execution path. The images are resolved at call
+            time if None.
+        docker_backend (Optional, ShardedDockerBackend): Run the container on the least loaded healthy daemon of
+            the backend instead of the local one, failing over to the next daemon when one is unreachable. The
+            work_dir must be visible to every daemon at the same path. Cannot be combined with `image_manager`.
+        limits (Optional, ResourceLimits): The CPU, memory and pids limits of the container. Not applied to a
+            local subprocess. A container killed for exceeding the memory limit is reported with `oom_killed`.
+        stats_interval (Optional, float): The seconds between two samples of the container stats, the usage is
+            returned in `resource_usage`. None to not sample.
+
+    Returns:
+        ExecutionStatus: The exit code, the output streams, the Python error if any and the docker image used.
+    """
+    from azentcoder.coding.error_channel import ErrorChannel, ExecutionStatus
+    from azentcoder.coding.resources import OOM_MSG, ContainerStatsSampler, ResourceUsage
+
     if all((code is None, filename is None)):
         error_msg = f"Either {code=} or {filename=} must be provided."
         logger.error(error_msg)
         raise AssertionError(error_msg)
 
+    if docker_backend is not None and image_manager is not None:
+        raise ValueError("image_manager cannot be used with docker_backend, images are resolved per endpoint.")
     running_inside_docker = in_docker_container()
-    docker_running = is_docker_running()
+    # 使用远程 daemon 时不需要本地的 docker
+    docker_running = docker_backend is not None or is_docker_running()
 
     # SENTINEL is used to indicate that the user did not explicitly set the argument
     if use_docker is SENTINEL:
         use_docker = decide_use_docker(use_docker=None)
-    check_can_use_docker_or_throw(use_docker)
+    if docker_backend is None:
+        check_can_use_docker_or_throw(use_docker)
 
     timeout = timeout or DEFAULT_TIMEOUT
     original_filename = filename
@@ -276,39 +507,69 @@ def execute_code(
         with open(filepath, "w", encoding="utf-8") as fout:
             fout.write(code)
 
+    recorder = None
+    run_filename = filename
+    if flight_recorder and lang.startswith("python"):
+        from azentcoder.coding.flight_recorder import FlightRecorder
+
+        recorder = FlightRecorder()
+        run_filename, runner_code = recorder.wrap(filename)
+        with open(os.path.join(work_dir, run_filename), "w", encoding="utf-8") as fout:
+            fout.write(runner_code)
+    error_channel = None
+    if lang.startswith("python"):
+        # 最外层的包装脚本，报告未捕获的异常
+        error_channel = ErrorChannel()
+        error_target = run_filename
+        run_filename, runner_code = error_channel.wrap(
+            error_target, source=filename, display_name=None if original_filename is not None else ""
+        )
+        with open(os.path.join(work_dir, run_filename), "w", encoding="utf-8") as fout:
+            fout.write(runner_code)
+
+    def collect(timed_out: bool) -> Tuple[Optional[str], Any]:
+        summary = recorder.collect(pathlib.Path(work_dir), filename) if recorder is not None else None
+        error = error_channel.collect(pathlib.Path(work_dir), error_target) if error_channel is not None else None
+        if original_filename is None:
+            os.remove(filepath)
+        if not timed_out:
+            return None, error
+        return (TIMEOUT_MSG if summary is None else f"{TIMEOUT_MSG}\n{summary.format()}"), error
+
     if not use_docker or running_inside_docker:
         # already running in a docker container
         cmd = [
             sys.executable if lang.startswith("python") else _cmd(lang),
-            f".\\{filename}" if WIN32 else filename,
+            f".\\{run_filename}" if WIN32 else run_filename,
         ]
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(
-                subprocess.run,
-                cmd,
-                cwd=work_dir,
-                capture_output=True,
-                text=True,
-            )
-            try:
-                result = future.result(timeout=timeout)
-            except TimeoutError:
-                if original_filename is None:
-                    os.remove(filepath)
-                return 1, TIMEOUT_MSG, None
-        if original_filename is None:
-            os.remove(filepath)
-        if result.returncode:
-            logs = result.stderr
-            if original_filename is None:
-                abs_path = str(pathlib.Path(filepath).absolute())
-                logs = logs.replace(str(abs_path), "").replace(filename, "")
-            else:
-                abs_path = str(pathlib.Path(work_dir).absolute()) + PATH_SEPARATOR
-                logs = logs.replace(str(abs_path), "")
-        else:
-            logs = result.stdout
-        return result.returncode, logs, None
+        from azentcoder.coding.cpu_affinity import pin_on_exec, set_affinity
+
+        preexec_fn = pin_on_exec(cpus)
+        proc = subprocess.Popen(
+            cmd,
+            cwd=work_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=None if env is None else {**os.environ, **env},
+            preexec_fn=preexec_fn,
+        )
+        if cpus is not None and preexec_fn is None:
+            set_affinity(proc.pid, cpus)
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _terminate(proc)
+            logs, _ = collect(timed_out=True)
+            return ExecutionStatus(exit_code=1, output=logs, timed_out=True)
+        _, error = collect(timed_out=False)
+        logs = stdout
+        if proc.returncode:
+            logs = stderr
+            if original_filename is None and error_channel is None:
+                # 隐藏生成的文件名，Python 的 traceback 已经由 ErrorChannel 处理
+                logs = logs.replace(filename, "")
+        return ExecutionStatus(exit_code=proc.returncode, output=logs, stdout=stdout, stderr=stderr, error=error)
 
     # create a docker client
     if use_docker and not docker_running:
@@ -316,8 +577,6 @@ def execute_code(
             "Docker package is missing or docker is not running. Please make sure docker is running or set use_docker=False."
         )
 
-    client = docker.from_env()
-
     image_list = (
         ["python:3-slim", "python:3", "python:3-windowsservercore"]
         if use_docker is True
@@ -325,69 +584,87 @@ def execute_code(
         if isinstance(use_docker, str)
         else use_docker
     )
-    for image in image_list:
-        # check if the image exists
-        try:
-            client.images.get(image)
-            break
-        except docker.errors.ImageNotFound:
-            # pull the image
-            print("Pulling image", image)
-            try:
-                client.images.pull(image)
-                break
-            except docker.errors.DockerException:
-                print("Failed to pull image", image)
-    # get a randomized str based on current time to wrap the exit code
-    exit_code_str = f"exitcode{time.time()}"
     abs_path = pathlib.Path(work_dir).absolute()
-    cmd = [
-        "sh",
-        "-c",
-        f'{_cmd(lang)} "{filename}"; exit_code=$?; echo -n {exit_code_str}; echo -n $exit_code; echo {exit_code_str}',
-    ]
-    # create a docker container
-    container = client.containers.run(
-        image,
-        command=cmd,
-        working_dir="/workspace",
-        detach=True,
-        # get absolute path to the working directory
-        volumes={abs_path: {"bind": "/workspace", "mode": "rw"}},
-    )
-    start_time = time.time()
-    while container.status != "exited" and time.time() - start_time < timeout:
-        # Reload the container object
-        container.reload()
-    if container.status != "exited":
-        container.stop()
+
+    def start(client: Any) -> Tuple[str, Any]:
+        if image_manager is None:
+            from azentcoder.coding.image_manager import ImageManager
+
+            # 没有共享的 ImageManager 时在调用时解析镜像
+            manager = ImageManager(client=client, refresh_interval=None, max_workers=1)
+            try:
+                image = manager.first_available(image_list)
+            finally:
+                manager.close()
+        else:
+            image = image_manager.first_available(image_list)
+        # create a docker container
+        container = client.containers.run(
+            image,
+            command=[_cmd(lang), run_filename],
+            environment=env,
+            working_dir="/workspace",
+            detach=True,
+            # get absolute path to the working directory
+            volumes={abs_path: {"bind": "/workspace", "mode": "rw"}},
+            **({} if cpus is None else {"cpuset_cpus": ",".join(str(cpu) for cpu in cpus)}),
+            **({} if limits is None else limits.create_kwargs()),
+        )
+        return image, container
+
+    endpoint = None
+    if docker_backend is None:
+        image, container = start(docker.from_env() if image_manager is None else image_manager.client)
+    else:
+        # 放到负载最低的健康 daemon 上，daemon 不可用时换下一个
+        endpoint, (image, container) = docker_backend.acquire(start)
+    try:
+        sampler = None
+        if stats_interval is not None:
+            # 容器为这次执行而创建，统计计数从零开始
+            sampler = ContainerStatsSampler(container, stats_interval, fresh=True)
+        start_time = time.time()
+        with sampler if sampler is not None else nullcontext():
+            while container.status != "exited" and time.time() - start_time < timeout:
+                # Reload the container object
+                container.reload()
+        usage = sampler.usage() if sampler is not None else None
+        if container.status != "exited":
+            container.stop()
+            container.remove()
+            logs, _ = collect(timed_out=True)
+            return ExecutionStatus(exit_code=1, output=logs, timed_out=True, image=image, resource_usage=usage)
+        # 容器的退出码就是代码的退出码，output 保留 stdout 和 stderr 交错的顺序，另外分开读取两个流
+        exit_code = container.attrs["State"]["ExitCode"]
+        oom_killed = bool(container.attrs["State"].get("OOMKilled"))
+        if usage is not None:
+            usage.oom_killed = oom_killed
+        logs = container.logs().decode("utf-8").rstrip()
+        stdout = container.logs(stdout=True, stderr=False).decode("utf-8")
+        stderr = container.logs(stdout=False, stderr=True).decode("utf-8")
+        # commit the image
+        tag = _sanitize_filename_for_docker_tag(filename)
+        container.commit(repository="python", tag=tag)
+        # remove the container
         container.remove()
-        if original_filename is None:
-            os.remove(filepath)
-        return 1, TIMEOUT_MSG, image
-    # get the container logs
-    logs = container.logs().decode("utf-8").rstrip()
-    # commit the image
-    tag = _sanitize_filename_for_docker_tag(filename)
-    container.commit(repository="python", tag=tag)
-    # remove the container
-    container.remove()
-    # check if the code executed successfully
-    exit_code = container.attrs["State"]["ExitCode"]
-    if exit_code == 0:
-        # extract the exit code from the logs
-        pattern = re.compile(f"{exit_code_str}(\\d+){exit_code_str}")
-        match = pattern.search(logs)
-        exit_code = 1 if match is None else int(match.group(1))
-        # remove the exit code from the logs
-        logs = logs if match is None else pattern.sub("", logs)
-
-    if original_filename is None:
-        os.remove(filepath)
-    if exit_code:
-        logs = logs.replace(f"/workspace/{filename if original_filename is None else ''}", "")
-    # return the exit code, logs and image
-    return exit_code, logs, f"python:{tag}"
+        _, error = collect(timed_out=False)
+        if exit_code and original_filename is None and error_channel is None:
+            logs = logs.replace(filename, "")
+        if oom_killed:
+            logs += f"\n{OOM_MSG}" + (f" (limit {limits.memory})." if limits is not None and limits.memory else ".")
+        return ExecutionStatus(
+            exit_code=exit_code,
+            output=logs,
+            stdout=stdout,
+            stderr=stderr,
+            error=error,
+            image=f"python:{tag}",
+            oom_killed=oom_killed,
+            resource_usage=usage,
+        )
+    finally:
+        if endpoint is not None:
+            docker_backend.release(endpoint)
 
 
 _GENERATE_ASSERTIONS_CONFIG = {
@@ -419,13 +696,265 @@ def generate_assertions(definition: str, **config) -> Tuple[str, float]:
         {"definition": definition},
         **params,
     )
-    # assertions = oai.Completion.extract_text(response)[0]
+    assertions = oai.Completion.extract_text(response)[0]
     return assertions, response["cost"]
 
+def _remove_check(response):
+    """Remove the check function from the response."""
+    # find the position of the check function
+    pos = response.find("def check(")
+    if pos == -1:
+        return response
+    return response[:pos]
+
+
+def _run_candidate(
+    code: str, timeout: Optional[float], use_docker: Optional[bool], cancelled: threading.Event
+) -> Tuple[bool, float]:
+    """在独立的子进程和临时目录中执行一个候选实现，返回是否通过以及运行耗时
+
+    The local process is terminated when it times out or as soon as `cancelled` is set. A container is stopped
+    at its timeout only.
+    """
+    start_time = time.time()
+    # 每个候选使用自己的目录，并发的候选不会读写同一个脚本
+    with tempfile.TemporaryDirectory(prefix="azentcoder-candidate-") as work_dir:
+        if use_docker:
+            succeed = execute_code(code, timeout=timeout, work_dir=work_dir, use_docker=use_docker)[0] == 0
+            return succeed, time.time() - start_time
+        with open(os.path.join(work_dir, "candidate.py"), "w", encoding="utf-8") as fout:
+            fout.write(code)
+        proc = subprocess.Popen(
+            [sys.executable, "candidate.py"], cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = start_time + (timeout or DEFAULT_TIMEOUT)
+        while proc.poll() is None:
+            if cancelled.is_set() or time.time() >= deadline:
+                _terminate(proc)
+                return False, time.time() - start_time
+            try:
+                proc.wait(timeout=min(0.05, max(0.0, deadline - time.time())))
+            except subprocess.TimeoutExpired:
+                pass
+        return proc.returncode == 0, time.time() - start_time
+
+
+def _first_pass(passed: List[Optional[bool]]) -> Optional[int]:
+    """Return the index of the first passing candidate once every earlier candidate has failed."""
+    for i, succeed in enumerate(passed):
+        if succeed is None:
+            return None
+        if succeed:
+            return i
+    return None
+
+
+def _check_candidates(
+    codes: List[str],
+    timeout: Optional[float] = 3,
+    use_docker: Optional[bool] = False,
+    max_workers: Optional[int] = None,
+    stop_on_first_pass: bool = True,
+) -> Tuple[List[Optional[bool]], List[Optional[float]]]:
+    """Run the candidate codes concurrently, each in its own process with its own timeout.
+
+    Identical candidates are only executed once. When `stop_on_first_pass` is True, the
+    remaining candidates are cancelled as soon as the lowest-index passing candidate is
+    known, so the selection is the same as running them one at a time. The processes of
+    the candidates that are still running are terminated.
+
+    Returns:
+        List[Optional[bool]]: Whether each candidate passed; None if it was cancelled.
+        List[Optional[float]]: The run time of each candidate in seconds; None if it was cancelled.
+    """
+    n = len(codes)
+    passed: List[Optional[bool]] = [None] * n
+    run_times: List[Optional[float]] = [None] * n
+    indices: Dict[str, List[int]] = {}
+    for i, code in enumerate(codes):
+        indices.setdefault(code, []).append(i)
+    max_workers = max_workers or min(len(indices), os.cpu_count() or 1)
+
+    cancelled = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    # 按候选顺序提交，保证 worker 数量较少时优先执行排在前面的候选
+    futures = {pool.submit(_run_candidate, code, timeout, use_docker, cancelled): code for code in indices}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                succeed, run_time = future.result()
+                for i in indices[futures[future]]:
+                    passed[i], run_times[i] = succeed, run_time
+            if stop_on_first_pass and _first_pass(passed) is not None:
+                break
+    finally:
+        for future in pending:
+            future.cancel()
+        # 结束仍在运行的候选进程，等待它们清理各自的临时目录
+        cancelled.set()
+        pool.shutdown(wait=True)
+    return passed, run_times
+
+
+def eval_function_completions(
+    responses: List[str],
+    definition: str,
+    test: Optional[str] = None,
+    entry_point: Optional[str] = None,
+    assertions: Optional[Union[str, Callable[[str], Tuple[str, float]]]] = None,
+    timeout: Optional[float] = 3,
+    use_docker: Optional[bool] = False,
+    max_workers: Optional[int] = None,
+    stop_on_first_pass: bool = True,
+) -> Dict:
+    """(openai<1) Select a response from a list of responses for the function completion task (using generated assertions), and/or evaluate if the task is successful using a gold test.
+
+    The candidates are checked concurrently in isolated local processes.
+
+    Args:
+        responses (list): The list of responses.
+        definition (str): The input definition.
+        test (Optional, str): The test code.
+        entry_point (Optional, str): The name of the function.
+        assertions (Optional, str or Callable): The assertion code which serves as a filter of the responses, or an assertion generator.
+            When provided, only the responses that pass the assertions will be considered for the actual test (if provided).
+        timeout (Optional, float): The timeout for executing the code of each candidate.
+        use_docker (Optional, bool): Whether to run the candidates in docker.
+        max_workers (Optional, int): The maximum number of candidates checked at the same time.
+        stop_on_first_pass (bool): Whether to stop checking once the first passing candidate is known.
+
+    Returns:
+        dict: The success metrics, including the per-candidate `run_times` and the total `cost`.
+    """
+    n = len(responses)
+    if assertions is None:
+        # no assertion filter
+        codes = []
+        for i in range(n):
+            response = _remove_check(responses[i])
+            codes.append(
+                f"{response}\n{test}\ncheck({entry_point})"
+                if response.startswith("def")
+                else f"{definition}{response}\n{test}\ncheck({entry_point})"
+            )
+        success_list, run_times = _check_candidates(
+            codes, timeout=timeout, use_docker=use_docker, max_workers=max_workers, stop_on_first_pass=False
+        )
+        return {
+            "expected_success": 1 - pow(1 - sum(success_list) / n, n),
+            "success": any(s for s in success_list),
+            "run_times": run_times,
+            "cost": 0,
+        }
+    if callable(assertions) and n > 1:
+        # assertion generator
+        assertions, gen_cost = assertions(definition)
+    else:
+        gen_cost = 0
+    run_times: List[Optional[float]] = [None] * n
+    if n > 1 or test is None:
+        codes = []
+        for i in range(n):
+            response = responses[i] = _remove_check(responses[i])
+            codes.append(
+                f"{response}\n{assertions}" if response.startswith("def") else f"{definition}{response}\n{assertions}"
+            )
+        passed, run_times = _check_candidates(
+            codes,
+            timeout=timeout,
+            use_docker=use_docker,
+            max_workers=max_workers,
+            stop_on_first_pass=stop_on_first_pass,
+        )
+        i = _first_pass(passed)
+        succeed_assertions = i is not None
+        if i is None:
+            # 没有候选通过断言时，与顺序执行一样选择最后一个候选
+            i = n - 1
+        response = responses[i]
+    else:
+        # just test, no need to check assertions
+        succeed_assertions = False
+        i, response = 0, responses[0]
+    metrics = {
+        "index_selected": i,
+        "succeed_assertions": succeed_assertions,
+        "gen_cost": gen_cost,
+        "assertions": assertions,
+        "run_times": run_times,
+        "cost": gen_cost,
+    }
+    if test is None:
+        # no test code
+        return metrics
+    code_test = (
+        f"{response}\n{test}\ncheck({entry_point})"
+        if response.startswith("def")
+        else f"{definition}{response}\n{test}\ncheck({entry_point})"
+    )
+    metrics["success"] = _run_candidate(code_test, timeout, use_docker, threading.Event())[0]
+    return metrics
+
+
+_FUNC_COMPLETION_PROMPT = "# Python 3{definition}"
+_FUNC_COMPLETION_STOP = ["\nclass", "\ndef", "\nif", "\nprint"]
+_IMPLEMENT_CONFIGS = [
+    {"model": FAST_MODEL, "prompt": _FUNC_COMPLETION_PROMPT, "temperature": 0, "cache_seed": 0},
+    {"model": FAST_MODEL, "prompt": _FUNC_COMPLETION_PROMPT, "stop": _FUNC_COMPLETION_STOP, "n": 7, "cache_seed": 0},
+    {"model": DEFAULT_MODEL, "prompt": _FUNC_COMPLETION_PROMPT, "temperature": 0, "cache_seed": 1},
+    {"model": DEFAULT_MODEL, "prompt": _FUNC_COMPLETION_PROMPT, "stop": _FUNC_COMPLETION_STOP, "n": 2, "cache_seed": 2},
+    {"model": DEFAULT_MODEL, "prompt": _FUNC_COMPLETION_PROMPT, "stop": _FUNC_COMPLETION_STOP, "n": 1, "cache_seed": 2},
+]
+
+
+class PassAssertionFilter:
+    """(openai<1) 用断言过滤模型返回的候选实现，候选会被并发地检查"""
+
+    def __init__(
+        self,
+        assertions,
+        timeout: Optional[float] = 3,
+        use_docker: Optional[bool] = False,
+        max_workers: Optional[int] = None,
+        stop_on_first_pass: bool = True,
+    ):
+        self._assertions = assertions
+        self._timeout = timeout
+        self._use_docker = use_docker
+        self._max_workers = max_workers
+        self._stop_on_first_pass = stop_on_first_pass
+        self.cost = 0
+        self.metrics = self.responses = None
+
+    def pass_assertions(self, context, response, **_):
+        """(openai<1) Check if the response passes the assertions."""
+        responses = oai.Completion.extract_text(response)
+        metrics = eval_function_completions(
+            responses,
+            context["definition"],
+            assertions=self._assertions,
+            timeout=self._timeout,
+            use_docker=self._use_docker,
+            max_workers=self._max_workers,
+            stop_on_first_pass=self._stop_on_first_pass,
+        )
+        self._assertions = metrics["assertions"]
+        self.cost += metrics["cost"]
+        self.metrics = metrics
+        self.responses = responses
+        return metrics["succeed_assertions"]
+
+
 def implement(
     definition: str,
     configs: Optional[List[Dict]] = None,
     assertions: Optional[Union[str, Callable[[str], Tuple[str, float]]]] = generate_assertions,
+    max_workers: Optional[int] = None,
+    stop_on_first_pass: bool = True,
+    fanout: Optional[int] = None,
+    hedge_delay: Optional[float] = None,
 ) -> Tuple[str, float]:
     """(openai<1) Implement a function from a definition.
 
@@ -433,6 +962,10 @@ def implement(
         definition (str): The function definition, including the signature and docstr.
         configs (list): The list of configurations for completion.
         assertions (Optional, str or Callable): The assertion code which serves as a filter of the responses, or an assertion generator.
+        max_workers (Optional, int): The maximum number of candidates whose assertions are checked at the same time.
+        stop_on_first_pass (bool): Whether to stop checking candidates once the first passing one is known.
+        fanout (Optional, int): The number of configs requested at once, see `oai.Completion.create`.
+        hedge_delay (Optional, float): The delay before hedging with the next config, see `oai.Completion.create`.
 
     Returns:
         str: The implementation.
@@ -443,9 +976,14 @@ def implement(
     configs = configs or _IMPLEMENT_CONFIGS
     if len(configs) > 1 and callable(assertions):
         assertions, cost = assertions(definition)
-    assertion_filter = PassAssertionFilter(assertions)
+    assertion_filter = PassAssertionFilter(assertions, max_workers=max_workers, stop_on_first_pass=stop_on_first_pass)
     response = oai.Completion.create(
-        {"definition": definition}, config_list=configs, filter_func=assertion_filter.pass_assertions
+        {"definition": definition},
+        config_list=configs,
+        filter_func=assertion_filter.pass_assertions,
+        fanout=fanout,
+        hedge_delay=hedge_delay,
     )
     cost += assertion_filter.cost + response["cost"]
+    logger.info("Candidate run times: %s, total cost: %s", assertion_filter.metrics["run_times"], cost)
     return assertion_filter.responses[assertion_filter.metrics["index_selected"]], cost, response["config_id"]
@@ -1,6 +1,6 @@
 from .base import CodeBlock, CodeExecutor, CodeExtractor, CodeResult
 from .markdown_code_extractor import MarkdownCodeExtractor
-from .local_commandline_code_executor import  CommandLineCodeResult
+from .local_commandline_code_executor import CommandLineCodeResult, LocalCommandLineCodeExecutor
 from .docker_commandline_code_executor import DockerCommandLineCodeExecutor
 
 __all__ = (
@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .history import percentile
+
+__all__ = ("AdmissionController", "AdmissionRejected", "AdmissionStats", "HostSignals", "read_host_signals")
+
+DEFAULT_TENANT = "default"
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when an execution is not admitted: the wait queue is full or the wait timed out."""
+
+
+class HostSignals(BaseModel):
+    """(Experimental) 主机的负载信号"""
+
+    load_per_cpu: Optional[float] = Field(default=None, description="The 1-minute load average divided by the CPUs.")
+    available_memory_bytes: Optional[int] = Field(default=None, description="The memory available to new processes.")
+
+
+def read_host_signals() -> HostSignals:
+    """(Experimental) Read the load average and the available memory, None where the platform lacks them."""
+    load_per_cpu = None
+    try:
+        load_per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        pass
+    available = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError):
+        pass
+    return HostSignals(load_per_cpu=load_per_cpu, available_memory_bytes=available)
+
+
+class AdmissionStats(BaseModel):
+    """(Experimental) 准入控制的状态和等待时间"""
+
+    running: int = Field(description="The number of admitted executions still running.")
+    queued: int = Field(description="The number of executions waiting to be admitted.")
+    admitted: int = Field(default=0, description="The number of executions admitted.")
+    rejected: int = Field(default=0, description="The number of executions rejected.")
+    throttled: int = Field(default=0, description="The number of times an admission was held back by host load.")
+    running_by_tenant: Dict[str, int] = Field(default_factory=dict)
+    queued_by_tenant: Dict[str, int] = Field(default_factory=dict)
+    wait_p50_seconds: float = Field(default=0.0, description="The median wait of the recent admissions.")
+    wait_p99_seconds: float = Field(default=0.0, description="The 99th percentile wait of the recent admissions.")
+    wait_max_seconds: float = Field(default=0.0, description="The longest wait of the recent admissions.")
+    signals: Optional[HostSignals] = Field(default=None, description="The last host signals read.")
+
+
+class _Waiter:
+    __slots__ = ("tenant", "admitted", "enqueued_at")
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.admitted = False
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    """(Experimental) Limit how many code executions run at once on this host.
+
+    An execution is admitted when fewer than `max_concurrent` executions run, its tenant is under its
+    limit, and the host is not overloaded: the load average per CPU is under `max_load_per_cpu` and the
+    available memory is above `min_available_memory`. The host signals are read at most every
+    `signal_interval` seconds. When the host is overloaded, new executions wait unless nothing is running,
+    so the controller never deadlocks on load from other processes.
+
+    Executions that cannot be admitted wait in a FIFO queue of at most `max_queued` entries; an execution of
+    a tenant at its limit does not block the tenants behind it. Executions arriving at a full queue, or
+    waiting longer than `queue_timeout`, are rejected with `AdmissionRejected` so callers can back off
+    instead of piling up. Share one controller between executors, by passing it as their `admission`.
+
+    Args:
+        max_concurrent (Optional, int): The maximum number of running executions. The number of CPUs if None.
+        tenant_limits (Optional, dict): The maximum number of running executions of each tenant.
+        default_tenant_limit (Optional, int): The limit of the tenants not in `tenant_limits`. No limit if None.
+        max_queued (int): The maximum number of waiting executions, 0 to reject instead of waiting.
+        queue_timeout (Optional, float): The longest wait in seconds. No limit if None.
+        max_load_per_cpu (Optional, float): Hold back admissions above this load average per CPU.
+        min_available_memory (Optional, int): Hold back admissions below this available memory in bytes.
+        signal_interval (float): How long the host signals are reused, in seconds.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        tenant_limits: Optional[Dict[str, int]] = None,
+        default_tenant_limit: Optional[int] = None,
+        max_queued: int = 64,
+        queue_timeout: Optional[float] = 60.0,
+        max_load_per_cpu: Optional[float] = None,
+        min_available_memory: Optional[int] = None,
+        signal_interval: float = 1.0,
+    ):
+        self._max_concurrent = max_concurrent or os.cpu_count() or 1
+        if self._max_concurrent < 1:
+            raise ValueError("max_concurrent must be greater than or equal to 1.")
+        self._tenant_limits = dict(tenant_limits or {})
+        self._default_tenant_limit = default_tenant_limit
+        self._max_queued = max_queued
+        self._queue_timeout = queue_timeout
+        self._max_load_per_cpu = max_load_per_cpu
+        self._min_available_memory = min_available_memory
+        self._signal_interval = signal_interval
+        self._signals: Optional[HostSignals] = None
+        self._signals_at = 0.0
+        self._waiters: List[_Waiter] = []
+        self._running: Dict[str, int] = {}
+        self._admitted = 0
+        self._rejected = 0
+        self._throttled = 0
+        self._waits: Deque[float] = deque(maxlen=1024)
+        self._cond = threading.Condition()
+
+    @property
+    def max_concurrent(self) -> int:
+        return self._max_concurrent
+
+    def _read_signals(self) -> HostSignals:
+        return read_host_signals()
+
+    def _overloaded(self) -> bool:
+        if self._max_load_per_cpu is None and self._min_available_memory is None:
+            return False
+        now = time.monotonic()
+        if self._signals is None or now - self._signals_at >= self._signal_interval:
+            self._signals = self._read_signals()
+            self._signals_at = now
+        signals = self._signals
+        if self._max_load_per_cpu is not None and signals.load_per_cpu is not None:
+            if signals.load_per_cpu > self._max_load_per_cpu:
+                return True
+        if self._min_available_memory is not None and signals.available_memory_bytes is not None:
+            if signals.available_memory_bytes < self._min_available_memory:
+                return True
+        return False
+
+    def _has_capacity(self, tenant: str) -> bool:
+        limit = self._tenant_limits.get(tenant, self._default_tenant_limit)
+        return limit is None or self._running.get(tenant, 0) < limit
+
+    def _dispatch(self) -> None:
+        """Admit the waiters that can run, in arrival order."""
+        total = sum(self._running.values())
+        admitted = False
+        for waiter in self._waiters:
+            if total >= self._max_concurrent:
+                break
+            if waiter.admitted or not self._has_capacity(waiter.tenant):
+                continue
+            if total > 0 and self._overloaded():
+                self._throttled += 1
+                break
+            waiter.admitted = admitted = True
+            self._running[waiter.tenant] = self._running.get(waiter.tenant, 0) + 1
+            total += 1
+        if admitted:
+            self._cond.notify_all()
+
+    def acquire(self, tenant: str = DEFAULT_TENANT, timeout: Optional[float] = None) -> float:
+        """(Experimental) Wait until an execution of the tenant is admitted and return the wait in seconds.
+
+        Args:
+            timeout (Optional, float): Overrides the `queue_timeout` of the controller.
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait times out.
+        """
+        timeout = self._queue_timeout if timeout is None else timeout
+        waiter = _Waiter(tenant)
+        with self._cond:
+            self._waiters.append(waiter)
+            self._dispatch()
+            if not waiter.admitted and sum(1 for w in self._waiters if not w.admitted) > self._max_queued:
+                # 快速失败，让调用方退避而不是继续堆积
+                self._waiters.remove(waiter)
+                self._rejected += 1
+                raise AdmissionRejected(f"The admission queue is full ({self._max_queued} executions).")
+            deadline = None if timeout is None else waiter.enqueued_at + timeout
+            while not waiter.admitted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._waiters.remove(waiter)
+                    self._rejected += 1
+                    raise AdmissionRejected(f"Not admitted within {timeout}s.")
+                # 主机负载变化不会通知条件变量，定期重新检查
+                self._cond.wait(self._signal_interval if remaining is None else min(remaining, self._signal_interval))
+                if not waiter.admitted:
+                    self._dispatch()
+            self._waiters.remove(waiter)
+            wait = time.monotonic() - waiter.enqueued_at
+            self._admitted += 1
+            self._waits.append(wait)
+            return wait
+
+    def release(self, tenant: str = DEFAULT_TENANT) -> None:
+        """(Experimental) Mark an admitted execution of the tenant as finished."""
+        with self._cond:
+            self._running[tenant] -= 1
+            if not self._running[tenant]:
+                del self._running[tenant]
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, tenant: str = DEFAULT_TENANT, timeout: Optional[float] = None) -> Iterator[float]:
+        """(Experimental) A context manager that holds an admission of the tenant, yielding the wait in seconds."""
+        wait = self.acquire(tenant, timeout)
+        try:
+            yield wait
+        finally:
+            self.release(tenant)
+
+    def stats(self) -> AdmissionStats:
+        with self._cond:
+            queued_by_tenant: Dict[str, int] = {}
+            for waiter in self._waiters:
+                if not waiter.admitted:
+                    queued_by_tenant[waiter.tenant] = queued_by_tenant.get(waiter.tenant, 0) + 1
+            waits = sorted(self._waits)
+            return AdmissionStats(
+                running=sum(self._running.values()),
+                queued=sum(queued_by_tenant.values()),
+                admitted=self._admitted,
+                rejected=self._rejected,
+                throttled=self._throttled,
+                running_by_tenant=dict(self._running),
+                queued_by_tenant=queued_by_tenant,
+                wait_p50_seconds=percentile(waits, 0.5) if waits else 0.0,
+                wait_p99_seconds=percentile(waits, 0.99) if waits else 0.0,
+                wait_max_seconds=waits[-1] if waits else 0.0,
+                signals=self._signals,
+            )
+
@@ -1,8 +1,9 @@
-from typing import Any, Dict, List, Protocol, Union, runtime_checkable
+from typing import Any, Dict, List, Optional, Protocol, Union, runtime_checkable
 
 from pydantic import BaseModel, Field
 
 from ..developerchat.agent import LLMAgent
+from .resources import ResourceLimits
 
 __all__ = ("CodeBlock", "CodeResult", "CodeExtractor", "CodeExecutor")
 
@@ -14,6 +15,10 @@ class CodeBlock(BaseModel):
     code: str = Field(description="The code to execute.")
     # 代码语言类别
     language: str = Field(description="The language of the code.")
+    # 这个代码块的资源限制，只能比执行器的限制更严格
+    limits: Optional[ResourceLimits] = Field(
+        default=None, description="The resource limits of this code block, within the limits of the executor."
+    )
 
 
 class CodeResult(BaseModel):
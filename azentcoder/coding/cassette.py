@@ -0,0 +1,194 @@
+import json
+import logging
+import threading
+import time
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from .base import CodeBlock, CodeExecutor, CodeExtractor, CodeResult
+from .markdown_code_extractor import MarkdownCodeExtractor
+
+__all__ = ("CassetteEntry", "CassetteExecutor", "CassetteMiss")
+
+logger = logging.getLogger(__name__)
+
+MODES = ("once", "record", "replay")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when the cassette has no execution of the code blocks."""
+
+
+class CassetteEntry(BaseModel):
+    """(Experimental) 磁带中记录的一次执行"""
+
+    key: str = Field(description="The hash of the languages and the code of the code blocks.")
+    code_blocks: List[CodeBlock] = Field(description="The executed code blocks.")
+    result_type: str = Field(description="The class of the result, as module:qualname.")
+    result: Dict[str, Any] = Field(description="The fields of the result that differ from their defaults.")
+    seconds: float = Field(description="The time the execution took.")
+
+
+def cassette_key(code_blocks: List[CodeBlock]) -> str:
+    """The key of an execution in a cassette: a hash of the languages and the code of the code blocks."""
+    payload = json.dumps([[block.language, block.code] for block in code_blocks], separators=(",", ":"))
+    return sha256(payload.encode()).hexdigest()[:32]
+
+
+def _result_types() -> Dict[str, type]:
+    """The subclasses of `CodeResult` that a cassette can replay, by module:qualname."""
+    # 确保命令行执行器的结果类型已经定义
+    from .local_commandline_code_executor import CommandLineCodeResult  # noqa: F401
+
+    result_types: Dict[str, type] = {}
+    classes = [CodeResult]
+    while classes:
+        result_type = classes.pop()
+        result_types[f"{result_type.__module__}:{result_type.__qualname__}"] = result_type
+        classes.extend(result_type.__subclasses__())
+    return result_types
+
+
+def _result_type(name: str) -> type:
+    # 磁带文件不可信，只接受已经定义的 CodeResult 子类，不按名字导入模块
+    result_type = _result_types().get(name)
+    if result_type is None:
+        logger.warning(f"Unknown result type {name} in the cassette, replaying as CodeResult.")
+        return CodeResult
+    return result_type
+
+
+class CassetteExecutor(CodeExecutor):
+    """(Experimental) Record the executions of a code executor into a cassette file and replay them.
+
+    Each execution is stored as one JSON line: the code blocks, the fields of the result and the time it took.
+    A replayed execution returns an equal result of the same class without running anything, so tests and
+    benchmarks of agents run without subprocesses or docker. Executions of the same code blocks are replayed
+    in the order they were recorded, and the last one is repeated once they run out.
+
+    Modes:
+        - "once": replay the recorded executions and record the new ones.
+        - "record": run every execution and record it, replacing the cassette.
+        - "replay": only replay, raise `CassetteMiss` for an execution that was not recorded.
+
+    Args:
+        cassette_path (Path or str): The cassette file, created when the first execution is recorded.
+        executor (Optional, CodeExecutor): The executor to record. Only needed to record.
+        mode (str): "once", "record" or "replay".
+        replay_latency (bool): Whether a replayed execution takes as long as the recorded one.
+        code_extractor (Optional, CodeExtractor): The code extractor when there is no executor. Markdown if None.
+    """
+
+    def __init__(
+        self,
+        cassette_path: Union[Path, str],
+        executor: Optional[CodeExecutor] = None,
+        mode: str = "once",
+        replay_latency: bool = False,
+        code_extractor: Optional[CodeExtractor] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode}.")
+        if executor is None and mode != "replay":
+            raise ValueError(f"An executor is needed to record in mode {mode}.")
+        self._path = Path(cassette_path)
+        self._executor = executor
+        self._mode = mode
+        self._replay_latency = replay_latency
+        self._code_extractor = code_extractor
+        self._entries: Dict[str, List[CassetteEntry]] = {}
+        # 每个 key 下一次回放的位置
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.num_recorded = 0
+        self.num_replayed = 0
+        if mode == "record":
+            self._path.unlink(missing_ok=True)
+        elif self._path.exists():
+            with self._path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = CassetteEntry.model_validate_json(line)
+                        self._entries.setdefault(entry.key, []).append(entry)
+
+    @property
+    def executor(self) -> Optional[CodeExecutor]:
+        return self._executor
+
+    @property
+    def user_capability(self) -> Any:
+        if self._executor is not None:
+            return self._executor.user_capability
+        # 回放时 agent 的 system message 要和录制时一致
+        from .local_commandline_code_executor import LocalCommandLineCodeExecutor
+
+        return LocalCommandLineCodeExecutor.UserCapability(LocalCommandLineCodeExecutor.DEFAULT_SYSTEM_MESSAGE_UPDATE)
+
+    @property
+    def code_extractor(self) -> CodeExtractor:
+        if self._code_extractor is not None:
+            return self._code_extractor
+        return self._executor.code_extractor if self._executor is not None else MarkdownCodeExtractor()
+
+    def __len__(self) -> int:
+        """The number of executions in the cassette."""
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    def _next_entry(self, key: str) -> Optional[CassetteEntry]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            return entries[min(position, len(entries) - 1)]
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CodeResult:
+        """(Experimental) Replay the execution of the code blocks, or run and record it.
+
+        Raises:
+            CassetteMiss: In replay mode, if the execution was not recorded.
+        """
+        key = cassette_key(code_blocks)
+        entry = self._next_entry(key) if self._mode != "record" else None
+        if entry is not None:
+            if self._replay_latency:
+                time.sleep(entry.seconds)
+            with self._lock:
+                self.num_replayed += 1
+            return _result_type(entry.result_type).model_validate(entry.result)
+        if self._mode == "replay":
+            raise CassetteMiss(f"No execution of these code blocks in {self._path} (key {key}).")
+
+        start = time.perf_counter()
+        result = self._executor.execute_code_blocks(code_blocks)
+        seconds = time.perf_counter() - start
+        result_type = type(result)
+        entry = CassetteEntry(
+            key=key,
+            code_blocks=code_blocks,
+            result_type=f"{result_type.__module__}:{result_type.__qualname__}",
+            result=result.model_dump(mode="json", exclude_defaults=True),
+            seconds=seconds,
+        )
+        with self._lock:
+            entries = self._entries.setdefault(key, [])
+            entries.append(entry)
+            # 录制的执行已经用过了，回放从下一条开始
+            self._positions[key] = len(entries)
+            self.num_recorded += 1
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with self._path.open("a", encoding="utf-8") as f:
+                f.write(entry.model_dump_json(exclude_defaults=True) + "\n")
+        return result
+
+    def restart(self) -> None:
+        """(Experimental) Restart the recorded executor and replay the cassette from the start."""
+        with self._lock:
+            self._positions.clear()
+        if self._executor is not None and hasattr(self._executor, "restart"):
+            self._executor.restart()
@@ -0,0 +1,118 @@
+import http.client
+import json
+import socket
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from .base import CodeBlock, CodeExtractor
+from .local_commandline_code_executor import CommandLineCodeResult, LocalCommandLineCodeExecutor
+from .markdown_code_extractor import MarkdownCodeExtractor
+
+__all__ = ("RemoteCodeExecutor",)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+class RemoteCodeExecutor:
+    """(Experimental) A code executor that runs code blocks on an `ExecutionServer`.
+
+    Args:
+        address (str): The address of the server, `unix:///path/to/socket` or `http://host:port`.
+        tenant (str): The tenant that the jobs are accounted to.
+        priority (int): The priority of the jobs, higher runs first.
+        timeout (Optional, float): The socket timeout in seconds, including the time a job waits in the queue.
+            No timeout if None.
+        token (Optional, str): The shared token of the server, if it requires one.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        tenant: str = "default",
+        priority: int = 0,
+        timeout: Optional[float] = None,
+        token: Optional[str] = None,
+    ):
+        self._address = urlparse(address)
+        if self._address.scheme not in ("unix", "http"):
+            raise ValueError(f"Unsupported address {address}, use unix:///path or http://host:port.")
+        self.tenant = tenant
+        self.priority = priority
+        self._timeout = timeout
+        self._token = token
+
+    @property
+    def user_capability(self) -> "LocalCommandLineCodeExecutor.UserCapability":
+        return LocalCommandLineCodeExecutor.UserCapability(LocalCommandLineCodeExecutor.DEFAULT_SYSTEM_MESSAGE_UPDATE)
+
+    @property
+    def code_extractor(self) -> CodeExtractor:
+        """(Experimental) Export a code extractor that can be used by an agent."""
+        return MarkdownCodeExtractor()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._address.scheme == "unix":
+            return _UnixHTTPConnection(self._address.path, timeout=self._timeout)
+        return http.client.HTTPConnection(self._address.hostname, self._address.port, timeout=self._timeout)
+
+    def _headers(self) -> Dict[str, str]:
+        return {} if self._token is None else {"Authorization": f"Bearer {self._token}"}
+
+    def stream(self, code_blocks: List[CodeBlock]) -> Iterator[Dict[str, Any]]:
+        """(Experimental) Submit code blocks and yield the events of the job as they arrive.
+
+        Raises:
+            RuntimeError: If the server rejects the job.
+        """
+        body = json.dumps(
+            {
+                "code_blocks": [block.model_dump() for block in code_blocks],
+                "tenant": self.tenant,
+                "priority": self.priority,
+            }
+        )
+        connection = self._connect()
+        try:
+            connection.request("POST", "/execute", body=body, headers={"Content-Type": "application/json", **self._headers()})
+            response = connection.getresponse()
+            if response.status != 200:
+                error = json.loads(response.read() or b"{}").get("error", response.reason)
+                raise RuntimeError(f"The execution server rejected the job: {error}")
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            connection.close()
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        """(Experimental) Execute code blocks on the server and return the result."""
+        for event in self.stream(code_blocks):
+            if event["event"] == "result":
+                result = dict(event["result"])
+                result.pop("type", None)
+                return CommandLineCodeResult(**result)
+            if event["event"] == "error":
+                raise RuntimeError(f"Execution failed on the server: {event['error']}")
+        raise RuntimeError("The execution server closed the connection before the job finished.")
+
+    def stats(self) -> Dict[str, Any]:
+        """(Experimental) The queue state of the server."""
+        connection = self._connect()
+        try:
+            connection.request("GET", "/stats", headers=self._headers())
+            return json.loads(connection.getresponse().read())
+        finally:
+            connection.close()
+
+    def restart(self) -> None:
+        """(Experimental) Nothing to restart, the executors are owned by the server."""
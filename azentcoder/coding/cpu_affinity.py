@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+__all__ = ("CpuSlot", "CpuSlotPool", "SlotStats", "available_cpus", "pin_on_exec", "pin_process", "set_affinity")
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> List[int]:
+    """(Experimental) The CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def set_affinity(pid: int, cpus: Iterable[int]) -> bool:
+    """(Experimental) Restrict a thread or process to the CPUs, return False where the platform cannot.
+
+    On Linux the affinity is per thread: this pins the main thread of `pid` and the threads and processes it
+    creates afterwards. Use `pin_process` for the threads that already exist.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(pid, set(cpus))
+    except (OSError, ValueError) as e:
+        logger.debug(f"Failed to set the CPU affinity of {pid}: {e}")
+        return False
+    return True
+
+
+def pin_on_exec(cpus: Optional[Iterable[int]]) -> Optional[Callable[[], None]]:
+    """(Experimental) A `preexec_fn` of `subprocess.Popen` that pins the child to the CPUs before it executes.
+
+    Pinning in the child covers the start-up of the command and every thread and process it creates, which
+    `set_affinity` after `Popen` returns does not. Returns None if `cpus` is None or the platform has no
+    `os.sched_setaffinity`, the caller then falls back to `set_affinity`.
+    """
+    if cpus is None or not hasattr(os, "sched_setaffinity"):
+        return None
+    cpus = set(cpus)
+
+    def pin() -> None:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError:
+            # 子进程里不能记录日志，固定失败时照常执行
+            pass
+
+    return pin
+
+
+def pin_process(cpus: Iterable[int], pid: Optional[int] = None) -> bool:
+    """(Experimental) Restrict every thread of a process to the CPUs, the current process if `pid` is None."""
+    cpus = set(cpus)
+    pid = os.getpid() if pid is None else pid
+    try:
+        tids = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        tids = [pid]
+    return all([set_affinity(tid, cpus) for tid in tids])
+
+
+def _read_cpu_times() -> Optional[Dict[int, Tuple[int, int]]]:
+    """The (busy, total) jiffies of every CPU from /proc/stat, or None."""
+    try:
+        with open("/proc/stat") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    times = {}
+    for line in lines:
+        if line.startswith("cpu") and line[3].isdigit():
+            name, *values = line.split()
+            values = [int(value) for value in values[:8]]
+            # idle 和 iowait 以外的时间都算作忙碌
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            times[int(name[3:])] = (sum(values) - idle, sum(values))
+    return times
+
+
+class CpuSlot:
+    """(Experimental) A set of CPUs dedicated to one execution at a time."""
+
+    def __init__(self, index: int, cpus: List[int]):
+        self.index = index
+        self.cpus = cpus
+
+    @property
+    def cpuset(self) -> str:
+        """The CPUs in the format of docker's `cpuset_cpus`, such as "2,3"."""
+        return ",".join(str(cpu) for cpu in self.cpus)
+
+    def __repr__(self) -> str:
+        return f"CpuSlot(index={self.index}, cpus={self.cpus})"
+
+
+class SlotStats(BaseModel):
+    """(Experimental) 一个执行槽位的使用情况"""
+
+    index: int = Field(description="The index of the slot.")
+    cpus: List[int] = Field(description="The CPUs of the slot.")
+    runs: int = Field(default=0, description="The number of executions that held the slot.")
+    busy_seconds: float = Field(default=0.0, description="The time the slot was held.")
+    utilization: float = Field(default=0.0, description="The fraction of the pool's lifetime the slot was held.")
+    cpu_utilization: Optional[float] = Field(
+        default=None, description="The busy fraction of the slot's CPUs while it was held, from /proc/stat."
+    )
+
+
+class CpuSlotPool:
+    """(Experimental) Split the CPUs into dedicated slots, one execution per slot at a time.
+
+    The first `reserved_cores` CPUs are kept for the agent process, which is pinned to them with
+    `pin_agent`, so the event loop does not compete with the code it runs. The other CPUs are split into
+    slots of `cores_per_slot` CPUs. Executors hold a slot while they run a batch: local subprocesses are
+    pinned with `sched_setaffinity` and the `cpuset_cpus` of containers is updated to the slot. With too few
+    CPUs to reserve any, the agent shares the CPUs of the slots.
+
+    Args:
+        cores_per_slot (int): The number of CPUs of each slot.
+        reserved_cores (int): The number of CPUs reserved for the agent process.
+        cpus (Optional, list): The CPUs to use. The CPUs of this process if None.
+        pin_agent (bool): Whether to pin every thread of this process to the reserved CPUs now.
+    """
+
+    def __init__(
+        self,
+        cores_per_slot: int = 1,
+        reserved_cores: int = 1,
+        cpus: Optional[List[int]] = None,
+        pin_agent: bool = False,
+    ):
+        if cores_per_slot < 1:
+            raise ValueError("cores_per_slot must be greater than or equal to 1.")
+        cpus = sorted(cpus if cpus is not None else available_cpus())
+        if len(cpus) - reserved_cores >= cores_per_slot:
+            self.reserved = cpus[:reserved_cores]
+            slot_cpus = cpus[reserved_cores:]
+        else:
+            logger.warning(f"Not enough CPUs to reserve {reserved_cores} for the agent: {cpus}.")
+            self.reserved = []
+            slot_cpus = cpus
+        num_slots = max(1, len(slot_cpus) // cores_per_slot)
+        self.slots = [CpuSlot(i, slot_cpus[i * cores_per_slot : (i + 1) * cores_per_slot]) for i in range(num_slots)]
+        # 除不尽的 CPU 分给最后一个槽位
+        self.slots[-1].cpus = self.slots[-1].cpus + slot_cpus[num_slots * cores_per_slot :]
+        self._free: List[CpuSlot] = list(self.slots)
+        self._runs = [0] * num_slots
+        self._busy = [0.0] * num_slots
+        self._held_at: Dict[int, Tuple[float, Optional[Dict[int, Tuple[int, int]]]]] = {}
+        self._jiffies = [[0, 0] for _ in range(num_slots)]
+        self._created_at = time.monotonic()
+        self._cond = threading.Condition()
+        if pin_agent and self.reserved:
+            pin_process(self.reserved)
+
+    def acquire(self, timeout: Optional[float] = None) -> CpuSlot:
+        """(Experimental) Wait for a free slot.
+
+        Raises:
+            TimeoutError: If no slot is free within `timeout` seconds.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free, timeout):
+                raise TimeoutError(f"No CPU slot was free within {timeout}s.")
+            slot = self._free.pop(0)
+            self._held_at[slot.index] = (time.monotonic(), _read_cpu_times())
+            return slot
+
+    def release(self, slot: CpuSlot) -> None:
+        """(Experimental) Return a slot from `acquire`."""
+        end_times = _read_cpu_times()
+        with self._cond:
+            started, start_times = self._held_at.pop(slot.index)
+            self._runs[slot.index] += 1
+            self._busy[slot.index] += time.monotonic() - started
+            if start_times is not None and end_times is not None:
+                for cpu in slot.cpus:
+                    if cpu in start_times and cpu in end_times:
+                        self._jiffies[slot.index][0] += end_times[cpu][0] - start_times[cpu][0]
+                        self._jiffies[slot.index][1] += end_times[cpu][1] - start_times[cpu][1]
+            self._free.append(slot)
+            self._free.sort(key=lambda s: s.index)
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[CpuSlot]:
+        """(Experimental) A context manager that holds a slot."""
+        slot = self.acquire(timeout)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def stats(self) -> List[SlotStats]:
+        """(Experimental) The usage of every slot since the pool was created."""
+        with self._cond:
+            now = time.monotonic()
+            elapsed = max(now - self._created_at, 1e-9)
+            stats = []
+            for slot in self.slots:
+                busy = self._busy[slot.index]
+                if slot.index in self._held_at:
+                    busy += now - self._held_at[slot.index][0]
+                used, total = self._jiffies[slot.index]
+                stats.append(
+                    SlotStats(
+                        index=slot.index,
+                        cpus=slot.cpus,
+                        runs=self._runs[slot.index],
+                        busy_seconds=busy,
+                        utilization=min(1.0, busy / elapsed),
+                        cpu_utilization=used / total if total else None,
+                    )
+                )
+            return stats
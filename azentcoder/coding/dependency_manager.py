@@ -0,0 +1,406 @@
+import ast
+import json
+import logging
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from pydantic import BaseModel, Field
+
+from ..compile_cache import parse_ast
+from .base import CodeBlock
+
+__all__ = ("DependencyManager", "DependencyReport", "scan_code_blocks")
+
+logger = logging.getLogger(__name__)
+
+WHEELHOUSE_MOUNT = "/wheelhouse"
+STATE_FILE = ".azentcoder-deps.json"
+
+# import 名与 PyPI 包名不一致的常见情况
+IMPORT_TO_PACKAGE = {
+    "Crypto": "pycryptodome",
+    "PIL": "pillow",
+    "attr": "attrs",
+    "bs4": "beautifulsoup4",
+    "cv2": "opencv-python",
+    "dateutil": "python-dateutil",
+    "docx": "python-docx",
+    "dotenv": "python-dotenv",
+    "jwt": "pyjwt",
+    "pptx": "python-pptx",
+    "serial": "pyserial",
+    "skimage": "scikit-image",
+    "sklearn": "scikit-learn",
+    "yaml": "pyyaml",
+}
+
+if sys.version_info >= (3, 10):
+    STDLIB_MODULES = set(sys.stdlib_module_names)
+else:
+    STDLIB_MODULES = set(sys.builtin_module_names) | {
+        "abc", "argparse", "ast", "asyncio", "base64", "bisect", "collections", "concurrent", "contextlib", "copy",
+        "csv", "dataclasses", "datetime", "decimal", "enum", "functools", "glob", "hashlib", "heapq", "html", "http",
+        "importlib", "inspect", "io", "itertools", "json", "logging", "math", "multiprocessing", "os", "pathlib",
+        "pickle", "platform", "pprint", "queue", "random", "re", "shlex", "shutil", "signal", "socket", "sqlite3",
+        "statistics", "string", "struct", "subprocess", "tempfile", "textwrap", "threading", "time", "timeit",
+        "traceback", "types", "typing", "unittest", "urllib", "uuid", "warnings", "xml", "zipfile",
+    }  # fmt: skip
+
+PIP_INSTALL_PATTERN = re.compile(r"^[ \t]*(?:python3?[ \t]+-m[ \t]+)?pip3?[ \t]+install[ \t]+(.+)$", re.MULTILINE)
+# 带参数的 pip install 选项，解析时需要跳过它们的值
+PIP_OPTIONS_WITH_VALUE = {
+    "-r",
+    "--requirement",
+    "-c",
+    "--constraint",
+    "-i",
+    "--index-url",
+    "--extra-index-url",
+    "-f",
+    "--find-links",
+    "-t",
+    "--target",
+}
+
+
+def normalize_package_name(name: str) -> str:
+    """Normalize a package name as in PEP 503."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _requirement_name(requirement: str) -> str:
+    return re.split(r"[\s\[<>=!~;@]", requirement, maxsplit=1)[0]
+
+
+def scan_python_imports(code: str, local_modules: Iterable[str] = ()) -> Set[str]:
+    """The third-party packages imported by a Python block, ignoring the stdlib and `local_modules`."""
+    try:
+        tree = parse_ast(code)
+    except SyntaxError:
+        return set()
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split(".")[0])
+    modules -= STDLIB_MODULES | set(local_modules)
+    return {IMPORT_TO_PACKAGE.get(m, m) for m in modules}
+
+
+def scan_pip_installs(code: str) -> Set[str]:
+    """The packages installed by `pip install` commands in a shell block."""
+    packages = set()
+    for match in PIP_INSTALL_PATTERN.finditer(code):
+        try:
+            args = shlex.split(match.group(1).split("&&")[0].split(";")[0])
+        except ValueError:
+            continue
+        skip = False
+        for arg in args:
+            if skip:
+                skip = False
+            elif arg in PIP_OPTIONS_WITH_VALUE:
+                skip = True
+            elif not arg.startswith("-") and "/" not in arg:
+                packages.add(_requirement_name(arg))
+    return packages
+
+
+def local_modules(work_dir: Union[Path, str]) -> Set[str]:
+    """The modules and packages that can be imported from the working directory."""
+    work_dir = Path(work_dir)
+    if not work_dir.is_dir():
+        return set()
+    packages = {p.name for p in work_dir.iterdir() if (p / "__init__.py").exists()}
+    return {p.stem for p in work_dir.glob("*.py")} | packages
+
+
+def scan_code_blocks(
+    code_blocks: Iterable[CodeBlock], work_dir: Optional[Union[Path, str]] = None
+) -> Dict[str, List[str]]:
+    """(Experimental) Scan code blocks for the packages they need.
+
+    Args:
+        code_blocks (List[CodeBlock]): The code blocks to scan.
+        work_dir (Optional, Path or str): Imports of modules in this directory are not packages.
+
+    Returns:
+        dict: The sorted, normalized package names under "imports" (Python blocks) and "pip" (pip commands).
+    """
+    local = local_modules(work_dir) if work_dir is not None else set()
+    imports: Set[str] = set()
+    pip: Set[str] = set()
+    for block in code_blocks:
+        if block.language.lower().startswith("python"):
+            imports |= scan_python_imports(block.code, local)
+        else:
+            pip |= scan_pip_installs(block.code)
+    return {
+        "imports": sorted({normalize_package_name(p) for p in imports}),
+        "pip": sorted({normalize_package_name(p) for p in pip}),
+    }
+
+
+class DependencyReport(BaseModel):
+    """(Experimental) 依赖安装的统计"""
+
+    packages_prewarmed: int = Field(default=0, description="The number of packages installed ahead of execution.")
+    install_seconds: float = Field(default=0.0, description="The time spent installing packages.")
+    seconds_saved: float = Field(
+        default=0.0,
+        description="The recorded install time of packages that were already present, e.g. in a baked image.",
+    )
+    images_baked: List[str] = Field(default_factory=list, description="The derived images baked in this process.")
+
+
+class DependencyManager:
+    """(Experimental) Serve the dependencies of generated code from a shared local wheelhouse.
+
+    The wheelhouse directory is mounted read-only into the containers of `DockerCommandLineCodeExecutor`
+    and pip inside the container is pointed at it with `PIP_FIND_LINKS` (and `PIP_NO_INDEX` when offline), so
+    `pip install` commands in shell blocks resolve locally. Packages imported by Python blocks are installed
+    from the wheelhouse before the block runs. Package sets that are used often can be baked into derived
+    images, and the usage and install times are kept in the wheelhouse so they carry across sessions.
+
+    The package names come from generated code, so by default nothing is downloaded and only the wheels
+    already in the wheelhouse are used. When `offline` is False, only the packages in `allowed_packages` are
+    downloaded on the host, and only as wheels (`--only-binary=:all:`), so no sdist is built and no setup
+    code runs on the host.
+
+    Args:
+        wheelhouse (Path or str): The directory holding wheels and sdists.
+        offline (bool): Never download; only use what is already in the wheelhouse.
+        allowed_packages (Optional, Iterable[str]): The packages that may be downloaded when not offline.
+            Required when `offline` is False.
+        download_args (Optional, list): Extra arguments for `pip download`, e.g. `--python-version` and
+            `--platform` when the container differs from the host.
+        bake_threshold (int): The number of uses after which a package is included in baked images.
+    """
+
+    def __init__(
+        self,
+        wheelhouse: Union[Path, str],
+        offline: bool = True,
+        allowed_packages: Optional[Iterable[str]] = None,
+        download_args: Optional[List[str]] = None,
+        bake_threshold: int = 3,
+    ):
+        if not offline and allowed_packages is None:
+            raise ValueError("allowed_packages is required to download packages when offline is False.")
+        self._wheelhouse = Path(wheelhouse).resolve()
+        self._wheelhouse.mkdir(parents=True, exist_ok=True)
+        self._offline = offline
+        self._allowed_packages = {normalize_package_name(p) for p in allowed_packages or ()}
+        self._download_args = download_args or []
+        self._bake_threshold = bake_threshold
+        self._lock = threading.Lock()
+        self._report = DependencyReport()
+        self._state = self._load_state()
+
+    @property
+    def wheelhouse(self) -> Path:
+        return self._wheelhouse
+
+    @property
+    def offline(self) -> bool:
+        return self._offline
+
+    @property
+    def report(self) -> DependencyReport:
+        with self._lock:
+            return self._report.model_copy(deep=True)
+
+    def volumes(self) -> Dict[str, Dict[str, str]]:
+        """The docker volume that mounts the wheelhouse into a container."""
+        return {str(self._wheelhouse): {"bind": WHEELHOUSE_MOUNT, "mode": "ro"}}
+
+    def environment(self) -> Dict[str, str]:
+        """The environment that makes pip inside a container install from the wheelhouse."""
+        env = {"PIP_FIND_LINKS": WHEELHOUSE_MOUNT, "PIP_DISABLE_PIP_VERSION_CHECK": "1"}
+        if self._offline:
+            env["PIP_NO_INDEX"] = "1"
+        return env
+
+    def available_packages(self) -> Set[str]:
+        """The normalized names of the packages in the wheelhouse."""
+        names = set()
+        for path in self._wheelhouse.iterdir():
+            if path.name.endswith(".whl"):
+                names.add(normalize_package_name(path.name.split("-")[0]))
+            elif path.name.endswith((".tar.gz", ".zip")):
+                names.add(normalize_package_name(path.name.rsplit("-", 1)[0]))
+        return names
+
+    def ensure_wheels(self, packages: Iterable[str]) -> List[str]:
+        """(Experimental) Download the allowed packages that are not in the wheelhouse yet, as wheels only.
+
+        Returns:
+            List[str]: The packages that are still missing, e.g. because the manager is offline or they are not
+                in `allowed_packages`.
+        """
+        missing = sorted(set(packages) - self.available_packages())
+        allowed = set() if self._offline else self._allowed_packages
+        downloadable = [p for p in missing if normalize_package_name(p) in allowed]
+        if len(downloadable) < len(missing):
+            skipped = sorted(set(missing) - set(downloadable))
+            logger.warning("Packages missing from the wheelhouse and not downloaded: %s", ", ".join(skipped))
+        if not downloadable:
+            return missing
+        command = [sys.executable, "-m", "pip", "download", "--only-binary=:all:", "--dest", str(self._wheelhouse)]
+        result = subprocess.run([*command, *self._download_args, *downloadable], capture_output=True, text=True)
+        if result.returncode != 0:
+            logger.warning("Failed to download %s: %s", ", ".join(downloadable), result.stderr.strip())
+        return sorted(set(missing) - self.available_packages())
+
+    def install_command(self, packages: Iterable[str]) -> List[str]:
+        """The command that installs the packages inside a container from the mounted wheelhouse."""
+        return ["python", "-m", "pip", "install", "--quiet", "--no-index", "--find-links", WHEELHOUSE_MOUNT, *packages]
+
+    def prewarm(self, container, code_blocks: List[CodeBlock], work_dir: Optional[Union[Path, str]] = None) -> None:
+        """(Experimental) Make the packages needed by the code blocks available before they run.
+
+        Wheels for `pip install` commands are fetched into the wheelhouse so the command resolves locally.
+        Packages imported by Python blocks that are missing in the container are installed from the wheelhouse.
+
+        Args:
+            container: The docker container the code blocks run in.
+            code_blocks (List[CodeBlock]): The code blocks to run.
+            work_dir (Optional, Path or str): The working directory, whose modules are not packages.
+        """
+        scanned = scan_code_blocks(code_blocks, work_dir)
+        needed = sorted(set(scanned["imports"]) | set(scanned["pip"]))
+        if not needed:
+            return
+        self._record_usage(needed)
+        self.ensure_wheels(needed)
+
+        installable = sorted(set(scanned["imports"]) & self.available_packages())
+        present = self._installed_in(container, installable)
+        saved = sum(self._state["install_seconds"].get(p, 0.0) for p in present)
+        to_install = [p for p in installable if p not in present]
+        if to_install:
+            start_time = time.time()
+            result = container.exec_run(self.install_command(to_install))
+            elapsed = time.time() - start_time
+            if result.exit_code != 0:
+                logger.warning("Failed to prewarm %s: %s", ", ".join(to_install), result.output.decode("utf-8"))
+            else:
+                self._record_install(to_install, elapsed)
+        with self._lock:
+            self._report.seconds_saved += saved
+        self._save_state()
+
+    def hot_packages(self) -> List[str]:
+        """The packages used at least `bake_threshold` times."""
+        usage = self._state["usage"]
+        return sorted(p for p, count in usage.items() if count >= self._bake_threshold)
+
+    def baked_image_tag(self, base_image: str, packages: Optional[List[str]] = None) -> str:
+        packages = self.hot_packages() if packages is None else sorted(packages)
+        digest = sha256(json.dumps([base_image, packages]).encode()).hexdigest()[:12]
+        return f"azentcoder-deps:{digest}"
+
+    def resolve_image(self, client, base_image: str) -> str:
+        """(Experimental) Return the baked image for the hot packages of the base image if it exists."""
+        import docker
+
+        if not self.hot_packages():
+            return base_image
+        tag = self.baked_image_tag(base_image)
+        try:
+            client.images.get(tag)
+            return tag
+        except docker.errors.ImageNotFound:
+            return base_image
+
+    def bake_image(self, client, base_image: str, packages: Optional[List[str]] = None) -> Optional[str]:
+        """(Experimental) Bake the packages (the hot packages by default) into an image derived from the base.
+
+        Returns:
+            Optional[str]: The tag of the baked image, or None if there is nothing to bake or it failed.
+        """
+        packages = self.hot_packages() if packages is None else sorted(packages)
+        if not packages or self.ensure_wheels(packages):
+            return None
+        tag = self.baked_image_tag(base_image, packages)
+        repository, _, version = tag.partition(":")
+        start_time = time.time()
+        container = client.containers.run(
+            base_image,
+            command=self.install_command(packages),
+            volumes=self.volumes(),
+            detach=True,
+        )
+        try:
+            exit_code = container.wait()["StatusCode"]
+            if exit_code != 0:
+                logger.warning("Failed to bake %s: %s", tag, container.logs().decode("utf-8"))
+                return None
+            container.commit(repository=repository, tag=version)
+        finally:
+            container.remove()
+        self._record_install(packages, time.time() - start_time, prewarmed=False)
+        with self._lock:
+            self._report.images_baked.append(tag)
+        self._save_state()
+        return tag
+
+    def _installed_in(self, container, packages: List[str]) -> Set[str]:
+        if not packages:
+            return set()
+        script = (
+            "import importlib.metadata as m, json, sys\n"
+            "found = []\n"
+            "for name in sys.argv[1:]:\n"
+            "    try:\n"
+            "        m.version(name)\n"
+            "        found.append(name)\n"
+            "    except m.PackageNotFoundError:\n"
+            "        pass\n"
+            "print(json.dumps(found))\n"
+        )
+        result = container.exec_run(["python", "-c", script, *packages])
+        if result.exit_code != 0:
+            return set()
+        try:
+            found = json.loads(result.output.decode("utf-8").strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            return set()
+        return {normalize_package_name(p) for p in found}
+
+    def _record_usage(self, packages: List[str]) -> None:
+        with self._lock:
+            for package in packages:
+                self._state["usage"][package] = self._state["usage"].get(package, 0) + 1
+
+    def _record_install(self, packages: List[str], seconds: float, prewarmed: bool = True) -> None:
+        with self._lock:
+            for package in packages:
+                self._state["install_seconds"][package] = seconds / len(packages)
+            if prewarmed:
+                self._report.packages_prewarmed += len(packages)
+                self._report.install_seconds += seconds
+
+    def _load_state(self) -> Dict[str, Dict]:
+        try:
+            state = json.loads((self._wheelhouse / STATE_FILE).read_text())
+        except (OSError, ValueError):
+            state = {}
+        return {"usage": state.get("usage", {}), "install_seconds": state.get("install_seconds", {})}
+
+    def _save_state(self) -> None:
+        with self._lock:
+            data = json.dumps(self._state)
+        try:
+            (self._wheelhouse / STATE_FILE).write_text(data)
+        except OSError:
+            # 只读的 wheelhouse 不记录使用情况
+            pass
@@ -0,0 +1,311 @@
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from hashlib import md5
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple, TypeVar, Union
+
+from pydantic import BaseModel, Field
+
+from .history import percentile
+
+__all__ = ("DockerEndpoint", "EndpointStats", "NoHealthyEndpoint", "ShardedDockerBackend")
+
+logger = logging.getLogger(__name__)
+
+PLACEMENTS = ("least_loaded", "consistent_hash")
+
+T = TypeVar("T")
+
+
+class NoHealthyEndpoint(RuntimeError):
+    """Raised when no healthy docker endpoint has spare capacity, or every attempt failed over."""
+
+
+class EndpointStats(BaseModel):
+    """(Experimental) 一个 docker daemon 的健康状态、负载和延迟"""
+
+    name: str = Field(description="The name of the endpoint, its base URL when configured with one.")
+    healthy: bool = Field(description="Whether the endpoint answered its last health check and operation.")
+    active: int = Field(description="The number of placements currently held on the endpoint.")
+    capacity: int = Field(description="The maximum number of placements held at the same time.")
+    placements: int = Field(default=0, description="The number of placements made on the endpoint.")
+    failures: int = Field(default=0, description="The number of failed health checks and operations.")
+    last_error: Optional[str] = Field(default=None, description="The error of the last failure.")
+    ping_p50_seconds: float = Field(default=0.0, description="The median latency of the recent health checks.")
+    ping_p99_seconds: float = Field(default=0.0, description="The 99th percentile latency of the recent health checks.")
+    start_p50_seconds: float = Field(default=0.0, description="The median time to start on the endpoint.")
+    start_p99_seconds: float = Field(default=0.0, description="The 99th percentile time to start on the endpoint.")
+
+
+class DockerEndpoint:
+    """(Experimental) A docker daemon of a `ShardedDockerBackend`.
+
+    Args:
+        name (str): The name of the endpoint.
+        client (Optional, docker.DockerClient): The client of the daemon. Created from `base_url` on first use
+            if None.
+        base_url (Optional, str): The URL of the daemon, such as tcp://10.0.0.2:2376 or unix:///var/run/docker.sock.
+        capacity (int): The maximum number of placements held at the same time.
+    """
+
+    def __init__(self, name: str, client: Optional[Any] = None, base_url: Optional[str] = None, capacity: int = 8):
+        if capacity < 1:
+            raise ValueError("capacity must be greater than or equal to 1.")
+        if client is None and base_url is None:
+            raise ValueError("Either client or base_url must be provided.")
+        self.name = name
+        self.base_url = base_url
+        self.capacity = capacity
+        self._client = client
+        self.healthy = True
+        self.active = 0
+        self.placements = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.pings: Deque[float] = deque(maxlen=256)
+        self.starts: Deque[float] = deque(maxlen=256)
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            import docker
+
+            # 连接失败时抛出 DockerException，由调用方把 endpoint 标记为不健康
+            self._client = docker.DockerClient(base_url=self.base_url)
+        return self._client
+
+    def __repr__(self) -> str:
+        return f"DockerEndpoint({self.name!r}, healthy={self.healthy}, active={self.active}/{self.capacity})"
+
+
+def _is_endpoint_failure(error: BaseException) -> bool:
+    """Whether an error means the daemon is unreachable or failing, rather than a bad request."""
+    import docker
+    import requests
+
+    if isinstance(error, docker.errors.APIError):
+        # 只有 5xx 说明 daemon 有问题，4xx (镜像不存在、名字冲突等) 换一个 daemon 也不会成功
+        return error.is_server_error()
+    return isinstance(error, (docker.errors.DockerException, requests.exceptions.ConnectionError, OSError))
+
+
+def _hash(value: str) -> int:
+    return int(md5(value.encode()).hexdigest()[:16], 16)
+
+
+class ShardedDockerBackend:
+    """(Experimental) Place containers on several docker daemons, with health checks and failover.
+
+    Each endpoint holds at most `capacity` placements. With "least_loaded" placement a container goes to the
+    healthy endpoint with the lowest share of its capacity in use, the one with the fastest health checks on a
+    tie. With "consistent_hash" placement, a placement with a key (the session) goes to the endpoint that owns
+    the key on a hash ring of `virtual_nodes` points per endpoint, so a session returns to the daemon that has
+    its image layers and caches warm, and only the sessions of an endpoint that fails or is full move; a
+    placement without a key is least-loaded.
+
+    `acquire` runs a start function, e.g. the creation of a container, on the client of the chosen endpoint.
+    When it fails because the daemon is unreachable or answers with a server error, the endpoint is marked
+    unhealthy and the next endpoint is tried. Errors of the request itself, such as a missing image, are
+    raised. `start` pings every endpoint every `health_check_interval` seconds in the background, so an
+    unhealthy endpoint is used again once it recovers.
+
+    Args:
+        endpoints (list): The daemons: base URLs, docker clients, or `DockerEndpoint`s.
+        placement (str): "least_loaded" or "consistent_hash".
+        capacity (int): The capacity of the endpoints given as base URLs or clients.
+        health_check_interval (Optional, float): The seconds between two health checks of the endpoints. None to
+            check only on `check_health`.
+        virtual_nodes (int): The points of each endpoint on the hash ring.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Union[str, Any, DockerEndpoint]],
+        placement: str = "least_loaded",
+        capacity: int = 8,
+        health_check_interval: Optional[float] = 10.0,
+        virtual_nodes: int = 64,
+    ):
+        if placement not in PLACEMENTS:
+            raise ValueError(f"placement must be one of {PLACEMENTS}, got {placement}.")
+        if not endpoints:
+            raise ValueError("At least one endpoint is needed.")
+        self._endpoints: List[DockerEndpoint] = []
+        for i, endpoint in enumerate(endpoints):
+            if isinstance(endpoint, str):
+                endpoint = DockerEndpoint(endpoint, base_url=endpoint, capacity=capacity)
+            elif not isinstance(endpoint, DockerEndpoint):
+                endpoint = DockerEndpoint(f"endpoint-{i}", client=endpoint, capacity=capacity)
+            self._endpoints.append(endpoint)
+        if len({endpoint.name for endpoint in self._endpoints}) != len(self._endpoints):
+            raise ValueError("The names of the endpoints must be unique.")
+        self._placement = placement
+        self._health_check_interval = health_check_interval
+        # 哈希环：(hash, endpoint 下标)，按 hash 排序
+        self._ring: List[Tuple[int, int]] = sorted(
+            (_hash(f"{endpoint.name}#{v}"), i)
+            for i, endpoint in enumerate(self._endpoints)
+            for v in range(virtual_nodes)
+        )
+        self._ring_hashes = [h for h, _ in self._ring]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker: Optional[threading.Thread] = None
+
+    @property
+    def endpoints(self) -> List[DockerEndpoint]:
+        return list(self._endpoints)
+
+    def __enter__(self) -> "ShardedDockerBackend":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def start(self) -> "ShardedDockerBackend":
+        """(Experimental) Check the health of the endpoints now and then on schedule in the background."""
+        self.check_health()
+        if self._health_check_interval is not None and self._checker is None:
+            self._stop.clear()
+            self._checker = threading.Thread(target=self._check_loop, name="docker-health", daemon=True)
+            self._checker.start()
+        return self
+
+    def close(self) -> None:
+        """(Experimental) Stop the health checks."""
+        self._stop.set()
+        if self._checker is not None:
+            self._checker.join()
+            self._checker = None
+
+    def _check_loop(self) -> None:
+        while not self._stop.wait(self._health_check_interval):
+            self.check_health()
+
+    def check_health(self) -> Dict[str, bool]:
+        """(Experimental) Ping every endpoint and return whether each one is healthy."""
+        for endpoint in self._endpoints:
+            start = time.perf_counter()
+            try:
+                endpoint.client.ping()
+            except Exception as e:
+                self.mark_unhealthy(endpoint, e)
+                continue
+            seconds = time.perf_counter() - start
+            with self._lock:
+                if not endpoint.healthy:
+                    logger.info(f"Docker endpoint {endpoint.name} is healthy again.")
+                endpoint.healthy = True
+                endpoint.pings.append(seconds)
+        with self._lock:
+            return {endpoint.name: endpoint.healthy for endpoint in self._endpoints}
+
+    def mark_unhealthy(self, endpoint: DockerEndpoint, error: BaseException) -> None:
+        """(Experimental) Stop placing on an endpoint until a health check succeeds."""
+        with self._lock:
+            if endpoint.healthy:
+                logger.warning(f"Docker endpoint {endpoint.name} is unhealthy: {error}")
+            endpoint.healthy = False
+            endpoint.failures += 1
+            endpoint.last_error = str(error)
+
+    def _load(self, i: int) -> Tuple[float, float, int]:
+        endpoint = self._endpoints[i]
+        ping = percentile(endpoint.pings, 0.5) if endpoint.pings else 0.0
+        return endpoint.active / endpoint.capacity, ping, i
+
+    def _candidates(self, key: Optional[str], exclude: Set[int]) -> List[int]:
+        """The endpoints to try in order: healthy, with spare capacity and not tried yet."""
+        available = [
+            i
+            for i, endpoint in enumerate(self._endpoints)
+            if i not in exclude and endpoint.healthy and endpoint.active < endpoint.capacity
+        ]
+        if self._placement == "least_loaded" or key is None:
+            return sorted(available, key=self._load)
+        # 从 key 在环上的位置顺时针走，第一个可用的 endpoint 拥有这个 key
+        order: List[int] = []
+        start = bisect.bisect(self._ring_hashes, _hash(key))
+        for offset in range(len(self._ring)):
+            i = self._ring[(start + offset) % len(self._ring)][1]
+            if i in available and i not in order:
+                order.append(i)
+                if len(order) == len(available):
+                    break
+        return order
+
+    def place(self, key: Optional[str] = None) -> DockerEndpoint:
+        """(Experimental) Reserve a slot on an endpoint, to be given back with `release`.
+
+        Raises:
+            NoHealthyEndpoint: If no healthy endpoint has spare capacity.
+        """
+        return self._place(key, set())
+
+    def _place(self, key: Optional[str], exclude: Set[int]) -> DockerEndpoint:
+        with self._lock:
+            candidates = self._candidates(key, exclude)
+            if not candidates:
+                raise NoHealthyEndpoint(f"No healthy docker endpoint with spare capacity, tried {len(exclude)}.")
+            endpoint = self._endpoints[candidates[0]]
+            endpoint.active += 1
+            endpoint.placements += 1
+            return endpoint
+
+    def release(self, endpoint: DockerEndpoint) -> None:
+        """(Experimental) Give back a slot reserved by `place` or `acquire`."""
+        with self._lock:
+            endpoint.active -= 1
+
+    def acquire(self, start: Callable[[Any], T], key: Optional[str] = None) -> Tuple[DockerEndpoint, T]:
+        """(Experimental) Reserve a slot and run `start` with the client of its endpoint, failing over on errors.
+
+        Args:
+            start (Callable): Called with the docker client of the endpoint, e.g. to create a container.
+            key (Optional, str): The session, for the consistent-hash placement.
+
+        Returns:
+            Tuple[DockerEndpoint, Any]: The endpoint, to be given back with `release`, and the result of `start`.
+
+        Raises:
+            NoHealthyEndpoint: If no endpoint is left to try.
+        """
+        tried: Set[int] = set()
+        while True:
+            endpoint = self._place(key, tried)
+            began = time.perf_counter()
+            try:
+                result = start(endpoint.client)
+            except Exception as e:
+                self.release(endpoint)
+                if not _is_endpoint_failure(e):
+                    raise
+                self.mark_unhealthy(endpoint, e)
+                tried.add(self._endpoints.index(endpoint))
+                logger.info(f"Failing over from docker endpoint {endpoint.name}.")
+                continue
+            with self._lock:
+                endpoint.starts.append(time.perf_counter() - began)
+            return endpoint, result
+
+    def stats(self) -> List[EndpointStats]:
+        """(Experimental) The health, load and latency of every endpoint."""
+        with self._lock:
+            return [
+                EndpointStats(
+                    name=endpoint.name,
+                    healthy=endpoint.healthy,
+                    active=endpoint.active,
+                    capacity=endpoint.capacity,
+                    placements=endpoint.placements,
+                    failures=endpoint.failures,
+                    last_error=endpoint.last_error,
+                    ping_p50_seconds=percentile(endpoint.pings, 0.5) if endpoint.pings else 0.0,
+                    ping_p99_seconds=percentile(endpoint.pings, 0.99) if endpoint.pings else 0.0,
+                    start_p50_seconds=percentile(endpoint.starts, 0.5) if endpoint.starts else 0.0,
+                    start_p99_seconds=percentile(endpoint.starts, 0.99) if endpoint.starts else 0.0,
+                )
+                for endpoint in self._endpoints
+            ]
@@ -5,19 +5,34 @@ import logging
 from pathlib import Path
 
 import atexit
+from contextlib import ExitStack, nullcontext
 from hashlib import md5
-from time import sleep
+from time import perf_counter, sleep
 
 import uuid
-from typing import List, Optional, Type, Union
+from typing import List, Optional, Tuple, Type, Union
 
 import docker
 from docker.models.containers import Container
 from docker.errors import ImageNotFound
+from pydantic import BaseModel, Field
 
+from .admission import DEFAULT_TENANT, AdmissionController
 from .base import CodeBlock, CodeExecutor, CodeExtractor
+from .dependency_manager import DependencyManager
+from .docker_backend import DockerEndpoint, ShardedDockerBackend, _is_endpoint_failure
+from .error_channel import ErrorChannel
+from .cpu_affinity import CpuSlotPool
+from .file_tracker import create_file_tracker
+from .flight_recorder import FlightRecorder
+from .history import ExecutionHistory
+from .image_manager import ImageManager
 from .markdown_code_extractor import MarkdownCodeExtractor
+from .profiling import CodeProfiler, ProfileSummary
+from .resources import OOM_MSG, ContainerStatsSampler, ResourceLimits, ResourceUsage
 from .local_commandline_code_executor import CommandLineCodeResult
+from .runtimes import BlockTiming
+from .workspace import Workspace, WorkspaceManager, WorkspaceQuotaError, WorkspaceSnapshot
 from ..code_utils import TIMEOUT_MSG, _cmd
 if sys.version_info >= (3, 11):
     from typing import Self
@@ -35,7 +50,25 @@ def _wait_for_ready(container: Container, timeout: int = 60, stop_time: int = 0.
         raise ValueError("Container failed to start")
     
 
-__all__ = ("DockerCommandLineCodeExecutor",)
+__all__ = ("DockerCommandLineCodeExecutor", "ResetReport")
+
+logger = logging.getLogger(__name__)
+
+# 杀掉除 init shell (PID 1) 以外的所有进程，并清空 /tmp
+FAST_RESET_COMMAND = ["sh", "-c", "kill -9 -1 2>/dev/null; rm -rf /tmp/* /tmp/.[!.]* 2>/dev/null; exit 0"]
+
+
+class ResetReport(BaseModel):
+    """(Experimental) 一次 restart 的结果"""
+
+    mode: str = Field(
+        description="'fast' for an in-place reset, 'full' for a container restart, 'failover' for a new container "
+        "on another docker endpoint."
+    )
+    seconds: float = Field(description="The time the reset took.")
+    files_removed: int = Field(default=0, description="The files created after the baseline that were removed.")
+    files_restored: int = Field(default=0, description="The baseline files that were restored.")
+    fallback_reason: Optional[str] = Field(default=None, description="Why the fast reset fell back to a restart.")
 
 
 class DockerCommandLineCodeExecutor(CodeExecutor):
@@ -47,48 +80,153 @@ class DockerCommandLineCodeExecutor(CodeExecutor):
         work_dir: Union[Path, str] = Path("."),
         auto_remove: bool = True,
         stop_container: bool = True,
+        dependency_manager: Optional[DependencyManager] = None,
+        workspace_manager: Optional[WorkspaceManager] = None,
+        session_id: Optional[str] = None,
+        fast_reset: bool = True,
+        reset_workspace: bool = False,
+        profiling: bool = False,
+        profile_top_n: int = 10,
+        flight_recorder: bool = False,
+        track_files: bool = False,
+        history: Optional[ExecutionHistory] = None,
+        admission: Optional[AdmissionController] = None,
+        tenant: str = DEFAULT_TENANT,
+        cpu_pool: Optional[CpuSlotPool] = None,
+        image_manager: Optional[ImageManager] = None,
+        docker_backend: Optional[ShardedDockerBackend] = None,
+        limits: Optional[ResourceLimits] = None,
+        stats_interval: Optional[float] = 0.5,
     ):
+        """(Experimental) A code executor that runs code blocks in a docker container.
+
+        Args:
+            image (str): The image of the container.
+            container_name (Optional, str): The name of the container. Generated if None.
+            timeout (int): The timeout for each code execution in seconds.
+            work_dir (Path or str): The directory mounted at /workspace.
+            auto_remove (bool): Whether to remove the container when it stops.
+            stop_container (bool): Whether to stop the container when the process exits.
+            dependency_manager (Optional, DependencyManager): Prewarms the dependencies of the code blocks.
+            workspace_manager (Optional, WorkspaceManager): Use a managed per-session workspace as work_dir.
+            session_id (Optional, str): The session of the managed workspace. A new one if None.
+            fast_reset (bool): Whether `restart` resets the container in place instead of restarting it.
+            reset_workspace (bool): Whether a fast reset also rolls /workspace back to its content at start.
+            profiling (bool): Whether to run Python code blocks under cProfile and tracemalloc. The summaries
+                are returned in `profiles` and the raw profiles in `output_files`.
+            profile_top_n (int): The number of hotspots in each profile summary.
+            flight_recorder (bool): Whether to sample the stack of Python code blocks while they run. When a block
+                times out, the stacks where the time went are returned in `stack_summary` and the output.
+            track_files (bool): Whether to report the files that the code created or modified in `output_files`.
+                Uses inotify on the mounted work_dir where available, otherwise an index of file sizes and
+                modification times.
+            history (Optional, ExecutionHistory): Records the run time of every code block and sets the timeout
+                of blocks with enough history from the observed percentiles, never above `timeout`.
+            admission (Optional, AdmissionController): Wait for an admission before running each batch of code
+                blocks, so executors sharing the controller respect its concurrency caps and host load signals.
+                `AdmissionRejected` is raised when the execution is not admitted.
+            tenant (str): The tenant of the executions, for the per-tenant caps of `admission`.
+            cpu_pool (Optional, CpuSlotPool): Hold a CPU slot of the pool while running each batch of code blocks
+                and run the code on the CPUs of the slot only.
+            image_manager (Optional, ImageManager): Resolves the image from its cache and uses its docker client,
+                so executors started after the manager prefetched the image do not wait for docker.
+            docker_backend (Optional, ShardedDockerBackend): Place the container on one of several docker daemons,
+                keyed by `session_id` (or the container name) for the consistent-hash placement. The slot is held
+                until `stop`, and `restart` moves the container to another daemon when its daemon is unhealthy.
+                Cannot be combined with `image_manager`.
+            limits (Optional, ResourceLimits): The CPU, memory and pids limits of the container. The `limits` of a
+                code block tighten them while it runs; the pids limit of a block is not applied, docker cannot
+                change it on a running container. A block killed for exceeding the memory limit is reported with
+                `oom_killed` instead of as a timeout.
+            stats_interval (Optional, float): The seconds between two samples of the container stats while a code
+                block runs, the usage is returned in `resource_usage`. None to not sample.
+        """
         if timeout < 1:
             raise ValueError("Timeout must be greater than or equal to 1.")
-        
+
+        self._workspace: Optional[Workspace] = None
+        if workspace_manager is not None:
+            # 使用受管理的会话目录作为 /workspace
+            workspace_manager.gc()
+            self._workspace = workspace_manager.create(session_id)
+            work_dir = self._workspace.path
+
         if isinstance(work_dir, str):
             work_dir = Path(work_dir)
 
         if not work_dir.exists():
             raise ValueError(f"Working directory {work_dir} does not exist.")
         
-        client = docker.from_env()
+        if docker_backend is not None and image_manager is not None:
+            # ImageManager 只缓存一个 daemon 的镜像
+            raise ValueError("image_manager cannot be used with docker_backend, images are resolved per endpoint.")
 
-        try:
-            client.images.get(image)
-        except ImageNotFound:
-            logging.info(f"Pulling image {image}...")
-            # Let the docker exception escape if this fails.
-            client.images.pull(image)
+        volumes = {str(work_dir.resolve()): {"bind": "/workspace", "mode": "rw"}}
+        environment = {}
+        if dependency_manager is not None:
+            # 挂载共享的 wheelhouse，并优先使用预先安装了常用依赖的镜像
+            volumes.update(dependency_manager.volumes())
+            environment.update(dependency_manager.environment())
 
         if container_name is None:
             container_name = f"azent-code-exec-{uuid.uuid4()}"
+        limits = limits or ResourceLimits()
 
-        self._container = client.containers.create(
-            image,
-            name=container_name,
-            entrypoint="/bin/sh",
-            tty=True,
-            auto_remove=auto_remove,
-            volumes={str(work_dir.resolve()): {"bind": "/workspace", "mode": "rw"}},
-            working_dir="/workspace",
-        )
-
-        self._container.start()
-
-        _wait_for_ready(self._container)
+        def start_container(client) -> Container:
+            if image_manager is not None:
+                # Let the docker exception escape if this fails.
+                image_manager.resolve(image)
+            else:
+                try:
+                    client.images.get(image)
+                except ImageNotFound:
+                    logger.info(f"Pulling image {image}...")
+                    # Let the docker exception escape if this fails.
+                    client.images.pull(image)
+            container_image = image
+            if dependency_manager is not None:
+                container_image = dependency_manager.resolve_image(client, image)
+            container = client.containers.create(
+                container_image,
+                name=container_name,
+                entrypoint="/bin/sh",
+                tty=True,
+                auto_remove=auto_remove,
+                volumes=volumes,
+                environment=environment,
+                working_dir="/workspace",
+                **limits.create_kwargs(),
+            )
+            container.start()
+            _wait_for_ready(container)
+            if container.status != "running":
+                raise ValueError(f"Failed to start container from image {image}. Logs: {container.logs()}")
+            return container
+
+        self._docker_backend = docker_backend
+        self._endpoint: Optional[DockerEndpoint] = None
+        self._start_container = start_container
+        self._session_key = session_id or container_name
+        if docker_backend is not None:
+            # 同一个会话优先放回同一个 daemon，daemon 不可用时换下一个
+            self._endpoint, self._container = docker_backend.acquire(start_container, key=self._session_key)
+            self._client = self._endpoint.client
+        else:
+            self._client = image_manager.client if image_manager is not None else docker.from_env()
+            self._container = start_container(self._client)
 
         def cleanup():
             try:
-                container = client.containers.get(container_name)
+                container = self._client.containers.get(container_name)
                 container.stop()
             except docker.errors.NotFound:
                 pass
+            except docker.errors.DockerException as e:
+                # daemon 已经不可用，容器随之消失
+                logger.warning(f"Could not stop container {container_name}: {e}")
+            if self._endpoint is not None:
+                self._docker_backend.release(self._endpoint)
+                self._endpoint = None
 
             atexit.unregister(cleanup)
 
@@ -98,12 +236,29 @@ class DockerCommandLineCodeExecutor(CodeExecutor):
 
         self._cleanup = cleanup
 
-        if self._container.status != "running":
-            raise ValueError(f"Failed to start container from image {image}. Logs: {self._container.logs()}")
-
         self._timeout = timeout
         self._work_dir: Path = work_dir
-
+        self._dependency_manager = dependency_manager
+        self._workspace_manager = workspace_manager
+        self._fast_reset = fast_reset
+        self._snapshot = WorkspaceSnapshot(work_dir) if fast_reset and reset_workspace else None
+        self._last_reset: Optional[ResetReport] = None
+        self._profiler = CodeProfiler(profile_top_n) if profiling else None
+        self._flight_recorder = FlightRecorder() if flight_recorder else None
+        self._error_channel = ErrorChannel()
+        self._file_tracker = create_file_tracker(work_dir) if track_files else None
+        self._history = history
+        self._admission = admission
+        self._tenant = tenant
+        self._cpu_pool = cpu_pool
+        self._limits = limits
+        self._stats_interval = stats_interval
+        # 容器的 OOMKilled 标志在容器重启前一直保留，记录已经报告过的状态
+        self._oom_seen = False
+        self._total_memory: Optional[int] = None
+        self._total_cpus: Optional[int] = None
+        # (容器, 创建时的 cpuset)，每批代码执行后恢复
+        self._original_cpuset: Optional[Tuple[Container, str]] = None
 
     @property
     def timeout(self) -> int:
@@ -115,18 +270,73 @@ class DockerCommandLineCodeExecutor(CodeExecutor):
         """(Experimental) The working directory for the code execution."""
         return self._work_dir
 
+    @property
+    def workspace(self) -> Optional[Workspace]:
+        """(Experimental) The managed workspace of the executor, if any."""
+        return self._workspace
+
+    @property
+    def endpoint(self) -> Optional[DockerEndpoint]:
+        """(Experimental) The docker endpoint of the container when placed by a `ShardedDockerBackend`."""
+        return self._endpoint
+
     @property
     def code_extractor(self) -> CodeExtractor:
         """(Experimental) Export a code extractor that can be used by an agent."""
         return MarkdownCodeExtractor()
     
     def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        with ExitStack() as stack:
+            if self._admission is not None:
+                stack.enter_context(self._admission.admit(self._tenant))
+            if self._cpu_pool is not None:
+                slot = stack.enter_context(self._cpu_pool.slot())
+                # 运行中的容器可以直接修改 cpuset，不需要重建；释放 slot 前恢复原来的 cpuset
+                original = self._container_cpuset()
+                self._container.update(cpuset_cpus=slot.cpuset)
+                stack.callback(self._restore_cpuset, self._container, original)
+            return self._execute_code_blocks(code_blocks)
+
+    def _container_cpuset(self) -> str:
+        """The cpuset the container was created with, every CPU of the daemon if it was not pinned."""
+        if self._original_cpuset is None or self._original_cpuset[0] is not self._container:
+            cpuset = (self._container.attrs.get("HostConfig") or {}).get("CpusetCpus")
+            if not cpuset:
+                if self._total_cpus is None:
+                    self._total_cpus = self._client.info()["NCPU"]
+                cpuset = f"0-{self._total_cpus - 1}"
+            self._original_cpuset = (self._container, cpuset)
+        return self._original_cpuset[1]
+
+    def _restore_cpuset(self, container: Container, cpuset: str) -> None:
+        # 容器可能已经在执行中被重建
+        if container is not self._container:
+            return
+        try:
+            container.update(cpuset_cpus=cpuset)
+        except Exception as e:
+            logger.warning(f"Could not restore the cpuset of the container: {e}")
+
+    def _execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
         if len(code_blocks) == 0:
             raise ValueError("No code blocks to execute.")
-        
+
+        if self._dependency_manager is not None:
+            self._dependency_manager.prewarm(self._container, code_blocks, work_dir=self._work_dir)
+
         outputs = []
         files = []
+        profiles: List[ProfileSummary] = []
+        stack_summary = None
+        timings: List[BlockTiming] = []
+        written: List[Path] = []
+        if self._file_tracker is not None:
+            self._file_tracker.mark()
         last_exit_code = 0
+        stdout = stderr = ""
+        error = None
+        resource_usage: List[ResourceUsage] = []
+        oom_killed = False
         for code_block in code_blocks:
             lang = code_block.language
             code = code_block.code
@@ -146,40 +356,224 @@ class DockerCommandLineCodeExecutor(CodeExecutor):
             else:
                 # create a file with a automatically generated name
                 filename = f"tmp_code_{code_hash}.{'py' if lang.startswith('python') else lang}"
+                if self._workspace is not None:
+                    self._workspace.script_path(filename)
 
             code_path = self._work_dir / filename
             with code_path.open("w", encoding="utf-8") as fout:
                 fout.write(code)
 
-            command = ["timeout", str(self._timeout), _cmd(lang), filename]
-
-            result = self._container.exec_run(command)
+            run_filename = filename
+            if self._profiler is not None and lang.startswith("python"):
+                run_filename, runner_code = self._profiler.wrap(filename)
+                (self._work_dir / run_filename).write_text(runner_code, encoding="utf-8")
+            recorded = None
+            if self._flight_recorder is not None and lang.startswith("python"):
+                recorded = run_filename
+                run_filename, runner_code = self._flight_recorder.wrap(recorded)
+                (self._work_dir / run_filename).write_text(runner_code, encoding="utf-8")
+            reported = None
+            if lang.startswith("python"):
+                # 最外层的包装脚本，通过文件报告未捕获的异常
+                reported = run_filename
+                run_filename, runner_code = self._error_channel.wrap(reported, source=filename)
+                (self._work_dir / run_filename).write_text(runner_code, encoding="utf-8")
+
+            written += [self._work_dir / name for name in {filename, run_filename, recorded, reported} if name]
+
+            timeout = self._timeout if self._history is None else self._history.timeout_for(lang, code, self._timeout)
+            # timeout 先发送 SIGTERM，5 秒后仍未退出再 SIGKILL
+            command = ["timeout", "-k", "5", f"{timeout:g}", _cmd(lang), run_filename]
+
+            limits = self._limits.merge(code_block.limits)
+            if code_block.limits is not None and code_block.limits.pids is not None:
+                logger.warning("The pids limit of a code block is not applied to a running container.")
+            if limits != self._limits:
+                self._apply_limits(limits)
+            sampler = None
+            if self._stats_interval is not None:
+                sampler = ContainerStatsSampler(self._container, self._stats_interval)
+            start = perf_counter()
+            try:
+                with sampler if sampler is not None else nullcontext():
+                    result = self._container.exec_run(command, demux=True)
+            except Exception as e:
+                if self._endpoint is not None and _is_endpoint_failure(e):
+                    # 下一次 restart 把容器移到其他 daemon
+                    self._docker_backend.mark_unhealthy(self._endpoint, e)
+                raise
+            finally:
+                if limits != self._limits:
+                    self._apply_limits(self._limits, lift_memory=limits.memory is not None)
+            timings.append(BlockTiming(language=lang, run_seconds=perf_counter() - start))
             exit_code = result.exit_code
-            output = result.output.decode("utf-8")
+            usage = sampler.usage() if sampler is not None else None
+            # 超出内存限制的进程被 SIGKILL (137)；timeout -k 超时后的 SIGKILL 也是 137，用运行时间区分
+            block_oom = exit_code == 137 and timings[-1].run_seconds < timeout and self._oom_killed(limits, usage)
+            oom_killed = oom_killed or block_oom
+            if usage is not None:
+                usage.oom_killed = block_oom
+                resource_usage.append(usage)
+            if self._history is not None:
+                self._history.record(lang, code, timings[-1].run_seconds, timed_out=exit_code == 124)
+            block_stdout, block_stderr = ((part or b"").decode("utf-8") for part in result.output)
+            stdout += block_stdout
+            stderr += block_stderr
+            output = block_stdout + block_stderr
+            error = self._error_channel.collect(self._work_dir, reported) if reported is not None else None
             if exit_code == 124:
                 output += "\n"
                 output += TIMEOUT_MSG
+            elif block_oom:
+                output += f"\n{OOM_MSG}" + (f" (limit {limits.memory})." if limits.memory is not None else ".")
+            if recorded is not None:
+                summary = self._flight_recorder.collect(self._work_dir, recorded)
+                if exit_code == 124 and summary is not None:
+                    stack_summary = summary
+                    output += "\n" + summary.format()
+            if self._profiler is not None and lang.startswith("python"):
+                profile = self._profiler.collect(self._work_dir, filename)
+                if profile is not None:
+                    profiles.append(profile)
 
             outputs.append(output)
             files.append(code_path)
 
             last_exit_code = exit_code
-            if exit_code != 0:
+            if exit_code == 0 and self._workspace is not None:
+                try:
+                    self._workspace.check_quota()
+                except WorkspaceQuotaError as e:
+                    last_exit_code = 1
+                    outputs.append("\n" + str(e))
+            if last_exit_code != 0:
                 break
 
         code_file = str(files[0]) if files else None
-        return CommandLineCodeResult(exit_code=last_exit_code, output="".join(outputs), code_file=code_file)
+        output_files = [profile.profile_file for profile in profiles if profile.profile_file]
+        if self._file_tracker is not None:
+            if self._workspace is not None:
+                written.append(self._workspace.marker)
+            generated = self._file_tracker.changes(exclude=written)
+            output_files = generated + [path for path in output_files if path not in generated]
+        if self._workspace is not None:
+            self._workspace_manager.cleanup_scripts(self._workspace)
+            self._workspace.touch()
+            if code_file is not None and not Path(code_file).exists():
+                code_file = None
+        return CommandLineCodeResult(
+            exit_code=last_exit_code,
+            output="".join(outputs),
+            code_file=code_file,
+            output_files=output_files,
+            profiles=profiles,
+            stack_summary=stack_summary,
+            timings=timings,
+            stdout=stdout,
+            stderr=stderr,
+            error=error,
+            resource_usage=resource_usage,
+            oom_killed=oom_killed,
+        )
+
+    def _apply_limits(self, limits: ResourceLimits, lift_memory: bool = False) -> None:
+        total_memory = None
+        if lift_memory and limits.memory is None:
+            # 运行中的容器不能去掉内存限制，改为 daemon 的全部内存
+            if self._total_memory is None:
+                self._total_memory = self._client.info()["MemTotal"]
+            total_memory = self._total_memory
+        self._container.update(**limits.update_kwargs(total_memory))
+
+    def _oom_killed(self, limits: ResourceLimits, usage: Optional[ResourceUsage]) -> bool:
+        self._container.reload()
+        flag = bool(self._container.attrs.get("State", {}).get("OOMKilled"))
+        newly_set, self._oom_seen = flag and not self._oom_seen, flag
+        if newly_set:
+            return True
+        # 标志已经为真时，用采样到的内存峰值判断
+        memory = limits.memory_bytes
+        return memory is not None and usage is not None and usage.peak_memory_bytes >= 0.9 * memory
 
+    @property
+    def last_reset(self) -> Optional[ResetReport]:
+        """(Experimental) The report of the last `restart`."""
+        return self._last_reset
+
+    def restart(self, fast: Optional[bool] = None) -> None:
+        """(Experimental) Restart the code executor.
+
+        A fast reset kills every process in the container except the init shell, empties /tmp and, with
+        `reset_workspace`, rolls /workspace back to its baseline, keeping the container and its warm caches.
+        The container is restarted only when the fast reset fails or `fast` is False. When the container was
+        placed by a `ShardedDockerBackend` and its daemon is unhealthy, a new container is started on another one.
+
+        Args:
+            fast (Optional, bool): Overrides the `fast_reset` of the executor.
+        """
+        fast = self._fast_reset if fast is None else fast
+        start = perf_counter()
+        fallback_reason = None
+        if self._endpoint is not None and not self._endpoint.healthy:
+            unhealthy = self._endpoint
+            self._docker_backend.release(unhealthy)
+            self._endpoint = None
+            self._endpoint, self._container = self._docker_backend.acquire(self._start_container, key=self._session_key)
+            self._client = self._endpoint.client
+            self._oom_seen = False
+            self._last_reset = ResetReport(
+                mode="failover",
+                seconds=perf_counter() - start,
+                fallback_reason=f"Docker endpoint {unhealthy.name} is unhealthy.",
+            )
+            logger.info(f"Moved container from {unhealthy.name} to {self._endpoint.name}.")
+            return
+        if fast:
+            try:
+                removed, restored = self._reset_in_place()
+            except Exception as e:
+                fallback_reason = str(e)
+                logger.warning(f"Fast reset failed, restarting the container: {e}")
+            else:
+                self._last_reset = ResetReport(
+                    mode="fast", seconds=perf_counter() - start, files_removed=removed, files_restored=restored
+                )
+                logger.info(f"Reset container in place in {self._last_reset.seconds:.3f}s.")
+                return
 
-    def restart(self) -> None:
-        """(Experimental) Restart the code executor."""
         self._container.restart()
+        self._container.reload()
+        self._oom_seen = False
         if self._container.status != "running":
             raise ValueError(f"Failed to restart container. Logs: {self._container.logs()}")
+        self._last_reset = ResetReport(mode="full", seconds=perf_counter() - start, fallback_reason=fallback_reason)
+        logger.info(f"Restarted container in {self._last_reset.seconds:.3f}s.")
+
+    def _reset_in_place(self) -> Tuple[int, int]:
+        result = self._container.exec_run(FAST_RESET_COMMAND)
+        if result.exit_code != 0:
+            raise RuntimeError(f"reset command exited with {result.exit_code}: {result.output.decode('utf-8')}")
+        self._container.reload()
+        if self._container.status != "running":
+            raise RuntimeError(f"container is {self._container.status}")
+        if self._snapshot is None:
+            return 0, 0
+        removed, restored, failed = self._snapshot.rollback()
+        if failed:
+            # 容器内创建的文件可能属于 root，宿主机上删不掉时在容器内删除
+            result = self._container.exec_run(["rm", "-rf", "--"] + [f"/workspace/{path}" for path in failed])
+            if result.exit_code != 0:
+                raise RuntimeError(f"could not remove {failed}: {result.output.decode('utf-8')}")
+            removed += len(failed)
+        return removed, restored
 
     def stop(self) -> None:
         """(Experimental) Stop the code executor."""
         self._cleanup()
+        if self._snapshot is not None:
+            self._snapshot.discard()
+        if self._file_tracker is not None:
+            self._file_tracker.close()
 
     def __enter__(self) -> Self:
         return self
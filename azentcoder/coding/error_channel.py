@@ -0,0 +1,161 @@
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from .resources import ResourceUsage
+
+__all__ = ("CodeError", "ErrorChannel", "ExecutionStatus", "TracebackFrame")
+
+# 包装脚本在执行环境中运行（本地或容器内），只能依赖标准库。
+# 其他包装脚本 (profiling, flight recorder) 在它里面运行，异常会传到这里
+_REPORTER_TEMPLATE = '''\
+import json, os, runpy, sys, traceback
+_target, _source, _display, _out = {target!r}, {source!r}, {display!r}, {out!r}
+_skip = ("runpy.py", "<frozen runpy>", ".error_runner.py", ".profile_runner.py", ".flight_runner.py")
+sys.argv = [_target]
+sys.path.insert(0, os.path.dirname(os.path.abspath(_target)))
+try:
+    runpy.run_path(_target, run_name="__main__")
+except SystemExit:
+    raise
+except BaseException as e:
+    _cwd = os.getcwd() + os.sep
+
+    def _name(file):
+        if os.path.abspath(file) == os.path.abspath(_source):
+            return _display
+        return file[len(_cwd):] if file.startswith(_cwd) else file
+
+    _stack = [f for f in traceback.extract_tb(e.__traceback__) if not f.filename.endswith(_skip)]
+    _frames = [traceback.FrameSummary(_name(f.filename), f.lineno, f.name, line=f.line) for f in _stack]
+    _exc = traceback.TracebackException(type(e), e, None)
+    _exc.stack = traceback.StackSummary.from_list(_frames)
+    _file = _line = None
+    if isinstance(e, SyntaxError) and e.filename:
+        _exc.filename = _name(e.filename)
+        _file, _line = _exc.filename, e.lineno
+    else:
+        # 最内层的用户代码栈帧，没有时用最内层的栈帧
+        _user = [f for f in _frames if not os.path.isabs(f.filename)] or _frames
+        if _user:
+            _file, _line = _user[-1].filename, _user[-1].lineno
+    _type = type(e).__qualname__
+    if type(e).__module__ not in ("builtins", "__main__"):
+        _type = type(e).__module__ + "." + _type
+    with open(_out + ".tmp", "w") as _f:
+        json.dump({{
+            "exception_type": _type,
+            "message": e.msg if isinstance(e, SyntaxError) else str(e),
+            "file": _file or None,
+            "line": _line,
+            "frames": [{{"file": f.filename, "line": f.lineno, "name": f.name}} for f in _frames],
+        }}, _f)
+    os.replace(_out + ".tmp", _out)
+    sys.stderr.write("".join(_exc.format()))
+    sys.exit(1)
+'''
+
+
+class TracebackFrame(BaseModel):
+    """(Experimental) traceback 中的一个栈帧"""
+
+    file: str = Field(description="The file, relative to the working directory for the code in it.")
+    line: Optional[int] = Field(default=None, description="The line number.")
+    name: str = Field(description="The function, or <module>.")
+
+
+class CodeError(BaseModel):
+    """(Experimental) 代码块抛出的未捕获的 Python 异常"""
+
+    exception_type: str = Field(description="The qualified name of the exception class, e.g. ZeroDivisionError.")
+    message: str = Field(description="The message of the exception.")
+    file: Optional[str] = Field(default=None, description="The file of the innermost frame in the user's code.")
+    line: Optional[int] = Field(default=None, description="The line of the innermost frame in the user's code.")
+    frames: List[TracebackFrame] = Field(default_factory=list, description="The traceback, outermost first.")
+
+    def format(self) -> str:
+        """(Experimental) A one-line description of the error for the model, such as `KeyError: 'x' (at line 3)`."""
+        text = f"{self.exception_type}: {self.message}" if self.message else self.exception_type
+        if self.line is None:
+            return text
+        return f"{text} (at {self.file}:{self.line})" if self.file else f"{text} (at line {self.line})"
+
+
+class ExecutionStatus(BaseModel):
+    """(Experimental) 一次代码执行的结构化结果"""
+
+    exit_code: int = Field(description="The exit code of the process, 1 on a timeout.")
+    output: str = Field(
+        description="The output for the model: stdout on success, the errors otherwise. In docker, stdout and stderr "
+        "interleaved as the container logged them."
+    )
+    stdout: str = Field(default="", description="The standard output of the process.")
+    stderr: str = Field(default="", description="The standard error of the process.")
+    timed_out: bool = Field(default=False, description="Whether the execution was stopped by the timeout.")
+    error: Optional[CodeError] = Field(default=None, description="The uncaught exception of Python code.")
+    image: Optional[str] = Field(default=None, description="The docker image of the execution, if any.")
+    oom_killed: bool = Field(default=False, description="Whether the container ran out of memory.")
+    resource_usage: Optional[ResourceUsage] = Field(
+        default=None, description="The resources used by the container, when its stats are sampled."
+    )
+
+
+class ErrorChannel:
+    """(Experimental) Report the uncaught exception of a Python code block as structured data.
+
+    `wrap` returns a runner script that executes the code block file with `runpy`. When the code raises, the
+    runner writes the exception type, message and traceback frames to a JSON file next to it, prints the
+    traceback without the runner's frames and with paths relative to the working directory, and exits with 1.
+    The exit code and the output streams are taken from the process, so nothing is parsed out of the logs.
+    The runner is the outermost wrapper: the profiler and the flight recorder runners run inside it.
+    """
+
+    @staticmethod
+    def _names(filename: str) -> Tuple[str, str]:
+        stem = Path(filename).stem
+        return f"{stem}.error_runner.py", f"{stem}.error.json"
+
+    def wrap(
+        self, filename: str, source: Optional[str] = None, display_name: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """(Experimental) The file name and the source of the runner of a code block file.
+
+        Args:
+            filename (str): The file to run, the code block or the runner of another wrapper, relative to the
+                working directory.
+            source (Optional, str): The code block file when `filename` is another runner.
+            display_name (Optional, str): The name of the code block file in the traceback. Its relative path if
+                None, use "" to hide generated names.
+        """
+        runner, out = self._names(filename)
+        parent = Path(filename).parent
+        source = filename if source is None else source
+        code = _REPORTER_TEMPLATE.format(
+            target=filename,
+            source=source,
+            display=source if display_name is None else display_name,
+            out=(parent / out).as_posix(),
+        )
+        return (parent / runner).as_posix(), code
+
+    def collect(self, work_dir: Path, filename: str) -> Optional[CodeError]:
+        """(Experimental) Read the error written by the runner and remove the runner files.
+
+        Returns:
+            Optional[CodeError]: The error, or None if the code did not raise.
+        """
+        runner, out = (Path(work_dir) / Path(filename).parent / name for name in self._names(filename))
+        try:
+            data = json.loads(out.read_text())
+        except (OSError, ValueError):
+            data = None
+        for path in (runner, out, out.with_name(out.name + ".tmp")):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        if data is None:
+            return None
+        return CodeError(**data)
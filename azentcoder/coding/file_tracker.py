@@ -0,0 +1,225 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+__all__ = ("FileChangeTracker", "IndexFileTracker", "InotifyFileTracker", "create_file_tracker")
+
+logger = logging.getLogger(__name__)
+
+# 来自 <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _walk(root: Path) -> Iterator[Tuple[str, os.stat_result, bool]]:
+    """Yield the (path, stat, is_dir) of every entry under the directory, not following symlinks."""
+    stack = [str(root)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    stack.append(entry.path)
+                yield entry.path, stat, is_dir
+
+
+class FileChangeTracker:
+    """(Experimental) Report the files created or modified in a directory since the last `mark`.
+
+    Executors call `mark` before running code and `changes` after it. Use `create_file_tracker` to get the
+    best tracker for the platform.
+    """
+
+    def __init__(self, root: Union[Path, str]):
+        self.root = Path(root).resolve()
+
+    def mark(self) -> None:
+        """(Experimental) Start a new run: changes before this call are not reported."""
+        raise NotImplementedError
+
+    def changes(self, exclude: Iterable[Union[Path, str]] = ()) -> List[str]:
+        """(Experimental) The sorted paths of the existing files created or modified since `mark`.
+
+        Args:
+            exclude (Iterable): Paths that are not reported, such as the code files written by the executor.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """(Experimental) Release the resources of the tracker."""
+
+    def _filter(self, paths: Iterable[str], exclude: Iterable[Union[Path, str]]) -> List[str]:
+        excluded = {os.path.realpath(path) for path in exclude}
+        # 只报告仍然存在的普通文件
+        return sorted(path for path in set(paths) if path not in excluded and os.path.isfile(path))
+
+    def __enter__(self) -> "FileChangeTracker":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class IndexFileTracker(FileChangeTracker):
+    """(Experimental) Detect changes by comparing the size and modification time of every file with an index.
+
+    The index is kept between runs, so each run costs one walk of the tree instead of a walk before and after.
+    Changes made between runs are reported by the next run.
+    """
+
+    def __init__(self, root: Union[Path, str]):
+        super().__init__(root)
+        self._index: Optional[Dict[str, Tuple[int, int]]] = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        return {path: (stat.st_size, stat.st_mtime_ns) for path, stat, is_dir in _walk(self.root) if not is_dir}
+
+    def mark(self) -> None:
+        if self._index is None:
+            self._index = self._scan()
+
+    def changes(self, exclude: Iterable[Union[Path, str]] = ()) -> List[str]:
+        previous = self._index or {}
+        self._index = self._scan()
+        changed = [path for path, version in self._index.items() if previous.get(path) != version]
+        return self._filter(changed, exclude)
+
+
+class InotifyFileTracker(FileChangeTracker):
+    """(Experimental) Detect changes with Linux inotify, in time proportional to the number of changes.
+
+    Every directory of the tree is watched for files that are created, written and closed, or moved in.
+    Directories created during a run are watched as soon as they appear and scanned for the files created
+    before the watch. If the kernel event queue overflows, the run falls back to comparing modification times.
+    Writes made inside a container to a bind-mounted directory are seen as well.
+
+    Raises:
+        OSError: If inotify is not available or the watch limit is reached.
+    """
+
+    def __init__(self, root: Union[Path, str]):
+        super().__init__(root)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available.")
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: Dict[int, str] = {}
+        self._changed: Set[str] = set()
+        self._overflow = False
+        self._mark_ns = time.time_ns()
+        try:
+            self._watch_tree(str(self.root), initial=True)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch failed for {path}: {os.strerror(errno)}")
+        self._watches[wd] = path
+
+    def _watch_tree(self, path: str, initial: bool = False) -> None:
+        self._watch(path)
+        for child, _, is_dir in _walk(Path(path)):
+            if is_dir:
+                self._watch(child)
+            elif not initial:
+                # 新目录在加上监听之前创建的文件
+                self._changed.add(child)
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size : offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += _EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    self._overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        try:
+                            self._watch_tree(path)
+                        except OSError:
+                            self._overflow = True
+                else:
+                    self._changed.add(path)
+
+    def mark(self) -> None:
+        self._drain()
+        self._changed.clear()
+        self._overflow = False
+        self._mark_ns = time.time_ns()
+
+    def changes(self, exclude: Iterable[Union[Path, str]] = ()) -> List[str]:
+        self._drain()
+        changed = self._changed
+        if self._overflow:
+            logger.warning(f"inotify queue overflowed for {self.root}, comparing modification times instead.")
+            changed = {path for path, stat, is_dir in _walk(self.root) if not is_dir and stat.st_mtime_ns >= self._mark_ns}
+        result = self._filter(changed, exclude)
+        self._changed = set()
+        self._overflow = False
+        self._mark_ns = time.time_ns()
+        return result
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_file_tracker(root: Union[Path, str], use_inotify: Optional[bool] = None) -> FileChangeTracker:
+    """(Experimental) Create an inotify tracker on Linux, or an index tracker elsewhere or if inotify fails.
+
+    Args:
+        root (Path or str): The directory to track.
+        use_inotify (Optional, bool): Force (True) or disable (False) inotify. Automatic if None.
+    """
+    if use_inotify is not False and sys.platform.startswith("linux"):
+        try:
+            return InotifyFileTracker(root)
+        except OSError as e:
+            if use_inotify:
+                raise
+            logger.info(f"Falling back to an index file tracker for {root}: {e}")
+    return IndexFileTracker(root)
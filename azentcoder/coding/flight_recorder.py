@@ -0,0 +1,149 @@
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+__all__ = ("FlightRecorder", "StackSummary")
+
+# 采样线程在执行环境中运行（本地或容器内），只能依赖标准库。
+# 收到 SIGTERM（本地超时或 docker 的 timeout 命令）时写出最近的采样，另外每秒写一次，以防进程被直接 SIGKILL
+_RECORDER_TEMPLATE = '''\
+import collections, json, os, runpy, signal, sys, threading, time
+_target, _out, _interval, _window = {target!r}, {out!r}, {interval!r}, {window!r}
+_samples = collections.deque(maxlen=_window)
+_main = threading.main_thread().ident
+_skip = (__file__, "runpy.py", ".profile_runner.py", ".error_runner.py", "threading.py")
+_lock = threading.Lock()
+
+
+def _sample():
+    frame = sys._current_frames().get(_main)
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        if not code.co_filename.endswith(_skip):
+            stack.append(f"{{os.path.basename(code.co_filename)}}:{{code.co_name}}:{{frame.f_lineno}}")
+        frame = frame.f_back
+    if stack:
+        _samples.append(";".join(reversed(stack)))
+
+
+def _dump():
+    with _lock:
+        counts = collections.Counter(list(_samples))
+        tmp = _out + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({{"interval": _interval, "num_samples": sum(counts.values()), "stacks": counts.most_common()}}, f)
+        os.replace(tmp, _out)
+
+
+def _run():
+    last_dump = time.monotonic()
+    while True:
+        time.sleep(_interval)
+        _sample()
+        if time.monotonic() - last_dump >= 1.0:
+            _dump()
+            last_dump = time.monotonic()
+
+
+def _on_term(signum, frame):
+    _sample()
+    _dump()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+if hasattr(signal, "SIGTERM"):
+    signal.signal(signal.SIGTERM, _on_term)
+threading.Thread(target=_run, name="flight-recorder", daemon=True).start()
+sys.argv = [_target]
+sys.path.insert(0, os.path.dirname(os.path.abspath(_target)))
+runpy.run_path(_target, run_name="__main__")
+'''
+
+
+class StackSummary(BaseModel):
+    """(Experimental) 超时前最近一段时间的采样栈汇总"""
+
+    num_samples: int = Field(description="The number of stack samples in the window.")
+    interval: float = Field(description="The sampling interval in seconds.")
+    stacks: List[Tuple[str, int]] = Field(
+        default_factory=list,
+        description="The collapsed stacks (root first, frames joined by ';') and their sample counts, most frequent first.",
+    )
+
+    def leaf_counts(self) -> Dict[str, int]:
+        """(Experimental) The sample counts of the innermost frames."""
+        counts: Counter = Counter()
+        for stack, count in self.stacks:
+            counts[stack.rsplit(";", 1)[-1]] += count
+        return dict(counts.most_common())
+
+    def format(self, top_n: int = 5) -> str:
+        """(Experimental) A short text of where the time went, for the logs or the model."""
+        if not self.num_samples:
+            return "No stack samples were recorded."
+        lines = [f"Stack samples of the last {self.num_samples * self.interval:.1f}s before the timeout:"]
+        for stack, count in self.stacks[:top_n]:
+            lines.append(f"{count / self.num_samples:6.1%}  {stack}")
+        return "\n".join(lines)
+
+
+class FlightRecorder:
+    """(Experimental) A low-frequency stack sampler for Python code blocks that may time out.
+
+    `wrap` returns a runner script that starts a sampling thread and executes the code block file with
+    `runpy`. The thread samples the main thread's stack every `interval` seconds into a rolling window of
+    `window` samples. The collapsed stacks of the window are written to a file when the process receives
+    SIGTERM, which is how both the local executor and the docker `timeout` command stop a block, and once a
+    second in case the process is killed outright.
+
+    Args:
+        interval (float): The sampling interval in seconds.
+        window (int): The number of samples kept.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 300):
+        self.interval = interval
+        self.window = window
+
+    @staticmethod
+    def _names(filename: str) -> Tuple[str, str]:
+        stem = Path(filename).stem
+        return f"{stem}.flight_runner.py", f"{stem}.stacks.json"
+
+    def wrap(self, filename: str) -> Tuple[str, str]:
+        """(Experimental) The file name and the source of the runner of a code block file.
+
+        Args:
+            filename (str): The code block file, relative to the working directory.
+        """
+        runner, out = self._names(filename)
+        parent = Path(filename).parent
+        source = _RECORDER_TEMPLATE.format(
+            target=filename, out=(parent / out).as_posix(), interval=self.interval, window=self.window
+        )
+        return (parent / runner).as_posix(), source
+
+    def collect(self, work_dir: Path, filename: str) -> Optional[StackSummary]:
+        """(Experimental) Read the samples written by the runner and remove the runner files.
+
+        Returns:
+            Optional[StackSummary]: The samples, or None if the runner did not write any.
+        """
+        runner, out = (Path(work_dir) / Path(filename).parent / name for name in self._names(filename))
+        try:
+            data = json.loads(out.read_text())
+        except (OSError, ValueError):
+            data = None
+        for path in (runner, out, out.with_name(out.name + ".tmp")):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        if data is None:
+            return None
+        return StackSummary(**data)
@@ -0,0 +1,230 @@
+import ast
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+from ..compile_cache import parse_ast
+from .base import CodeBlock
+
+__all__ = ("ExecutionHistory", "HistoryStats", "code_shape", "percentile")
+
+_NUMBER_RE = re.compile(r"\b\d+(\.\d+)?([eE][-+]?\d+)?\b")
+_STRING_RE = re.compile(r"(\"(\\.|[^\"\\])*\"|'(\\.|[^'\\])*')")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """The nearest-rank percentile of the samples, `q` between 0 and 1."""
+    if not samples:
+        raise ValueError("No samples.")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class _ConstantNormalizer(ast.NodeTransformer):
+    def visit_Constant(self, node: ast.Constant) -> ast.Constant:
+        value = node.value
+        if isinstance(value, (int, float, complex)) and not isinstance(value, bool):
+            return ast.Constant(value="number")
+        return ast.Constant(value=type(value).__name__)
+
+
+def code_shape(lang: str, code: str) -> str:
+    """(Experimental) A hash of the code with its literals, comments and layout removed.
+
+    Blocks that only differ by their constants, such as the same script run on another file or size, have
+    the same shape. Python code is normalized on its AST, other languages with regular expressions.
+    """
+    lang = lang.lower()
+    normalized = None
+    if lang.startswith("python"):
+        try:
+            normalized = ast.dump(_ConstantNormalizer().visit(parse_ast(code)))
+        except (SyntaxError, ValueError):
+            pass
+    if normalized is None:
+        lines = [line.split("#", 1)[0] if lang in ("sh", "bash", "shell") else line for line in code.splitlines()]
+        normalized = _SPACE_RE.sub(" ", _NUMBER_RE.sub("0", _STRING_RE.sub('""', "\n".join(lines)))).strip()
+    return hashlib.sha256(f"{lang}\0{normalized}".encode()).hexdigest()
+
+
+def _code_hash(lang: str, code: str) -> str:
+    return hashlib.sha256(f"{lang.lower()}\0{code}".encode()).hexdigest()
+
+
+class HistoryStats(BaseModel):
+    """(Experimental) 执行历史的统计"""
+
+    records: int = Field(description="The number of run times recorded.")
+    code_hashes: int = Field(description="The number of distinct code blocks recorded.")
+    shapes: int = Field(description="The number of distinct code shapes recorded.")
+    predictions: int = Field(default=0, description="The number of predictions served.")
+    exact_hits: int = Field(default=0, description="The predictions made from the same code.")
+    shape_hits: int = Field(default=0, description="The predictions made from code of the same shape.")
+
+
+class ExecutionHistory:
+    """(Experimental) A store of the run times of code blocks, used to predict how long a block will run.
+
+    Run times are kept per code hash and per normalized code shape (see `code_shape`), the most recent
+    `max_samples` of each. A prediction uses the samples of the same code if there are at least
+    `min_samples`, otherwise the samples of the same shape. `JobQueue` uses the predictions to run the shortest
+    jobs first. Executors derive timeouts from the observed percentiles of the same code only: the constants
+    that a shape erases, such as a size or a sleep, are what sets the run time.
+
+    Args:
+        path (Optional, Path or str): A JSON file the history is loaded from and saved to by `save`. In memory
+            only if None.
+        max_samples (int): The number of samples kept per code hash and per shape.
+        min_samples (int): The number of samples needed before a prediction is made.
+        timeout_percentile (float): The percentile of the run times that adaptive timeouts are based on.
+        timeout_margin (float): The factor applied to that percentile.
+        min_timeout (float): The lowest adaptive timeout in seconds.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[Path, str]] = None,
+        max_samples: int = 50,
+        min_samples: int = 3,
+        timeout_percentile: float = 0.99,
+        timeout_margin: float = 3.0,
+        min_timeout: float = 5.0,
+    ):
+        if min_samples < 1 or max_samples < min_samples:
+            raise ValueError("max_samples must be greater than or equal to min_samples, which must be at least 1.")
+        self.path = None if path is None else Path(path)
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.timeout_percentile = timeout_percentile
+        self.timeout_margin = timeout_margin
+        self.min_timeout = min_timeout
+        # (秒, 是否超时)
+        self._by_hash: Dict[str, Deque[Tuple[float, bool]]] = {}
+        self._by_shape: Dict[str, Deque[Tuple[float, bool]]] = {}
+        self._records = 0
+        self._predictions = 0
+        self._exact_hits = 0
+        self._shape_hits = 0
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def _append(self, table: Dict[str, Deque[Tuple[float, bool]]], key: str, sample: Tuple[float, bool]) -> None:
+        samples = table.get(key)
+        if samples is None:
+            samples = table[key] = deque(maxlen=self.max_samples)
+        samples.append(sample)
+
+    def record(self, lang: str, code: str, seconds: float, timed_out: bool = False) -> None:
+        """(Experimental) Record the run time of a code block.
+
+        Args:
+            timed_out (bool): Whether the block was stopped by its timeout, `seconds` is then a lower bound.
+        """
+        key, shape = _code_hash(lang, code), code_shape(lang, code)
+        with self._lock:
+            self._append(self._by_hash, key, (seconds, timed_out))
+            self._append(self._by_shape, shape, (seconds, timed_out))
+            self._records += 1
+
+    def _samples(self, lang: str, code: str, exact: bool = False) -> Optional[List[Tuple[float, bool]]]:
+        key = _code_hash(lang, code)
+        with self._lock:
+            self._predictions += 1
+            samples = self._by_hash.get(key)
+            if samples is not None and len(samples) >= self.min_samples:
+                self._exact_hits += 1
+                return list(samples)
+        if exact:
+            return None
+        shape = code_shape(lang, code)
+        with self._lock:
+            samples = self._by_shape.get(shape)
+            if samples is not None and len(samples) >= self.min_samples:
+                self._shape_hits += 1
+                return list(samples)
+        return None
+
+    def predict(self, lang: str, code: str, q: float = 0.5) -> Optional[float]:
+        """(Experimental) The `q` percentile of the run times of the block, or None if it is unknown."""
+        samples = self._samples(lang, code)
+        if samples is None:
+            return None
+        return percentile([seconds for seconds, _ in samples], q)
+
+    def predict_blocks(self, code_blocks: List[CodeBlock], unknown: float) -> float:
+        """(Experimental) The predicted run time of a batch, counting `unknown` seconds for each unknown block."""
+        total = 0.0
+        for block in code_blocks:
+            predicted = self.predict(block.language, block.code)
+            total += unknown if predicted is None else predicted
+        return total
+
+    def timeout_for(self, lang: str, code: str, default: float) -> float:
+        """(Experimental) A timeout from the observed run times: `timeout_margin` times the `timeout_percentile`.
+
+        The result is between `min_timeout` and `default`. Runs that timed out are not counted, instead the
+        timeout doubles for each timeout in a row at the end of the history, so a block that legitimately got
+        slower soon gets `default` again. Blocks without enough history of the same code get `default`, the
+        history of the same shape is not used to tighten a timeout.
+        """
+        samples = self._samples(lang, code, exact=True)
+        if samples is None:
+            return default
+        completed = [seconds for seconds, timed_out in samples if not timed_out]
+        if not completed:
+            return default
+        streak = 0
+        for _, timed_out in reversed(samples):
+            if not timed_out:
+                break
+            streak += 1
+        estimate = percentile(completed, self.timeout_percentile) * self.timeout_margin * 2**streak
+        return min(default, max(self.min_timeout, estimate))
+
+    def stats(self) -> HistoryStats:
+        with self._lock:
+            return HistoryStats(
+                records=self._records,
+                code_hashes=len(self._by_hash),
+                shapes=len(self._by_shape),
+                predictions=self._predictions,
+                exact_hits=self._exact_hits,
+                shape_hits=self._shape_hits,
+            )
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text())
+            for name, table in (("by_hash", self._by_hash), ("by_shape", self._by_shape)):
+                for key, samples in data[name].items():
+                    table[key] = deque((tuple(sample) for sample in samples), maxlen=self.max_samples)
+            self._records = data.get("records", 0)
+        except (OSError, ValueError, KeyError, TypeError):
+            # 损坏的历史文件不影响执行，重新开始记录
+            self._by_hash.clear()
+            self._by_shape.clear()
+
+    def save(self) -> None:
+        """(Experimental) Write the history to `path` atomically."""
+        if self.path is None:
+            raise ValueError("The history has no path.")
+        with self._lock:
+            data = {
+                "records": self._records,
+                "by_hash": {key: list(samples) for key, samples in self._by_hash.items()},
+                "by_shape": {key: list(samples) for key, samples in self._by_shape.items()},
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from pydantic import BaseModel, Field
+
+__all__ = ("ImageManager", "ImageStatus")
+
+logger = logging.getLogger(__name__)
+
+
+class ImageStatus(BaseModel):
+    """(Experimental) 一个镜像的解析状态"""
+
+    name: str = Field(description="The name of the image, such as python:3-slim.")
+    image_id: Optional[str] = Field(default=None, description="The resolved image ID, None if not resolved.")
+    resolved_at: Optional[float] = Field(default=None, description="When the image was last resolved, a time.time().")
+    pulls: int = Field(default=0, description="The number of times the image was pulled.")
+    error: Optional[str] = Field(default=None, description="The error of the last failed resolution.")
+
+
+class ImageManager:
+    """(Experimental) Resolve and pull docker images in the background and cache their IDs.
+
+    `start` resolves the configured images on a worker thread, pulling the missing ones, and then refreshes
+    them every `refresh_interval` seconds, so a deleted or retagged image is noticed without blocking any
+    execution. `resolve` returns a cached image right away and only waits when the image is really missing:
+    for the prefetch in flight, or for a pull of its own.
+
+    Args:
+        images (list): The images to prefetch.
+        client (Optional, docker.DockerClient): The docker client. `docker.from_env()` if None.
+        refresh_interval (Optional, float): The seconds between two refreshes of the cached images. None to
+            never refresh.
+        max_workers (int): The number of images resolved at the same time.
+    """
+
+    def __init__(
+        self,
+        images: Sequence[str] = (),
+        client: Optional[Any] = None,
+        refresh_interval: Optional[float] = 300.0,
+        max_workers: int = 2,
+    ):
+        if client is None:
+            import docker
+
+            client = docker.from_env()
+        self._client = client
+        self._images: List[str] = list(dict.fromkeys(images))
+        self._refresh_interval = refresh_interval
+        self._status: Dict[str, ImageStatus] = {image: ImageStatus(name=image) for image in self._images}
+        self._pending: Dict[str, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-manager")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    @property
+    def client(self) -> Any:
+        return self._client
+
+    def __enter__(self) -> "ImageManager":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def start(self) -> "ImageManager":
+        """(Experimental) Prefetch the images in the background and refresh them on schedule."""
+        self.prefetch(self._images)
+        if self._refresh_interval is not None and self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="image-refresh", daemon=True)
+            self._refresher.start()
+        return self
+
+    def close(self) -> None:
+        """(Experimental) Stop refreshing and wait for the resolutions in flight."""
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+        self._pool.shutdown(wait=True)
+
+    def prefetch(self, images: Sequence[str]) -> List[Future]:
+        """(Experimental) Resolve the images in the background, pulling the missing ones."""
+        with self._lock:
+            for image in images:
+                if image not in self._status:
+                    self._images.append(image)
+                    self._status[image] = ImageStatus(name=image)
+            return [self._submit(image) for image in images]
+
+    def _submit(self, image: str) -> Future:
+        # 同一个镜像同时只解析一次，后来的调用等待同一个 future
+        future = self._pending.get(image)
+        if future is None:
+            future = self._pool.submit(self._resolve_now, image)
+            self._pending[image] = future
+        return future
+
+    def _resolve_now(self, image: str) -> str:
+        import docker
+
+        try:
+            try:
+                image_id = self._client.images.get(image).id
+            except docker.errors.ImageNotFound:
+                logger.info(f"Pulling image {image}...")
+                self._client.images.pull(image)
+                with self._lock:
+                    self._status[image].pulls += 1
+                image_id = self._client.images.get(image).id
+        except Exception as e:
+            with self._lock:
+                status = self._status[image]
+                # 刷新失败时保留之前解析到的 ID，镜像可能仍然可用
+                status.error = str(e)
+                self._pending.pop(image, None)
+            logger.warning(f"Failed to resolve image {image}: {e}")
+            raise
+        with self._lock:
+            status = self._status[image]
+            if status.image_id is not None and status.image_id != image_id:
+                logger.info(f"Image {image} changed from {status.image_id} to {image_id}.")
+            status.image_id, status.resolved_at, status.error = image_id, time.time(), None
+            self._pending.pop(image, None)
+        return image_id
+
+    def resolve(self, image: str, timeout: Optional[float] = None) -> str:
+        """(Experimental) The ID of an image, waiting for it to be pulled only if it is not cached.
+
+        Raises:
+            docker.errors.DockerException: If the image cannot be found nor pulled.
+            concurrent.futures.TimeoutError: If the image is not resolved within `timeout` seconds.
+        """
+        with self._lock:
+            if image not in self._status:
+                self._images.append(image)
+                self._status[image] = ImageStatus(name=image)
+            image_id = self._status[image].image_id
+            if image_id is not None:
+                return image_id
+            future = self._submit(image)
+        return future.result(timeout)
+
+    def first_available(self, images: Sequence[str], timeout: Optional[float] = None) -> str:
+        """(Experimental) The first of the images that is cached or can be pulled, in order of preference.
+
+        The cached images are checked first, so a pull is only waited for when none of the images is cached.
+        Returns the last image if none can be resolved, so the caller fails with the error of docker.
+        """
+        with self._lock:
+            for image in images:
+                if image in self._status and self._status[image].image_id is not None:
+                    return image
+        for image in images:
+            try:
+                self.resolve(image, timeout)
+                return image
+            except Exception:
+                continue
+        return images[-1]
+
+    def invalidate(self, image: str) -> None:
+        """(Experimental) Forget the ID of an image, the next `resolve` checks docker again."""
+        with self._lock:
+            if image in self._status:
+                self._status[image].image_id = None
+
+    def refresh(self) -> List[Future]:
+        """(Experimental) Resolve every known image again in the background. The cached IDs stay in use."""
+        with self._lock:
+            return [self._submit(image) for image in self._images]
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self._refresh_interval):
+            self.refresh()
+
+    def status(self) -> List[ImageStatus]:
+        """(Experimental) The resolution status of every known image."""
+        with self._lock:
+            return [self._status[image].model_copy() for image in self._images]
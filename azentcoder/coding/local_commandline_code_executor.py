@@ -1,15 +1,25 @@
-import os
+from contextlib import ExitStack
 from pathlib import Path
-import re
+import time
 import uuid
-import warnings
 from typing import ClassVar, List, Optional, Union
 from pydantic import Field
 
 from ..developerchat.agent import LLMAgent
-# from ..code_utils import execute_code
+from ..code_utils import TIMEOUT_MSG, run_code
+from .admission import DEFAULT_TENANT, AdmissionController
 from .base import CodeBlock, CodeExecutor, CodeExtractor, CodeResult
+from .cpu_affinity import CpuSlotPool
+from .error_channel import CodeError
+from .file_tracker import create_file_tracker
+from .flight_recorder import FlightRecorder, StackSummary
+from .history import ExecutionHistory
 from .markdown_code_extractor import MarkdownCodeExtractor
+from .profiling import CodeProfiler, ProfileSummary
+from .resources import ResourceUsage
+from .runtimes import DEFAULT_RUNTIMES, BlockTiming, BuildCache, RuntimeRegistry
+from .sanitizer import DEFAULT_SANITIZER
+from .workspace import Workspace, WorkspaceManager, WorkspaceQuotaError
 
 __all__ = (
     "LocalCommandLineCodeExecutor",
@@ -24,6 +34,39 @@ class CommandLineCodeResult(CodeResult):
         default=None,
         description="The file that the executed code block was saved to.",
     )
+    output_files: List[str] = Field(
+        default_factory=list,
+        description="The list of files that the executed code blocks generated.",
+    )
+    profiles: List[ProfileSummary] = Field(
+        default_factory=list,
+        description="The profiles of the executed Python code blocks, when profiling is enabled.",
+    )
+    stack_summary: Optional[StackSummary] = Field(
+        default=None,
+        description="Where a Python code block that timed out spent its last seconds, when the flight recorder is enabled.",
+    )
+    timings: List[BlockTiming] = Field(
+        default_factory=list,
+        description="The compile and run time of each executed code block.",
+    )
+    stdout: str = Field(default="", description="The standard output of the executed code blocks.")
+    stderr: str = Field(default="", description="The standard error of the executed code blocks.")
+    error: Optional[CodeError] = Field(
+        default=None,
+        description="The uncaught exception of the Python code block that failed: its type, message, file and line.",
+    )
+    resource_usage: List[ResourceUsage] = Field(
+        default_factory=list,
+        description="The container resources used by each executed code block, when the stats are sampled.",
+    )
+    oom_killed: bool = Field(
+        default=False,
+        description="Whether any executed code block ran out of memory. The execution stops at that block, see "
+        "`resource_usage` for each block.",
+    )
+
+
 class LocalCommandLineCodeExecutor(CodeExecutor):
     DEFAULT_SYSTEM_MESSAGE_UPDATE: ClassVar[
         str
@@ -41,18 +84,75 @@ If you want the user to save the code in a file before executing it, put # filen
         timeout: int = 60,
         work_dir: Union[Path, str] = Path("."),
         system_message_update: str = DEFAULT_SYSTEM_MESSAGE_UPDATE,
+        workspace_manager: Optional[WorkspaceManager] = None,
+        session_id: Optional[str] = None,
+        profiling: bool = False,
+        profile_top_n: int = 10,
+        flight_recorder: bool = False,
+        track_files: bool = False,
+        runtimes: Optional[RuntimeRegistry] = None,
+        build_cache: Optional[BuildCache] = None,
+        history: Optional[ExecutionHistory] = None,
+        admission: Optional[AdmissionController] = None,
+        tenant: str = DEFAULT_TENANT,
+        cpu_pool: Optional[CpuSlotPool] = None,
     ):
-        
+        """(Experimental) A code executor that runs code blocks as local subprocesses.
+
+        Args:
+            timeout (int): The timeout for each code execution in seconds.
+            work_dir (Path or str): The working directory. Ignored when `workspace_manager` is given.
+            system_message_update (str): The system message added to the agent by `user_capability`.
+            workspace_manager (Optional, WorkspaceManager): Run the code in a managed per-session workspace.
+                Generated script files are removed after each run, the quota of the workspace is checked,
+                and stale sessions are collected when the executor is created.
+            session_id (Optional, str): The session of the managed workspace. A new one if None.
+            profiling (bool): Whether to run Python code blocks under cProfile and tracemalloc. The summaries
+                are returned in `profiles` and the raw profiles in `output_files`.
+            profile_top_n (int): The number of hotspots in each profile summary.
+            flight_recorder (bool): Whether to sample the stack of Python code blocks while they run. When a block
+                times out, the stacks where the time went are returned in `stack_summary` and the output.
+            track_files (bool): Whether to report the files that the code created or modified in `output_files`.
+                Uses inotify where available, otherwise an index of file sizes and modification times.
+            runtimes (Optional, RuntimeRegistry): The runtimes of the languages other than Python and shell, such as
+                C, C++, Go and JavaScript. `DEFAULT_RUNTIMES` if None, a language is only available if its toolchain
+                is installed.
+            build_cache (Optional, BuildCache): The cache of compiled binaries, shared between executors to skip
+                compiling unchanged programs. A cache under the temp directory if None.
+            history (Optional, ExecutionHistory): Records the run time of every code block and sets the timeout
+                of blocks with enough history from the observed percentiles, never above `timeout`.
+            admission (Optional, AdmissionController): Wait for an admission before running each batch of code
+                blocks, so executors sharing the controller respect its concurrency caps and host load signals.
+                `AdmissionRejected` is raised when the execution is not admitted.
+            tenant (str): The tenant of the executions, for the per-tenant caps of `admission`.
+            cpu_pool (Optional, CpuSlotPool): Hold a CPU slot of the pool while running each batch of code blocks
+                and run the code on the CPUs of the slot only.
+        """
         if timeout < 1:
             raise ValueError("Timeout must be greater than or equal to 1.")
+        self._workspace = None
+        if workspace_manager is not None:
+            workspace_manager.gc()
+            self._workspace = workspace_manager.create(session_id)
+            work_dir = self._workspace.path
         if isinstance(work_dir, str):
             work_dir = Path(work_dir)
         if not work_dir.exists():
             raise ValueError(f"Working directory {work_dir} does not exist.")
-        
+
         self._timeout = timeout
         self._work_dir: Path = work_dir
         self._system_message_update = system_message_update
+        self._workspace_manager = workspace_manager
+        self._profiler = CodeProfiler(profile_top_n) if profiling else None
+        self._flight_recorder = FlightRecorder() if flight_recorder else None
+        self._file_tracker = create_file_tracker(work_dir) if track_files else None
+        self._runtimes = runtimes or DEFAULT_RUNTIMES
+        self._build_cache = build_cache
+        self._history = history
+        self._admission = admission
+        self._tenant = tenant
+        self._cpu_pool = cpu_pool
 
     class UserCapability:
         def __init__(self, system_message_update: str) -> None:
@@ -77,6 +177,11 @@ If you want the user to save the code in a file before executing it, put # filen
         """(Experimental) The working directory for the code execution."""
         return self._work_dir
 
+    @property
+    def workspace(self) -> Optional[Workspace]:
+        """(Experimental) The managed workspace of the executor, if any."""
+        return self._workspace
+
     @property
     def code_extractor(self) -> CodeExtractor:
         """(Experimental) Export a code extractor that can be used by an agent."""
@@ -85,54 +190,141 @@ If you want the user to save the code in a file before executing it, put # filen
 
     @staticmethod
     def sanitize_command(lang: str, code: str) -> None:
-        dangerous_patterns = [
-            (r"\brm\s+-rf\b", "Use of 'rm -rf' command is not allowed."),
-            (r"\bmv\b.*?\s+/dev/null", "Moving files to /dev/null is not allowed."),
-            (r"\bdd\b", "Use of 'dd' command is not allowed."),
-            (r">\s*/dev/sd[a-z][1-9]?", "Overwriting disk blocks directly is not allowed."),
-            (r":\(\)\{\s*:\|\:&\s*\};:", "Fork bombs are not allowed."),
-        ]
-
-        if lang in ["bash", "shell", "sh"]:
-            for pattern, message in dangerous_patterns:
-                if re.search(pattern, code):
-                    raise ValueError(f"Potentially dangerous command detected: {message}")
-                
+        """(Experimental) Raise a ValueError if the code block contains a potentially dangerous command.
+
+        Shell scripts are matched against a precompiled policy and Python code is checked on its AST,
+        see `CommandSanitizer`.
+        """
+        DEFAULT_SANITIZER.sanitize(lang, code)
 
     def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        with ExitStack() as stack:
+            if self._admission is not None:
+                stack.enter_context(self._admission.admit(self._tenant))
+            cpus = None
+            if self._cpu_pool is not None:
+                cpus = stack.enter_context(self._cpu_pool.slot()).cpus
+            return self._execute_code_blocks(code_blocks, cpus)
+
+    def _execute_code_blocks(self, code_blocks: List[CodeBlock], cpus: Optional[List[int]]) -> CommandLineCodeResult:
         logs_all = ""
+        stdout = stderr = ""
+        error: Optional[CodeError] = None
+        profiles: List[ProfileSummary] = []
+        stack_summary = None
+        timings: List[BlockTiming] = []
+        # executor 自己写入的文件不算作生成的文件
+        written: List[Path] = []
+        if self._file_tracker is not None:
+            self._file_tracker.mark()
         for code_block in code_blocks:
             lang, code = code_block.language, code_block.code
 
             LocalCommandLineCodeExecutor.sanitize_command(lang, code)
+            timeout = self._timeout if self._history is None else self._history.timeout_for(lang, code, self._timeout)
+            timing = error = None
             filename_uuid = uuid.uuid4().hex
             filename = None
             if lang in ["bash", "shell", "sh", "pwsh", "powershell", "ps1"]:
                 filename = f"{filename_uuid}.{lang}"
-                exitcode, logs, _ = execute_code(
-                    code=code,
-                    lang=lang,
-                    timeout=self._timeout,
-                    work_dir=str(self._work_dir),
-                    filename=filename,
-                    use_docker=False,
-                )
+                exec_lang = lang
             elif lang in ["python", "Python"]:
                 filename = f"{filename_uuid}.py"
-                exitcode, logs, _ = execute_code(
-                    code=code,
-                    lang="python",
-                    timeout=self._timeout,
+                exec_lang = "python"
+            if filename is not None:
+                if self._workspace is not None:
+                    # 登记生成的脚本文件，执行结束后删除
+                    self._workspace.script_path(filename)
+                run_code_text, run_filename = code, filename
+                if self._profiler is not None and exec_lang == "python":
+                    (self._work_dir / filename).write_text(code, encoding="utf-8")
+                    run_filename, run_code_text = self._profiler.wrap(filename)
+                recorded = None
+                if self._flight_recorder is not None and exec_lang == "python":
+                    # 采样器包在 profiling 外面，也能和 profiling 一起使用
+                    (self._work_dir / run_filename).write_text(run_code_text, encoding="utf-8")
+                    recorded = run_filename
+                    run_filename, run_code_text = self._flight_recorder.wrap(recorded)
+                written += [self._work_dir / name for name in {filename, run_filename, recorded} if name]
+                start = time.perf_counter()
+                status = run_code(
+                    code=run_code_text,
+                    lang=exec_lang,
+                    timeout=timeout,
                     work_dir=str(self._work_dir),
-                    filename=filename,
+                    filename=run_filename,
                     use_docker=False,
+                    cpus=cpus,
+                )
+                exitcode, logs, error = status.exit_code, status.output, status.error
+                stdout += status.stdout
+                stderr += status.stderr
+                timing = BlockTiming(language=exec_lang, run_seconds=time.perf_counter() - start)
+                if recorded is not None:
+                    summary = self._flight_recorder.collect(self._work_dir, recorded)
+                    if logs == TIMEOUT_MSG and summary is not None:
+                        stack_summary = summary
+                        logs += "\n" + summary.format()
+                if self._profiler is not None and exec_lang == "python":
+                    profile = self._profiler.collect(self._work_dir, filename)
+                    if profile is not None:
+                        profiles.append(profile)
+            elif self._runtimes.get(lang) is not None:
+                if self._build_cache is None:
+                    self._build_cache = BuildCache()
+                exitcode, logs, timing = self._runtimes.execute(
+                    lang, code, self._work_dir, timeout, self._build_cache, cpus
                 )
             else:
                 # In case the language is not supported, we return an error message.
                 exitcode, logs, _ = (1, f"unknown language {lang}", None)
+            if timing is not None:
+                timings.append(timing)
+                if self._history is not None:
+                    seconds = timing.compile_seconds + timing.run_seconds
+                    self._history.record(lang, code, seconds, timed_out=logs.startswith(TIMEOUT_MSG))
             logs_all += "\n" + logs
+            if exitcode == 0 and self._workspace is not None:
+                try:
+                    self._workspace.check_quota()
+                except WorkspaceQuotaError as e:
+                    exitcode = 1
+                    logs_all += "\n" + str(e)
             if exitcode != 0:
                 break
 
         code_filename = str(self._work_dir / filename) if filename is not None else None
-        return CommandLineCodeResult(exit_code=exitcode, output=logs_all, code_file=code_filename)
\ No newline at end of file
+        output_files = [profile.profile_file for profile in profiles if profile.profile_file]
+        if self._file_tracker is not None:
+            if self._workspace is not None:
+                written.append(self._workspace.marker)
+            generated = self._file_tracker.changes(exclude=written)
+            output_files = generated + [path for path in output_files if path not in generated]
+        if self._workspace is not None:
+            self._workspace_manager.cleanup_scripts(self._workspace)
+            self._workspace.touch()
+            code_filename = None
+        return CommandLineCodeResult(
+            exit_code=exitcode,
+            output=logs_all,
+            code_file=code_filename,
+            output_files=output_files,
+            profiles=profiles,
+            stack_summary=stack_summary,
+            timings=timings,
+            stdout=stdout,
+            stderr=stderr,
+            error=error,
+        )
+
+    def stop(self) -> None:
+        """(Experimental) Release the resources of the executor, such as the inotify watches of the file tracker."""
+        if self._file_tracker is not None:
+            self._file_tracker.close()
+            self._file_tracker = None
+
+    def __enter__(self) -> "LocalCommandLineCodeExecutor":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
@@ -1,11 +1,11 @@
 import re
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from ..code_utils import CODE_BLOCK_PATTERN, UNKNOWN, content_str, infer_lang
+from ..code_utils import CODE_BLOCK_PATTERN, UNKNOWN, ContentSpan, MessageContentView, content_str, infer_lang
 from .base import CodeBlock
 
 
-__all__ = ("MarkdownCodeExtractor",)
+__all__ = ("MarkdownCodeExtractor", "StreamingCodeBlockParser")
 
 
 class MarkdownCodeExtractor:
@@ -26,11 +26,72 @@ class MarkdownCodeExtractor:
         match = re.findall(CODE_BLOCK_PATTERN, text, flags=re.DOTALL)
         if not match:
             return []
+        return [_to_code_block(lang, code) for lang, code in match]
+
+    def locate_code_blocks(
+        self, message: Union[str, List[Dict[str, Any]], None]
+    ) -> List[Tuple[CodeBlock, List[ContentSpan]]]:
+        """(Experimental) Extract code blocks from a message with the parts of the message their code comes from.
+
+        Args:
+            message (str or list): The message to extract code blocks from.
+
+        Returns:
+            List[Tuple[CodeBlock, List[ContentSpan]]]: Each code block and the spans of its code within the content
+                parts it comes from. A string message is a single part with index 0.
+        """
+        text = content_str(message)
+        located = []
+        for match in re.finditer(CODE_BLOCK_PATTERN, text, flags=re.DOTALL):
+            start, end = match.span(2)
+            if isinstance(text, MessageContentView):
+                spans = text.locate(start, end)
+            else:
+                spans = [ContentSpan(start, end, 0)] if start < end else []
+            located.append((_to_code_block(match.group(1) or "", match.group(2)), spans))
+        return located
+
+
+def _to_code_block(lang: str, code: str) -> CodeBlock:
+    if lang == "":
+        lang = infer_lang(code)
+    if lang == UNKNOWN:
+        lang = ""
+    return CodeBlock(code=code, language=lang)
+
+
+class StreamingCodeBlockParser:
+    """(Experimental) Extract code blocks from a streamed message as soon as each block is closed.
+
+    Feeding all the chunks of a message yields the same code blocks as `MarkdownCodeExtractor` on the whole
+    message: a block is final once its closing fence arrives, whatever text follows.
+    """
+
+    def __init__(self):
+        self._pattern = re.compile(CODE_BLOCK_PATTERN, flags=re.DOTALL)
+        self._chunks: List[str] = []
+        self._text = ""
+        self._pos = 0
+
+    @property
+    def text(self) -> str:
+        """The text fed so far."""
+        if self._chunks:
+            self._text += "".join(self._chunks)
+            self._chunks = []
+        return self._text
+
+    def feed(self, chunk: str) -> List[CodeBlock]:
+        """(Experimental) Add a chunk of the message and return the code blocks it closed."""
+        self._chunks.append(chunk)
+        # 只有出现反引号时才可能闭合代码块，其余的片段只暂存
+        if "`" not in chunk:
+            return []
+        text = self.text
         code_blocks = []
-        for lang, code in match:
-            if lang == "":
-                lang = infer_lang(code)
-            if lang == UNKNOWN:
-                lang = ""
-            code_blocks.append(CodeBlock(code=code, language=lang))
-        return code_blocks
\ No newline at end of file
+        match = self._pattern.search(text, self._pos)
+        while match is not None:
+            code_blocks.append(_to_code_block(match.group(1) or "", match.group(2)))
+            self._pos = match.end()
+            match = self._pattern.search(text, self._pos)
+        return code_blocks
@@ -0,0 +1,131 @@
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+__all__ = ("CodeProfiler", "ProfileHotspot", "ProfileSummary")
+
+# 包装脚本在执行环境中运行（本地或容器内），只能依赖标准库
+_RUNNER_TEMPLATE = '''\
+import cProfile, json, os, pstats, runpy, sys, time, tracemalloc
+_target, _raw, _summary, _top_n = {target!r}, {raw!r}, {summary!r}, {top_n!r}
+sys.argv = [_target]
+sys.path.insert(0, os.path.dirname(os.path.abspath(_target)))
+_profiler = cProfile.Profile()
+_status = 0
+tracemalloc.start()
+_start = time.perf_counter()
+_profiler.enable()
+try:
+    runpy.run_path(_target, run_name="__main__")
+except SystemExit as e:
+    _status = e.code
+except BaseException:
+    _profiler.disable()
+    # 由外层的 ErrorChannel 报告异常
+    raise
+finally:
+    _profiler.disable()
+    _wall = time.perf_counter() - _start
+    _, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _profiler.dump_stats(_raw)
+    _rows = []
+    for (_file, _line, _func), (_cc, _nc, _tt, _ct, _) in pstats.Stats(_profiler).stats.items():
+        if _file == __file__ or _file.endswith(("runpy.py", ".error_runner.py")) or "_lsprof" in _func:
+            continue
+        _rows.append({{"function": _func, "file": _file, "line": _line, "calls": _nc,
+                      "total_time": _tt, "cumulative_time": _ct}})
+    _rows.sort(key=lambda r: r["total_time"], reverse=True)
+    with open(_summary, "w") as _f:
+        json.dump({{"hotspots": _rows[:_top_n], "peak_memory_bytes": _peak, "wall_time": _wall}}, _f)
+sys.exit(_status)
+'''
+
+
+class ProfileHotspot(BaseModel):
+    """(Experimental) 性能分析中耗时最多的函数之一"""
+
+    function: str = Field(description="The name of the function.")
+    file: str = Field(description="The file that defines the function.")
+    line: int = Field(description="The line of the function definition.")
+    calls: int = Field(description="The number of calls.")
+    total_time: float = Field(description="The time spent in the function itself, in seconds.")
+    cumulative_time: float = Field(description="The time spent in the function and its callees, in seconds.")
+
+
+class ProfileSummary(BaseModel):
+    """(Experimental) 一个代码块的性能分析结果"""
+
+    hotspots: List[ProfileHotspot] = Field(default_factory=list, description="The top functions by own time.")
+    peak_memory_bytes: int = Field(description="The peak memory allocated by Python, from tracemalloc.")
+    wall_time: float = Field(description="The wall-clock time of the code block under the profiler, in seconds.")
+    profile_file: Optional[str] = Field(default=None, description="The raw cProfile output, readable with pstats.")
+
+    def format(self) -> str:
+        """(Experimental) A compact text summary that can be given to a model to ask for optimizations."""
+        lines = [f"wall time {self.wall_time:.3f}s, peak memory {self.peak_memory_bytes / 1024 / 1024:.1f} MiB"]
+        for hotspot in self.hotspots:
+            lines.append(
+                f"{hotspot.total_time:8.3f}s own {hotspot.cumulative_time:8.3f}s cumulative {hotspot.calls:>8} calls  "
+                f"{hotspot.function} ({Path(hotspot.file).name}:{hotspot.line})"
+            )
+        return "\n".join(lines)
+
+
+class CodeProfiler:
+    """(Experimental) Wrap Python code blocks with cProfile and tracemalloc.
+
+    `wrap` returns a runner script that executes the code block file with `runpy` under the profiler and
+    writes the raw profile and a JSON summary next to it. The runner only uses the standard library and
+    relative paths, so the same script works for local subprocesses and inside a container. Executors only
+    call the profiler when profiling is enabled, so there is no cost otherwise.
+
+    Args:
+        top_n (int): The number of hotspots in the summary.
+    """
+
+    def __init__(self, top_n: int = 10):
+        self.top_n = top_n
+
+    @staticmethod
+    def _names(filename: str) -> Tuple[str, str, str]:
+        stem = Path(filename).stem
+        return f"{stem}.profile_runner.py", f"{stem}.prof", f"{stem}.profile.json"
+
+    def wrap(self, filename: str) -> Tuple[str, str]:
+        """(Experimental) The file name and the source of the runner of a code block file.
+
+        Args:
+            filename (str): The code block file, relative to the working directory.
+        """
+        runner, raw, summary = self._names(filename)
+        parent = Path(filename).parent
+        source = _RUNNER_TEMPLATE.format(
+            target=filename,
+            raw=(parent / raw).as_posix(),
+            summary=(parent / summary).as_posix(),
+            top_n=self.top_n,
+        )
+        return (parent / runner).as_posix(), source
+
+    def collect(self, work_dir: Path, filename: str) -> Optional[ProfileSummary]:
+        """(Experimental) Read the summary written by the runner and remove the runner and the summary.
+
+        Returns:
+            Optional[ProfileSummary]: The summary, or None if the runner was killed before writing it.
+        """
+        runner, raw, summary = (work_dir / Path(filename).parent / name for name in self._names(filename))
+        try:
+            data = json.loads(summary.read_text())
+        except (OSError, ValueError):
+            data = None
+        for path in (runner, summary):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        if data is None:
+            return None
+        return ProfileSummary(**data, profile_file=str(raw.resolve()) if raw.exists() else None)
@@ -0,0 +1,166 @@
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+__all__ = ("ContainerStatsSampler", "ResourceLimits", "ResourceUsage", "OOM_MSG")
+
+logger = logging.getLogger(__name__)
+
+OOM_MSG = "Killed: the code ran out of memory"
+
+CPU_PERIOD = 100_000
+
+_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+
+
+def parse_memory(memory: Union[int, str]) -> int:
+    """The bytes of a memory size in the docker format, such as 512m or 2g."""
+    if isinstance(memory, int):
+        return memory
+    match = re.fullmatch(r"\s*(\d+)\s*([bkmg]?)b?\s*", memory.lower())
+    if match is None:
+        raise ValueError(f"Invalid memory size {memory}.")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+class ResourceLimits(BaseModel):
+    """(Experimental) 容器的 cgroup 资源限制"""
+
+    cpus: Optional[float] = Field(default=None, description="The CPU time, in CPUs, e.g. 0.5 for half a CPU.")
+    memory: Optional[Union[int, str]] = Field(
+        default=None, description="The memory, in bytes or in the docker format such as 512m. Swap is disabled."
+    )
+    pids: Optional[int] = Field(default=None, description="The maximum number of processes and threads.")
+
+    @property
+    def memory_bytes(self) -> Optional[int]:
+        return None if self.memory is None else parse_memory(self.memory)
+
+    def merge(self, block: Optional["ResourceLimits"]) -> "ResourceLimits":
+        """(Experimental) The limits of a code block under these limits: a block can only tighten them."""
+        if block is None:
+            return self
+
+        def tighter(mine: Any, theirs: Any) -> Any:
+            return mine if theirs is None else theirs if mine is None else min(mine, theirs)
+
+        memory = tighter(self.memory_bytes, block.memory_bytes)
+        return ResourceLimits(cpus=tighter(self.cpus, block.cpus), memory=memory, pids=tighter(self.pids, block.pids))
+
+    def update_kwargs(self, total_memory: Optional[int] = None) -> Dict[str, Any]:
+        """(Experimental) The keyword arguments of `Container.update` that apply the CPU and memory limits.
+
+        Args:
+            total_memory (Optional, int): The memory of the daemon, set as the limit to lift a memory limit.
+        """
+        kwargs: Dict[str, Any] = {"cpu_period": CPU_PERIOD, "cpu_quota": -1}
+        if self.cpus is not None:
+            kwargs["cpu_quota"] = max(1000, int(self.cpus * CPU_PERIOD))
+        memory = self.memory_bytes if self.memory is not None else total_memory
+        if memory is not None:
+            # memswap 和 memory 相同即禁用 swap，否则超出限制的进程只会变慢而不会被 OOM kill
+            kwargs["mem_limit"] = memory
+            kwargs["memswap_limit"] = memory if self.memory is not None else -1
+        return kwargs
+
+    def create_kwargs(self) -> Dict[str, Any]:
+        """(Experimental) The keyword arguments of `containers.create` and `containers.run` for the limits."""
+        kwargs = self.update_kwargs()
+        if self.cpus is None:
+            del kwargs["cpu_period"], kwargs["cpu_quota"]
+        if self.pids is not None:
+            kwargs["pids_limit"] = self.pids
+        return kwargs
+
+
+class ResourceUsage(BaseModel):
+    """(Experimental) 一次执行使用的容器资源，来自采样的容器统计"""
+
+    cpu_seconds: float = Field(default=0.0, description="The CPU time used, in seconds.")
+    peak_memory_bytes: int = Field(default=0, description="The highest memory usage sampled.")
+    io_read_bytes: int = Field(default=0, description="The bytes read from block devices.")
+    io_write_bytes: int = Field(default=0, description="The bytes written to block devices.")
+    samples: int = Field(default=0, description="The number of container stats sampled.")
+    oom_killed: bool = Field(default=False, description="Whether the code was killed for exceeding its memory limit.")
+
+
+def _io_bytes(stats: Dict[str, Any]) -> Dict[str, int]:
+    totals = {"read": 0, "write": 0}
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        op = str(entry.get("op", "")).lower()
+        if op in totals:
+            totals[op] += int(entry.get("value", 0))
+    return totals
+
+
+class ContainerStatsSampler:
+    """(Experimental) Sample the stats of a container in the background while code runs in it.
+
+    The CPU time and the I/O bytes are cumulative counters of the container, so the usage of an execution is
+    the difference between the last and the first sample, or the last sample for a container started for the
+    execution (`fresh`). The peak memory is the highest usage sampled, so a spike shorter than `interval` can
+    be missed. A sample is taken when the sampler starts and when it stops, and every `interval` seconds in
+    between.
+
+    Args:
+        container (docker.models.containers.Container): The container.
+        interval (float): The seconds between two samples.
+        fresh (bool): Whether the container was started for this execution, so its counters start at zero.
+    """
+
+    def __init__(self, container: Any, interval: float = 0.5, fresh: bool = False):
+        self._container = container
+        self._interval = interval
+        self._fresh = fresh
+        self._samples: List[Dict[str, Any]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _sample(self) -> None:
+        try:
+            stats = self._container.stats(stream=False, one_shot=True)
+        except Exception as e:
+            logger.debug(f"Could not sample the stats of the container: {e}")
+            return
+        # 已经退出的容器返回空的统计
+        if not (stats.get("cpu_stats") or {}).get("cpu_usage"):
+            return
+        with self._lock:
+            self._samples.append(stats)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self._interval):
+            self._sample()
+
+    def __enter__(self) -> "ContainerStatsSampler":
+        self._sample()
+        self._thread = threading.Thread(target=self._loop, name="container-stats", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def usage(self) -> ResourceUsage:
+        """(Experimental) The resources used between the first and the last sample."""
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return ResourceUsage()
+        cpu = [int(s["cpu_stats"]["cpu_usage"].get("total_usage", 0)) for s in samples]
+        io = [_io_bytes(s) for s in samples]
+        memory = [int((s.get("memory_stats") or {}).get("usage", 0)) for s in samples]
+        first_cpu, first_io = (0, {"read": 0, "write": 0}) if self._fresh else (cpu[0], io[0])
+        return ResourceUsage(
+            cpu_seconds=max(0, max(cpu) - first_cpu) / 1e9,
+            peak_memory_bytes=max(memory),
+            io_read_bytes=max(0, max(i["read"] for i in io) - first_io["read"]),
+            io_write_bytes=max(0, max(i["write"] for i in io) - first_io["write"]),
+            samples=len(samples),
+        )
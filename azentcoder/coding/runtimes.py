@@ -0,0 +1,277 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+from ..code_utils import TIMEOUT_MSG, _terminate
+from .cpu_affinity import pin_on_exec, set_affinity
+
+__all__ = (
+    "BlockTiming",
+    "BuildCache",
+    "CompiledRuntime",
+    "DEFAULT_RUNTIMES",
+    "InterpretedRuntime",
+    "Runtime",
+    "RuntimeRegistry",
+)
+
+
+class BlockTiming(BaseModel):
+    """(Experimental) 一个代码块的编译和运行耗时"""
+
+    language: str = Field(description="The language of the code block.")
+    compile_seconds: float = Field(default=0.0, description="The time spent compiling, 0 for interpreted code.")
+    run_seconds: float = Field(default=0.0, description="The time spent running the code.")
+    cache_hit: bool = Field(default=False, description="Whether the build was served from the build cache.")
+
+
+class Runtime:
+    """(Experimental) A language that code blocks can be written in.
+
+    Args:
+        name (str): The name of the runtime.
+        aliases (List[str]): The code block languages handled by the runtime.
+        extension (str): The extension of the source file.
+        candidates (List[str]): The executables that can run or compile the code, the first one found is used.
+    """
+
+    compiled = False
+
+    def __init__(self, name: str, aliases: List[str], extension: str, candidates: List[str]):
+        self.name = name
+        self.aliases = aliases
+        self.extension = extension
+        self.candidates = candidates
+
+    @property
+    def executable(self) -> Optional[str]:
+        """The path of the first installed candidate, or None."""
+        for candidate in self.candidates:
+            path = shutil.which(candidate)
+            if path is not None:
+                return path
+        return None
+
+    def available(self) -> bool:
+        return self.executable is not None
+
+    def run_command(self, path: str) -> List[str]:
+        """The command that runs the source file, or the binary of a compiled runtime."""
+        raise NotImplementedError
+
+
+class InterpretedRuntime(Runtime):
+    """(Experimental) A runtime that runs the source file with an interpreter, such as node."""
+
+    def run_command(self, path: str) -> List[str]:
+        return [self.executable, path]
+
+
+class CompiledRuntime(Runtime):
+    """(Experimental) A runtime that compiles the source file into a binary and runs the binary.
+
+    Args:
+        build_args (List[str]): The arguments of the compiler, `{source}` and `{output}` are replaced with the
+            paths of the source file and the binary.
+    """
+
+    compiled = True
+
+    def __init__(self, name: str, aliases: List[str], extension: str, candidates: List[str], build_args: List[str]):
+        super().__init__(name, aliases, extension, candidates)
+        self.build_args = build_args
+
+    def build_command(self, source: str, output: str) -> List[str]:
+        return [self.executable] + [arg.format(source=source, output=output) for arg in self.build_args]
+
+    def run_command(self, path: str) -> List[str]:
+        return [path]
+
+
+class BuildCache:
+    """(Experimental) A cache of compiled binaries keyed by the hash of the source, the compiler and its flags.
+
+    Re-running an unchanged program skips the compilation. The compiler is identified by its path, size and
+    modification time, so upgrading the toolchain invalidates the cache. Builds go to a temporary directory
+    and are moved into place, so concurrent builds of the same source are safe.
+
+    Args:
+        cache_dir (Optional, Path or str): The directory of the binaries. A directory under the temp directory
+            if None.
+    """
+
+    def __init__(self, cache_dir: Optional[Union[Path, str]] = None):
+        self.cache_dir = Path(cache_dir or Path(tempfile.gettempdir()) / "azentcoder-build-cache")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, runtime: CompiledRuntime, source: str) -> str:
+        executable = runtime.executable
+        stat = os.stat(executable)
+        toolchain = f"{executable}\0{stat.st_size}\0{stat.st_mtime_ns}\0{' '.join(runtime.build_args)}"
+        return hashlib.sha256(f"{runtime.name}\0{toolchain}\0{source}".encode()).hexdigest()
+
+    def build(
+        self, runtime: CompiledRuntime, source: str, timeout: float, cpus: Optional[List[int]] = None
+    ) -> Tuple[int, str, Optional[Path], bool]:
+        """(Experimental) Return the binary of the source, compiling it if it is not cached.
+
+        Args:
+            cpus (Optional, list): Compile on these CPUs only.
+
+        Returns:
+            Tuple[int, str, Optional[Path], bool]: The exit code and output of the compiler, the binary (None
+                if the compilation failed) and whether it was a cache hit.
+        """
+        key = self.key(runtime, source)
+        binary = self.cache_dir / key / "main"
+        if binary.exists():
+            with self._lock:
+                self.hits += 1
+            return 0, "", binary, True
+        with self._lock:
+            self.misses += 1
+
+        build_dir = Path(tempfile.mkdtemp(prefix=f"{key[:12]}-", dir=self.cache_dir))
+        try:
+            source_path = build_dir / f"main.{runtime.extension}"
+            source_path.write_text(source, encoding="utf-8")
+            output_path = build_dir / "main"
+            env = {**os.environ, "GOCACHE": str(self.cache_dir / "go-build")} if runtime.name == "go" else None
+            preexec_fn = pin_on_exec(cpus)
+            proc = subprocess.Popen(
+                runtime.build_command(str(source_path), str(output_path)),
+                cwd=build_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                env=env,
+                preexec_fn=preexec_fn,
+            )
+            if cpus is not None and preexec_fn is None:
+                set_affinity(proc.pid, cpus)
+            try:
+                output, _ = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _terminate(proc)
+                return 1, TIMEOUT_MSG, None, False
+            if proc.returncode != 0 or not output_path.exists():
+                return proc.returncode or 1, output.replace(str(build_dir) + os.sep, ""), None, False
+            try:
+                # 另一个线程可能已经完成了同样的构建
+                build_dir.rename(self.cache_dir / key)
+            except OSError:
+                pass
+            return 0, output, binary, False
+        finally:
+            if build_dir.exists():
+                shutil.rmtree(build_dir, ignore_errors=True)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+class RuntimeRegistry:
+    """(Experimental) The runtimes that code blocks can use, looked up by language."""
+
+    def __init__(self, runtimes: Optional[List[Runtime]] = None):
+        self._runtimes: Dict[str, Runtime] = {}
+        for runtime in runtimes or []:
+            self.register(runtime)
+
+    def register(self, runtime: Runtime) -> None:
+        """(Experimental) Register a runtime for its aliases, replacing the runtimes registered before."""
+        for alias in runtime.aliases:
+            self._runtimes[alias.lower()] = runtime
+
+    def get(self, lang: str) -> Optional[Runtime]:
+        """(Experimental) The runtime of a language if it is registered and its toolchain is installed."""
+        runtime = self._runtimes.get(lang.lower())
+        if runtime is None or not runtime.available():
+            return None
+        return runtime
+
+    def languages(self) -> List[str]:
+        """(Experimental) The languages whose toolchain is installed."""
+        return sorted(alias for alias, runtime in self._runtimes.items() if runtime.available())
+
+    def execute(
+        self,
+        lang: str,
+        code: str,
+        work_dir: Union[Path, str],
+        timeout: float,
+        build_cache: BuildCache,
+        cpus: Optional[List[int]] = None,
+    ) -> Tuple[int, str, BlockTiming]:
+        """(Experimental) Compile if needed and run a code block in the working directory.
+
+        Args:
+            cpus (Optional, list): Compile and run on these CPUs only.
+
+        Raises:
+            ValueError: If no installed runtime handles the language.
+        """
+        runtime = self.get(lang)
+        if runtime is None:
+            raise ValueError(f"No installed runtime for {lang}.")
+        timing = BlockTiming(language=runtime.name)
+        script = None
+        if isinstance(runtime, CompiledRuntime):
+            start = time.perf_counter()
+            exit_code, output, binary, timing.cache_hit = build_cache.build(runtime, code, timeout, cpus)
+            timing.compile_seconds = time.perf_counter() - start
+            if binary is None:
+                return exit_code, output, timing
+            command = runtime.run_command(str(binary))
+            timeout -= timing.compile_seconds
+        else:
+            script = Path(work_dir) / f"tmp_code_{hashlib.md5(code.encode()).hexdigest()}.{runtime.extension}"
+            script.write_text(code, encoding="utf-8")
+            command = runtime.run_command(script.name)
+
+        start = time.perf_counter()
+        preexec_fn = pin_on_exec(cpus)
+        proc = subprocess.Popen(
+            command, cwd=work_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, preexec_fn=preexec_fn
+        )
+        if cpus is not None and preexec_fn is None:
+            set_affinity(proc.pid, cpus)
+        try:
+            stdout, stderr = proc.communicate(timeout=max(timeout, 0.001))
+        except subprocess.TimeoutExpired:
+            _terminate(proc)
+            exit_code, output = 1, TIMEOUT_MSG
+        else:
+            exit_code, output = proc.returncode, stdout if proc.returncode == 0 else stdout + stderr
+        timing.run_seconds = time.perf_counter() - start
+        if script is not None:
+            script.unlink()
+        return exit_code, output, timing
+
+
+DEFAULT_RUNTIMES = RuntimeRegistry(
+    [
+        CompiledRuntime("c", ["c"], "c", ["cc", "gcc", "clang"], ["-O2", "-o", "{output}", "{source}", "-lm"]),
+        CompiledRuntime(
+            "c++",
+            ["c++", "cpp", "cxx"],
+            "cpp",
+            ["c++", "g++", "clang++"],
+            ["-O2", "-std=c++17", "-o", "{output}", "{source}"],
+        ),
+        CompiledRuntime("go", ["go", "golang"], "go", ["go"], ["build", "-o", "{output}", "{source}"]),
+        InterpretedRuntime("node", ["javascript", "js", "node"], "js", ["node", "nodejs"]),
+    ]
+)
@@ -0,0 +1,238 @@
+import ast
+import re
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..compile_cache import parse_ast
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+__all__ = ("CommandSanitizer",)
+
+SHELL_LANGUAGES = ("bash", "shell", "sh")
+
+# (名字, 正则, 提示信息)，名字用作合并后正则的分组名
+DANGEROUS_SHELL_PATTERNS: List[Tuple[str, str, str]] = [
+    ("rm_rf", r"\brm\s+-rf\b", "Use of 'rm -rf' command is not allowed."),
+    ("mv_dev_null", r"\bmv\b.*?\s+/dev/null", "Moving files to /dev/null is not allowed."),
+    ("dd", r"\bdd\b", "Use of 'dd' command is not allowed."),
+    ("disk_write", r">\s*/dev/sd[a-z][1-9]?", "Overwriting disk blocks directly is not allowed."),
+    ("fork_bomb", r":\(\)\{\s*:\|\:&\s*\};:", "Fork bombs are not allowed."),
+]
+
+# 删除这些目录会破坏用户环境
+PROTECTED_PATHS = {"/", "~", "/bin", "/boot", "/dev", "/etc", "/home", "/lib", "/root", "/sbin", "/usr", "/var"}
+
+# 会把参数交给 shell 或者直接执行的函数
+SHELL_CALLS = {
+    "os.system",
+    "os.popen",
+    "subprocess.run",
+    "subprocess.call",
+    "subprocess.check_call",
+    "subprocess.check_output",
+    "subprocess.Popen",
+    "subprocess.getoutput",
+    "subprocess.getstatusoutput",
+}
+
+REMOVE_TREE_CALLS = {"shutil.rmtree", "os.removedirs", "os.rmdir"}
+
+
+def _first_chars(items) -> Optional[Set[str]]:
+    """The characters that every match of the parsed pattern starts with, or None if they cannot be proven.
+
+    Zero-width assertions such as `\\b` are skipped. An optional first atom, a negated or category charset and
+    anything else that is not a literal make the result None, so the prefilter is only used when it is sound.
+    """
+    for op, av in items:
+        if op is sre_parse.AT:
+            continue
+        if op is sre_parse.LITERAL:
+            return {chr(av)}
+        if op is sre_parse.IN:
+            chars: Set[str] = set()
+            for set_op, set_av in av:
+                if set_op is sre_parse.LITERAL:
+                    chars.add(chr(set_av))
+                elif set_op is sre_parse.RANGE and set_av[1] - set_av[0] < 128:
+                    chars.update(map(chr, range(set_av[0], set_av[1] + 1)))
+                else:
+                    return None
+            return chars
+        if op is sre_parse.BRANCH:
+            chars = set()
+            for branch in av[1]:
+                branch_chars = _first_chars(branch)
+                if branch_chars is None:
+                    return None
+                chars |= branch_chars
+            return chars
+        if op is sre_parse.SUBPATTERN:
+            # (?i:...) 会匹配大小写不同的首字符
+            return None if av[1] & re.IGNORECASE else _first_chars(av[-1])
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            return _first_chars(av[2])
+        return None
+    # 可以匹配空串
+    return None
+
+
+def _compile_shell_matcher(patterns: List[Tuple[str, str, str]]) -> "re.Pattern[str]":
+    alternatives = "|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in patterns)
+    first_chars = _first_chars(sre_parse.parse(alternatives))
+    if not first_chars:
+        return re.compile(alternatives)
+    # 以字符集开头的正则可以让 re 快速跳过不可能匹配的位置，而不是在每个位置尝试所有分支
+    charset = "".join(sorted(re.escape(c) for c in first_chars))
+    return re.compile(f"(?=[{charset}])(?:{alternatives})")
+
+
+class _PythonChecker(ast.NodeVisitor):
+    """Find dangerous calls in a Python module, following `import ... as ...` aliases."""
+
+    def __init__(self, shell_check):
+        self._shell_check = shell_check
+        self._aliases: Dict[str, str] = {}
+        self.message: Optional[str] = None
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            if alias.asname:
+                self._aliases[alias.asname] = alias.name
+            else:
+                name = alias.name.split(".")[0]
+                self._aliases[name] = name
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        for alias in node.names:
+            self._aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+
+    def _qualified_name(self, node: ast.AST) -> Optional[str]:
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        parts.append(self._aliases.get(node.id, node.id))
+        return ".".join(reversed(parts))
+
+    @staticmethod
+    def _literal(node: ast.AST) -> Optional[str]:
+        """The value of a string literal, a list of string literals or an f-string's literal parts."""
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node.value
+        if isinstance(node, (ast.List, ast.Tuple)):
+            parts = [_PythonChecker._literal(elt) for elt in node.elts]
+            return " ".join(part for part in parts if part is not None)
+        if isinstance(node, ast.JoinedStr):
+            return "".join(v.value for v in node.values if isinstance(v, ast.Constant) and isinstance(v.value, str))
+        return None
+
+    def _is_protected_path(self, node: ast.AST) -> bool:
+        value = self._literal(node)
+        if value is not None:
+            return (value.strip().rstrip("/") or "/") in PROTECTED_PATHS
+        if isinstance(node, ast.Call):
+            name = self._qualified_name(node.func)
+            if name in ("os.path.expanduser", "os.path.abspath", "os.path.realpath", "pathlib.Path", "Path"):
+                return bool(node.args) and self._is_protected_path(node.args[0])
+            if name in ("pathlib.Path.home", "Path.home"):
+                return True
+        return False
+
+    @staticmethod
+    def _first_argument(node: ast.Call, keywords: Tuple[str, ...]) -> Optional[ast.AST]:
+        """The first positional argument of a call, or the first of the keywords that is passed."""
+        if node.args:
+            return node.args[0]
+        return next((keyword.value for keyword in node.keywords if keyword.arg in keywords), None)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if self.message is not None:
+            return
+        name = self._qualified_name(node.func)
+        if name in REMOVE_TREE_CALLS:
+            path = self._first_argument(node, ("path",))
+            if path is not None and self._is_protected_path(path):
+                self.message = f"Use of '{name}' on a protected directory is not allowed."
+        elif name in SHELL_CALLS:
+            command = self._first_argument(node, ("args", "cmd", "command"))
+            payload = None if command is None else self._literal(command)
+            if payload is not None:
+                self.message = self._shell_check(payload)
+        if self.message is None:
+            self.generic_visit(node)
+
+
+class CommandSanitizer:
+    """(Experimental) 检查代码块中可能存在危害的命令
+
+    Shell scripts are checked with a single precompiled regex that combines every dangerous pattern. Python
+    code is parsed and checked for calls such as `shutil.rmtree('/')` or `os.system` and `subprocess` calls
+    whose literal payload is a dangerous shell command. Verdicts are cached by a hash of the language and
+    the code, so re-running the same block does not check it again.
+
+    Args:
+        patterns (Optional, list): The (name, regex, message) of the dangerous shell patterns.
+        cache_size (int): The number of verdicts kept in the cache.
+    """
+
+    def __init__(self, patterns: Optional[List[Tuple[str, str, str]]] = None, cache_size: int = 4096):
+        patterns = DANGEROUS_SHELL_PATTERNS if patterns is None else patterns
+        self._shell_matcher = _compile_shell_matcher(patterns)
+        self._messages = {name: message for name, _, message in patterns}
+        self._cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def check_shell(self, code: str) -> Optional[str]:
+        """Return the message of the first dangerous shell command in the code, or None."""
+        match = self._shell_matcher.search(code)
+        return None if match is None else self._messages[match.lastgroup]
+
+    def check_python(self, code: str) -> Optional[str]:
+        """Return the message of the first dangerous call in the Python code, or None."""
+        try:
+            tree = parse_ast(code)
+        except SyntaxError:
+            # 语法错误由执行时报告
+            return None
+        checker = _PythonChecker(self.check_shell)
+        checker.visit(tree)
+        return checker.message
+
+    def check(self, lang: str, code: str) -> Optional[str]:
+        """(Experimental) Return why the code is dangerous, or None if it is allowed."""
+        if lang in SHELL_LANGUAGES:
+            family = "sh"
+        elif lang.lower().startswith("python"):
+            family = "python"
+        else:
+            return None
+        key = sha256(f"{family}\0{code}".encode()).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        message = self.check_shell(code) if family == "sh" else self.check_python(code)
+        with self._lock:
+            self._cache[key] = message
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return message
+
+    def sanitize(self, lang: str, code: str) -> None:
+        """(Experimental) Raise a ValueError if the code contains a dangerous command."""
+        message = self.check(lang, code)
+        if message is not None:
+            raise ValueError(f"Potentially dangerous command detected: {message}")
+
+
+DEFAULT_SANITIZER = CommandSanitizer()
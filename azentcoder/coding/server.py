@@ -0,0 +1,504 @@
+import heapq
+import hmac
+import itertools
+import json
+import logging
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+from .base import CodeBlock, CodeExecutor, CodeResult
+from .history import ExecutionHistory
+
+__all__ = ("ExecutionServer", "Job", "JobQueue", "QueueFullError", "ServerStats", "default_socket_path")
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "[::1]")
+
+
+def default_socket_path() -> str:
+    """The Unix socket the server listens on by default, private to the current user."""
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(base, f"azentcoder-{os.getuid()}.sock")
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted to a full queue."""
+
+
+class Job:
+    """A batch of code blocks waiting in the queue of an `ExecutionServer`.
+
+    The progress of the job is published as events on `events`: `queued`, `started`, then either `result`
+    or `error`.
+    """
+
+    def __init__(self, code_blocks: List[CodeBlock], tenant: str = DEFAULT_TENANT, priority: int = 0):
+        self.job_id = uuid.uuid4().hex
+        self.code_blocks = code_blocks
+        self.tenant = tenant
+        self.priority = priority
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.predicted_seconds: Optional[float] = None
+        self.cancelled = False
+        self.events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+    def publish(self, event: str, **data: Any) -> None:
+        self.events.put({"event": event, "job_id": self.job_id, **data})
+
+
+class ServerStats(BaseModel):
+    """(Experimental) 执行服务的队列状态"""
+
+    queued: int = Field(description="The number of jobs waiting in the queue.")
+    running: int = Field(description="The number of jobs being executed.")
+    completed: int = Field(description="The number of jobs finished since the server started.")
+    rejected: int = Field(description="The number of jobs rejected because the queue was full.")
+    queued_by_tenant: Dict[str, int] = Field(default_factory=dict)
+    running_by_tenant: Dict[str, int] = Field(default_factory=dict)
+
+
+class JobQueue:
+    """(Experimental) A priority queue of jobs with per-tenant concurrency limits.
+
+    Jobs with a higher priority are dispatched first, jobs with the same priority in submission order. With
+    a `history`, jobs with the same priority are dispatched shortest predicted run time first instead, so quick
+    blocks do not wait behind long ones. A job is skipped while its tenant already runs as many jobs as its
+    limit allows, so one busy tenant cannot hold every worker.
+
+    Args:
+        tenant_limits (Optional, dict): The maximum number of running jobs of each tenant.
+        default_tenant_limit (Optional, int): The limit of the tenants not in `tenant_limits`. No limit if None.
+        max_queued (Optional, int): The maximum number of waiting jobs. No limit if None.
+        history (Optional, ExecutionHistory): Predicts the run time of the jobs for shortest-job-first ordering.
+        unknown_seconds (float): The predicted run time of a code block without history.
+    """
+
+    def __init__(
+        self,
+        tenant_limits: Optional[Dict[str, int]] = None,
+        default_tenant_limit: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        history: Optional[ExecutionHistory] = None,
+        unknown_seconds: float = 5.0,
+    ):
+        self._tenant_limits = dict(tenant_limits or {})
+        self._default_tenant_limit = default_tenant_limit
+        self._max_queued = max_queued
+        self._history = history
+        self._unknown_seconds = unknown_seconds
+        # (-优先级, 预计运行时间, 序号, job)
+        self._heap: List[Tuple[int, float, int, Job]] = []
+        self._counter = itertools.count()
+        self._running: Dict[str, int] = {}
+        self._completed = 0
+        self._rejected = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _limit(self, tenant: str) -> Optional[int]:
+        return self._tenant_limits.get(tenant, self._default_tenant_limit)
+
+    def _has_capacity(self, tenant: str) -> bool:
+        limit = self._limit(tenant)
+        return limit is None or self._running.get(tenant, 0) < limit
+
+    def put(self, job: Job) -> int:
+        """(Experimental) Queue a job and return the number of jobs ahead of it.
+
+        Raises:
+            QueueFullError: If the queue already holds `max_queued` jobs.
+        """
+        predicted = 0.0
+        if self._history is not None:
+            predicted = job.predicted_seconds = self._history.predict_blocks(job.code_blocks, self._unknown_seconds)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The queue is closed.")
+            if self._max_queued is not None and len(self._heap) >= self._max_queued:
+                self._rejected += 1
+                raise QueueFullError(f"The queue is full ({self._max_queued} jobs).")
+            key = (-job.priority, predicted, next(self._counter))
+            heapq.heappush(self._heap, (*key, job))
+            position = sum(1 for item in self._heap if item[:3] < key)
+            self._cond.notify_all()
+        return position
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Job]:
+        """(Experimental) Take the next job whose tenant has capacity, or None on timeout or close."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._pop_eligible()
+                if job is not None:
+                    self._running[job.tenant] = self._running.get(job.tenant, 0) + 1
+                    return job
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _pop_eligible(self) -> Optional[Job]:
+        skipped = []
+        found = None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            job = item[-1]
+            if job.cancelled:
+                continue
+            if self._has_capacity(job.tenant):
+                found = job
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return found
+
+    def done(self, job: Job) -> None:
+        """(Experimental) Mark a job returned by `get` as finished."""
+        with self._cond:
+            self._running[job.tenant] -= 1
+            if not self._running[job.tenant]:
+                del self._running[job.tenant]
+            self._completed += 1
+            self._cond.notify_all()
+
+    def cancel(self, job: Job) -> None:
+        """(Experimental) Drop a job that has not started yet."""
+        with self._cond:
+            job.cancelled = True
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> ServerStats:
+        with self._cond:
+            queued_by_tenant: Dict[str, int] = {}
+            for *_, job in self._heap:
+                if not job.cancelled:
+                    queued_by_tenant[job.tenant] = queued_by_tenant.get(job.tenant, 0) + 1
+            return ServerStats(
+                queued=sum(queued_by_tenant.values()),
+                running=sum(self._running.values()),
+                completed=self._completed,
+                rejected=self._rejected,
+                queued_by_tenant=queued_by_tenant,
+                running_by_tenant=dict(self._running),
+            )
+
+
+def _stop_executor(executor: CodeExecutor) -> None:
+    stop = getattr(executor, "stop", None)
+    if callable(stop):
+        try:
+            stop()
+        except Exception as e:
+            logger.warning(f"Could not stop the executor: {e}")
+
+
+def _result_to_dict(result: CodeResult) -> Dict[str, Any]:
+    return {"type": type(result).__name__, **result.model_dump()}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server: "_ThreadingHTTPServer"
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _forbidden_reason(self) -> Optional[str]:
+        # 浏览器发出的请求带有 Origin，DNS rebinding 的请求带有外部域名的 Host
+        if self.headers.get("Origin") is not None:
+            return "cross-origin requests are not allowed"
+        host = self.headers.get("Host", "localhost")
+        hostname = host.rsplit(":", 1)[0] if not host.endswith("]") else host
+        if hostname.lower() not in LOCAL_HOSTS:
+            return f"host {host} is not allowed"
+        token = self.server.execution_server.token
+        if token is not None:
+            scheme, _, credentials = self.headers.get("Authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.encode(), token.encode()):
+                return "missing or invalid token"
+        return None
+
+    def _authorize(self) -> bool:
+        reason = self._forbidden_reason()
+        if reason is not None:
+            self._send_json(403, {"error": reason})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        if not self._authorize():
+            return
+        if self.path == "/stats":
+            self._send_json(200, self.server.execution_server.stats().model_dump())
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        if not self._authorize():
+            return
+        if self.path != "/execute":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        # 只接受 JSON，text/plain 等无需 CORS 预检的跨域表单请求被拒绝
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._send_json(415, {"error": "the request body must be application/json"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            code_blocks = [CodeBlock(**block) for block in request["code_blocks"]]
+            tenant = str(request.get("tenant") or DEFAULT_TENANT)
+            job = Job(code_blocks, tenant=tenant, priority=int(request.get("priority", 0)))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"invalid request: {e}"})
+            return
+        try:
+            position = self.server.execution_server.submit(job)
+        except QueueFullError as e:
+            self._send_json(503, {"event": "rejected", "error": str(e)})
+            return
+
+        # 以换行分隔的 JSON 流式返回事件，连接在结果发送后关闭
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            self._write_event({"event": "queued", "job_id": job.job_id, "position": position})
+            while True:
+                event = job.events.get()
+                self._write_event(event)
+                if event["event"] in ("result", "error"):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端断开后，尚未开始的任务不再执行
+            self.server.execution_server.queue.cancel(job)
+
+    def _write_event(self, event: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    execution_server: "ExecutionServer"
+
+
+class _ThreadingUnixHTTPServer(_ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self) -> None:
+        # HTTPServer.server_bind 会把地址当作 (host, port)
+        # 在 bind 前收紧 umask，socket 文件从创建起就只有当前用户可以连接
+        umask = os.umask(0o177)
+        try:
+            self.socket.bind(self.server_address)
+        finally:
+            os.umask(umask)
+        os.chmod(self.server_address, 0o600)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ("unix", 0)
+
+
+class ExecutionServer:
+    """(Experimental) A local execution server shared by several processes.
+
+    The server listens on a Unix socket or on a localhost HTTP port and accepts batches of code blocks as
+    `POST /execute` requests with a JSON body `{"code_blocks": [...], "tenant": ..., "priority": ...}`. Jobs
+    are queued by priority with per-tenant concurrency limits and run by a fixed pool of worker threads.
+    The progress of a job is streamed back as newline-delimited JSON events. `GET /stats` returns the queue
+    state. Use `RemoteCodeExecutor` as the client.
+
+    The server runs arbitrary code, so by default it listens on a Unix socket that only the current user can
+    connect to (mode 0600). Requests must be `application/json`, and requests with an `Origin` header or a
+    `Host` other than localhost are rejected, so a web page cannot submit code through the browser. Set a
+    `token` when listening on TCP: every request must then send it as `Authorization: Bearer <token>`.
+
+    The jobs of different tenants never share an executor or its workspace. The executors are created on
+    demand by `executor_factory(tenant)` and reused for the later jobs of the same tenant; at most
+    `max_idle_executors` idle executors are kept and the least recently used ones are stopped.
+
+    Args:
+        executor_factory (Callable): Creates an executor for the jobs of a tenant, called with the tenant.
+        num_workers (int): The number of jobs executed at the same time.
+        socket_path (Optional, Path or str): The Unix socket to listen on. Defaults to `default_socket_path()`
+            unless `port` is given.
+        host (str): The host to listen on when `port` is given.
+        port (Optional, int): Listen on TCP on this port instead of a Unix socket, 0 to pick a free port.
+        token (Optional, str): The shared token that the clients must send.
+        tenant_limits (Optional, dict): The maximum number of running jobs of each tenant.
+        default_tenant_limit (Optional, int): The limit of the tenants not in `tenant_limits`.
+        max_queued (Optional, int): The maximum number of waiting jobs, further jobs are rejected.
+        history (Optional, ExecutionHistory): Dispatch the jobs of the same priority shortest predicted run time
+            first. Give the same history to the executors created by `executor_factory` so that it learns.
+        max_idle_executors (Optional, int): The number of idle executors kept for reuse. Defaults to
+            `num_workers`.
+    """
+
+    def __init__(
+        self,
+        executor_factory: Callable[[str], CodeExecutor],
+        num_workers: int = 4,
+        socket_path: Optional[Union[Path, str]] = None,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        token: Optional[str] = None,
+        tenant_limits: Optional[Dict[str, int]] = None,
+        default_tenant_limit: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        history: Optional[ExecutionHistory] = None,
+        max_idle_executors: Optional[int] = None,
+    ):
+        if num_workers < 1:
+            raise ValueError("num_workers must be greater than or equal to 1.")
+        self.queue = JobQueue(tenant_limits, default_tenant_limit, max_queued, history=history)
+        self.token = token
+        self._executor_factory = executor_factory
+        self._num_workers = num_workers
+        self._max_idle_executors = num_workers if max_idle_executors is None else max_idle_executors
+        self._workers: List[threading.Thread] = []
+        # 空闲的 executor，按最近使用排序，(租户, executor)
+        self._idle: List[Tuple[str, CodeExecutor]] = []
+        self._idle_lock = threading.Lock()
+        if socket_path is None and port is None:
+            socket_path = default_socket_path()
+        self._socket_path = None if socket_path is None else str(socket_path)
+        if self._socket_path is not None:
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+            self._httpd: _ThreadingHTTPServer = _ThreadingUnixHTTPServer(self._socket_path, _RequestHandler)
+        else:
+            if token is None:
+                # 同一台机器上的任何用户都能连接 TCP 端口
+                logger.warning(f"The execution server listens on {host}:{port} without a token.")
+            self._httpd = _ThreadingHTTPServer((host, port), _RequestHandler)
+        self._httpd.execution_server = self
+        self._serve_thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        """(Experimental) The address of the server, `unix://<path>` or `http://<host>:<port>`."""
+        if self._socket_path is not None:
+            return f"unix://{self._socket_path}"
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def submit(self, job: Job) -> int:
+        """(Experimental) Queue a job and return the number of jobs ahead of it."""
+        return self.queue.put(job)
+
+    def stats(self) -> ServerStats:
+        return self.queue.stats()
+
+    def _checkout(self, tenant: str) -> CodeExecutor:
+        with self._idle_lock:
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i][0] == tenant:
+                    return self._idle.pop(i)[1]
+        return self._executor_factory(tenant)
+
+    def _checkin(self, tenant: str, executor: CodeExecutor) -> None:
+        with self._idle_lock:
+            self._idle.append((tenant, executor))
+            evicted = self._idle[: max(0, len(self._idle) - self._max_idle_executors)]
+            del self._idle[: len(evicted)]
+        for _, executor in evicted:
+            _stop_executor(executor)
+
+    def _work(self) -> None:
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.started_at = time.monotonic()
+            job.publish("started", queued_seconds=job.started_at - job.submitted_at)
+            executor = None
+            try:
+                executor = self._checkout(job.tenant)
+                result = executor.execute_code_blocks(job.code_blocks)
+            except Exception as e:
+                job.publish("error", error=f"{type(e).__name__}: {e}")
+            else:
+                job.publish("result", result=_result_to_dict(result), seconds=time.monotonic() - job.started_at)
+            finally:
+                if executor is not None:
+                    self._checkin(job.tenant, executor)
+                self.queue.done(job)
+
+    def start(self) -> "ExecutionServer":
+        """(Experimental) Start the workers and serve in background threads."""
+        for i in range(self._num_workers):
+            worker = threading.Thread(target=self._work, name=f"azentcoder-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self._serve_thread = threading.Thread(target=self._httpd.serve_forever, name="azentcoder-server", daemon=True)
+        self._serve_thread.start()
+        logger.info(f"Execution server listening on {self.address} with {self._num_workers} workers.")
+        return self
+
+    def serve_forever(self) -> None:
+        """(Experimental) Start the server and block until it is interrupted."""
+        self.start()
+        try:
+            while self._serve_thread.is_alive():
+                self._serve_thread.join(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """(Experimental) Stop accepting jobs, finish the running ones and stop the executors."""
+        if self._serve_thread is not None:
+            self._httpd.shutdown()
+        self._httpd.server_close()
+        self.queue.close()
+        for worker in self._workers:
+            worker.join()
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for _, executor in idle:
+            _stop_executor(executor)
+        if self._socket_path is not None and os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+
+    def __enter__(self) -> "ExecutionServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
@@ -0,0 +1,321 @@
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from hashlib import md5
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from ..code_utils import TIMEOUT_MSG, _cmd, execute_code
+from .admission import DEFAULT_TENANT, AdmissionController
+from .base import CodeBlock, CodeExtractor
+from .local_commandline_code_executor import CommandLineCodeResult, LocalCommandLineCodeExecutor
+from .markdown_code_extractor import MarkdownCodeExtractor
+from .sanitizer import DEFAULT_SANITIZER
+from .workspace import Workspace, WorkspaceManager
+
+__all__ = ("ExecutorSession", "SessionExecutor")
+
+SHELL_LANGUAGES = ["bash", "shell", "sh", "pwsh", "powershell", "ps1"]
+
+
+def _script_name(code: str, lang: str) -> Tuple[Optional[str], bool]:
+    """The file name of a code block and whether it was generated, or None if `# filename:` leaves the workspace."""
+    first_line = code.split("\n")[0]
+    if first_line.startswith("# filename:"):
+        filename = first_line.split(":", 1)[1].strip()
+        path = Path(filename)
+        if path.is_absolute() or ".." in path.parts:
+            return None, False
+        return path.as_posix(), False
+    code_hash = md5(code.encode()).hexdigest()
+    return f"tmp_code_{code_hash}.{'py' if lang.startswith('python') else lang}", True
+
+
+class ExecutorSession:
+    """(Experimental) A lightweight session handle of a `SessionExecutor`.
+
+    Every session has its own sub-workspace and environment variables. Code blocks of one session run one
+    batch at a time in submission order, batches of different sessions run concurrently on the shared pool.
+    A session implements the `CodeExecutor` protocol, so it can be given to an agent like any other executor.
+    """
+
+    def __init__(
+        self, executor: "SessionExecutor", workspace: Workspace, env: Dict[str, str], tenant: str = DEFAULT_TENANT
+    ):
+        self._executor = executor
+        self._workspace = workspace
+        self.env = env
+        self.tenant = tenant
+        self._pending: Deque[Tuple[List[CodeBlock], Future]] = deque()
+        self._running = False
+        self._current: Optional[Future] = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def session_id(self) -> str:
+        return self._workspace.session_id
+
+    @property
+    def work_dir(self) -> Path:
+        """(Experimental) The working directory of the session."""
+        return self._workspace.path
+
+    @property
+    def timeout(self) -> int:
+        """(Experimental) The timeout for code execution."""
+        return self._executor.timeout
+
+    @property
+    def user_capability(self) -> "LocalCommandLineCodeExecutor.UserCapability":
+        return LocalCommandLineCodeExecutor.UserCapability(LocalCommandLineCodeExecutor.DEFAULT_SYSTEM_MESSAGE_UPDATE)
+
+    @property
+    def code_extractor(self) -> CodeExtractor:
+        """(Experimental) Export a code extractor that can be used by an agent."""
+        return MarkdownCodeExtractor()
+
+    def submit(self, code_blocks: List[CodeBlock]) -> "Future[CommandLineCodeResult]":
+        """(Experimental) Queue code blocks for execution and return a future of the result."""
+        future: "Future[CommandLineCodeResult]" = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Session {self.session_id} is closed.")
+            self._pending.append((code_blocks, future))
+            if self._running:
+                return future
+            self._running = True
+        self._executor._schedule(self._drain)
+        return future
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        """(Experimental) Execute code blocks in the session and return the result."""
+        return self.submit(code_blocks).result()
+
+    def _drain(self) -> None:
+        # 每次只执行一批，之后重新排队，避免一个会话长期占用线程
+        with self._lock:
+            code_blocks, future = self._pending.popleft()
+            self._current = future
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(self._executor._run(self, code_blocks))
+            except BaseException as e:
+                future.set_exception(e)
+        with self._lock:
+            if not self._pending:
+                self._running = False
+                return
+        self._executor._schedule(self._drain)
+
+    def restart(self) -> None:
+        """(Experimental) Nothing to restart, every code block runs in a new process."""
+
+    def close(self) -> None:
+        """(Experimental) Close the session and remove its workspace once the queued code has run."""
+        with self._lock:
+            self._closed = True
+            pending = [future for _, future in self._pending]
+            if self._current is not None:
+                pending.insert(0, self._current)
+        for future in pending:
+            try:
+                future.exception()
+            except BaseException:
+                pass
+        self._executor._release(self)
+
+
+class SessionExecutor:
+    """(Experimental) Multiplex many isolated sessions over one shared pool of workers or one container.
+
+    Sessions are created with `open_session` and get a sub-workspace from the `WorkspaceManager`, so
+    `# filename:` paths of different sessions never collide. With `docker=False`, code runs as local
+    subprocesses from a shared thread pool. With `docker=True`, all sessions share a single container whose
+    `/workspace` is the root of the workspace manager, each session running in `/workspace/<session_id>`.
+
+    Args:
+        max_workers (int): The number of code blocks that can run at the same time across sessions.
+        timeout (int): The timeout for each code block in seconds.
+        workspace_manager (Optional, WorkspaceManager): Creates the session workspaces. A new manager under
+            the temp directory if None.
+        docker (bool): Whether to run the code in a shared docker container.
+        image (str): The image of the shared container.
+        env (Optional, dict): The environment variables shared by every session.
+        admission (Optional, AdmissionController): Wait for an admission of the session's tenant before running
+            each batch, on top of the `max_workers` of the executor.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        timeout: int = 60,
+        workspace_manager: Optional[WorkspaceManager] = None,
+        docker: bool = False,
+        image: str = "python:3-slim",
+        env: Optional[Dict[str, str]] = None,
+        admission: Optional[AdmissionController] = None,
+    ):
+        if timeout < 1:
+            raise ValueError("Timeout must be greater than or equal to 1.")
+        if max_workers < 1:
+            raise ValueError("max_workers must be greater than or equal to 1.")
+        self._timeout = timeout
+        self._workspace_manager = workspace_manager or WorkspaceManager()
+        self._env = dict(env or {})
+        self._admission = admission
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="azentcoder-session")
+        self._sessions: Dict[str, ExecutorSession] = {}
+        self._lock = threading.Lock()
+        self._container = None
+        if docker:
+            self._container = self._start_container(image)
+
+    @property
+    def timeout(self) -> int:
+        """(Experimental) The timeout for code execution."""
+        return self._timeout
+
+    @property
+    def workspace_manager(self) -> WorkspaceManager:
+        return self._workspace_manager
+
+    @property
+    def sessions(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+
+    def _start_container(self, image: str) -> Any:
+        import docker
+
+        from .docker_commandline_code_executor import _wait_for_ready
+
+        client = docker.from_env()
+        try:
+            client.images.get(image)
+        except docker.errors.ImageNotFound:
+            client.images.pull(image)
+        container = client.containers.create(
+            image,
+            name=f"azent-code-session-{uuid.uuid4()}",
+            entrypoint="/bin/sh",
+            tty=True,
+            auto_remove=True,
+            volumes={str(self._workspace_manager.root.resolve()): {"bind": "/workspace", "mode": "rw"}},
+            working_dir="/workspace",
+        )
+        container.start()
+        _wait_for_ready(container)
+        return container
+
+    def open_session(
+        self, session_id: Optional[str] = None, env: Optional[Dict[str, str]] = None, tenant: str = DEFAULT_TENANT
+    ) -> ExecutorSession:
+        """(Experimental) Open a session with its own workspace and environment variables."""
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            if session_id in self._sessions:
+                raise ValueError(f"Session {session_id} is already open.")
+            workspace = self._workspace_manager.create(session_id)
+            session = ExecutorSession(self, workspace, {**self._env, **(env or {})}, tenant)
+            self._sessions[session_id] = session
+        return session
+
+    def get_session(self, session_id: str) -> Optional[ExecutorSession]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def _schedule(self, fn: Callable[[], None]) -> None:
+        self._pool.submit(fn)
+
+    def _release(self, session: ExecutorSession) -> None:
+        with self._lock:
+            self._sessions.pop(session.session_id, None)
+        self._workspace_manager.release(session.session_id)
+
+    def _run(self, session: ExecutorSession, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        if len(code_blocks) == 0:
+            raise ValueError("No code blocks to execute.")
+        if self._admission is None:
+            return self._run_blocks(session, code_blocks)
+        with self._admission.admit(session.tenant):
+            return self._run_blocks(session, code_blocks)
+
+    def _run_blocks(self, session: ExecutorSession, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        workspace = session._workspace
+        outputs: List[str] = []
+        code_file = None
+        exit_code = 0
+        for code_block in code_blocks:
+            code = code_block.code
+            # 统一语言名，本地和容器执行、文件扩展名都使用同一个名字
+            lang = code_block.language.lower()
+            if lang.startswith("python"):
+                lang = "python"
+            DEFAULT_SANITIZER.sanitize(lang, code)
+            if not (lang == "python" or lang in SHELL_LANGUAGES):
+                exit_code = 1
+                outputs.append(f"unknown language {code_block.language}")
+                break
+            filename, generated = _script_name(code, lang)
+            if filename is None:
+                exit_code = 1
+                outputs.append("Filename is not in the workspace")
+                break
+            if generated:
+                workspace.script_path(filename)
+            elif code_file is None:
+                code_file = str(workspace.path / filename)
+            if self._container is None:
+                exit_code, output, _ = execute_code(
+                    code=code,
+                    lang=lang,
+                    timeout=self._timeout,
+                    work_dir=str(workspace.path),
+                    filename=filename,
+                    use_docker=False,
+                    env=session.env,
+                )
+            else:
+                exit_code, output = self._run_in_container(session, lang, code, filename)
+            outputs.append(output)
+            if exit_code != 0:
+                break
+        self._workspace_manager.cleanup_scripts(workspace)
+        workspace.touch()
+        return CommandLineCodeResult(exit_code=exit_code, output="".join(outputs), code_file=code_file)
+
+    def _run_in_container(self, session: ExecutorSession, lang: str, code: str, filename: str) -> Tuple[int, str]:
+        path = session.work_dir / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(code, encoding="utf-8")
+        result = self._container.exec_run(
+            ["timeout", str(self._timeout), _cmd(lang), filename],
+            workdir=f"/workspace/{session.session_id}",
+            environment=session.env or None,
+        )
+        output = result.output.decode("utf-8")
+        if result.exit_code == 124:
+            output += "\n" + TIMEOUT_MSG
+        return result.exit_code, output
+
+    def close(self) -> None:
+        """(Experimental) Close every session, wait for the running code and stop the shared container."""
+        for session_id in self.sessions:
+            session = self.get_session(session_id)
+            if session is not None:
+                session.close()
+        self._pool.shutdown(wait=True)
+        if self._container is not None:
+            try:
+                self._container.stop()
+            except Exception:
+                pass
+            self._container = None
+
+    def __enter__(self) -> "SessionExecutor":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
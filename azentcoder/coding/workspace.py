@@ -0,0 +1,434 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+__all__ = ("Workspace", "WorkspaceManager", "WorkspaceQuotaError", "WorkspaceReport", "WorkspaceSnapshot")
+
+logger = logging.getLogger(__name__)
+
+# 每个会话目录下的标记文件，记录创建和最后使用时间，GC 只会删除带有这个文件的目录
+SESSION_MARKER = ".azentcoder-session"
+TMPFS_ROOT = "/dev/shm"
+
+
+class WorkspaceQuotaError(RuntimeError):
+    """Raised when a workspace uses more bytes or inodes than its quota."""
+
+
+class WorkspaceReport(BaseModel):
+    """(Experimental) 工作目录回收的统计"""
+
+    sessions_removed: int = Field(default=0, description="The number of stale sessions removed.")
+    scripts_removed: int = Field(default=0, description="The number of generated script files removed.")
+    bytes_reclaimed: int = Field(default=0, description="The number of bytes freed.")
+    inodes_reclaimed: int = Field(default=0, description="The number of files and directories removed.")
+
+    def add(self, other: "WorkspaceReport") -> None:
+        self.sessions_removed += other.sessions_removed
+        self.scripts_removed += other.scripts_removed
+        self.bytes_reclaimed += other.bytes_reclaimed
+        self.inodes_reclaimed += other.inodes_reclaimed
+
+
+def _usage(path: Path) -> Tuple[int, int]:
+    """The (bytes, inodes) used by a directory tree, not following symlinks."""
+    total_bytes, inodes = 0, 0
+    stack = [str(path)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                inodes += 1
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total_bytes += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+    return total_bytes, inodes
+
+
+def _remove_tree(path: Path) -> Tuple[int, int]:
+    total_bytes, inodes = _usage(path)
+    shutil.rmtree(path, ignore_errors=True)
+    # 目录本身也占一个 inode
+    return total_bytes, inodes + 1
+
+
+class Workspace:
+    """(Experimental) A per-session working directory managed by a `WorkspaceManager`.
+
+    Generated script files are registered with `script_path` and removed by `cleanup_scripts`, files that
+    the code creates are kept until the session is released or collected.
+
+    Args:
+        session_id (str): The id of the session.
+        path (Path): The directory of the session.
+        max_bytes (Optional, int): The size quota of the directory. No quota if None.
+        max_inodes (Optional, int): The maximum number of files and directories. No quota if None.
+    """
+
+    def __init__(self, session_id: str, path: Path, max_bytes: Optional[int] = None, max_inodes: Optional[int] = None):
+        self.session_id = session_id
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_inodes = max_inodes
+        self._scripts: List[Path] = []
+        self._lock = threading.Lock()
+
+    @property
+    def marker(self) -> Path:
+        return self.path / SESSION_MARKER
+
+    def touch(self) -> None:
+        """Mark the session as used now."""
+        try:
+            os.utime(self.marker)
+        except OSError:
+            pass
+
+    def script_path(self, filename: str) -> Path:
+        """The path of a generated script file, which is removed by `cleanup_scripts`."""
+        path = self.path / filename
+        with self._lock:
+            self._scripts.append(path)
+        return path
+
+    def cleanup_scripts(self) -> WorkspaceReport:
+        """(Experimental) Remove the generated script files of this session."""
+        with self._lock:
+            scripts, self._scripts = self._scripts, []
+        report = WorkspaceReport()
+        for path in scripts:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                continue
+            report.scripts_removed += 1
+            report.bytes_reclaimed += size
+            report.inodes_reclaimed += 1
+        return report
+
+    def usage(self) -> Tuple[int, int]:
+        """(Experimental) The (bytes, inodes) used by the session."""
+        return _usage(self.path)
+
+    def check_quota(self) -> None:
+        """(Experimental) Raise a WorkspaceQuotaError if the session exceeds its quota."""
+        if self.max_bytes is None and self.max_inodes is None:
+            return
+        used_bytes, inodes = self.usage()
+        if self.max_bytes is not None and used_bytes > self.max_bytes:
+            raise WorkspaceQuotaError(
+                f"Workspace {self.session_id} uses {used_bytes} bytes, the quota is {self.max_bytes} bytes."
+            )
+        if self.max_inodes is not None and inodes > self.max_inodes:
+            raise WorkspaceQuotaError(f"Workspace {self.session_id} has {inodes} files, the quota is {self.max_inodes}.")
+
+
+class WorkspaceManager:
+    """(Experimental) Create, clean up and garbage collect per-session workspaces.
+
+    Every session gets its own directory under `root`, with a marker file that records when it was created
+    and last used. `gc` removes the sessions that are older than `max_age` seconds and, if the sessions use
+    more than `max_total_bytes` together, the least recently used ones until they fit. Sessions left behind
+    by other processes are collected too, the sessions this manager still holds and directories without the
+    marker file are never touched.
+
+    Args:
+        root (Optional, Path or str): The directory that holds the sessions. Defaults to a directory under
+            /dev/shm when `tmpfs` is True and /dev/shm is available, otherwise under the temp directory.
+        tmpfs (bool): Whether to keep the sessions in memory (tmpfs) when `root` is not given.
+        max_bytes (Optional, int): The size quota of each session.
+        max_inodes (Optional, int): The maximum number of files and directories of each session.
+        max_age (Optional, float): The idle time in seconds after which a session is collected by `gc`.
+        max_total_bytes (Optional, int): The total size of all sessions above which `gc` removes the least
+            recently used ones.
+    """
+
+    def __init__(
+        self,
+        root: Optional[Union[Path, str]] = None,
+        tmpfs: bool = False,
+        max_bytes: Optional[int] = None,
+        max_inodes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        max_total_bytes: Optional[int] = None,
+    ):
+        if root is None:
+            base = tempfile.gettempdir()
+            if tmpfs:
+                if os.path.isdir(TMPFS_ROOT) and os.access(TMPFS_ROOT, os.W_OK):
+                    base = TMPFS_ROOT
+                else:
+                    logger.warning(f"{TMPFS_ROOT} is not available, workspaces are kept in {base}.")
+            root = Path(base) / "azentcoder-workspaces"
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_inodes = max_inodes
+        self.max_age = max_age
+        self.max_total_bytes = max_total_bytes
+        self._sessions: Dict[str, Workspace] = {}
+        self._lock = threading.Lock()
+        self._report = WorkspaceReport()
+
+    @property
+    def report(self) -> WorkspaceReport:
+        """(Experimental) The total bytes and inodes reclaimed by this manager."""
+        with self._lock:
+            return self._report.model_copy()
+
+    def _record(self, report: WorkspaceReport) -> WorkspaceReport:
+        with self._lock:
+            self._report.add(report)
+        return report
+
+    def _session_path(self, session_id: str) -> Path:
+        """The directory of a session, which must be a direct child of the root."""
+        separators = [sep for sep in (os.sep, os.altsep, "/") if sep]
+        if session_id in ("", ".", "..") or "\0" in session_id or any(sep in session_id for sep in separators):
+            raise ValueError(f"Invalid session id {session_id!r}.")
+        path = self.root / session_id
+        # 符号链接等情况下再确认一次
+        if path.resolve().parent != self.root.resolve():
+            raise ValueError(f"Invalid session id {session_id!r}: the workspace would be outside {self.root}.")
+        return path
+
+    def create(self, session_id: Optional[str] = None) -> Workspace:
+        """(Experimental) Create the workspace of a session, or return it if it already exists.
+
+        Raises:
+            ValueError: If the session id is not a plain directory name, e.g. it contains a path separator.
+        """
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            workspace = self._sessions.get(session_id)
+            if workspace is not None:
+                return workspace
+            path = self._session_path(session_id)
+            path.mkdir(parents=True, exist_ok=True)
+            marker = path / SESSION_MARKER
+            if not marker.exists():
+                marker.write_text(json.dumps({"session_id": session_id, "created": time.time(), "pid": os.getpid()}))
+            workspace = Workspace(session_id, path, max_bytes=self.max_bytes, max_inodes=self.max_inodes)
+            self._sessions[session_id] = workspace
+        return workspace
+
+    def get(self, session_id: str) -> Optional[Workspace]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def release(self, session_id: str) -> WorkspaceReport:
+        """(Experimental) Remove the workspace of a session and everything in it.
+
+        Raises:
+            ValueError: If the session id is not a plain directory name, e.g. it contains a path separator.
+        """
+        with self._lock:
+            workspace = self._sessions.pop(session_id, None)
+        path = workspace.path if workspace is not None else self._session_path(session_id)
+        if not (path / SESSION_MARKER).exists():
+            return WorkspaceReport()
+        bytes_reclaimed, inodes = _remove_tree(path)
+        return self._record(WorkspaceReport(sessions_removed=1, bytes_reclaimed=bytes_reclaimed, inodes_reclaimed=inodes))
+
+    def gc(self, max_age: Optional[float] = None, max_total_bytes: Optional[int] = None) -> WorkspaceReport:
+        """(Experimental) Remove stale sessions by age and total size.
+
+        The sessions created by this manager and not released yet are in use, so they are neither removed nor
+        counted in the total size.
+
+        Args:
+            max_age (Optional, float): Overrides the `max_age` of the manager.
+            max_total_bytes (Optional, int): Overrides the `max_total_bytes` of the manager.
+
+        Returns:
+            WorkspaceReport: The sessions removed and the bytes and inodes reclaimed by this run.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        max_total_bytes = self.max_total_bytes if max_total_bytes is None else max_total_bytes
+        now = time.time()
+        with self._lock:
+            live = set(self._sessions)
+        # (最后使用时间, 会话 id, 大小)
+        sessions: List[Tuple[float, str, int]] = []
+        stale: List[str] = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name in live:
+                    continue
+                marker = os.path.join(entry.path, SESSION_MARKER)
+                try:
+                    last_used = os.stat(marker).st_mtime
+                except OSError:
+                    continue
+                if max_age is not None and now - last_used > max_age:
+                    stale.append(entry.name)
+                elif max_total_bytes is not None:
+                    sessions.append((last_used, entry.name, _usage(Path(entry.path))[0]))
+
+        if max_total_bytes is not None:
+            total = sum(size for _, _, size in sessions)
+            for _, session_id, size in sorted(sessions):
+                if total <= max_total_bytes:
+                    break
+                stale.append(session_id)
+                total -= size
+
+        report = WorkspaceReport()
+        for session_id in stale:
+            report.add(self.release(session_id))
+        if report.sessions_removed:
+            logger.info(
+                f"Removed {report.sessions_removed} stale workspaces, "
+                f"reclaimed {report.bytes_reclaimed} bytes and {report.inodes_reclaimed} inodes."
+            )
+        return report
+
+    def cleanup_scripts(self, workspace: Workspace) -> WorkspaceReport:
+        """(Experimental) Remove the generated script files of a session and count them in the report."""
+        return self._record(workspace.cleanup_scripts())
+
+    def close(self) -> WorkspaceReport:
+        """(Experimental) Release every session created by this manager."""
+        with self._lock:
+            session_ids = list(self._sessions)
+        report = WorkspaceReport()
+        for session_id in session_ids:
+            report.add(self.release(session_id))
+        return report
+
+
+class WorkspaceSnapshot:
+    """(Experimental) A baseline of a directory that it can be rolled back to.
+
+    The snapshot records the size and modification time of every file. Files up to `max_bytes` in total are
+    also copied to a private directory, so files that were modified or deleted after the snapshot can be
+    restored. Files created after the snapshot are removed by `rollback`.
+
+    Args:
+        path (Path or str): The directory.
+        max_bytes (int): The maximum total size of the copied files. Larger baselines are rolled back by
+            removing the new files only.
+    """
+
+    def __init__(self, path: Union[Path, str], max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._manifest: Dict[str, Tuple[int, int]] = {}
+        self._dirs: Set[str] = set()
+        self._copy_dir: Optional[Path] = None
+        self.capture()
+
+    def _walk(self) -> List[Tuple[str, os.stat_result, bool]]:
+        """The (relative path, stat, is_dir) of every entry under the directory."""
+        entries = []
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                scanned = list(os.scandir(self.path / rel_dir))
+            except OSError:
+                continue
+            for entry in scanned:
+                rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append((rel, stat, is_dir))
+                if is_dir:
+                    stack.append(rel)
+        return entries
+
+    def capture(self) -> None:
+        """(Experimental) Take the current content of the directory as the baseline."""
+        self.discard()
+        self._manifest.clear()
+        self._dirs = set()
+        files = []
+        for rel, stat, is_dir in self._walk():
+            if is_dir:
+                self._dirs.add(rel)
+            else:
+                self._manifest[rel] = (stat.st_size, stat.st_mtime_ns)
+                files.append((rel, stat.st_size))
+        if sum(size for _, size in files) <= self.max_bytes:
+            self._copy_dir = Path(tempfile.mkdtemp(prefix="azentcoder-baseline-"))
+            for rel, _ in files:
+                target = self._copy_dir / rel
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    shutil.copy2(self.path / rel, target, follow_symlinks=False)
+                except OSError:
+                    self._manifest.pop(rel, None)
+
+    def rollback(self) -> Tuple[int, int, List[str]]:
+        """(Experimental) Roll the directory back to the baseline.
+
+        Returns:
+            Tuple[int, int, List[str]]: The number of files removed, the number of files restored, and the
+                relative paths that could not be removed, for example files created by another user.
+        """
+        removed, restored, failed = 0, 0, []
+        seen = set()
+        new_dirs = []
+        for rel, stat, is_dir in self._walk():
+            if is_dir:
+                if rel not in self._dirs:
+                    new_dirs.append(rel)
+                continue
+            seen.add(rel)
+            baseline = self._manifest.get(rel)
+            if baseline is None:
+                try:
+                    os.unlink(self.path / rel)
+                    removed += 1
+                except OSError:
+                    failed.append(rel)
+            elif baseline != (stat.st_size, stat.st_mtime_ns) and self._restore(rel):
+                restored += 1
+        for rel in self._manifest:
+            if rel not in seen and self._restore(rel):
+                restored += 1
+        # 先删除最深的目录
+        for rel in sorted(new_dirs, key=len, reverse=True):
+            try:
+                os.rmdir(self.path / rel)
+            except OSError:
+                if not any(f.startswith(rel + os.sep) for f in failed):
+                    failed.append(rel)
+        return removed, restored, failed
+
+    def _restore(self, rel: str) -> bool:
+        if self._copy_dir is None:
+            return False
+        target = self.path / rel
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(self._copy_dir / rel, target, follow_symlinks=False)
+        except OSError:
+            return False
+        return True
+
+    def discard(self) -> None:
+        """(Experimental) Remove the copied files of the baseline."""
+        if self._copy_dir is not None:
+            shutil.rmtree(self._copy_dir, ignore_errors=True)
+            self._copy_dir = None
@@ -0,0 +1,152 @@
+"""Python 代码的编译缓存
+
+`DEFAULT_COMPILE_CACHE` only deduplicates the compiles of `infer_lang`, which checks whether a code block is
+Python. The code runners execute scripts in a subprocess and never read the cached code objects, so the disk
+tier only lets `infer_lang` skip compilation across processes.
+"""
+import ast
+import marshal
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+from pathlib import Path
+from types import CodeType
+from typing import Any, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+__all__ = ("CompiledCodeCache", "CompileCacheStats", "DEFAULT_COMPILE_CACHE", "DEFAULT_FILENAME", "parse_ast")
+
+# 所有使用缓存的地方用同一个文件名编译，才能共享同一个 code 对象
+DEFAULT_FILENAME = "<code_block>"
+
+# CPython 3.11.8 之前的 ast 模块在多个线程同时解析时会报
+# "AST constructor recursion depth mismatch"，所以串行化所有解析
+_AST_LOCK = threading.Lock()
+
+
+def parse_ast(source: str, filename: str = "<unknown>") -> ast.Module:
+    """`ast.parse`, safe to call from several threads at once."""
+    with _AST_LOCK:
+        return ast.parse(source, filename)
+
+
+class CompileCacheStats(BaseModel):
+    """(Experimental) 编译缓存的命中统计"""
+
+    memory_hits: int = Field(default=0, description="The number of compilations served from memory.")
+    disk_hits: int = Field(default=0, description="The number of compilations served from disk.")
+    misses: int = Field(default=0, description="The number of sources that had to be compiled.")
+
+
+class CompiledCodeCache:
+    """(Experimental) A bounded cache of compiled Python code objects.
+
+    Entries are keyed by a hash of the source, the filename, the mode and the Python version
+    (`sys.implementation.cache_tag`), so a code object is never reused by another interpreter version.
+    Sources that fail to compile are cached too and raise the same SyntaxError again. With `cache_dir`,
+    code objects are also stored on disk with `marshal`, so repeated blocks skip compilation across sessions.
+
+    Args:
+        max_entries (int): The number of code objects kept in memory.
+        cache_dir (Optional, Path or str): The directory of the on-disk tier. No disk tier if None.
+    """
+
+    def __init__(self, max_entries: int = 1024, cache_dir: Optional[Union[Path, str]] = None):
+        if max_entries < 1:
+            raise ValueError("max_entries must be greater than or equal to 1.")
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Union[CodeType, Tuple[Any, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CompileCacheStats()
+        self.set_cache_dir(cache_dir)
+
+    def set_cache_dir(self, cache_dir: Optional[Union[Path, str]]) -> None:
+        """(Experimental) Set the directory of the on-disk tier, or disable it with None."""
+        self._cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self._cache_dir is not None:
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def stats(self) -> CompileCacheStats:
+        with self._lock:
+            return self._stats.model_copy()
+
+    @staticmethod
+    def key(source: str, filename: str = DEFAULT_FILENAME, mode: str = "exec") -> str:
+        tag = f"{sys.implementation.cache_tag}-{marshal.version}-{sys.flags.optimize}"
+        return sha256(f"{tag}\0{filename}\0{mode}\0{source}".encode()).hexdigest()
+
+    def compile(self, source: str, filename: str = DEFAULT_FILENAME, mode: str = "exec") -> CodeType:
+        """(Experimental) Compile the source, or return the cached code object.
+
+        Raises:
+            SyntaxError: If the source is not valid Python.
+        """
+        key = self.key(source, filename, mode)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats.memory_hits += 1
+        if entry is None:
+            entry = self._load(key)
+            if entry is None:
+                try:
+                    entry = compile(source, filename, mode)
+                except SyntaxError as e:
+                    # 只在内存中缓存编译失败的结果
+                    entry = (type(e), e.args)
+                else:
+                    self._store(key, entry)
+            self._remember(key, entry)
+        if isinstance(entry, tuple):
+            error_type, args = entry
+            raise error_type(*args)
+        return entry
+
+    def clear(self) -> None:
+        """(Experimental) Clear the in-memory tier and the statistics. The on-disk tier is kept."""
+        with self._lock:
+            self._entries.clear()
+            self._stats = CompileCacheStats()
+
+    def _remember(self, key: str, entry: Union[CodeType, Tuple[Any, ...]]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[CodeType]:
+        if self._cache_dir is not None:
+            try:
+                code = marshal.loads((self._cache_dir / f"{key}.bin").read_bytes())
+            except (OSError, EOFError, ValueError, TypeError):
+                code = None
+            if isinstance(code, CodeType):
+                with self._lock:
+                    self._stats.disk_hits += 1
+                return code
+        with self._lock:
+            self._stats.misses += 1
+        return None
+
+    def _store(self, key: str, code: CodeType) -> None:
+        if self._cache_dir is None:
+            return
+        # 先写临时文件再改名，其它进程不会读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(marshal.dumps(code))
+            os.replace(tmp_path, self._cache_dir / f"{key}.bin")
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+DEFAULT_COMPILE_CACHE = CompiledCodeCache()
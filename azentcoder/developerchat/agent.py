@@ -1,4 +1,91 @@
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    # coding.base 在模块级别导入 LLMAgent，这里只能在函数内导入 coding 相关的模块
+    from .pipeline import AgentRunResult
+
+__all__ = ("LLMAgent",)
 
 
 class LLMAgent:
-    pass
\ No newline at end of file
+    """(Experimental) 使用 LLM 生成回复并执行回复中代码块的 agent
+
+    Args:
+        name (str): The name of the agent.
+        system_message (str): The system message of the agent.
+        llm_config (Optional, dict): The config of the completions, e.g. model, passed to `Completion.stream`.
+        code_executor (Optional, CodeExecutor): The executor of the code blocks in the replies.
+    """
+
+    DEFAULT_SYSTEM_MESSAGE = "You are a helpful AI assistant."
+
+    def __init__(
+        self,
+        name: str = "assistant",
+        system_message: str = DEFAULT_SYSTEM_MESSAGE,
+        llm_config: Optional[Dict[str, Any]] = None,
+        code_executor: Optional[Any] = None,
+    ):
+        self.name = name
+        self._system_message = system_message
+        self.llm_config = dict(llm_config or {})
+        self.code_executor = code_executor
+        self.messages: List[Dict[str, str]] = []
+
+    @property
+    def system_message(self) -> str:
+        return self._system_message
+
+    def update_system_message(self, system_message: str) -> None:
+        self._system_message = system_message
+
+    def _prompt(self, messages: List[Dict[str, str]]) -> str:
+        lines = [f"system: {self._system_message}"]
+        lines += [f"{message['role']}: {message['content']}" for message in messages]
+        lines.append("assistant:")
+        return "\n".join(lines)
+
+    def generate_reply_stream(
+        self, messages: Optional[List[Dict[str, str]]] = None, cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[str]:
+        """(Experimental) Stream the reply to the messages, the history of the agent if None, in chunks."""
+        from ..oai_mock import Completion
+
+        prompt = self._prompt(self.messages if messages is None else messages)
+        return Completion.stream(cancel_event=cancel_event, **{**self.llm_config, "prompt": prompt})
+
+    def generate_reply(self, messages: Optional[List[Dict[str, str]]] = None) -> str:
+        """(Experimental) Generate the whole reply to the messages, the history of the agent if None."""
+        return "".join(self.generate_reply_stream(messages))
+
+    def run(self, message: str, pipelined: bool = True) -> "AgentRunResult":
+        """(Experimental) Reply to a message and execute the code blocks of the reply.
+
+        With `pipelined`, each code block is executed as soon as its closing fence is generated, while the
+        rest of the reply is still being generated, and a failed block stops generation. Otherwise the whole
+        reply is generated before the code blocks are executed. The reply and the output of the code blocks
+        are added to `messages`.
+
+        Args:
+            message (str): The message of the user.
+            pipelined (bool): Whether to execute the code blocks while the reply is generated.
+
+        Returns:
+            AgentRunResult: The reply and the results of the code blocks.
+
+        Raises:
+            ValueError: If the agent has no code executor.
+        """
+        from .pipeline import run_pipelined, run_sequential
+
+        if self.code_executor is None:
+            raise ValueError("The agent has no code executor.")
+        self.messages.append({"role": "user", "content": message})
+        result = run_pipelined(self, self.messages) if pipelined else run_sequential(self, self.messages)
+        self.messages.append({"role": "assistant", "content": result.reply})
+        if result.code_results:
+            self.messages.append(
+                {"role": "user", "content": f"exitcode: {result.exit_code}\nCode output: {result.output}"}
+            )
+        return result
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from ..coding.base import CodeBlock, CodeResult
+from ..coding.markdown_code_extractor import StreamingCodeBlockParser
+
+if TYPE_CHECKING:
+    from .agent import LLMAgent
+
+__all__ = ("AgentRunResult", "run_pipelined", "run_sequential")
+
+logger = logging.getLogger(__name__)
+
+
+class AgentRunResult(BaseModel):
+    """(Experimental) agent 一轮生成和执行的结果"""
+
+    reply: str = Field(description="The text of the reply, up to where generation stopped.")
+    code_blocks: List[CodeBlock] = Field(default_factory=list, description="The code blocks found in the reply.")
+    code_results: List[CodeResult] = Field(
+        default_factory=list, description="The results of the executions, in the order of the code blocks."
+    )
+    exit_code: int = Field(default=0, description="The exit code of the last execution, 0 without code blocks.")
+    output: str = Field(default="", description="The output of all the executions.")
+    skipped: int = Field(default=0, description="The number of code blocks not executed after a failure.")
+    cancelled: bool = Field(default=False, description="Whether generation was stopped by a failed code block.")
+    generation_seconds: float = Field(default=0.0, description="The time until generation finished or stopped.")
+    total_seconds: float = Field(default=0.0, description="The time until the last execution finished.")
+
+
+def run_sequential(agent: "LLMAgent", messages: List[Dict[str, str]]) -> AgentRunResult:
+    """(Experimental) Generate the whole reply, then execute its code blocks."""
+    start = time.perf_counter()
+    reply = agent.generate_reply(messages)
+    generation_seconds = time.perf_counter() - start
+    executor = agent.code_executor
+    code_blocks = executor.code_extractor.extract_code_blocks(reply)
+    code_results = [executor.execute_code_blocks(code_blocks)] if code_blocks else []
+    return AgentRunResult(
+        reply=reply,
+        code_blocks=code_blocks,
+        code_results=code_results,
+        exit_code=code_results[-1].exit_code if code_results else 0,
+        output="".join(result.output for result in code_results),
+        generation_seconds=generation_seconds,
+        total_seconds=time.perf_counter() - start,
+    )
+
+
+def run_pipelined(agent: "LLMAgent", messages: List[Dict[str, str]]) -> AgentRunResult:
+    """(Experimental) Execute each code block of the reply as soon as it is closed, while generation continues.
+
+    The code blocks run one at a time in the order they appear, on a worker thread, so later blocks see the
+    effects of earlier ones as with `run_sequential`. When a block fails, generation is stopped and the
+    blocks not yet executed are skipped.
+    """
+    start = time.perf_counter()
+    executor = agent.code_executor
+    parser = StreamingCodeBlockParser()
+    cancel_event = threading.Event()
+    failed = threading.Event()
+    code_blocks: List[CodeBlock] = []
+    futures = []
+
+    def execute(code_block: CodeBlock) -> Optional[CodeResult]:
+        if failed.is_set():
+            return None
+        result = executor.execute_code_blocks([code_block])
+        if result.exit_code != 0:
+            # 后面的代码块依赖前面的结果，失败后停止生成并跳过剩余代码块
+            failed.set()
+            cancel_event.set()
+        return result
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    stream = agent.generate_reply_stream(messages, cancel_event=cancel_event)
+    try:
+        for chunk in stream:
+            for code_block in parser.feed(chunk):
+                code_blocks.append(code_block)
+                futures.append(pool.submit(execute, code_block))
+            if failed.is_set():
+                break
+        cancelled = failed.is_set()
+        generation_seconds = time.perf_counter() - start
+        results = [future.result() for future in futures]
+    finally:
+        stream.close()
+        cancel_event.set()
+        pool.shutdown(wait=True)
+
+    code_results = [result for result in results if result is not None]
+    if failed.is_set():
+        logger.info(f"Code block {len(code_results)} failed, skipped {len(results) - len(code_results)} blocks.")
+    return AgentRunResult(
+        reply=parser.text,
+        code_blocks=code_blocks,
+        code_results=code_results,
+        exit_code=code_results[-1].exit_code if code_results else 0,
+        output="".join(result.output for result in code_results),
+        skipped=len(results) - len(code_results),
+        cancelled=cancelled,
+        generation_seconds=generation_seconds,
+        total_seconds=time.perf_counter() - start,
+    )
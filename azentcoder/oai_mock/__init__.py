@@ -0,0 +1,12 @@
+from .backend import MockBackend
+from .cache import CacheStats, DiskCache, LRUCache, ResponseCache
+from .completion import Completion
+
+__all__ = (
+    "Completion",
+    "MockBackend",
+    "ResponseCache",
+    "LRUCache",
+    "DiskCache",
+    "CacheStats",
+)
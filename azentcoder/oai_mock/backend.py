@@ -0,0 +1,145 @@
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError
+from hashlib import sha1
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from ..token_count_utils import count_token
+
+__all__ = ("MockBackend",)
+
+# 每 1k token 的价格 (prompt, completion)
+DEFAULT_PRICE_1K = {
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "gpt-4": (0.03, 0.06),
+}
+
+
+class MockBackend:
+    """(Experimental) 本地确定性的 completion 后端，用于在没有网络和 API key 的情况下运行和测试
+
+    The same prompt and config always produce the same response.
+
+    Args:
+        latency (float, dict or Callable): The simulated latency of a request in seconds. A dict maps
+            model names to latencies and a callable receives the config and returns the latency.
+        responder (Optional, Callable): Produces the text of the i-th choice from `(prompt, config, i)`.
+            Defaults to a text derived from a hash of the prompt and the config.
+        price_1k (Optional, dict): The (prompt, completion) price per 1k tokens of each model.
+        stream_chunk_size (int): The number of characters of each chunk yielded by `stream`.
+        stream_interval (float): The simulated time between two chunks of `stream` in seconds.
+    """
+
+    def __init__(
+        self,
+        latency: Union[float, Dict[str, float], Callable[[Dict[str, Any]], float]] = 0.0,
+        responder: Optional[Callable[[str, Dict[str, Any], int], str]] = None,
+        price_1k: Optional[Dict[str, tuple]] = None,
+        stream_chunk_size: int = 16,
+        stream_interval: float = 0.0,
+    ):
+        if stream_chunk_size < 1:
+            raise ValueError("stream_chunk_size must be greater than or equal to 1.")
+        self._latency = latency
+        self._responder = responder or self._default_responder
+        self._price_1k = {**DEFAULT_PRICE_1K, **(price_1k or {})}
+        self._stream_chunk_size = stream_chunk_size
+        self._stream_interval = stream_interval
+        self.num_requests = 0
+        self.num_cancelled = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _default_responder(prompt: str, config: Dict[str, Any], index: int) -> str:
+        digest = sha1(f"{config.get('model')}\n{index}\n{prompt}".encode()).hexdigest()
+        return f"mock response {digest[:12]}"
+
+    def latency(self, config: Dict[str, Any]) -> float:
+        """The simulated latency of a request with the given config."""
+        if callable(self._latency):
+            return self._latency(config)
+        if isinstance(self._latency, dict):
+            return self._latency.get(config.get("model"), 0.0)
+        return self._latency
+
+    def complete(
+        self, prompt: str, config: Dict[str, Any], cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """(Experimental) Create a completion in the format of `openai.Completion.create`.
+
+        Args:
+            prompt (str): The rendered prompt.
+            config (dict): The config of the request, e.g. model, n, stop.
+            cancel_event (Optional, threading.Event): Abort the request when this event is set.
+
+        Returns:
+            dict: The response, including the `cost` of the request.
+
+        Raises:
+            CancelledError: If the request was cancelled before it completed.
+        """
+        with self._lock:
+            self.num_requests += 1
+        latency = self.latency(config)
+        if cancel_event is not None:
+            if cancel_event.wait(latency):
+                with self._lock:
+                    self.num_cancelled += 1
+                raise CancelledError()
+        elif latency > 0:
+            time.sleep(latency)
+        return self._build_response(prompt, config)
+
+    def stream(
+        self, prompt: str, config: Dict[str, Any], cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[str]:
+        """(Experimental) Stream the text of the first choice in chunks, like a streamed completion.
+
+        The latency of the request passes before the first chunk, and `stream_interval` between chunks.
+
+        Args:
+            prompt (str): The rendered prompt.
+            config (dict): The config of the request, e.g. model, stop.
+            cancel_event (Optional, threading.Event): Stop streaming when this event is set.
+
+        Yields:
+            str: The chunks of the text. Joined, they are the text of `complete`.
+        """
+        with self._lock:
+            self.num_requests += 1
+        text = self._responder(prompt, config, 0)
+        delays = [self.latency(config)] + [self._stream_interval] * (len(text) // self._stream_chunk_size)
+        for start, delay in zip(range(0, len(text), self._stream_chunk_size), delays):
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    with self._lock:
+                        self.num_cancelled += 1
+                    return
+            elif delay > 0:
+                time.sleep(delay)
+            yield text[start : start + self._stream_chunk_size]
+
+    def _build_response(self, prompt: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        model = config.get("model", "gpt-3.5-turbo")
+        choices: List[Dict[str, Any]] = []
+        completion_tokens = 0
+        for i in range(config.get("n", 1)):
+            text = self._responder(prompt, config, i)
+            completion_tokens += count_token(text, model)
+            choices.append({"index": i, "text": text, "finish_reason": "stop", "logprobs": None})
+        prompt_tokens = count_token(prompt, model)
+        prompt_price, completion_price = self._price_1k.get(model, (0.0, 0.0))
+        return {
+            "id": f"cmpl-{uuid.uuid4().hex}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+            "cost": (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000,
+        }
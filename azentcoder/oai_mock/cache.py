@@ -0,0 +1,208 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from pydantic import BaseModel, Field
+
+__all__ = ("LRUCache", "DiskCache", "ResponseCache", "CacheStats")
+
+
+class _LeaderCancelled(Exception):
+    """The request computing a value was cancelled, a waiting caller computes it instead."""
+
+
+class CacheStats(BaseModel):
+    """(Experimental) 缓存的命中统计"""
+
+    memory_hits: int = Field(default=0, description="The number of lookups served from memory.")
+    disk_hits: int = Field(default=0, description="The number of lookups served from disk.")
+    coalesced: int = Field(default=0, description="The number of lookups that waited for an identical in-flight request.")
+    misses: int = Field(default=0, description="The number of lookups that required a request to the backend.")
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits + self.coalesced
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache:
+    """(Experimental) A bounded in-memory cache that evicts the least recently used entry."""
+
+    def __init__(self, capacity: int = 1024):
+        if capacity < 1:
+            raise ValueError("Capacity must be greater than or equal to 1.")
+        self._capacity = capacity
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self._capacity:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """(Experimental) 基于 sqlite 的磁盘缓存，值以 JSON 保存，进程重启后仍然有效"""
+
+    def __init__(self, path: Union[Path, str]):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """(Experimental) A two-tier response cache with coalescing of identical in-flight requests.
+
+    Lookups go to the in-memory LRU cache first, then to the optional sqlite cache on disk. If both miss
+    and the same key is already being computed by another thread, the caller waits for that result
+    instead of sending a second request.
+
+    Args:
+        capacity (int): The number of responses kept in memory.
+        disk_path (Optional, Path or str): The sqlite file of the disk tier. No disk tier if None.
+    """
+
+    def __init__(self, capacity: int = 1024, disk_path: Optional[Union[Path, str]] = None):
+        self._memory = LRUCache(capacity)
+        self._disk = DiskCache(disk_path) if disk_path is not None else None
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    @property
+    def stats(self) -> CacheStats:
+        """(Experimental) A snapshot of the hit/miss statistics."""
+        with self._lock:
+            return self._stats.model_copy()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """(Experimental) Return the cached value of the key, computing it at most once if it is missing.
+
+        Args:
+            key (str): The cache key.
+            compute (Callable): Computes the value on a miss. Exceptions are propagated to every waiting caller
+                and nothing is cached, except a `CancelledError`: it only reaches the cancelled caller, and one
+                of the waiting callers computes the value with its own `compute` instead.
+
+        Returns:
+            Any: The cached or computed value.
+        """
+        while True:
+            value = self._memory.get(key)
+            if value is not None:
+                self._count("memory_hits")
+                return value
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    # 另一个线程可能刚刚完成同一个请求
+                    value = self._memory.get(key)
+                    if value is None:
+                        future = self._inflight[key] = Future()
+            if leader and value is not None:
+                self._count("memory_hits")
+                return value
+            if leader:
+                return self._compute(key, compute, future)
+            try:
+                value = future.result()
+            except _LeaderCancelled:
+                # 被取消的请求 (例如被放弃的 hedge) 不能让等待它的请求失败，重新竞争领头
+                continue
+            self._count("coalesced")
+            return value
+
+    def _compute(self, key: str, compute: Callable[[], Any], future: Future) -> Any:
+        try:
+            value = self._disk.get(key) if self._disk is not None else None
+            if value is not None:
+                self._count("disk_hits")
+            else:
+                self._count("misses")
+                value = compute()
+                if self._disk is not None:
+                    self._disk.set(key, value)
+            self._memory.set(key, value)
+        except BaseException as e:
+            # 先移除 in-flight 的 Future，等待者重试时不会再拿到它
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(_LeaderCancelled() if isinstance(e, CancelledError) else e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        """(Experimental) Remove every entry from both tiers and reset the statistics."""
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+        with self._lock:
+            self._stats = CacheStats()
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self._stats, field, getattr(self._stats, field) + 1)
+
+
+def default_disk_path(seed: Union[int, str], cache_path_root: Union[Path, str] = ".cache") -> Path:
+    """The sqlite file used for the given cache seed."""
+    return Path(cache_path_root) / str(seed) / "responses.sqlite"
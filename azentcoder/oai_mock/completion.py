@@ -1,11 +1,302 @@
+import copy
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .backend import MockBackend
+from .cache import CacheStats, ResponseCache, default_disk_path
+from .hedging import LatencySummary, LatencyTracker
+
+__all__ = ("Completion",)
+
+logger = logging.getLogger(__name__)
 
 
 class Completion:
+    """(Experimental) 兼容 `openai.Completion` (openai<1) 接口的 completion 层
+
+    Requests are sent to a pluggable backend, the local deterministic `MockBackend` by default. Responses are
+    cached in memory and optionally in a sqlite file, keyed by the rendered prompt and the config, and identical
+    concurrent requests are coalesced into one backend call.
+    """
+
+    backend = MockBackend()
+    cache: Optional[ResponseCache] = ResponseCache()
+    latency_tracker = LatencyTracker()
+
+    @classmethod
+    def set_backend(cls, backend: Any) -> None:
+        """(Experimental) Set the backend. A backend has a `complete(prompt, config) -> dict` method."""
+        cls.backend = backend
+
+    @classmethod
+    def set_cache(
+        cls,
+        seed: Optional[Union[int, str]] = 41,
+        cache_path_root: Optional[Union[Path, str]] = ".cache",
+        capacity: int = 1024,
+    ) -> None:
+        """(Experimental) Set the response cache.
+
+        Args:
+            seed (int or str): The seed of the cache. Different seeds use different sqlite files.
+            cache_path_root (Optional, Path or str): The root directory of the disk cache. Memory only if None.
+            capacity (int): The number of responses kept in memory.
+        """
+        disk_path = default_disk_path(seed, cache_path_root) if cache_path_root is not None else None
+        cls.cache = ResponseCache(capacity=capacity, disk_path=disk_path)
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """(Experimental) Clear the response cache and its statistics."""
+        if cls.cache is not None:
+            cls.cache.clear()
+
+    @classmethod
+    def cache_stats(cls) -> CacheStats:
+        """(Experimental) The hit/miss statistics of the response cache."""
+        return cls.cache.stats if cls.cache is not None else CacheStats()
+
+    @classmethod
+    def latency_stats(cls) -> Dict[str, LatencySummary]:
+        """(Experimental) The latency statistics of the backend requests of each config used in `config_list`, keyed
+        by the config as JSON. Cache hits are not counted."""
+        return cls.latency_tracker.summary()
+
+    @classmethod
+    def instantiate(
+        cls,
+        template: Union[str, Callable[[Dict], str], None],
+        context: Optional[Dict] = None,
+    ) -> Optional[str]:
+        """Render a prompt template with the context."""
+        if not context or template is None:
+            return template
+        if isinstance(template, str):
+            return template.format(**context)
+        return template(context)
+
+    @staticmethod
+    def _cache_key(prompt: str, config: Dict[str, Any]) -> str:
+        # config 中的值可能不是 JSON 类型 (例如 callable)，统一转成字符串
+        payload = json.dumps({**config, "prompt": prompt}, sort_keys=True, default=str)
+        return sha256(payload.encode()).hexdigest()
+
+    @classmethod
+    def _get_response(
+        cls,
+        context: Optional[Dict],
+        use_cache: bool,
+        config: Dict[str, Any],
+        cancel_event: Optional[threading.Event] = None,
+        latency_config: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        config = dict(config)
+        prompt = cls.instantiate(config.pop("prompt", None), context) or ""
+
+        def complete():
+            start_time = time.time()
+            if cancel_event is None:
+                response = cls.backend.complete(prompt, config)
+            else:
+                response = cls.backend.complete(prompt, config, cancel_event=cancel_event)
+            # 只记录真正发给 backend 的请求，缓存命中不计入 config 的延迟
+            if latency_config is not None:
+                cls.latency_tracker.record(latency_config, time.time() - start_time)
+            return response
 
+        # cache_seed 为 None 表示不使用缓存
+        if not use_cache or cls.cache is None or ("cache_seed" in config and config["cache_seed"] is None):
+            return complete()
+        key = cls._cache_key(prompt, config)
+        response = cls.cache.get_or_compute(key, complete)
+        # 返回副本，避免调用方修改缓存中的 response
+        return copy.deepcopy(response)
 
     @classmethod
     def create(
-        cls
-    ):
-        
-        
\ No newline at end of file
+        cls,
+        context: Optional[Dict] = None,
+        use_cache: bool = True,
+        config_list: Optional[List[Dict]] = None,
+        filter_func: Optional[Callable[[Dict, Dict], bool]] = None,
+        fanout: Optional[int] = None,
+        hedge_delay: Optional[float] = None,
+        adaptive_order: bool = False,
+        **config,
+    ) -> Dict[str, Any]:
+        """(Experimental) Make a completion for a given context.
+
+        Args:
+            context (Optional, dict): The context to instantiate the prompt.
+                It needs to contain keys that are used by the prompt template.
+                E.g., `prompt="Complete the following sentence: {prefix}"`, `context={"prefix": "Today I feel"}`.
+            use_cache (bool): Whether to use the response cache.
+            config_list (Optional, list): List of configurations for the completion to try.
+                The first one that does not raise an error and passes `filter_func` will be used.
+            filter_func (Optional, Callable): A function that takes in the context and the response and returns
+                a boolean to indicate whether the response is valid.
+            fanout (Optional, int): Send requests for this many configs of `config_list` at once instead of trying
+                them one after another. The first response that passes `filter_func` wins and the other requests
+                are cancelled. The backend must accept a `cancel_event` argument.
+            hedge_delay (Optional, float): Also start the next config whenever no response has passed
+                `filter_func` for this many seconds. Implies `fanout=1` if `fanout` is not set.
+            adaptive_order (bool): Try the configs of `config_list` in the order of their observed median latency.
+            **config: The configuration of the request, e.g. prompt, model, n, stop. It is shared by all the
+                configurations in `config_list`.
+
+        Returns:
+            dict: The response, including `cost`. With `config_list`, also `config_id` and `pass_filter`.
+        """
+        if not config_list:
+            return cls._get_response(context, use_cache, config)
+
+        order = cls.latency_tracker.order(config_list) if adaptive_order else list(range(len(config_list)))
+        if fanout or hedge_delay is not None:
+            fanout = fanout or 1
+            return cls._create_fanout(context, use_cache, config_list, order, filter_func, fanout, hedge_delay, config)
+
+        last = len(order) - 1
+        cost = 0
+        for position, i in enumerate(order):
+            each_config = config_list[i]
+            try:
+                response = cls._get_response(context, use_cache, {**config, **each_config}, latency_config=each_config)
+            except Exception:
+                if position == last:
+                    raise
+                logger.warning("failed with config %d", i, exc_info=True)
+                continue
+            pass_filter = filter_func is None or filter_func(context=context, response=response)
+            if pass_filter or position == last:
+                response["cost"] = cost + response["cost"]
+                response["config_id"] = i
+                response["pass_filter"] = pass_filter
+                return response
+            cost += response["cost"]
+
+    @classmethod
+    def stream(
+        cls,
+        context: Optional[Dict] = None,
+        cancel_event: Optional[threading.Event] = None,
+        **config,
+    ) -> Iterator[str]:
+        """(Experimental) Stream the text of a completion in chunks as the backend produces it.
+
+        Streamed responses are not cached. A backend without a `stream` method yields the whole text of
+        `complete` as one chunk.
+
+        Args:
+            context (Optional, dict): The context to instantiate the prompt.
+            cancel_event (Optional, threading.Event): Stop streaming when this event is set.
+            **config: The configuration of the request, e.g. prompt, model, stop.
+
+        Yields:
+            str: The chunks of the text of the first choice.
+        """
+        prompt = cls.instantiate(config.pop("prompt", None), context) or ""
+        if hasattr(cls.backend, "stream"):
+            if cancel_event is None:
+                yield from cls.backend.stream(prompt, config)
+            else:
+                yield from cls.backend.stream(prompt, config, cancel_event=cancel_event)
+            return
+        response = cls._get_response(None, False, {**config, "prompt": prompt}, cancel_event)
+        yield cls.extract_text(response)[0]
+
+    @classmethod
+    def _create_fanout(
+        cls,
+        context: Optional[Dict],
+        use_cache: bool,
+        config_list: List[Dict],
+        order: List[int],
+        filter_func: Optional[Callable[[Dict, Dict], bool]],
+        fanout: int,
+        hedge_delay: Optional[float],
+        config: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        cancel_event = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=len(order))
+        futures = {}
+        queue = list(order)
+
+        def launch():
+            i = queue.pop(0)
+            each_config = config_list[i]
+            future = pool.submit(
+                cls._get_response, context, use_cache, {**config, **each_config}, cancel_event, each_config
+            )
+            futures[future] = i
+            return future
+
+        pending = {launch() for _ in range(min(fanout, len(queue)))}
+        # 已经返回的 response: config 的位置 -> (response, pass_filter)
+        results: Dict[int, Tuple[Dict[str, Any], bool]] = {}
+        last_checked = last_error = None
+        cost = 0
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=hedge_delay if queue else None, return_when=FIRST_COMPLETED)
+                if not done:
+                    # hedge: 在规定时间内没有合格的 response，启动下一个 config
+                    pending.add(launch())
+                    continue
+                for future in done:
+                    i = futures[future]
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        logger.warning("failed with config %d", i, exc_info=True)
+                        last_error = e
+                        continue
+                    cost += response["cost"]
+                    pass_filter = filter_func is None or filter_func(context=context, response=response)
+                    results[i], last_checked = (response, pass_filter), i
+                    if pass_filter:
+                        response["cost"] = cost
+                        response["config_id"] = i
+                        response["pass_filter"] = True
+                        return response
+                # 有 config 失败或未通过过滤时立即补上下一个
+                while queue and len(pending) < fanout:
+                    pending.add(launch())
+        finally:
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+        if not results:
+            raise last_error
+        # 没有 response 通过过滤时，与顺序尝试一样返回顺序上最后一个 config 的 response
+        i = max(results, key=order.index)
+        response, pass_filter = results[i]
+        if filter_func is not None and last_checked != i:
+            # 让有状态的 filter_func (例如 PassAssertionFilter) 的状态对应返回的 response
+            filter_func(context=context, response=response)
+        response["cost"] = cost
+        response["config_id"] = i
+        response["pass_filter"] = pass_filter
+        return response
+
+    @classmethod
+    def extract_text(cls, response: Dict[str, Any]) -> List[str]:
+        """Extract the text from a completion response.
+
+        Args:
+            response (dict): The response from `create`.
+
+        Returns:
+            A list of text in the responses.
+        """
+        choices = response["choices"]
+        if "text" in choices[0]:
+            return [choice["text"] for choice in choices]
+        return [choice["message"].get("content", "") for choice in choices]
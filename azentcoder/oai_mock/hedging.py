@@ -0,0 +1,115 @@
+import bisect
+import json
+import math
+import threading
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+__all__ = ("LatencyHistogram", "LatencyTracker", "LatencySummary")
+
+
+class LatencySummary(BaseModel):
+    """(Experimental) 一个 config 的延迟统计"""
+
+    count: int = Field(description="The number of recorded requests.")
+    p50: float = Field(description="The estimated median latency in seconds.")
+    p90: float = Field(description="The estimated 90th percentile latency in seconds.")
+    p99: float = Field(description="The estimated 99th percentile latency in seconds.")
+    max: float = Field(description="The largest recorded latency in seconds.")
+
+
+class LatencyHistogram:
+    """(Experimental) A latency histogram with exponentially growing buckets.
+
+    Args:
+        min_latency (float): The upper bound of the first bucket in seconds.
+        max_latency (float): Latencies above this go to the overflow bucket.
+        growth (float): The ratio between the bounds of two consecutive buckets.
+    """
+
+    def __init__(self, min_latency: float = 0.001, max_latency: float = 600.0, growth: float = 1.25):
+        num_buckets = int(math.ceil(math.log(max_latency / min_latency, growth))) + 1
+        self._bounds = [min_latency * growth**i for i in range(num_buckets)]
+        self._counts = [0] * (num_buckets + 1)
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self._bounds, latency)] += 1
+            self._count += 1
+            self._max = max(self._max, latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile as the upper bound of the bucket that contains it. None if empty."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            rank = q * self._count
+            seen = 0
+            for i, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank and count:
+                    return min(self._bounds[i], self._max) if i < len(self._bounds) else self._max
+            return self._max
+
+    def summary(self) -> LatencySummary:
+        return LatencySummary(
+            count=self._count,
+            p50=self.quantile(0.5) or 0.0,
+            p90=self.quantile(0.9) or 0.0,
+            p99=self.quantile(0.99) or 0.0,
+            max=self._max,
+        )
+
+
+class LatencyTracker:
+    """(Experimental) 按 config 记录延迟直方图，并据此调整 config 的尝试顺序"""
+
+    def __init__(self):
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def config_key(config: Dict[str, Any]) -> str:
+        return json.dumps(config, sort_keys=True, default=str)
+
+    def record(self, config: Dict[str, Any], latency: float) -> None:
+        key = self.config_key(config)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+        histogram.record(latency)
+
+    def histogram(self, config: Dict[str, Any]) -> Optional[LatencyHistogram]:
+        return self._histograms.get(self.config_key(config))
+
+    def order(self, config_list: List[Dict[str, Any]], q: float = 0.5) -> List[int]:
+        """Return the indices of the configs sorted by their observed q-quantile latency.
+
+        Configs without any recorded latency keep their original position relative to each other and are
+        tried first, so that every config gets measured.
+        """
+
+        def sort_key(i: int):
+            histogram = self.histogram(config_list[i])
+            latency = histogram.quantile(q) if histogram is not None else None
+            return (latency is not None, latency or 0.0, i)
+
+        return sorted(range(len(config_list)), key=sort_key)
+
+    def summary(self) -> Dict[str, LatencySummary]:
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {key: histogram.summary() for key, histogram in histograms.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
@@ -0,0 +1,35 @@
+import re
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+__all__ = ("count_token",)
+
+# 没有安装 tiktoken 时，按单词和标点近似计算 token 数
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_token(text: Optional[str], model: str = "gpt-3.5-turbo") -> int:
+    """Count the number of tokens used by a text.
+
+    Uses tiktoken when it is installed, otherwise an approximation based on words and punctuation.
+
+    Args:
+        text (str): The text to count.
+        model (str): The model whose tokenizer is used.
+
+    Returns:
+        int: The number of tokens.
+    """
+    if not text:
+        return 0
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return len(encoding.encode(text))
+    return len(_TOKEN_PATTERN.findall(text))
@@ -0,0 +1,71 @@
+"""静态超时 + 先进先出队列，与执行历史驱动的自适应超时 + 最短作业优先队列的周转时间对比
+
+    PYTHONPATH=. python benchmark/bench_adaptive_scheduling.py
+"""
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.history import ExecutionHistory, percentile
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.coding.server import Job, JobQueue
+
+NUM_WORKERS = 2
+# 代替 60 秒的默认超时，让基准测试在合理时间内结束
+STATIC_TIMEOUT = 10
+SHORT = "import time\ntime.sleep(0.05)\nprint('short')"
+LONG = "import time\nfor _ in range(10):\n    time.sleep(0.1)"
+# 和 LONG 形状相同，但是卡住了
+HUNG = "import time\nfor _ in range(10):\n    time.sleep(30)"
+# 长任务先到，短任务排在后面
+WORKLOAD = [HUNG, LONG, LONG] + [SHORT] * 8 + [LONG, HUNG, LONG] + [SHORT] * 10
+
+
+def run(history: Optional[ExecutionHistory]) -> List[float]:
+    queue = JobQueue(history=history)
+    finished: Dict[str, float] = {}
+
+    def work() -> None:
+        executor = LocalCommandLineCodeExecutor(timeout=STATIC_TIMEOUT, work_dir=tempfile.mkdtemp(), history=history)
+        while True:
+            job = queue.get(timeout=0.5)
+            if job is None:
+                return
+            executor.execute_code_blocks(job.code_blocks)
+            finished[job.job_id] = time.perf_counter()
+            queue.done(job)
+
+    jobs = [Job([CodeBlock(code=code, language="python")]) for code in WORKLOAD]
+    start = time.perf_counter()
+    for job in jobs:
+        queue.put(job)
+    workers = [threading.Thread(target=work) for _ in range(NUM_WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [finished[job.job_id] - start for job in jobs]
+
+
+def main() -> None:
+    history = ExecutionHistory(min_samples=3, min_timeout=1.0)
+    warmup = LocalCommandLineCodeExecutor(work_dir=tempfile.mkdtemp(), history=history)
+    for code in (SHORT, LONG):
+        for _ in range(3):
+            warmup.execute_code_blocks([CodeBlock(code=code, language="python")])
+
+    print(f"{len(WORKLOAD)} jobs, {NUM_WORKERS} workers, static timeout {STATIC_TIMEOUT}s")
+    print(f"{'scheduling':>28} {'p50 (s)':>8} {'p99 (s)':>8} {'makespan (s)':>13}")
+    for name, h in (("static timeout, FIFO", None), ("adaptive timeout, SJF", history)):
+        turnaround = run(h)
+        print(
+            f"{name:>28} {percentile(turnaround, 0.5):>8.2f} {percentile(turnaround, 0.99):>8.2f} "
+            f"{max(turnaround):>13.2f}"
+        )
+    print(f"hung block timeout from history: {history.timeout_for('python', HUNG, STATIC_TIMEOUT):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""CPU 密集的代码块在 agent 自身负载下的延迟抖动：不绑核，与 CpuSlotPool 保留核心并按槽位绑核对比
+
+    PYTHONPATH=. python benchmark/bench_cpu_affinity.py
+
+需要至少 3 个 CPU，CPU 更少时绑核没有可以隔离的核心。
+"""
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.cpu_affinity import CpuSlotPool, available_cpus
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+
+RUNS = 24
+CODE = "import time\nstart = time.perf_counter()\nsum(i * i for i in range(2_000_000))\nprint(time.perf_counter() - start)"
+
+
+def agent_load(stop: threading.Event) -> None:
+    # 模拟 agent 自己的事件循环和解析工作
+    while not stop.is_set():
+        sum(i for i in range(10_000))
+
+
+def run(pool: Optional[CpuSlotPool], concurrency: int) -> List[float]:
+    executor = LocalCommandLineCodeExecutor(work_dir=tempfile.mkdtemp(), cpu_pool=pool)
+    stop = threading.Event()
+    load = threading.Thread(target=agent_load, args=(stop,))
+    load.start()
+
+    def once(_) -> float:
+        result = executor.execute_code_blocks([CodeBlock(code=CODE, language="python")])
+        return float(result.output.strip())
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as threads:
+            return list(threads.map(once, range(RUNS)))
+    finally:
+        stop.set()
+        load.join()
+
+
+def main() -> None:
+    cpus = available_cpus()
+    print(f"{len(cpus)} CPUs, {RUNS} runs")
+    if len(cpus) < 3:
+        print("Fewer than 3 CPUs, pinning cannot isolate the agent from the code blocks.")
+    concurrency = max(1, len(cpus) - 1)
+    print(f"{'':>22} {'mean (s)':>9} {'stdev (s)':>10} {'max (s)':>8}")
+    # 先测不绑核的情况，绑核会改变整个进程的亲和性
+    for name, pinned in (("floating", False), ("pinned slots", True)):
+        pool = CpuSlotPool(reserved_cores=1, pin_agent=True) if pinned else None
+        latencies = run(pool, concurrency)
+        print(
+            f"{name:>22} {statistics.mean(latencies):>9.3f} {statistics.pstdev(latencies):>10.4f} "
+            f"{max(latencies):>8.3f}"
+        )
+        if pool is not None:
+            for stats in pool.stats():
+                cpu = "n/a" if stats.cpu_utilization is None else f"{stats.cpu_utilization:.0%}"
+                print(f"  slot {stats.index} cpus {stats.cpus}: {stats.runs} runs, held {stats.utilization:.0%}, cpu {cpu}")
+
+
+if __name__ == "__main__":
+    main()
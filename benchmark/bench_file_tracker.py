@@ -0,0 +1,65 @@
+"""一次运行只改动一个文件时，前后两次目录遍历、索引比较和 inotify 的耗时随目录大小的变化
+
+    python benchmark/bench_file_tracker.py
+"""
+import os
+import tempfile
+import time
+
+from azentcoder.coding.file_tracker import IndexFileTracker, InotifyFileTracker
+
+FILES_PER_DIR = 100
+
+
+def make_tree(root: str, num_files: int) -> None:
+    for i in range(num_files):
+        directory = os.path.join(root, f"d{i // FILES_PER_DIR}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"f{i}.txt"), "w") as f:
+            f.write("x")
+
+
+def naive_walk(root: str) -> dict:
+    return {
+        os.path.join(dirpath, name): os.stat(os.path.join(dirpath, name)).st_mtime_ns
+        for dirpath, _, names in os.walk(root)
+        for name in names
+    }
+
+
+def run(tracker_or_none, root: str, i: int) -> float:
+    start = time.perf_counter()
+    if tracker_or_none is None:
+        before = naive_walk(root)
+    else:
+        tracker_or_none.mark()
+    with open(os.path.join(root, f"new{i}.txt"), "w") as f:
+        f.write("new")
+    if tracker_or_none is None:
+        after = naive_walk(root)
+        changes = [path for path, mtime in after.items() if before.get(path) != mtime]
+    else:
+        changes = tracker_or_none.changes()
+    assert len(changes) == 1
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    print(f"{'files':>8} {'walk before/after':>18} {'index':>10} {'inotify':>10}")
+    for num_files in (1_000, 10_000, 50_000):
+        with tempfile.TemporaryDirectory() as root:
+            make_tree(root, num_files)
+            timings = []
+            for j, factory in enumerate((lambda: None, IndexFileTracker, InotifyFileTracker)):
+                # 在每种方式自己的运行之前创建，索引不会包含其它方式创建的文件
+                tracker = factory(root) if j else None
+                if tracker is not None:
+                    tracker.mark()
+                timings.append(min(run(tracker, root, j * 10 + k) for k in range(5)))
+                if tracker is not None:
+                    tracker.close()
+        print(f"{num_files:>8} " + " ".join(f"{t * 1000:>9.2f}ms" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""生成完整回复后再执行代码块，与边生成边执行代码块的端到端时间对比，使用 mock completion 后端模拟流式生成
+
+    PYTHONPATH=. python benchmark/bench_pipelined_agent.py
+"""
+import statistics
+import tempfile
+
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.developerchat.agent import LLMAgent
+from azentcoder.oai_mock import Completion, MockBackend
+
+RUNS = 5
+BLOCK = "```python\nimport time\ntime.sleep(0.2)\nprint({i})\n```\n"
+# 每个代码块前都有一段解释，和真实的回复类似
+STEP = "Step {i}: explain what the next block does in a sentence or two.\n"
+REPLY = "".join(STEP.format(i=i) + BLOCK.format(i=i) for i in range(4))
+FAILING = REPLY.replace("print(1)", "raise SystemExit(1)")
+
+
+def measure(reply: str, pipelined: bool):
+    # 约 50 token/s 的生成速度，首个 token 前有 0.3 秒延迟
+    backend = MockBackend(latency=0.3, responder=lambda *_: reply, stream_chunk_size=4, stream_interval=0.02)
+    Completion.set_backend(backend)
+    totals, generation = [], []
+    for _ in range(RUNS):
+        agent = LLMAgent(code_executor=LocalCommandLineCodeExecutor(work_dir=tempfile.mkdtemp()))
+        result = agent.run("Run the steps.", pipelined=pipelined)
+        totals.append(result.total_seconds)
+        generation.append(result.generation_seconds)
+    return statistics.mean(totals), statistics.mean(generation), result
+
+
+def main() -> None:
+    Completion.cache = None
+    print(f"{len(REPLY)} characters, 4 code blocks of 0.2s, {RUNS} runs")
+    print(f"{'':>40} {'total (s)':>10} {'generation (s)':>15} {'results':>8}")
+    for name, reply in (("all blocks succeed", REPLY), ("second block fails", FAILING)):
+        for pipelined in (False, True):
+            total, generation, result = measure(reply, pipelined)
+            mode = "pipelined" if pipelined else "sequential"
+            print(f"{name + ', ' + mode:>40} {total:>10.2f} {generation:>15.2f} {len(result.code_results):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""对比逐条 re.search 的旧实现与预编译的 CommandSanitizer 在大脚本上的耗时
+
+    python benchmark/bench_sanitizer.py
+"""
+import re
+import timeit
+
+from azentcoder.coding.sanitizer import DANGEROUS_SHELL_PATTERNS, CommandSanitizer
+
+NUMBER = 20
+
+
+def legacy_sanitize_command(lang: str, code: str) -> None:
+    dangerous_patterns = [(pattern, message) for _, pattern, message in DANGEROUS_SHELL_PATTERNS]
+    if lang in ["bash", "shell", "sh"]:
+        for pattern, message in dangerous_patterns:
+            if re.search(pattern, code):
+                raise ValueError(f"Potentially dangerous command detected: {message}")
+
+
+def make_shell_script(lines: int) -> str:
+    return "\n".join(f"echo line {i} >> out.txt && ls -la /tmp/dir{i} | grep foo" for i in range(lines))
+
+
+def make_python_script(functions: int) -> str:
+    body = "\n".join(
+        f"def f{i}(x):\n    import os\n    os.makedirs('out{i}', exist_ok=True)\n    return [x * j for j in range({i})]\n"
+        for i in range(functions)
+    )
+    return "import os\nimport subprocess\n" + body + "\nsubprocess.run(['ls', '-la'])\n"
+
+
+def bench(label: str, func) -> None:
+    seconds = timeit.timeit(func, number=NUMBER) / NUMBER
+    print(f"{label:<45} {seconds * 1000:9.3f} ms")
+
+
+def main() -> None:
+    for lines in (1_000, 10_000, 100_000):
+        script = make_shell_script(lines)
+        print(f"shell script, {lines} lines ({len(script) / 1024:.0f} KiB)")
+        bench("  legacy re.search per pattern", lambda: legacy_sanitize_command("sh", script))
+        bench("  combined matcher, uncached", lambda: CommandSanitizer(cache_size=1).check_shell(script))
+        sanitizer = CommandSanitizer()
+        sanitizer.check("sh", script)
+        bench("  combined matcher, cached verdict", lambda: sanitizer.check("sh", script))
+
+    for functions in (100, 1_000, 5_000):
+        script = make_python_script(functions)
+        print(f"python script, {functions} functions ({len(script) / 1024:.0f} KiB)")
+        bench("  AST checker, uncached", lambda: CommandSanitizer(cache_size=1).check_python(script))
+        sanitizer = CommandSanitizer()
+        sanitizer.check("python", script)
+        bench("  AST checker, cached verdict", lambda: sanitizer.check("python", script))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""SessionExecutor 在不同会话数下的吞吐量，与每个会话一个 LocalCommandLineCodeExecutor 串行执行对比
+
+    python benchmark/bench_session_executor.py
+"""
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.coding.session_executor import SessionExecutor
+from azentcoder.coding.workspace import WorkspaceManager
+
+BLOCKS_PER_SESSION = 8
+MAX_WORKERS = 8
+CODE = "import time\ntime.sleep(0.05)\nprint(sum(range(10000)))"
+
+
+def run_sequential(num_sessions: int) -> float:
+    manager = WorkspaceManager(tempfile.mkdtemp())
+    executors = [LocalCommandLineCodeExecutor(workspace_manager=manager) for _ in range(num_sessions)]
+    start = time.perf_counter()
+    for executor in executors:
+        for _ in range(BLOCKS_PER_SESSION):
+            executor.execute_code_blocks([CodeBlock(code=CODE, language="python")])
+    elapsed = time.perf_counter() - start
+    manager.close()
+    return elapsed
+
+
+def run_sessions(num_sessions: int) -> float:
+    with SessionExecutor(max_workers=MAX_WORKERS, workspace_manager=WorkspaceManager(tempfile.mkdtemp())) as executor:
+        sessions = [executor.open_session() for _ in range(num_sessions)]
+        start = time.perf_counter()
+
+        # 每个会话由自己的线程提交，模拟并发的 agent
+        def agent(session):
+            for _ in range(BLOCKS_PER_SESSION):
+                session.execute_code_blocks([CodeBlock(code=CODE, language="python")])
+
+        with ThreadPoolExecutor(max_workers=num_sessions) as agents:
+            list(agents.map(agent, sessions))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    print(f"{BLOCKS_PER_SESSION} blocks per session, {MAX_WORKERS} workers")
+    print(f"{'sessions':>8} {'sequential blocks/s':>20} {'SessionExecutor blocks/s':>25}")
+    for num_sessions in (1, 2, 4, 8, 16):
+        blocks = num_sessions * BLOCKS_PER_SESSION
+        sequential = blocks / run_sequential(num_sessions)
+        multiplexed = blocks / run_sessions(num_sessions)
+        print(f"{num_sessions:>8} {sequential:>20.1f} {multiplexed:>25.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/zideajang/aZentCoder",
-    packages=setuptools.find_packages(include=["azentcoder"],exclude=["test"]),
+    packages=setuptools.find_packages(include=["azentcoder*"],exclude=["test"]),
     python_requires=">=3.8,<3.13",
+    entry_points={"console_scripts": ["azentcoder=azentcoder.__main__:main"]},
 )
\ No newline at end of file
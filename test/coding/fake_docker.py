@@ -0,0 +1,180 @@
+"""A fake docker client for testing the docker code executors without a docker daemon.
+
+Commands passed to `exec_run` are run on the host with the working directory mapped from the
+container's `/workspace` bind mount.
+"""
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from docker.errors import APIError, ImageNotFound, NotFound
+
+
+class FakeExecResult:
+    def __init__(self, exit_code: int, output: bytes):
+        self.exit_code = exit_code
+        self.output = output
+
+
+class FakeContainer:
+    def __init__(self, client: "FakeDockerClient", image: str, name: Optional[str] = None, **kwargs):
+        self.client = client
+        self.image = image
+        self.name = name
+        self.kwargs = kwargs
+        self.status = "created"
+        self.attrs: Dict[str, Any] = {"State": {"ExitCode": 0, "OOMKilled": False}}
+        self.exec_calls: List[Dict[str, Any]] = []
+        self.restarts = 0
+        self.commits: List[Dict[str, Any]] = []
+        self.updates: List[Dict[str, Any]] = []
+        # 容器日志，(流, 内容) 按写入的顺序
+        self.log_chunks: List[Tuple[str, bytes]] = []
+
+    @property
+    def host_workspace(self) -> Optional[str]:
+        for host, bind in (self.kwargs.get("volumes") or {}).items():
+            if bind["bind"] == "/workspace":
+                return host
+        return None
+
+    def start(self) -> None:
+        self.status = "running"
+
+    def reload(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        self.status = "exited"
+
+    def restart(self) -> None:
+        self.restarts += 1
+        self.status = "running"
+
+    def update(self, **kwargs) -> None:
+        self.updates.append(kwargs)
+        self.kwargs.update(kwargs)
+
+    def remove(self) -> None:
+        self.client.containers.removed.append(self)
+
+    def commit(self, repository: str, tag: str) -> None:
+        self.commits.append({"repository": repository, "tag": tag})
+        self.client.images.available.add(f"{repository}:{tag}")
+
+    def wait(self) -> Dict[str, int]:
+        return {"StatusCode": self.attrs["State"]["ExitCode"]}
+
+    def logs(self, stdout: bool = True, stderr: bool = True, **kwargs) -> bytes:
+        streams = {"stdout"} if stdout else set()
+        streams |= {"stderr"} if stderr else set()
+        return b"".join(chunk for stream, chunk in self.log_chunks if stream in streams)
+
+    def stats(self, stream: bool = True, **kwargs) -> Dict[str, Any]:
+        # client.stats_handler(container) 返回一次采样，默认没有统计
+        if self.client.stats_handler is not None:
+            return self.client.stats_handler(self)
+        return {}
+
+    def exec_run(self, cmd, **kwargs) -> FakeExecResult:
+        self.exec_calls.append({"cmd": cmd, **kwargs})
+        if self.client.exec_handler is not None:
+            result = self.client.exec_handler(self, cmd, kwargs)
+            if result is not None:
+                return result
+        workdir = kwargs.get("workdir") or "/workspace"
+        host = self.host_workspace
+        cwd = workdir.replace("/workspace", host, 1) if host is not None else None
+        args = [arg.replace("/workspace", host, 1) if host is not None else arg for arg in cmd]
+        result = subprocess.run(args, cwd=cwd, env=kwargs.get("environment"), capture_output=True)
+        if kwargs.get("demux"):
+            # 和 docker 一样，没有输出的流为 None
+            return FakeExecResult(result.returncode, (result.stdout or None, result.stderr or None))
+        return FakeExecResult(result.returncode, result.stdout + result.stderr)
+
+
+class FakeImage:
+    def __init__(self, name: str, image_id: str):
+        self.id = image_id
+        self.tags = [name]
+        self.attrs = {"Id": image_id}
+
+
+class FakeImages:
+    def __init__(self, available, pull_delay: float = 0.0):
+        self.available = set(available)
+        self.pulled: List[str] = []
+        self.gets: List[str] = []
+        # 覆盖镜像的 ID，模拟重新打标签
+        self.ids: Dict[str, str] = {}
+        self.pull_delay = pull_delay
+        self.unpullable: set = set()
+
+    def get(self, name: str) -> FakeImage:
+        self.gets.append(name)
+        if name not in self.available:
+            raise ImageNotFound(name)
+        return FakeImage(name, self.ids.get(name, f"sha256:{abs(hash(name)):x}"))
+
+    def pull(self, name: str) -> FakeImage:
+        time.sleep(self.pull_delay)
+        if name in self.unpullable:
+            raise APIError(f"pull access denied for {name}")
+        self.pulled.append(name)
+        self.available.add(name)
+        return self.get(name)
+
+
+class FakeContainers:
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+        self.created: List[FakeContainer] = []
+        self.removed: List[FakeContainer] = []
+
+    def create(self, image: str, name: Optional[str] = None, **kwargs) -> FakeContainer:
+        if not self.client.healthy:
+            from docker.errors import DockerException
+
+            raise DockerException("daemon is not responding")
+        container = FakeContainer(self.client, image, name=name, **kwargs)
+        self.created.append(container)
+        return container
+
+    def run(self, image: str, command=None, detach: bool = False, **kwargs) -> FakeContainer:
+        container = self.create(image, command=command, **kwargs)
+        container.status = "exited"
+        return container
+
+    def get(self, name: str) -> FakeContainer:
+        for container in self.created:
+            if container.name == name:
+                return container
+        raise NotFound(name)
+
+
+class FakeDockerClient:
+    def __init__(
+        self,
+        images=("python:3-slim",),
+        exec_handler: Optional[Callable] = None,
+        stats_handler: Optional[Callable] = None,
+        mem_total: int = 8 * 1024**3,
+        ncpu: int = 8,
+    ):
+        self.images = FakeImages(images)
+        self.containers = FakeContainers(self)
+        self.exec_handler = exec_handler
+        self.stats_handler = stats_handler
+        self.mem_total = mem_total
+        self.ncpu = ncpu
+        self.healthy = True
+
+    def info(self) -> Dict[str, Any]:
+        return {"MemTotal": self.mem_total, "NCPU": self.ncpu}
+
+    def ping(self) -> bool:
+        if not self.healthy:
+            from docker.errors import DockerException
+
+            raise DockerException("daemon is not responding")
+        return True
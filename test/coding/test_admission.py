@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from azentcoder.coding.admission import AdmissionController, AdmissionRejected, HostSignals, read_host_signals
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.coding.session_executor import SessionExecutor
+from azentcoder.coding.workspace import WorkspaceManager
+
+
+class FakeSignalsController(AdmissionController):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.signals = HostSignals(load_per_cpu=0.1, available_memory_bytes=8 << 30)
+
+    def _read_signals(self) -> HostSignals:
+        return self.signals
+
+
+# 记录同时运行的代码块数量
+COUNT_RUNNING = """
+import os, time
+marker = f"{os.getpid()}.run"
+open(marker, "w").close()
+print(len([f for f in os.listdir(".") if f.endswith(".run")]))
+time.sleep(0.2)
+os.remove(marker)
+"""
+
+
+def test_global_cap_and_fifo_order() -> None:
+    controller = AdmissionController(max_concurrent=2)
+    controller.acquire()
+    controller.acquire()
+    assert controller.stats().running == 2
+
+    order = []
+
+    def waiter(name):
+        controller.acquire()
+        order.append(name)
+
+    threads = [threading.Thread(target=waiter, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    assert controller.stats().queued == 2
+    controller.release()
+    controller.release()
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1]
+
+    stats = controller.stats()
+    assert stats.running == 2 and stats.queued == 0 and stats.admitted == 4
+    assert stats.wait_max_seconds > 0.04 and stats.wait_p50_seconds <= stats.wait_p99_seconds
+
+
+def test_tenant_cap_does_not_block_other_tenants() -> None:
+    controller = AdmissionController(max_concurrent=4, tenant_limits={"a": 1})
+    controller.acquire("a")
+    blocked = threading.Thread(target=controller.acquire, args=("a",))
+    blocked.start()
+    time.sleep(0.05)
+    # 租户 b 不受排在前面的租户 a 影响
+    assert controller.acquire("b", timeout=0.5) < 0.5
+    stats = controller.stats()
+    assert stats.running_by_tenant == {"a": 1, "b": 1} and stats.queued_by_tenant == {"a": 1}
+    controller.release("a")
+    blocked.join()
+    assert controller.stats().running_by_tenant == {"a": 1, "b": 1}
+
+
+def test_fail_fast_when_queue_is_full() -> None:
+    controller = AdmissionController(max_concurrent=1, max_queued=0)
+    controller.acquire()
+    start = time.perf_counter()
+    with pytest.raises(AdmissionRejected, match="queue is full"):
+        controller.acquire()
+    assert time.perf_counter() - start < 0.1
+    controller.release()
+    controller.acquire()
+    assert controller.stats().rejected == 1
+
+
+def test_queue_timeout() -> None:
+    controller = AdmissionController(max_concurrent=1, queue_timeout=0.1)
+    with controller.admit():
+        with pytest.raises(AdmissionRejected, match="within"):
+            controller.acquire()
+    assert controller.stats().queued == 0
+
+
+def test_host_load_holds_back_admissions() -> None:
+    controller = FakeSignalsController(max_concurrent=4, max_load_per_cpu=1.0, signal_interval=0.01)
+    controller.signals = HostSignals(load_per_cpu=3.0)
+    # 没有运行中的执行时总是准入，避免因为其他进程的负载而死锁
+    controller.acquire()
+    with pytest.raises(AdmissionRejected):
+        controller.acquire(timeout=0.1)
+    assert controller.stats().throttled > 0
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(controller.acquire(timeout=5)))
+    thread.start()
+    time.sleep(0.05)
+    controller.signals = HostSignals(load_per_cpu=0.5)
+    thread.join()
+    assert result and controller.stats().running == 2
+
+
+def test_low_memory_holds_back_admissions() -> None:
+    controller = FakeSignalsController(max_concurrent=4, min_available_memory=1 << 30, signal_interval=0.01)
+    controller.signals = HostSignals(available_memory_bytes=100 << 20)
+    controller.acquire()
+    with pytest.raises(AdmissionRejected):
+        controller.acquire(timeout=0.1)
+    assert controller.stats().signals.available_memory_bytes == 100 << 20
+
+
+def test_read_host_signals() -> None:
+    signals = read_host_signals()
+    assert signals.load_per_cpu is None or signals.load_per_cpu >= 0
+
+
+def test_executors_share_a_controller(tmp_path) -> None:
+    controller = AdmissionController(max_concurrent=1)
+    executors = [
+        LocalCommandLineCodeExecutor(work_dir=tmp_path, admission=controller, tenant=f"t{i}") for i in range(3)
+    ]
+    results = []
+
+    def run(executor):
+        results.append(executor.execute_code_blocks([CodeBlock(code=COUNT_RUNNING, language="python")]))
+
+    threads = [threading.Thread(target=run, args=(executor,)) for executor in executors]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 同一时间只有一个代码块在运行
+    assert [r.output.strip() for r in results] == ["1", "1", "1"]
+    stats = controller.stats()
+    assert stats.admitted == 3 and stats.running == 0 and stats.wait_max_seconds > 0.2
+
+
+def test_session_executor_admission(tmp_path) -> None:
+    controller = AdmissionController(max_concurrent=1, max_queued=0)
+    with SessionExecutor(max_workers=4, workspace_manager=WorkspaceManager(tmp_path), admission=controller) as executor:
+        slow_block = CodeBlock(code="import time\ntime.sleep(0.5)", language="python")
+        slow = executor.open_session(tenant="a").submit([slow_block])
+        time.sleep(0.2)
+        with pytest.raises(AdmissionRejected):
+            executor.open_session(tenant="b").execute_code_blocks([CodeBlock(code="print(1)", language="python")])
+        assert slow.result().exit_code == 0
+    assert controller.stats().rejected == 1
@@ -0,0 +1,102 @@
+import json
+import time
+
+import pytest
+
+from azentcoder.coding.base import CodeBlock, CodeResult
+from azentcoder.coding.cassette import CassetteExecutor, CassetteMiss, cassette_key
+from azentcoder.coding.local_commandline_code_executor import CommandLineCodeResult, LocalCommandLineCodeExecutor
+
+SLOW = [CodeBlock(code="import time\ntime.sleep(0.3)\nprint('slow')", language="python")]
+FAILING = [CodeBlock(code="print('before')", language="python"), CodeBlock(code="1 / 0", language="python")]
+
+
+class CountingExecutor(LocalCommandLineCodeExecutor):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def execute_code_blocks(self, code_blocks):
+        self.calls += 1
+        return super().execute_code_blocks(code_blocks)
+
+
+def test_record_then_replay(tmp_path) -> None:
+    cassette = tmp_path / "executions.jsonl"
+    recorder = CassetteExecutor(cassette, CountingExecutor(work_dir=tmp_path), mode="record")
+    recorded = [recorder.execute_code_blocks(SLOW), recorder.execute_code_blocks(FAILING)]
+    assert recorder.num_recorded == 2 and len(cassette.read_text().splitlines()) == 2
+
+    replayer = CassetteExecutor(cassette, mode="replay")
+    start = time.perf_counter()
+    replayed = [replayer.execute_code_blocks(SLOW), replayer.execute_code_blocks(FAILING)]
+    assert time.perf_counter() - start < 0.05
+    assert replayed == recorded and all(type(r) is CommandLineCodeResult for r in replayed)
+    assert replayed[1].exit_code == 1 and replayed[1].error.exception_type == "ZeroDivisionError"
+    assert replayer.num_replayed == 2 and len(replayer) == 2
+
+    with pytest.raises(CassetteMiss):
+        replayer.execute_code_blocks([CodeBlock(code="print('new')", language="python")])
+
+
+def test_replay_latency(tmp_path) -> None:
+    cassette = tmp_path / "executions.jsonl"
+    CassetteExecutor(cassette, LocalCommandLineCodeExecutor(work_dir=tmp_path)).execute_code_blocks(SLOW)
+    seconds = json.loads(cassette.read_text())["seconds"]
+    assert seconds >= 0.3
+
+    replayer = CassetteExecutor(cassette, mode="replay", replay_latency=True)
+    start = time.perf_counter()
+    assert replayer.execute_code_blocks(SLOW).output.strip() == "slow"
+    assert time.perf_counter() - start >= seconds
+
+
+def test_once_records_only_new_executions(tmp_path) -> None:
+    cassette = tmp_path / "executions.jsonl"
+    code = "import os\nn = len(os.listdir('marks'))\nopen(f'marks/{n}', 'w').close()\nprint(n)"
+    counter = [CodeBlock(code=code, language="python")]
+    (tmp_path / "marks").mkdir()
+    executor = CountingExecutor(work_dir=tmp_path)
+    first = CassetteExecutor(cassette, executor)
+    assert first.execute_code_blocks(counter).output.strip() == "0"
+    # 相同的代码块重复执行时回放最后一次记录
+    assert first.execute_code_blocks(counter).output.strip() == "0"
+    assert executor.calls == 1
+
+    second = CassetteExecutor(cassette, executor)
+    assert second.execute_code_blocks(counter).output.strip() == "0"
+    second.execute_code_blocks(SLOW)
+    assert executor.calls == 2 and second.num_recorded == 1 and len(second) == 2
+
+
+def test_replay_keeps_the_order_of_repeated_executions(tmp_path) -> None:
+    cassette = tmp_path / "executions.jsonl"
+    block = [CodeBlock(code="x", language="python")]
+    lines = [
+        {"key": cassette_key(block), "code_blocks": [b.model_dump() for b in block], "result_type": t, "result": r}
+        for t, r in [
+            ("azentcoder.coding.base:CodeResult", {"exit_code": 1, "output": "first"}),
+            ("no.such.module:Result", {"exit_code": 0, "output": "second"}),
+            # 不是 CodeResult 的类型不会被导入或者调用
+            ("subprocess:Popen", {"exit_code": 0, "output": "third"}),
+        ]
+    ]
+    for line in lines:
+        line["seconds"] = 0.1
+    cassette.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    replayer = CassetteExecutor(cassette, mode="replay")
+    outputs = [replayer.execute_code_blocks(block).output for _ in range(4)]
+    assert outputs == ["first", "second", "third", "third"]
+    # 未知的结果类型回放为 CodeResult
+    assert type(replayer.execute_code_blocks(block)) is CodeResult
+    replayer.restart()
+    assert replayer.execute_code_blocks(block).output == "first"
+
+
+def test_modes(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        CassetteExecutor(tmp_path / "c.jsonl", mode="record")
+    with pytest.raises(ValueError):
+        CassetteExecutor(tmp_path / "c.jsonl", LocalCommandLineCodeExecutor(work_dir=tmp_path), mode="rewind")
+    replayer = CassetteExecutor(tmp_path / "missing.jsonl", mode="replay")
+    assert len(replayer) == 0 and replayer.code_extractor.extract_code_blocks("```python\nx\n```")
@@ -0,0 +1,99 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from fake_docker import FakeDockerClient
+
+from azentcoder.code_utils import execute_code
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.cpu_affinity import CpuSlotPool, available_cpus, pin_process
+from azentcoder.coding.docker_commandline_code_executor import DockerCommandLineCodeExecutor
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+
+requires_affinity = pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="no sched_setaffinity")
+
+
+def test_slots_and_reserved_cores() -> None:
+    pool = CpuSlotPool(cores_per_slot=2, reserved_cores=1, cpus=list(range(8)))
+    assert pool.reserved == [0]
+    # 除不尽的 CPU 分给最后一个槽位
+    assert [slot.cpus for slot in pool.slots] == [[1, 2], [3, 4], [5, 6, 7]]
+    assert pool.slots[2].cpuset == "5,6,7"
+
+    # CPU 不够时不保留
+    pool = CpuSlotPool(cores_per_slot=1, reserved_cores=1, cpus=[0])
+    assert pool.reserved == [] and [slot.cpus for slot in pool.slots] == [[0]]
+
+    with pytest.raises(ValueError):
+        CpuSlotPool(cores_per_slot=0)
+
+
+def test_acquire_release_and_stats() -> None:
+    pool = CpuSlotPool(reserved_cores=0, cpus=[0, 1])
+    first, second = pool.acquire(), pool.acquire()
+    assert {first.index, second.index} == {0, 1}
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.05)
+    pool.release(first)
+    with pool.slot(timeout=1) as slot:
+        assert slot is first
+    pool.release(second)
+
+    stats = pool.stats()
+    assert [s.runs for s in stats] == [2, 1]
+    assert all(0 < s.utilization <= 1 and s.busy_seconds > 0 for s in stats)
+    assert stats[1].busy_seconds >= 0.05
+
+
+@requires_affinity
+def test_execute_code_pins_subprocess(tmp_path) -> None:
+    cpu = available_cpus()[-1]
+    code = "import os\nprint(sorted(os.sched_getaffinity(0)))"
+    exit_code, logs, _ = execute_code(code, work_dir=str(tmp_path), use_docker=False, cpus=[cpu])
+    assert exit_code == 0 and logs.strip() == f"[{cpu}]"
+
+    # 子进程在执行前就固定到 CPU 上，不依赖 Popen 之后的 set_affinity
+    with patch("azentcoder.coding.cpu_affinity.set_affinity", side_effect=AssertionError("pinned after Popen")):
+        exit_code, logs, _ = execute_code(code, work_dir=str(tmp_path), use_docker=False, cpus=[cpu])
+    assert exit_code == 0 and logs.strip() == f"[{cpu}]"
+
+
+@requires_affinity
+def test_local_executor_runs_on_slot(tmp_path) -> None:
+    pool = CpuSlotPool(reserved_cores=0, cpus=available_cpus()[-1:])
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, cpu_pool=pool)
+    result = executor.execute_code_blocks(
+        [CodeBlock(code="import os\nprint(sorted(os.sched_getaffinity(0)))", language="python")]
+    )
+    assert result.exit_code == 0 and result.output.strip() == str(pool.slots[0].cpus)
+    (stats,) = pool.stats()
+    assert stats.runs == 1
+    assert stats.cpu_utilization is None or 0 <= stats.cpu_utilization <= 1
+
+
+@requires_affinity
+def test_pin_process() -> None:
+    cpus = available_cpus()
+    assert pin_process(cpus)
+    assert sorted(os.sched_getaffinity(0)) == cpus
+
+
+def test_docker_executor_updates_cpuset(tmp_path) -> None:
+    client = FakeDockerClient()
+    pool = CpuSlotPool(cores_per_slot=2, reserved_cores=1, cpus=[0, 1, 2, 3, 4])
+    with patch("docker.from_env", return_value=client):
+        executor = DockerCommandLineCodeExecutor(work_dir=tmp_path, cpu_pool=pool, stop_container=False)
+        held = pool.acquire()
+        result = executor.execute_code_blocks([CodeBlock(code="echo hi", language="sh")])
+        assert result.exit_code == 0
+        (container,) = client.containers.created
+        other = [slot for slot in pool.slots if slot is not held][0]
+        # 释放 slot 时恢复为 daemon 的全部 CPU
+        assert container.updates == [{"cpuset_cpus": other.cpuset}, {"cpuset_cpus": "0-7"}]
+
+        # 创建时指定的 cpuset 也会被恢复
+        container.attrs["HostConfig"] = {"CpusetCpus": "0-3"}
+        executor._original_cpuset = None
+        pool.release(held)
+        executor.execute_code_blocks([CodeBlock(code="echo hi", language="sh")])
+    assert container.updates[-1] == {"cpuset_cpus": "0-3"}
@@ -0,0 +1,107 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from fake_docker import FakeDockerClient, FakeExecResult
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.dependency_manager import DependencyManager, scan_code_blocks
+from azentcoder.coding.docker_commandline_code_executor import DockerCommandLineCodeExecutor
+
+
+def make_wheelhouse(path, *names):
+    path.mkdir(exist_ok=True)
+    for name in names:
+        (path / name).write_bytes(b"")
+    return path
+
+
+def test_scan_code_blocks(tmp_path) -> None:
+    (tmp_path / "helpers.py").write_text("")
+    code_blocks = [
+        CodeBlock(code="import os\nimport numpy as np\nfrom sklearn.linear_model import X\nimport helpers", language="python"),
+        CodeBlock(code="from PIL import Image\nfrom . import local", language="python"),
+        CodeBlock(code="pip install -q requests==2.31 'pandas>=2' -r requirements.txt && echo done", language="sh"),
+        CodeBlock(code="python -m pip install --upgrade Flask_Login\nls", language="bash"),
+    ]
+    scanned = scan_code_blocks(code_blocks, work_dir=tmp_path)
+    assert scanned["imports"] == ["numpy", "pillow", "scikit-learn"]
+    assert scanned["pip"] == ["flask-login", "pandas", "requests"]
+
+
+def test_offline_wheelhouse(tmp_path) -> None:
+    wheelhouse = make_wheelhouse(tmp_path / "wheels", "numpy-1.26.0-cp311-cp311-linux_x86_64.whl", "Flask_Login-0.6.3.tar.gz")
+    manager = DependencyManager(wheelhouse, offline=True)
+    assert manager.available_packages() == {"numpy", "flask-login"}
+    with patch("subprocess.run") as run:
+        assert manager.ensure_wheels(["numpy", "requests"]) == ["requests"]
+        run.assert_not_called()
+    assert manager.environment()["PIP_NO_INDEX"] == "1"
+    assert manager.volumes() == {str(wheelhouse.resolve()): {"bind": "/wheelhouse", "mode": "ro"}}
+    assert DependencyManager(wheelhouse).offline
+
+
+def test_downloads_only_allowed_wheels(tmp_path) -> None:
+    wheelhouse = make_wheelhouse(tmp_path / "wheels")
+    with pytest.raises(ValueError):
+        DependencyManager(wheelhouse, offline=False)
+
+    manager = DependencyManager(wheelhouse, offline=False, allowed_packages=["Requests"])
+    with patch("subprocess.run") as run:
+        # google.cloud 的 import 名猜出的 "google" 不在允许列表中
+        assert manager.ensure_wheels(["requests", "google"]) == ["google", "requests"]
+    command = run.call_args.args[0]
+    assert "--only-binary=:all:" in command and command[-1] == "requests" and "google" not in command
+
+
+def test_prewarm_installs_missing_imports(tmp_path) -> None:
+    wheelhouse = make_wheelhouse(tmp_path / "wheels", "numpy-1.26.0-py3-none-any.whl", "pyyaml-6.0-py3-none-any.whl")
+
+    def exec_handler(container, cmd, kwargs):
+        if cmd[:2] == ["python", "-c"]:
+            # pyyaml is already installed in the container
+            return FakeExecResult(0, json.dumps(["PyYAML"]).encode())
+        return FakeExecResult(0, b"")
+
+    client = FakeDockerClient(exec_handler=exec_handler)
+    container = client.containers.create("python:3-slim")
+    manager = DependencyManager(wheelhouse, offline=True)
+    manager._state["install_seconds"]["pyyaml"] = 2.0
+    manager.prewarm(container, [CodeBlock(code="import numpy, yaml, missing_pkg", language="python")])
+
+    install = container.exec_calls[-1]["cmd"]
+    assert install[:4] == ["python", "-m", "pip", "install"] and install[-1] == "numpy"
+    report = manager.report
+    assert report.packages_prewarmed == 1 and report.seconds_saved == 2.0
+
+    state = json.loads((wheelhouse / ".azentcoder-deps.json").read_text())
+    assert state["usage"] == {"missing-pkg": 1, "numpy": 1, "pyyaml": 1}
+
+
+def test_bake_and_resolve_image(tmp_path) -> None:
+    wheelhouse = make_wheelhouse(tmp_path / "wheels", "numpy-1.26.0-py3-none-any.whl")
+    manager = DependencyManager(wheelhouse, offline=True, bake_threshold=2)
+    client = FakeDockerClient()
+    assert manager.resolve_image(client, "python:3-slim") == "python:3-slim"
+
+    manager._record_usage(["numpy"])
+    manager._record_usage(["numpy"])
+    tag = manager.bake_image(client, "python:3-slim")
+    assert tag is not None and tag.startswith("azentcoder-deps:")
+    assert manager.resolve_image(client, "python:3-slim") == tag
+    assert manager.report.images_baked == [tag]
+
+
+def test_docker_executor_mounts_wheelhouse(tmp_path) -> None:
+    wheelhouse = make_wheelhouse(tmp_path / "wheels")
+    manager = DependencyManager(wheelhouse, offline=True)
+    client = FakeDockerClient()
+    with patch("docker.from_env", return_value=client):
+        executor = DockerCommandLineCodeExecutor(work_dir=tmp_path, stop_container=False, dependency_manager=manager)
+    container = client.containers.created[0]
+    assert container.kwargs["volumes"][str(wheelhouse.resolve())]["bind"] == "/wheelhouse"
+    assert container.kwargs["environment"]["PIP_FIND_LINKS"] == "/wheelhouse"
+
+    result = executor.execute_code_blocks([CodeBlock(code="print('hello')", language="python")])
+    assert result.exit_code == 0 and "hello" in result.output
@@ -0,0 +1,139 @@
+from unittest.mock import patch
+
+import pytest
+from docker.errors import ImageNotFound
+from fake_docker import FakeDockerClient, FakeExecResult
+
+from azentcoder.code_utils import run_code
+from azentcoder.coding.docker_backend import DockerEndpoint, NoHealthyEndpoint, ShardedDockerBackend
+from azentcoder.coding.docker_commandline_code_executor import FAST_RESET_COMMAND, DockerCommandLineCodeExecutor
+
+
+def exec_handler(container, cmd, kwargs):
+    # 不能在宿主机上执行 kill -9 -1
+    if cmd == FAST_RESET_COMMAND:
+        return FakeExecResult(0, b"")
+    return None
+
+
+def make_backend(n=3, **kwargs):
+    clients = [FakeDockerClient(exec_handler=exec_handler) for _ in range(n)]
+    return clients, ShardedDockerBackend(clients, health_check_interval=None, **kwargs)
+
+
+def test_least_loaded_placement() -> None:
+    clients, backend = make_backend(capacity=2)
+    placed = [backend.place() for _ in range(6)]
+    assert sorted(endpoint.name for endpoint in placed) == sorted(["endpoint-0", "endpoint-1", "endpoint-2"] * 2)
+    with pytest.raises(NoHealthyEndpoint):
+        backend.place()
+    backend.release(placed[0])
+    assert backend.place() is placed[0]
+
+    stats = {s.name: s for s in backend.stats()}
+    assert all(s.active == 2 and s.capacity == 2 for s in stats.values())
+    assert stats[placed[0].name].placements == 3
+
+
+def test_consistent_hash_is_session_sticky() -> None:
+    clients, backend = make_backend(n=4, placement="consistent_hash")
+    owners = {}
+    for session in map(str, range(200)):
+        endpoint = backend.place(session)
+        owners[session] = endpoint
+        backend.release(endpoint)
+        assert backend.place(session) is endpoint
+        backend.release(endpoint)
+    # 虚拟节点让会话均匀分布
+    assert all(20 < list(owners.values()).count(endpoint) < 80 for endpoint in backend.endpoints)
+
+    # 一个 endpoint 不可用时只有它的会话移动
+    failed = backend.endpoints[0]
+    backend.mark_unhealthy(failed, RuntimeError("down"))
+    for session, owner in owners.items():
+        endpoint = backend.place(session)
+        backend.release(endpoint)
+        assert endpoint is not failed and (owner is failed or endpoint is owner)
+
+
+def test_health_checks() -> None:
+    clients, backend = make_backend(n=2)
+    clients[1].healthy = False
+    assert backend.check_health() == {"endpoint-0": True, "endpoint-1": False}
+    assert [backend.place().name for _ in range(3)] == ["endpoint-0"] * 3
+    stats = backend.stats()
+    assert stats[1].failures == 1 and "not responding" in stats[1].last_error
+    assert stats[0].ping_p50_seconds >= 0 and stats[0].ping_p99_seconds >= stats[0].ping_p50_seconds
+
+    clients[1].healthy = True
+    with backend:
+        assert backend.stats()[1].healthy
+    assert backend.place().name == "endpoint-1"
+
+
+def test_acquire_fails_over() -> None:
+    clients, backend = make_backend(n=2, placement="consistent_hash")
+    owner = backend.place("session")
+    backend.release(owner)
+    other = next(endpoint for endpoint in backend.endpoints if endpoint is not owner)
+    owner.client.healthy = False
+
+    endpoint, container = backend.acquire(lambda client: client.containers.create("python:3-slim"), key="session")
+    assert endpoint is other and container in other.client.containers.created
+    assert not owner.healthy and owner.active == 0 and other.active == 1
+    assert backend.stats()[backend.endpoints.index(other)].start_p50_seconds > 0
+
+    # 请求本身的错误不切换 endpoint
+    def missing_image(client):
+        raise ImageNotFound("no such image")
+
+    with pytest.raises(ImageNotFound):
+        backend.acquire(missing_image)
+    assert other.healthy and other.active == 1
+
+    other.client.healthy = False
+    with pytest.raises(NoHealthyEndpoint):
+        backend.acquire(lambda client: client.containers.create("python:3-slim"))
+
+
+def test_endpoints() -> None:
+    client = FakeDockerClient()
+    backend = ShardedDockerBackend([DockerEndpoint("local", client=client, capacity=1), "tcp://10.0.0.2:2376"])
+    assert [(endpoint.name, endpoint.capacity) for endpoint in backend.endpoints] == [
+        ("local", 1),
+        ("tcp://10.0.0.2:2376", 8),
+    ]
+    with pytest.raises(ValueError):
+        ShardedDockerBackend([client, client], placement="random")
+    with pytest.raises(ValueError):
+        ShardedDockerBackend([DockerEndpoint("a", client=client), DockerEndpoint("a", client=client)])
+
+
+def test_executor_on_backend(tmp_path) -> None:
+    clients, backend = make_backend(n=2, placement="consistent_hash")
+    executor = DockerCommandLineCodeExecutor(
+        work_dir=tmp_path, stop_container=False, docker_backend=backend, session_id="session"
+    )
+    endpoint = executor.endpoint
+    assert endpoint.active == 1 and len(endpoint.client.containers.created) == 1
+
+    endpoint.client.healthy = False
+    backend.check_health()
+    executor.restart()
+    assert executor.last_reset.mode == "failover" and endpoint.name in executor.last_reset.fallback_reason
+    assert executor.endpoint is not endpoint and endpoint.active == 0 and executor.endpoint.active == 1
+    assert len(executor.endpoint.client.containers.created) == 1
+
+    executor.stop()
+    assert executor.endpoint is None and all(s.active == 0 for s in backend.stats())
+
+
+def test_run_code_on_backend(tmp_path) -> None:
+    clients, backend = make_backend(n=2)
+    clients[0].healthy = False
+    with patch("azentcoder.code_utils.in_docker_container", return_value=False):
+        with patch("azentcoder.code_utils.is_docker_running", side_effect=AssertionError("local docker")):
+            status = run_code("print('hi')", work_dir=str(tmp_path), use_docker=True, docker_backend=backend)
+    assert status.exit_code == 0
+    assert not clients[0].containers.created and len(clients[1].containers.created) == 1
+    assert all(s.active == 0 for s in backend.stats()) and not backend.stats()[0].healthy
@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+from fake_docker import FakeDockerClient, FakeExecResult
+
+from azentcoder.coding.docker_commandline_code_executor import FAST_RESET_COMMAND, DockerCommandLineCodeExecutor
+
+
+def make_executor(tmp_path, reset_exit_code=0, **kwargs):
+    def exec_handler(container, cmd, kwargs):
+        # 不能在宿主机上执行 kill -9 -1
+        if cmd == FAST_RESET_COMMAND:
+            return FakeExecResult(reset_exit_code, b"")
+        return None
+
+    client = FakeDockerClient(exec_handler=exec_handler)
+    with patch("docker.from_env", return_value=client):
+        executor = DockerCommandLineCodeExecutor(work_dir=tmp_path, stop_container=False, **kwargs)
+    return executor, client.containers.created[0]
+
+
+def test_fast_reset(tmp_path) -> None:
+    (tmp_path / "input.txt").write_text("baseline")
+    executor, container = make_executor(tmp_path, reset_workspace=True)
+    (tmp_path / "input.txt").write_text("modified")
+    (tmp_path / "output.txt").write_text("generated")
+
+    executor.restart()
+    assert container.restarts == 0
+    assert container.exec_calls[-1]["cmd"] == FAST_RESET_COMMAND
+    report = executor.last_reset
+    assert report.mode == "fast" and report.files_removed == 1 and report.files_restored == 1
+    assert (tmp_path / "input.txt").read_text() == "baseline" and not (tmp_path / "output.txt").exists()
+
+
+def test_fast_reset_keeps_workspace_by_default(tmp_path) -> None:
+    executor, container = make_executor(tmp_path)
+    (tmp_path / "output.txt").write_text("generated")
+    executor.restart()
+    assert executor.last_reset.mode == "fast" and (tmp_path / "output.txt").exists()
+
+
+def test_fallback_to_full_restart(tmp_path) -> None:
+    executor, container = make_executor(tmp_path, reset_exit_code=137)
+    executor.restart()
+    assert container.restarts == 1
+    assert executor.last_reset.mode == "full" and "137" in executor.last_reset.fallback_reason
+
+    executor, container = make_executor(tmp_path, fast_reset=False)
+    executor.restart()
+    assert container.restarts == 1 and executor.last_reset.fallback_reason is None
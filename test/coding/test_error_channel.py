@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+from fake_docker import FakeDockerClient, FakeExecResult
+
+from azentcoder.code_utils import run_code
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.docker_commandline_code_executor import FAST_RESET_COMMAND, DockerCommandLineCodeExecutor
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+
+FAILING = """import json
+
+def load(text):
+    return json.loads(text)
+
+print("loading")
+load("not json")
+"""
+
+
+def test_run_code_reports_the_error(tmp_path) -> None:
+    status = run_code(FAILING, work_dir=str(tmp_path), use_docker=False)
+    assert status.exit_code == 1 and not status.timed_out
+    assert status.stdout == "loading\n"
+    assert status.output == status.stderr and "Traceback (most recent call last)" in status.stderr
+    error = status.error
+    assert error.exception_type == "json.decoder.JSONDecodeError"
+    assert error.message.startswith("Expecting value")
+    # 生成的文件名被隐藏，位置是最内层的用户代码
+    assert error.file is None and error.line == 4
+    assert [frame.name for frame in error.frames[:2]] == ["<module>", "load"]
+    assert "error_runner" not in status.stderr and "runpy" not in status.stderr
+    assert error.format() == f"json.decoder.JSONDecodeError: {error.message} (at line 4)"
+    # 包装脚本和错误文件都被删除
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_run_code_with_a_filename(tmp_path) -> None:
+    status = run_code("x = {}\nx['missing']", filename="pkg/main.py", work_dir=str(tmp_path), use_docker=False)
+    assert status.error.exception_type == "KeyError" and status.error.file == "pkg/main.py"
+    assert 'File "pkg/main.py", line 2' in status.output
+    assert status.error.format() == "KeyError: 'missing' (at pkg/main.py:2)"
+
+
+def test_run_code_without_an_exception(tmp_path) -> None:
+    status = run_code("import sys\nprint('out')\nsys.exit(3)", work_dir=str(tmp_path), use_docker=False)
+    assert status.exit_code == 3 and status.error is None and status.stdout == "out\n"
+
+    status = run_code("def f(:\n    pass", work_dir=str(tmp_path), use_docker=False)
+    assert status.error.exception_type == "SyntaxError" and status.error.line == 1
+    assert status.error.message and "tmp_code" not in status.error.message
+
+    status = run_code("echo out; echo err >&2; exit 2", lang="sh", work_dir=str(tmp_path), use_docker=False)
+    assert (status.exit_code, status.stdout, status.stderr, status.error) == (2, "out\n", "err\n", None)
+
+
+def test_run_code_docker_uses_the_container_exit_code(tmp_path) -> None:
+    client = FakeDockerClient()
+    with patch("azentcoder.code_utils.in_docker_container", return_value=False), patch(
+        "docker.from_env", return_value=client
+    ):
+        status = run_code("print(1)", work_dir=str(tmp_path), use_docker="python:3-slim")
+    command = client.containers.created[-1].kwargs["command"]
+    assert command[0] == "python" and command[1].endswith(".error_runner.py")
+    assert status.exit_code == 0 and status.image.startswith("python:")
+
+
+def test_run_code_docker_keeps_the_output_interleaved(tmp_path) -> None:
+    client = FakeDockerClient()
+    run = client.containers.run
+
+    def run_failing(*args, **kwargs):
+        container = run(*args, **kwargs)
+        container.attrs["State"]["ExitCode"] = 1
+        container.log_chunks = [("stdout", b"before\n"), ("stderr", b"Traceback\n"), ("stdout", b"after\n")]
+        return container
+
+    client.containers.run = run_failing
+    with patch("azentcoder.code_utils.in_docker_container", return_value=False), patch(
+        "docker.from_env", return_value=client
+    ):
+        status = run_code("print(1)", work_dir=str(tmp_path), use_docker="python:3-slim")
+    assert status.output == "before\nTraceback\nafter"
+    assert status.stdout == "before\nafter\n" and status.stderr == "Traceback\n"
+
+
+def test_local_executor_error(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, profiling=True, flight_recorder=True)
+    result = executor.execute_code_blocks(
+        [CodeBlock(code="print('first')", language="python"), CodeBlock(code=FAILING, language="python")]
+    )
+    assert result.exit_code == 1 and result.stdout == "first\nloading\n"
+    assert result.error.exception_type.endswith("JSONDecodeError") and result.error.line == 4
+    assert result.error.file.endswith(".py") and "runner" not in result.error.file
+    assert "profile_runner" not in result.output and "flight_runner" not in result.output
+
+    result = executor.execute_code_blocks([CodeBlock(code="print('ok')", language="python")])
+    assert result.error is None and result.output.strip() == "ok"
+
+
+def test_docker_executor_error(tmp_path) -> None:
+    def exec_handler(container, cmd, kwargs):
+        # 不能在宿主机上执行 kill -9 -1
+        if cmd == FAST_RESET_COMMAND:
+            return FakeExecResult(0, b"")
+        return None
+
+    client = FakeDockerClient(exec_handler=exec_handler)
+    with patch("docker.from_env", return_value=client):
+        executor = DockerCommandLineCodeExecutor(work_dir=tmp_path, stop_container=False)
+    result = executor.execute_code_blocks([CodeBlock(code=FAILING, language="python")])
+    assert result.exit_code == 1 and result.stdout == "loading\n"
+    assert result.error.exception_type == "json.decoder.JSONDecodeError" and result.error.line == 4
+    assert result.output == result.stdout + result.stderr
+    assert not list(tmp_path.glob("*.error*"))
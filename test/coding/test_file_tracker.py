@@ -0,0 +1,77 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from fake_docker import FakeDockerClient
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.docker_commandline_code_executor import DockerCommandLineCodeExecutor
+from azentcoder.coding.file_tracker import IndexFileTracker, InotifyFileTracker, create_file_tracker
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.coding.workspace import WorkspaceManager
+
+try:
+    InotifyFileTracker(os.getcwd()).close()
+    skip_inotify = False
+except OSError:
+    skip_inotify = True
+
+TRACKERS = [IndexFileTracker, pytest.param(InotifyFileTracker, marks=pytest.mark.skipif(skip_inotify, reason="no inotify"))]
+
+
+@pytest.mark.parametrize("tracker_class", TRACKERS)
+def test_tracker_reports_created_and_modified_files(tmp_path, tracker_class) -> None:
+    (tmp_path / "existing.txt").write_text("old")
+    (tmp_path / "untouched.txt").write_text("same")
+    (tmp_path / "script.py").write_text("")
+    with tracker_class(tmp_path) as tracker:
+        tracker.mark()
+        (tmp_path / "existing.txt").write_text("new content")
+        (tmp_path / "out" / "deep").mkdir(parents=True)
+        (tmp_path / "out" / "deep" / "result.csv").write_text("a,b")
+        (tmp_path / "temp.txt").write_text("gone")
+        (tmp_path / "temp.txt").unlink()
+        (tmp_path / "script.py").write_text("print(1)")
+        changes = tracker.changes(exclude=[tmp_path / "script.py"])
+        root = os.path.realpath(tmp_path)
+        assert changes == [os.path.join(root, "existing.txt"), os.path.join(root, "out", "deep", "result.csv")]
+
+        # 下一次运行只报告新的变化
+        tracker.mark()
+        (tmp_path / "out" / "second.txt").write_text("2")
+        assert tracker.changes() == [os.path.join(root, "out", "second.txt")]
+
+
+def test_create_file_tracker_falls_back(tmp_path) -> None:
+    assert isinstance(create_file_tracker(tmp_path, use_inotify=False), IndexFileTracker)
+    with patch.object(InotifyFileTracker, "__init__", side_effect=OSError("no inotify")):
+        assert isinstance(create_file_tracker(tmp_path), IndexFileTracker)
+        with pytest.raises(OSError):
+            create_file_tracker(tmp_path, use_inotify=True)
+
+
+def test_local_executor_output_files(tmp_path) -> None:
+    manager = WorkspaceManager(tmp_path)
+    executor = LocalCommandLineCodeExecutor(workspace_manager=manager, track_files=True, profiling=True)
+    code = "import os\nos.makedirs('plots', exist_ok=True)\nopen('plots/a.png', 'wb').write(b'png')"
+    result = executor.execute_code_blocks([CodeBlock(code=code, language="python")])
+    assert result.exit_code == 0
+    work_dir = os.path.realpath(executor.work_dir)
+    plot, profile = os.path.join(work_dir, "plots", "a.png"), result.profiles[0].profile_file
+    assert sorted(result.output_files) == sorted([plot, profile])
+
+    result = executor.execute_code_blocks([CodeBlock(code="print('nothing written')", language="python")])
+    assert [path for path in result.output_files if not path.endswith(".prof")] == []
+
+    tracker = executor._file_tracker
+    executor.stop()
+    # stop 释放 inotify 的文件描述符
+    assert getattr(tracker, "_fd", -1) == -1
+
+
+def test_docker_executor_output_files(tmp_path) -> None:
+    client = FakeDockerClient()
+    with patch("docker.from_env", return_value=client):
+        executor = DockerCommandLineCodeExecutor(work_dir=tmp_path, stop_container=False, track_files=True)
+    result = executor.execute_code_blocks([CodeBlock(code="echo hi > report.txt", language="sh")])
+    assert result.output_files == [os.path.join(os.path.realpath(tmp_path), "report.txt")]
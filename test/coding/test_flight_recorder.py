@@ -0,0 +1,62 @@
+import os
+import time
+from unittest.mock import patch
+
+from fake_docker import FakeDockerClient
+
+from azentcoder.code_utils import TIMEOUT_MSG, execute_code
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.docker_commandline_code_executor import DockerCommandLineCodeExecutor
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+
+SPIN_CODE = """
+def spin():
+    while True:
+        pass
+
+print("starting", flush=True)
+spin()
+"""
+
+
+def test_local_executor_records_stacks_on_timeout(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(timeout=1, work_dir=tmp_path, flight_recorder=True)
+    start = time.perf_counter()
+    result = executor.execute_code_blocks([CodeBlock(code=SPIN_CODE, language="python")])
+    assert time.perf_counter() - start < 5
+    assert result.exit_code == 1 and TIMEOUT_MSG in result.output
+    summary = result.stack_summary
+    assert summary.num_samples > 0
+    assert any(leaf.split(":")[1] == "spin" for leaf in summary.leaf_counts())
+    assert "spin" in result.output
+    # 只留下代码文件
+    assert [p.suffix for p in tmp_path.iterdir()] == [".py"]
+
+
+def test_no_summary_without_timeout(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, flight_recorder=True, profiling=True)
+    result = executor.execute_code_blocks([CodeBlock(code="print('fast')", language="python")])
+    assert result.exit_code == 0 and "fast" in result.output
+    assert result.stack_summary is None and len(result.profiles) == 1
+
+
+def test_execute_code_kills_on_timeout(tmp_path) -> None:
+    start = time.perf_counter()
+    exit_code, logs, _ = execute_code("import time\ntime.sleep(30)", timeout=1, work_dir=str(tmp_path), use_docker=False)
+    assert exit_code == 1 and logs == TIMEOUT_MSG
+    assert time.perf_counter() - start < 5
+
+    exit_code, logs, _ = execute_code(
+        SPIN_CODE, timeout=1, work_dir=str(tmp_path), use_docker=False, flight_recorder=True
+    )
+    assert exit_code == 1 and logs.startswith(TIMEOUT_MSG) and "spin" in logs
+    assert os.listdir(tmp_path) == []
+
+
+def test_docker_executor_records_stacks_on_timeout(tmp_path) -> None:
+    client = FakeDockerClient()
+    with patch("docker.from_env", return_value=client):
+        executor = DockerCommandLineCodeExecutor(timeout=1, work_dir=tmp_path, stop_container=False, flight_recorder=True)
+    result = executor.execute_code_blocks([CodeBlock(code=SPIN_CODE, language="python")])
+    assert result.exit_code == 124 and TIMEOUT_MSG in result.output
+    assert "spin" in result.stack_summary.format()
@@ -0,0 +1,110 @@
+import time
+
+from azentcoder.code_utils import TIMEOUT_MSG
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.history import ExecutionHistory, code_shape, percentile
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.coding.server import Job, JobQueue
+
+
+def test_percentile() -> None:
+    samples = list(range(1, 101))
+    assert percentile(samples, 0.5) == 50
+    assert percentile(samples, 0.99) == 99
+    assert percentile(samples, 1.0) == 100
+    assert percentile([3.0], 0.99) == 3.0
+
+
+def test_code_shape() -> None:
+    assert code_shape("python", "x = load('a.csv', n=10)\nprint(x)") == code_shape(
+        "python", "x = load(\"b.csv\", n=2000)  # comment\n\nprint(x)"
+    )
+    assert code_shape("python", "x = load('a.csv')") != code_shape("python", "x = save('a.csv')")
+    assert code_shape("sh", "sleep 1  # wait\necho 'a'") == code_shape("sh", "sleep   5\necho \"b\"")
+    # 语法错误的 Python 代码按文本规范化
+    assert code_shape("python", "def (:") == code_shape("python", "def  (:")
+
+
+def test_predict_and_timeout() -> None:
+    history = ExecutionHistory(min_samples=3, timeout_margin=2.0, min_timeout=1.0)
+    code = "import time\ntime.sleep(0.1)"
+    assert history.predict("python", code) is None
+    assert history.timeout_for("python", code, 60) == 60
+
+    for seconds in (0.5, 1.0, 2.0):
+        history.record("python", code, seconds)
+    assert history.predict("python", code) == 1.0
+    assert history.timeout_for("python", code, 60) == 4.0
+    assert history.timeout_for("python", code, 3) == 3
+
+    # 只有常量不同的代码使用同一形状的历史预测，但超时时间只按同一代码的历史收紧
+    assert history.predict("python", "import time\ntime.sleep(0.2)") == 1.0
+    assert history.timeout_for("python", "import time\ntime.sleep(100)", 600) == 600
+    stats = history.stats()
+    assert stats.exact_hits == 3 and stats.shape_hits == 1 and stats.code_hashes == 1 and stats.shapes == 1
+
+    # 连续超时后超时时间加倍，直到默认超时
+    history.record("python", code, 4.0, timed_out=True)
+    assert history.timeout_for("python", code, 60) == 8.0
+    for _ in range(4):
+        history.record("python", code, 8.0, timed_out=True)
+    assert history.timeout_for("python", code, 60) == 60
+
+
+def test_save_and_load(tmp_path) -> None:
+    path = tmp_path / "history.json"
+    history = ExecutionHistory(path, max_samples=2, min_samples=2)
+    for seconds in (1.0, 2.0, 3.0, 4.0):
+        history.record("sh", "echo hi", seconds)
+    history.save()
+
+    loaded = ExecutionHistory(path, max_samples=2, min_samples=2)
+    assert loaded.predict("sh", "echo hi", q=1.0) == 4.0
+    assert loaded.predict("sh", "echo hi", q=0.0) == 3.0
+    assert loaded.stats().records == 4
+
+    path.write_text("not json")
+    assert ExecutionHistory(path, max_samples=2, min_samples=2).stats().records == 0
+
+
+def test_local_executor_adaptive_timeout(tmp_path) -> None:
+    history = ExecutionHistory(min_samples=2, min_timeout=1.0)
+    executor = LocalCommandLineCodeExecutor(timeout=60, work_dir=tmp_path, history=history)
+    code = "import pathlib, time\ntime.sleep(float(pathlib.Path('delay').read_text()))"
+    block = CodeBlock(code=code, language="python")
+    (tmp_path / "delay").write_text("0.01")
+    for _ in range(2):
+        assert executor.execute_code_blocks([block]).exit_code == 0
+    assert history.stats().records == 2
+
+    # 同一代码卡住时，在 1 秒左右被终止，而不是 60 秒
+    (tmp_path / "delay").write_text("30")
+    start = time.perf_counter()
+    result = executor.execute_code_blocks([block])
+    assert time.perf_counter() - start < 10
+    assert result.exit_code == 1 and TIMEOUT_MSG in result.output
+    assert history.timeout_for("python", "import time\ntime.sleep(30)", 60) == 60
+
+
+def test_job_queue_shortest_job_first() -> None:
+    history = ExecutionHistory(min_samples=1)
+    history.record("python", "slow()", 10.0)
+    history.record("python", "fast()", 0.1)
+    queue = JobQueue(history=history, unknown_seconds=1.0)
+
+    slow = Job([CodeBlock(code="slow()", language="python")])
+    unknown = Job([CodeBlock(code="other()", language="python")])
+    fast = Job([CodeBlock(code="fast()", language="python")])
+    urgent = Job([CodeBlock(code="slow()", language="python")], priority=1)
+    assert [queue.put(job) for job in (slow, unknown, fast)] == [0, 0, 0]
+    assert queue.put(urgent) == 0
+    assert fast.predicted_seconds == 0.1
+
+    assert [queue.get(timeout=0) for _ in range(4)] == [urgent, fast, unknown, slow]
+
+
+def test_job_queue_fifo_without_history() -> None:
+    queue = JobQueue()
+    jobs = [Job([CodeBlock(code=f"print({i})", language="python")]) for i in range(3)]
+    assert [queue.put(job) for job in jobs] == [0, 1, 2]
+    assert [queue.get(timeout=0) for _ in range(3)] == jobs
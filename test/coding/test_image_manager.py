@@ -0,0 +1,108 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from docker.errors import APIError
+from fake_docker import FakeDockerClient
+
+from azentcoder.code_utils import execute_code
+from azentcoder.coding.docker_commandline_code_executor import DockerCommandLineCodeExecutor
+from azentcoder.coding.image_manager import ImageManager
+
+
+def test_prefetch_in_background() -> None:
+    client = FakeDockerClient(images=("python:3-slim",))
+    client.images.pull_delay = 0.2
+    start = time.perf_counter()
+    with ImageManager(["python:3-slim", "python:3"], client=client, refresh_interval=None) as manager:
+        # start 不等待镜像拉取
+        assert time.perf_counter() - start < 0.1
+        assert manager.resolve("python:3-slim") == client.images.get("python:3-slim").id
+        # 拉取中的镜像只等待正在进行的那一次拉取
+        assert manager.resolve("python:3").startswith("sha256:")
+    assert client.images.pulled == ["python:3"]
+    status = {s.name: s for s in manager.status()}
+    assert status["python:3"].pulls == 1 and status["python:3-slim"].pulls == 0
+
+
+def test_resolve_uses_the_cache() -> None:
+    client = FakeDockerClient()
+    with ImageManager(["python:3-slim"], client=client, refresh_interval=None) as manager:
+        manager.resolve("python:3-slim")
+        gets = len(client.images.gets)
+        for _ in range(10):
+            manager.resolve("python:3-slim")
+        assert len(client.images.gets) == gets
+
+        manager.invalidate("python:3-slim")
+        manager.resolve("python:3-slim")
+        assert len(client.images.gets) == gets + 1
+
+
+def test_concurrent_resolves_pull_once() -> None:
+    client = FakeDockerClient(images=())
+    client.images.pull_delay = 0.1
+    manager = ImageManager(client=client, refresh_interval=None, max_workers=4)
+    threads = [threading.Thread(target=manager.resolve, args=("python:3",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manager.close()
+    assert client.images.pulled == ["python:3"]
+
+
+def test_refresh_on_schedule() -> None:
+    client = FakeDockerClient()
+    with ImageManager(["python:3-slim"], client=client, refresh_interval=0.05) as manager:
+        old_id = manager.resolve("python:3-slim")
+        client.images.ids["python:3-slim"] = "sha256:retagged"
+        deadline = time.time() + 5
+        while manager.resolve("python:3-slim") == old_id and time.time() < deadline:
+            time.sleep(0.01)
+        assert manager.resolve("python:3-slim") == "sha256:retagged"
+
+        # 刷新失败时继续使用已经解析的 ID
+        client.images.available.discard("python:3-slim")
+        client.images.unpullable.add("python:3-slim")
+        time.sleep(0.2)
+        assert manager.resolve("python:3-slim") == "sha256:retagged"
+        assert "pull access denied" in manager.status()[0].error
+
+
+def test_first_available() -> None:
+    client = FakeDockerClient(images=("python:3",))
+    client.images.unpullable.add("private:latest")
+    with ImageManager(client=client, refresh_interval=None) as manager:
+        assert manager.first_available(["private:latest", "python:3"]) == "python:3"
+        # 已缓存的镜像优先，不再等待拉取
+        assert manager.first_available(["python:3-slim", "python:3"]) == "python:3"
+        assert client.images.pulled == []
+        with pytest.raises(APIError):
+            manager.resolve("private:latest")
+        assert manager.first_available(["private:latest"]) == "private:latest"
+
+
+def test_execute_code_uses_the_manager(tmp_path) -> None:
+    client = FakeDockerClient(images=("python:3",))
+    client.images.unpullable.add("python:3-slim")
+    with ImageManager(["python:3"], client=client, refresh_interval=None) as manager:
+        manager.resolve("python:3")
+        gets = len(client.images.gets)
+        with patch("azentcoder.code_utils.in_docker_container", return_value=False), patch(
+            "docker.from_env", return_value=client
+        ):
+            images = ["python:3-slim", "python:3"]
+            execute_code("print(1)", work_dir=str(tmp_path), use_docker=images, image_manager=manager)
+    assert client.containers.created[-1].image == "python:3"
+    # 镜像在缓存中，执行路径上没有访问 docker 的镜像接口
+    assert len(client.images.gets) == gets
+
+
+def test_docker_executor_uses_the_manager(tmp_path) -> None:
+    client = FakeDockerClient(images=())
+    with ImageManager(["python:3-slim"], client=client, refresh_interval=None) as manager:
+        DockerCommandLineCodeExecutor(work_dir=tmp_path, stop_container=False, image_manager=manager)
+    assert client.images.pulled == ["python:3-slim"]
+    assert [container.image for container in client.containers.created] == ["python:3-slim"]
@@ -0,0 +1,57 @@
+from azentcoder.coding.markdown_code_extractor import MarkdownCodeExtractor, StreamingCodeBlockParser
+
+MESSAGE = """Let me check.
+```python
+print("a")
+```
+Then:
+```sh
+echo b
+```
+```
+import os
+print(os.getcwd())
+```
+The end, with an unclosed
+```python
+print("c")
+"""
+
+
+def test_streaming_parser_matches_extractor() -> None:
+    expected = MarkdownCodeExtractor().extract_code_blocks(MESSAGE)
+    for size in (1, 2, 7, len(MESSAGE)):
+        parser = StreamingCodeBlockParser()
+        blocks = []
+        for start in range(0, len(MESSAGE), size):
+            blocks += parser.feed(MESSAGE[start : start + size])
+        assert blocks == expected
+        assert parser.text == MESSAGE
+    assert [block.language for block in expected] == ["python", "sh", "python"]
+
+
+def test_streaming_parser_emits_block_when_closed() -> None:
+    parser = StreamingCodeBlockParser()
+    assert parser.feed("```python\nprint(1)\n``") == []
+    blocks = parser.feed("`\nmore text")
+    assert [block.code for block in blocks] == ["print(1)"]
+    assert parser.feed(" and no code") == []
+
+
+def test_locate_code_blocks_in_parts() -> None:
+    image = {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * 1000}}
+    message = [
+        {"type": "text", "text": "Look:\n```python\nprint("},
+        {"type": "text", "text": "'split')\n```\n"},
+        image,
+        {"type": "text", "text": "```sh\necho hi\n```"},
+    ]
+    located = MarkdownCodeExtractor().locate_code_blocks(message)
+    assert [block.code for block, _ in located] == ["print('split')", "echo hi"]
+    first, second = (spans for _, spans in located)
+    assert [span.index for span in first] == [0, 1] and [span.index for span in second] == [3]
+    for block, spans in located:
+        assert "".join(message[s.index]["text"][s.start : s.end] for s in spans) == block.code
+
+    located = MarkdownCodeExtractor().locate_code_blocks("```python\nx = 1\n```")
+    assert located[0][1][0] == (10, 15, 0)
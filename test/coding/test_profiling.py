@@ -0,0 +1,63 @@
+import pstats
+from unittest.mock import patch
+
+from fake_docker import FakeDockerClient
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.docker_commandline_code_executor import DockerCommandLineCodeExecutor
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+
+SLOW_CODE = """
+def slow_sum(n):
+    total = 0
+    for i in range(n):
+        total += i
+    return total
+
+data = [0] * 500_000
+print(slow_sum(300_000))
+"""
+
+
+def test_local_profiling(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, profiling=True, profile_top_n=5)
+    result = executor.execute_code_blocks([CodeBlock(code=SLOW_CODE, language="python")])
+    assert result.exit_code == 0 and "44999850000" in result.output
+
+    (profile,) = result.profiles
+    assert 0 < len(profile.hotspots) <= 5
+    assert profile.hotspots[0].function == "slow_sum"
+    assert profile.peak_memory_bytes > 500_000 * 8
+    assert result.output_files == [profile.profile_file]
+    assert pstats.Stats(profile.profile_file).total_calls > 0
+    assert "slow_sum" in profile.format()
+    # 只留下代码文件和原始 profile
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".prof", ".py"]
+
+
+def test_local_profiling_keeps_errors_and_exit_codes(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, profiling=True)
+    result = executor.execute_code_blocks([CodeBlock(code="x = 1\nraise ValueError('boom')", language="python")])
+    assert result.exit_code == 1 and "ValueError: boom" in result.output
+    assert "runpy" not in result.output and len(result.profiles) == 1
+
+    result = executor.execute_code_blocks([CodeBlock(code="import sys\nsys.exit(3)", language="python")])
+    assert result.exit_code == 3
+
+
+def test_profiling_disabled_by_default(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path)
+    result = executor.execute_code_blocks([CodeBlock(code="print(1)", language="python")])
+    assert result.profiles == [] and result.output_files == []
+
+
+def test_docker_profiling(tmp_path) -> None:
+    client = FakeDockerClient()
+    with patch("docker.from_env", return_value=client):
+        executor = DockerCommandLineCodeExecutor(work_dir=tmp_path, stop_container=False, profiling=True)
+    result = executor.execute_code_blocks([CodeBlock(code=SLOW_CODE, language="python")])
+    assert result.exit_code == 0
+    command = client.containers.created[0].exec_calls[-1]["cmd"]
+    # ErrorChannel 的包装脚本在最外层
+    assert command[-1].endswith(".profile_runner.error_runner.py")
+    assert result.profiles[0].hotspots[0].function == "slow_sum"
@@ -0,0 +1,146 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from fake_docker import FakeDockerClient, FakeExecResult
+
+from azentcoder.code_utils import TIMEOUT_MSG, run_code
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.docker_commandline_code_executor import FAST_RESET_COMMAND, DockerCommandLineCodeExecutor
+from azentcoder.coding.resources import OOM_MSG, ContainerStatsSampler, ResourceLimits, parse_memory
+
+MiB = 1024**2
+
+
+def test_limits() -> None:
+    assert parse_memory("512m") == 512 * MiB and parse_memory("2g") == 2048 * MiB and parse_memory(100) == 100
+    with pytest.raises(ValueError):
+        parse_memory("lots")
+
+    limits = ResourceLimits(cpus=1.5, memory="256m", pids=64)
+    assert limits.create_kwargs() == {
+        "cpu_period": 100_000,
+        "cpu_quota": 150_000,
+        "mem_limit": 256 * MiB,
+        "memswap_limit": 256 * MiB,
+        "pids_limit": 64,
+    }
+    assert ResourceLimits().create_kwargs() == {}
+    # 代码块只能收紧执行器的限制
+    merged = limits.merge(ResourceLimits(cpus=4, memory="128m"))
+    assert (merged.cpus, merged.memory_bytes, merged.pids) == (1.5, 128 * MiB, 64)
+    assert limits.merge(None) is limits
+    assert ResourceLimits().update_kwargs(total_memory=8 * MiB) == {
+        "cpu_period": 100_000,
+        "cpu_quota": -1,
+        "mem_limit": 8 * MiB,
+        "memswap_limit": -1,
+    }
+
+
+def stats_of(cpu_ns: int, memory: int, read: int = 0, write: int = 0):
+    return {
+        "cpu_stats": {"cpu_usage": {"total_usage": cpu_ns}},
+        "memory_stats": {"usage": memory},
+        "blkio_stats": {"io_service_bytes_recursive": [{"op": "Read", "value": read}, {"op": "Write", "value": write}]},
+    }
+
+
+def test_sampler() -> None:
+    samples = iter([stats_of(10**9, 10, 100, 50), stats_of(3 * 10**9, 500, 300, 50), stats_of(4 * 10**9, 200, 300, 90)])
+    # 停止后的采样得到空的统计，和已经退出的容器一样
+    client = FakeDockerClient(stats_handler=lambda container: next(samples, {}))
+    container = client.containers.create("python:3-slim")
+    sampler = ContainerStatsSampler(container, interval=0.01)
+    with sampler:
+        deadline = time.time() + 5
+        while sampler.usage().samples < 3 and time.time() < deadline:
+            time.sleep(0.01)
+    usage = sampler.usage()
+    assert usage.samples == 3 and usage.cpu_seconds == 3.0 and usage.peak_memory_bytes == 500
+    assert usage.io_read_bytes == 200 and usage.io_write_bytes == 40
+
+    # 新建的容器从零开始计数
+    fresh = ContainerStatsSampler(container, fresh=True)
+    fresh._samples = [stats_of(2 * 10**9, 10, 100, 50)]
+    assert fresh.usage().cpu_seconds == 2.0 and fresh.usage().io_read_bytes == 100
+    assert ContainerStatsSampler(container).usage().samples == 0
+
+
+def make_executor(tmp_path, exec_result=None, **kwargs):
+    def exec_handler(container, cmd, kwargs):
+        # 不能在宿主机上执行 kill -9 -1
+        if cmd == FAST_RESET_COMMAND:
+            return FakeExecResult(0, b"")
+        if exec_result is not None and cmd[0] == "timeout":
+            return exec_result(container)
+        return None
+
+    client = FakeDockerClient(exec_handler=exec_handler, stats_handler=lambda container: stats_of(10**9, 300 * MiB))
+    with patch("docker.from_env", return_value=client):
+        executor = DockerCommandLineCodeExecutor(work_dir=tmp_path, stop_container=False, **kwargs)
+    return executor, client.containers.created[0]
+
+
+def test_executor_limits(tmp_path) -> None:
+    executor, container = make_executor(tmp_path, limits=ResourceLimits(cpus=2, pids=32), stats_interval=0.01)
+    assert container.kwargs["cpu_quota"] == 200_000 and container.kwargs["pids_limit"] == 32
+    assert "mem_limit" not in container.kwargs
+
+    result = executor.execute_code_blocks([CodeBlock(code="print('hi')", language="python")])
+    assert result.exit_code == 0 and not result.oom_killed and not container.updates
+    assert len(result.resource_usage) == 1 and result.resource_usage[0].peak_memory_bytes == 300 * MiB
+
+    block = CodeBlock(code="print('small')", language="python", limits=ResourceLimits(cpus=4, memory="64m"))
+    result = executor.execute_code_blocks([block])
+    assert result.exit_code == 0
+    # 代码块运行时收紧限制，之后恢复，没有内存限制时恢复为 daemon 的全部内存
+    applied, restored = container.updates
+    assert applied["cpu_quota"] == 200_000 and applied["mem_limit"] == applied["memswap_limit"] == 64 * MiB
+    assert restored["cpu_quota"] == 200_000 and restored["mem_limit"] == container.client.mem_total
+    assert restored["memswap_limit"] == -1
+
+
+def test_oom_is_not_a_timeout(tmp_path) -> None:
+    def oom(container):
+        container.attrs["State"]["OOMKilled"] = True
+        return FakeExecResult(137, (None, b"Killed\n"))
+
+    executor, container = make_executor(tmp_path, exec_result=oom, limits=ResourceLimits(memory="256m"))
+    block = CodeBlock(code="x = ' ' * 10**10", language="python")
+    result = executor.execute_code_blocks([block])
+    assert result.exit_code == 137 and result.oom_killed and result.resource_usage[0].oom_killed
+    assert OOM_MSG in result.output and "256m" in result.output and TIMEOUT_MSG not in result.output
+
+    # OOMKilled 一直保留，再次 OOM 时用内存峰值判断
+    assert executor.execute_code_blocks([block]).oom_killed
+    executor, container = make_executor(tmp_path, exec_result=oom, limits=ResourceLimits(memory="1g"))
+    container.attrs["State"]["OOMKilled"] = True
+    executor._oom_seen = True
+    assert not executor.execute_code_blocks([block]).oom_killed
+
+    executor, container = make_executor(tmp_path, exec_result=lambda c: FakeExecResult(124, (None, None)))
+    result = executor.execute_code_blocks([block])
+    assert not result.oom_killed and TIMEOUT_MSG in result.output
+
+
+def test_run_code_limits(tmp_path) -> None:
+    client = FakeDockerClient()
+    run = client.containers.run
+
+    def run_oom(*args, **kwargs):
+        container = run(*args, **kwargs)
+        container.attrs["State"].update(ExitCode=137, OOMKilled=True)
+        return container
+
+    client.containers.run = run_oom
+    with patch("docker.from_env", return_value=client), patch(
+        "azentcoder.code_utils.in_docker_container", return_value=False
+    ), patch("azentcoder.code_utils.is_docker_running", return_value=True):
+        status = run_code(
+            "x = ' ' * 10**10", work_dir=str(tmp_path), use_docker=True, limits=ResourceLimits(memory="128m", pids=16)
+        )
+    kwargs = client.containers.created[0].kwargs
+    assert kwargs["mem_limit"] == 128 * MiB and kwargs["pids_limit"] == 16
+    assert status.exit_code == 137 and status.oom_killed and not status.timed_out
+    assert status.output.endswith(f"{OOM_MSG} (limit 128m).")
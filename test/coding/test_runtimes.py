@@ -0,0 +1,102 @@
+import pytest
+
+from azentcoder.code_utils import TIMEOUT_MSG
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.coding.runtimes import DEFAULT_RUNTIMES, BuildCache, CompiledRuntime, RuntimeRegistry
+
+C_CODE = """
+#include <stdio.h>
+int main(void) {
+    long total = 0;
+    for (long i = 0; i < 1000; i++) total += i;
+    printf("%ld\\n", total);
+    return 0;
+}
+"""
+
+CPP_CODE = """
+#include <iostream>
+#include <vector>
+int main() {
+    std::vector<int> v{1, 2, 3};
+    std::cout << v.size() << std::endl;
+}
+"""
+
+
+def _requires(lang):
+    return pytest.mark.skipif(DEFAULT_RUNTIMES.get(lang) is None, reason=f"no {lang} toolchain installed")
+
+
+@_requires("c")
+def test_c_build_is_cached(tmp_path) -> None:
+    cache = BuildCache(tmp_path / "cache")
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, build_cache=cache)
+
+    first = executor.execute_code_blocks([CodeBlock(code=C_CODE, language="c")])
+    assert first.exit_code == 0 and "499500" in first.output
+    (timing,) = first.timings
+    assert timing.language == "c" and not timing.cache_hit and timing.compile_seconds > 0
+
+    second = executor.execute_code_blocks([CodeBlock(code=C_CODE, language="c")])
+    assert second.exit_code == 0 and "499500" in second.output
+    assert second.timings[0].cache_hit and second.timings[0].compile_seconds < timing.compile_seconds
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 修改源代码后重新编译
+    third = executor.execute_code_blocks([CodeBlock(code=C_CODE.replace("1000", "10"), language="c")])
+    assert "45" in third.output and not third.timings[0].cache_hit
+    # 构建产物不会写到工作目录
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cache"]
+
+
+@_requires("c")
+def test_c_compile_error(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, build_cache=BuildCache(tmp_path / "cache"))
+    blocks = [
+        CodeBlock(code="int main(void) { return undefined_name; }", language="c"),
+        CodeBlock(code="echo hi", language="sh"),
+    ]
+    result = executor.execute_code_blocks(blocks)
+    assert result.exit_code != 0
+    assert "undefined_name" in result.output and "main.c" in result.output
+    assert len(result.timings) == 1 and result.timings[0].run_seconds == 0
+
+
+@_requires("c")
+def test_c_runtime_error_and_timeout(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(timeout=1, work_dir=tmp_path, build_cache=BuildCache(tmp_path / "cache"))
+    result = executor.execute_code_blocks([CodeBlock(code="int main(void) { return 3; }", language="c")])
+    assert result.exit_code == 3
+
+    result = executor.execute_code_blocks([CodeBlock(code="int main(void) { for (;;) {} }", language="c")])
+    assert result.exit_code == 1 and TIMEOUT_MSG in result.output
+
+
+@_requires("cpp")
+def test_cpp(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, build_cache=BuildCache(tmp_path / "cache"))
+    result = executor.execute_code_blocks([CodeBlock(code=CPP_CODE, language="cpp")])
+    assert result.exit_code == 0 and result.output.strip() == "3"
+    assert result.timings[0].language == "c++"
+
+
+@_requires("javascript")
+def test_node(tmp_path) -> None:
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path)
+    result = executor.execute_code_blocks(
+        [CodeBlock(code="console.log(6 * 7)", language="javascript"), CodeBlock(code="print('py')", language="python")]
+    )
+    assert result.exit_code == 0 and "42" in result.output and "py" in result.output
+    assert [t.language for t in result.timings] == ["node", "python"]
+    assert all(t.compile_seconds == 0 and t.run_seconds > 0 for t in result.timings)
+    assert not list(tmp_path.glob("*.js"))
+
+
+def test_missing_toolchain(tmp_path) -> None:
+    registry = RuntimeRegistry([CompiledRuntime("fortran", ["fortran"], "f90", ["no-such-compiler"], [])])
+    assert registry.get("fortran") is None and registry.languages() == []
+    executor = LocalCommandLineCodeExecutor(work_dir=tmp_path, runtimes=registry)
+    result = executor.execute_code_blocks([CodeBlock(code="print *, 'hi'", language="fortran")])
+    assert result.exit_code == 1 and "unknown language fortran" in result.output
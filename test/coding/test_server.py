@@ -0,0 +1,150 @@
+import http.client
+import json
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.client import RemoteCodeExecutor
+from azentcoder.coding.local_commandline_code_executor import CommandLineCodeResult, LocalCommandLineCodeExecutor
+from azentcoder.coding.server import ExecutionServer, Job, JobQueue, QueueFullError
+from azentcoder.coding.workspace import WorkspaceManager
+
+
+class SleepyExecutor:
+    """Echoes the code after sleeping, and records the order of the jobs."""
+
+    def __init__(self, log):
+        self.log = log
+
+    def execute_code_blocks(self, code_blocks):
+        self.log.append(code_blocks[0].code)
+        time.sleep(0.05)
+        return CommandLineCodeResult(exit_code=0, output=code_blocks[0].code)
+
+
+def block(code: str):
+    return [CodeBlock(code=code, language="python")]
+
+
+def test_job_queue_priority_and_tenant_limits() -> None:
+    job_queue = JobQueue(tenant_limits={"a": 1})
+    low, high = Job(block("low"), tenant="b"), Job(block("high"), tenant="b", priority=5)
+    a1, a2 = Job(block("a1"), tenant="a", priority=9), Job(block("a2"), tenant="a", priority=9)
+    for job in (low, high, a1, a2):
+        job_queue.put(job)
+
+    assert job_queue.get(timeout=0) is a1
+    # 租户 a 已经有一个任务在运行，a2 被跳过
+    assert job_queue.get(timeout=0) is high
+    assert job_queue.get(timeout=0) is low
+    assert job_queue.get(timeout=0) is None
+    stats = job_queue.stats()
+    assert stats.queued_by_tenant == {"a": 1} and stats.running_by_tenant == {"a": 1, "b": 2}
+    job_queue.done(a1)
+    assert job_queue.get(timeout=0) is a2
+
+
+def test_job_queue_rejects_when_full() -> None:
+    job_queue = JobQueue(max_queued=1)
+    job_queue.put(Job(block("1")))
+    with pytest.raises(QueueFullError):
+        job_queue.put(Job(block("2")))
+    assert job_queue.stats().rejected == 1
+
+
+def test_server_over_unix_socket(tmp_path) -> None:
+    manager = WorkspaceManager(tmp_path / "workspaces")
+    socket_path = tmp_path / "server.sock"
+    factory = lambda tenant: LocalCommandLineCodeExecutor(workspace_manager=manager, session_id=tenant)  # noqa: E731
+    with ExecutionServer(factory, num_workers=2, socket_path=socket_path) as server:
+        assert server.address == f"unix://{socket_path}"
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        client = RemoteCodeExecutor(server.address)
+        result = client.execute_code_blocks(block("print('hello from the server')"))
+        assert result.exit_code == 0 and "hello from the server" in result.output
+
+        events = [event["event"] for event in client.stream(block("raise SystemExit(3)"))]
+        assert events == ["queued", "started", "result"]
+        assert client.stats()["completed"] == 2
+
+        # 不同租户的任务在各自的工作目录中执行
+        write = block("open('secret.txt', 'w').write('a')")
+        assert RemoteCodeExecutor(server.address, tenant="a").execute_code_blocks(write).exit_code == 0
+        read = block("import os; print(os.path.exists('secret.txt'))")
+        assert "True" in RemoteCodeExecutor(server.address, tenant="a").execute_code_blocks(read).output
+        assert "False" in RemoteCodeExecutor(server.address, tenant="b").execute_code_blocks(read).output
+    assert not socket_path.exists()
+
+
+def test_server_streams_priorities_over_http() -> None:
+    log = []
+    with ExecutionServer(lambda tenant: SleepyExecutor(log), num_workers=1, port=0) as server:
+        blocker = threading.Thread(target=RemoteCodeExecutor(server.address).execute_code_blocks, args=(block("first"),))
+        blocker.start()
+        time.sleep(0.02)
+        threads = [
+            threading.Thread(target=RemoteCodeExecutor(server.address, priority=p).execute_code_blocks, args=(block(n),))
+            for n, p in (("low", 0), ("high", 10))
+        ]
+        for t in threads:
+            t.start()
+            time.sleep(0.01)
+        for t in [blocker] + threads:
+            t.join()
+    assert log == ["first", "high", "low"]
+
+
+def test_client_raises_on_rejection() -> None:
+    log = []
+    with ExecutionServer(lambda tenant: SleepyExecutor(log), num_workers=1, port=0, max_queued=0) as server:
+        with pytest.raises(RuntimeError, match="rejected"):
+            RemoteCodeExecutor(server.address).execute_code_blocks(block("x"))
+
+
+def post(server, body, headers):
+    host, port = server.address[len("http://") :].split(":")
+    connection = http.client.HTTPConnection(host, int(port))
+    try:
+        connection.request("POST", "/execute", body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def test_server_rejects_unsafe_requests() -> None:
+    log = []
+    body = json.dumps({"code_blocks": [{"code": "x", "language": "python"}]})
+    json_headers = {"Content-Type": "application/json", "Authorization": "Bearer secret"}
+    with ExecutionServer(lambda tenant: SleepyExecutor(log), num_workers=1, port=0, token="secret") as server:
+        # 浏览器无需预检即可发出的 text/plain 请求
+        assert post(server, body, {"Content-Type": "text/plain", "Authorization": "Bearer secret"})[0] == 415
+        assert post(server, body, {**json_headers, "Origin": "http://evil.example"})[0] == 403
+        assert post(server, body, {**json_headers, "Host": "evil.example:8765"})[0] == 403
+        assert post(server, body, {"Content-Type": "application/json"})[0] == 403
+        assert post(server, body, {**json_headers, "Authorization": "Bearer wrong"})[0] == 403
+        status, error = post(server, json.dumps({**json.loads(body), "priority": "high"}), json_headers)
+        assert status == 400 and b"invalid request" in error
+
+        with pytest.raises(RuntimeError, match="token"):
+            RemoteCodeExecutor(server.address).execute_code_blocks(block("x"))
+        assert RemoteCodeExecutor(server.address, token="secret").execute_code_blocks(block("x")).output == "x"
+    assert log == ["x"]
+
+
+def test_executors_are_per_tenant() -> None:
+    created = []
+
+    def factory(tenant):
+        created.append(tenant)
+        return SleepyExecutor([])
+
+    with ExecutionServer(factory, num_workers=1, port=0, max_idle_executors=1) as server:
+        for tenant in ("a", "a", "b", "a"):
+            RemoteCodeExecutor(server.address, tenant=tenant).execute_code_blocks(block(tenant))
+    # 空闲的 executor 只保留一个，租户 b 的任务之后 a 的 executor 已被回收
+    assert created == ["a", "b", "a"]
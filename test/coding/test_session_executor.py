@@ -0,0 +1,84 @@
+import threading
+import time
+
+from fake_docker import FakeDockerClient, FakeExecResult
+from unittest.mock import patch
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.session_executor import SessionExecutor
+from azentcoder.coding.workspace import WorkspaceManager
+
+
+def test_sessions_have_isolated_workspaces(tmp_path) -> None:
+    with SessionExecutor(max_workers=2, workspace_manager=WorkspaceManager(tmp_path)) as executor:
+        a = executor.open_session("a", env={"NAME": "a"})
+        b = executor.open_session("b", env={"NAME": "b"})
+        code = "# filename: main.py\nimport os\nprint(os.environ['NAME'])"
+        result_a = a.execute_code_blocks([CodeBlock(code=code, language="python")])
+        result_b = b.execute_code_blocks([CodeBlock(code=code, language="python")])
+        assert result_a.output.strip() == "a" and result_b.output.strip() == "b"
+        assert result_a.code_file == str(tmp_path / "a" / "main.py")
+        assert (tmp_path / "b" / "main.py").exists()
+
+        result = a.execute_code_blocks([CodeBlock(code="# filename: ../b/main.py\nprint(1)", language="python")])
+        assert result.exit_code == 1 and "not in the workspace" in result.output
+
+        a.close()
+        assert not (tmp_path / "a").exists() and executor.sessions == ["b"]
+
+
+def test_serial_within_session_concurrent_across_sessions(tmp_path) -> None:
+    code = "import time\nopen('log.txt', 'a').write(f'{time.time()} start\\n')\ntime.sleep(0.3)\nopen('log.txt', 'a').write(f'{time.time()} end\\n')"
+    with SessionExecutor(max_workers=4, workspace_manager=WorkspaceManager(tmp_path)) as executor:
+        a, b = executor.open_session("a"), executor.open_session("b")
+        start = time.perf_counter()
+        futures = [s.submit([CodeBlock(code=code, language="python")]) for s in (a, b, a, b)]
+        assert all(f.result().exit_code == 0 for f in futures)
+        elapsed = time.perf_counter() - start
+        # 两个会话并行，每个会话内部两批串行
+        assert elapsed < 4 * 0.3
+        events = [line.split()[1] for line in (tmp_path / "a" / "log.txt").read_text().splitlines()]
+        assert events == ["start", "end", "start", "end"]
+
+
+def test_thread_safe_submission(tmp_path) -> None:
+    with SessionExecutor(max_workers=4, workspace_manager=WorkspaceManager(tmp_path)) as executor:
+        session = executor.open_session("s")
+        results = []
+
+        def worker(i):
+            results.append(session.execute_code_blocks([CodeBlock(code=f"print({i})", language="python")]))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert sorted(int(r.output) for r in results) == list(range(8))
+        assert sorted(p.name for p in session.work_dir.iterdir()) == [".azentcoder-session"]
+
+
+def test_shared_container(tmp_path) -> None:
+    def exec_handler(container, cmd, kwargs):
+        # 宿主机上不一定有 python 命令
+        if cmd[2] == "python":
+            return FakeExecResult(0, cmd[3].encode() + b"\n")
+        return None
+
+    client = FakeDockerClient(exec_handler=exec_handler)
+    with patch("docker.from_env", return_value=client):
+        executor = SessionExecutor(workspace_manager=WorkspaceManager(tmp_path), docker=True)
+    assert len(client.containers.created) == 1
+    session = executor.open_session("s", env={"A": "1"})
+    result = session.execute_code_blocks([CodeBlock(code="echo hi > out.txt", language="sh")])
+    assert result.exit_code == 0 and (tmp_path / "s" / "out.txt").read_text() == "hi\n"
+    call = client.containers.created[0].exec_calls[-1]
+    assert call["workdir"] == "/workspace/s" and call["environment"] == {"A": "1"}
+
+    # 语言名大小写和版本后缀不影响容器中的命令和脚本名
+    blocks = [CodeBlock(code="print('a')", language="Python"), CodeBlock(code="print('b')", language="python3")]
+    result = session.execute_code_blocks(blocks)
+    scripts = [call["cmd"][3] for call in client.containers.created[0].exec_calls[-2:]]
+    assert result.exit_code == 0 and result.output == "".join(f"{script}\n" for script in scripts)
+    assert all(script.endswith(".py") for script in scripts)
+    executor.close()
@@ -0,0 +1,143 @@
+import os
+import time
+
+import pytest
+
+from azentcoder.coding.base import CodeBlock
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.coding.workspace import SESSION_MARKER, WorkspaceManager, WorkspaceQuotaError, WorkspaceSnapshot
+
+
+def test_sessions_are_isolated(tmp_path) -> None:
+    manager = WorkspaceManager(tmp_path)
+    a, b = manager.create("a"), manager.create("b")
+    assert a.path != b.path and (a.path / SESSION_MARKER).exists()
+    assert manager.create("a") is a
+
+    (a.path / "data.txt").write_text("x" * 100)
+    report = manager.release("a")
+    assert report.sessions_removed == 1
+    assert report.bytes_reclaimed >= 100 and report.inodes_reclaimed >= 3
+    assert not a.path.exists() and b.path.exists()
+
+
+@pytest.mark.parametrize("session_id", ["../other", "..", "a/b", "/tmp/x", "."])
+def test_session_ids_stay_inside_the_root(tmp_path, session_id) -> None:
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / SESSION_MARKER).write_text("{}")
+    manager = WorkspaceManager(tmp_path / "root")
+    with pytest.raises(ValueError):
+        manager.create(session_id)
+    with pytest.raises(ValueError):
+        manager.release(session_id)
+    assert (other / SESSION_MARKER).exists()
+
+
+def test_cleanup_scripts(tmp_path) -> None:
+    manager = WorkspaceManager(tmp_path)
+    workspace = manager.create()
+    workspace.script_path("tmp.py").write_text("print(1)")
+    (workspace.path / "result.csv").write_text("a,b")
+    report = manager.cleanup_scripts(workspace)
+    assert report.scripts_removed == 1 and report.bytes_reclaimed == 8
+    assert not (workspace.path / "tmp.py").exists() and (workspace.path / "result.csv").exists()
+    assert manager.report.scripts_removed == 1
+
+
+def test_quota(tmp_path) -> None:
+    workspace = WorkspaceManager(tmp_path, max_bytes=1000).create()
+    workspace.check_quota()
+    (workspace.path / "big.bin").write_bytes(b"\0" * 2000)
+    with pytest.raises(WorkspaceQuotaError):
+        workspace.check_quota()
+
+    workspace = WorkspaceManager(tmp_path, max_inodes=3).create()
+    for i in range(3):
+        (workspace.path / f"{i}.txt").write_text("")
+    with pytest.raises(WorkspaceQuotaError):
+        workspace.check_quota()
+
+
+def test_gc_by_age_and_size(tmp_path) -> None:
+    # 其他进程留下的会话
+    other = WorkspaceManager(tmp_path)
+    old, recent, newest = other.create("old"), other.create("recent"), other.create("newest")
+    now = time.time()
+    os.utime(old.marker, (now - 3600, now - 3600))
+    os.utime(recent.marker, (now - 60, now - 60))
+    for workspace in (recent, newest):
+        (workspace.path / "data.bin").write_bytes(b"\0" * 1000)
+    # 不属于任何会话的目录不会被删除
+    (tmp_path / "unmanaged").mkdir()
+
+    manager = WorkspaceManager(tmp_path)
+    report = manager.gc(max_age=600)
+    assert report.sessions_removed == 1 and not old.path.exists()
+
+    report = manager.gc(max_total_bytes=1500)
+    assert report.sessions_removed == 1 and not recent.path.exists()
+    assert newest.path.exists() and (tmp_path / "unmanaged").exists()
+    assert manager.report.sessions_removed == 2
+
+
+def test_gc_keeps_live_sessions(tmp_path) -> None:
+    manager = WorkspaceManager(tmp_path, max_age=600, max_total_bytes=1000)
+    a, b = manager.create("a"), manager.create("b")
+    other = WorkspaceManager(tmp_path)
+    orphan, recent = other.create("orphan"), other.create("recent")
+    now = time.time()
+    for workspace in (a, b, orphan, recent):
+        (workspace.path / "data.bin").write_bytes(b"\0" * 800)
+    for workspace in (a, b, orphan):
+        os.utime(workspace.marker, (now - 3600, now - 3600))
+
+    # 正在使用的会话既不会按时间删除，也不计入总大小
+    report = manager.gc()
+    assert report.sessions_removed == 1 and not orphan.path.exists() and recent.path.exists()
+    assert a.path.exists() and b.path.exists() and manager.get("a") is a
+
+
+def test_local_executor_with_workspace(tmp_path) -> None:
+    manager = WorkspaceManager(tmp_path, max_bytes=10_000)
+    executor = LocalCommandLineCodeExecutor(workspace_manager=manager, session_id="s1")
+    assert executor.work_dir == tmp_path / "s1"
+
+    code = "open('out.txt', 'w').write('hello')\nprint('done')"
+    result = executor.execute_code_blocks([CodeBlock(code=code, language="python")])
+    assert result.exit_code == 0 and "done" in result.output
+    assert result.code_file is None
+    assert sorted(os.listdir(executor.work_dir)) == [SESSION_MARKER, "out.txt"]
+
+    code = "open('big.bin', 'wb').write(b'0' * 20000)"
+    result = executor.execute_code_blocks([CodeBlock(code=code, language="python")])
+    assert result.exit_code == 1 and "quota" in result.output
+
+
+def test_snapshot_rollback(tmp_path) -> None:
+    (tmp_path / "keep.txt").write_text("original")
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "input.csv").write_text("a,b")
+    snapshot = WorkspaceSnapshot(tmp_path)
+
+    (tmp_path / "keep.txt").write_text("changed!")
+    (tmp_path / "data" / "input.csv").unlink()
+    (tmp_path / "new.txt").write_text("new")
+    (tmp_path / "out" / "nested").mkdir(parents=True)
+    (tmp_path / "out" / "nested" / "result.bin").write_bytes(b"1")
+
+    removed, restored, failed = snapshot.rollback()
+    assert (removed, restored, failed) == (2, 2, [])
+    assert sorted(os.listdir(tmp_path)) == ["data", "keep.txt"]
+    assert (tmp_path / "keep.txt").read_text() == "original"
+    assert (tmp_path / "data" / "input.csv").read_text() == "a,b"
+    snapshot.discard()
+
+
+def test_snapshot_without_copies(tmp_path) -> None:
+    (tmp_path / "big.bin").write_bytes(b"\0" * 100)
+    snapshot = WorkspaceSnapshot(tmp_path, max_bytes=10)
+    (tmp_path / "big.bin").write_bytes(b"\1" * 200)
+    (tmp_path / "new.txt").write_text("new")
+    assert snapshot.rollback() == (1, 0, [])
+    assert (tmp_path / "big.bin").stat().st_size == 200
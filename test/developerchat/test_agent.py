@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from azentcoder.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from azentcoder.developerchat.agent import LLMAgent
+from azentcoder.oai_mock import Completion, MockBackend, ResponseCache
+
+REPLY = """First create the file.
+```python
+open("data.txt", "w").write("42")
+print("written")
+```
+Now read it back.
+```python
+print(open("data.txt").read())
+```
+Done."""
+
+FAILING_REPLY = """```python
+print("ok")
+```
+```python
+raise SystemExit(3)
+```
+```python
+print("never")
+```
+""" + "Some more explanation. " * 20
+
+
+class RecordingExecutor(LocalCommandLineCodeExecutor):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.started = []
+
+    def execute_code_blocks(self, code_blocks):
+        self.started.append(time.perf_counter())
+        return super().execute_code_blocks(code_blocks)
+
+
+@pytest.fixture(autouse=True)
+def mock_completion():
+    backend, cache = Completion.backend, Completion.cache
+    Completion.cache = ResponseCache()
+    yield
+    Completion.backend, Completion.cache = backend, cache
+
+
+def make_agent(tmp_path, reply, **backend_kwargs) -> LLMAgent:
+    Completion.set_backend(MockBackend(responder=lambda *_: reply, **backend_kwargs))
+    executor = RecordingExecutor(work_dir=tmp_path)
+    agent = LLMAgent(llm_config={"model": "gpt-4"}, code_executor=executor)
+    executor.user_capability.add_to_agent(agent)
+    return agent
+
+
+@pytest.mark.parametrize("pipelined", [True, False])
+def test_run_executes_blocks_in_order(tmp_path, pipelined) -> None:
+    agent = make_agent(tmp_path, REPLY, stream_chunk_size=8)
+    result = agent.run("Write and read a file.", pipelined=pipelined)
+    assert result.reply == REPLY
+    assert [block.code.splitlines()[0] for block in result.code_blocks] == [
+        'open("data.txt", "w").write("42")',
+        'print(open("data.txt").read())',
+    ]
+    assert result.exit_code == 0 and not result.cancelled
+    assert result.output.split() == ["written", "42"]
+    assert [message["role"] for message in agent.messages] == ["user", "assistant", "user"]
+    assert "42" in agent.messages[-1]["content"]
+
+
+def test_pipelined_starts_executing_before_generation_ends(tmp_path) -> None:
+    agent = make_agent(tmp_path, REPLY, stream_chunk_size=4, stream_interval=0.01)
+    start = time.perf_counter()
+    result = agent.run("Write and read a file.")
+    first_started = agent.code_executor.started[0] - start
+    assert first_started < result.generation_seconds
+
+
+def test_failed_block_cancels_the_rest(tmp_path) -> None:
+    agent = make_agent(tmp_path, FAILING_REPLY, stream_chunk_size=4, stream_interval=0.01)
+    result = agent.run("Go.")
+    assert [r.exit_code for r in result.code_results] == [0, 3]
+    assert result.exit_code == 3 and "never" not in result.output
+    assert result.cancelled and len(result.reply) < len(FAILING_REPLY)
+    assert result.skipped == len(result.code_blocks) - 2
+    assert Completion.backend.num_cancelled == 1
+
+
+def test_run_without_code_blocks(tmp_path) -> None:
+    agent = make_agent(tmp_path, "No code needed.")
+    result = agent.run("Hi.")
+    assert result.code_results == [] and result.exit_code == 0
+    assert agent.messages[-1] == {"role": "assistant", "content": "No code needed."}
+
+
+def test_run_requires_code_executor() -> None:
+    with pytest.raises(ValueError):
+        LLMAgent().run("Hi.")
+
+
+def test_system_message_update(tmp_path) -> None:
+    agent = make_agent(tmp_path, REPLY)
+    assert agent.system_message.startswith(LLMAgent.DEFAULT_SYSTEM_MESSAGE)
+    assert len(agent.system_message) > len(LLMAgent.DEFAULT_SYSTEM_MESSAGE)
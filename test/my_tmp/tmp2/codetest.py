@@ -0,0 +1 @@
+with open('tmp/codetest.py', 'w') as f: f.write('b=1')
\ No newline at end of file
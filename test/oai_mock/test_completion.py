@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+from azentcoder.oai_mock import Completion, MockBackend, ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def mock_completion():
+    backend, cache = Completion.backend, Completion.cache
+    Completion.set_backend(MockBackend())
+    Completion.cache = ResponseCache()
+    yield
+    Completion.backend, Completion.cache = backend, cache
+
+
+def test_create_is_deterministic() -> None:
+    config = {"prompt": "Complete: {prefix}", "model": "gpt-3.5-turbo", "n": 2}
+    first = Completion.create({"prefix": "hello"}, use_cache=False, **config)
+    second = Completion.create({"prefix": "hello"}, use_cache=False, **config)
+    assert Completion.extract_text(first) == Completion.extract_text(second)
+    assert len(Completion.extract_text(first)) == 2
+    other = Completion.create({"prefix": "world"}, use_cache=False, **config)
+    assert Completion.extract_text(other) != Completion.extract_text(first)
+    assert first["cost"] > 0
+
+
+def test_memory_cache_hits() -> None:
+    config = {"prompt": "{definition}", "model": "gpt-4"}
+    response = Completion.create({"definition": "def f(): pass"}, **config)
+    response["cost"] = -1
+    cached = Completion.create({"definition": "def f(): pass"}, **config)
+    assert cached["cost"] != -1
+    Completion.create({"definition": "def f(): pass"}, **config, temperature=0)
+    stats = Completion.cache_stats()
+    assert stats.memory_hits == 1 and stats.misses == 2
+    assert Completion.backend.num_requests == 2
+
+    Completion.create({"definition": "def f(): pass"}, **config, cache_seed=None)
+    assert Completion.backend.num_requests == 3
+
+
+def test_disk_cache_persists(tmp_path) -> None:
+    Completion.set_cache(seed=0, cache_path_root=tmp_path)
+    Completion.create({"x": 1}, prompt="{x}")
+    Completion.set_cache(seed=0, cache_path_root=tmp_path)
+    Completion.create({"x": 1}, prompt="{x}")
+    assert Completion.cache_stats().disk_hits == 1
+    assert Completion.backend.num_requests == 1
+
+    Completion.set_cache(seed=1, cache_path_root=tmp_path)
+    Completion.create({"x": 1}, prompt="{x}")
+    assert Completion.backend.num_requests == 2
+
+
+def test_concurrent_identical_requests_are_coalesced() -> None:
+    Completion.set_backend(MockBackend(latency=0.2))
+    responses = []
+
+    def request():
+        responses.append(Completion.create({"x": 1}, prompt="{x}"))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert Completion.backend.num_requests == 1
+    stats = Completion.cache_stats()
+    assert stats.misses == 1 and stats.hits == 7
+    assert len({Completion.extract_text(r)[0] for r in responses}) == 1
+
+
+def test_config_list_with_filter_func() -> None:
+    def responder(prompt, config, index):
+        return "pass" if config["model"] == "gpt-4" else "fail"
+
+    Completion.set_backend(MockBackend(responder=responder))
+    config_list = [{"model": "gpt-3.5-turbo"}, {"model": "gpt-4"}, {"model": "gpt-4", "n": 2}]
+    response = Completion.create(
+        {"x": 1},
+        prompt="{x}",
+        config_list=config_list,
+        filter_func=lambda context, response: Completion.extract_text(response)[0] == "pass",
+    )
+    assert response["config_id"] == 1 and response["pass_filter"]
+    assert Completion.backend.num_requests == 2
+
+
+def test_stream_matches_complete() -> None:
+    Completion.set_backend(MockBackend(stream_chunk_size=5))
+    config = {"prompt": "Complete: {prefix}", "model": "gpt-4"}
+    chunks = list(Completion.stream({"prefix": "hello"}, **config))
+    assert len(chunks) > 1 and all(len(chunk) <= 5 for chunk in chunks)
+    response = Completion.create({"prefix": "hello"}, use_cache=False, **config)
+    assert "".join(chunks) == Completion.extract_text(response)[0]
+
+
+def test_stream_cancel() -> None:
+    Completion.set_backend(MockBackend(responder=lambda *_: "x" * 100, stream_chunk_size=10, stream_interval=0.01))
+    cancel_event = threading.Event()
+    chunks = []
+    for chunk in Completion.stream(prompt="p", cancel_event=cancel_event):
+        chunks.append(chunk)
+        if len(chunks) == 3:
+            cancel_event.set()
+    assert len(chunks) == 3
+    assert Completion.backend.num_cancelled == 1
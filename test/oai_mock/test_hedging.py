@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from azentcoder.oai_mock import Completion, MockBackend, ResponseCache
+from azentcoder.oai_mock.hedging import LatencyHistogram, LatencyTracker
+
+
+@pytest.fixture(autouse=True)
+def mock_completion():
+    backend, cache, tracker = Completion.backend, Completion.cache, Completion.latency_tracker
+    Completion.cache = ResponseCache()
+    Completion.latency_tracker = LatencyTracker()
+    yield
+    Completion.backend, Completion.cache, Completion.latency_tracker = backend, cache, tracker
+
+
+def passes(context, response):
+    return Completion.extract_text(response)[0] == "pass"
+
+
+def test_fanout_returns_first_passing_response() -> None:
+    Completion.set_backend(
+        MockBackend(latency={"slow": 1.0, "fast": 0.05}, responder=lambda prompt, config, i: "pass")
+    )
+    config_list = [{"model": "slow"}, {"model": "fast"}]
+
+    start_time = time.time()
+    response = Completion.create({"x": 1}, prompt="{x}", config_list=config_list, filter_func=passes, fanout=2)
+    assert time.time() - start_time < 0.5
+    assert response["config_id"] == 1 and response["pass_filter"]
+    # the slow request is cancelled instead of completing
+    time.sleep(0.1)
+    assert Completion.backend.num_cancelled == 1
+
+
+def test_hedge_after_delay() -> None:
+    Completion.set_backend(
+        MockBackend(latency={"slow": 1.0, "fast": 0.05}, responder=lambda prompt, config, i: "pass")
+    )
+    config_list = [{"model": "slow"}, {"model": "fast"}]
+
+    start_time = time.time()
+    response = Completion.create({"x": 1}, prompt="{x}", config_list=config_list, filter_func=passes, hedge_delay=0.1)
+    assert time.time() - start_time < 0.5
+    assert response["config_id"] == 1
+
+
+def test_fanout_without_passing_response_matches_sequential() -> None:
+    Completion.set_backend(MockBackend(latency={"a": 0.1, "b": 0.01}, responder=lambda prompt, config, i: "fail"))
+    config_list = [{"model": "a"}, {"model": "b"}]
+    checked = []
+
+    def filter_func(context, response):
+        checked.append(response["model"])
+        return False
+
+    response = Completion.create({"x": 1}, prompt="{x}", config_list=config_list, filter_func=filter_func, fanout=2)
+    assert response["config_id"] == 1 and not response["pass_filter"]
+    # the stateful filter last saw the returned response
+    assert checked[-1] == "b"
+
+
+def test_latency_is_recorded_and_order_adapts() -> None:
+    Completion.set_backend(MockBackend(latency={"slow": 0.1, "fast": 0.01}))
+    config_list = [{"model": "slow"}, {"model": "fast"}]
+    for model in ("slow", "fast"):
+        Completion.create({"x": model}, prompt="{x}", config_list=[{"model": model}])
+    stats = Completion.latency_stats()
+    assert stats['{"model": "slow"}'].count == 1
+    assert stats['{"model": "slow"}'].p50 > stats['{"model": "fast"}'].p50
+
+    assert Completion.latency_tracker.order(config_list) == [1, 0]
+    response = Completion.create({"x": 2}, prompt="{x}", config_list=config_list, adaptive_order=True)
+    assert response["config_id"] == 1
+
+
+def test_cache_hits_are_not_recorded_as_latency() -> None:
+    Completion.set_backend(MockBackend(latency={"slow": 0.1}))
+    for _ in range(3):
+        Completion.create({"x": 1}, prompt="{x}", config_list=[{"model": "slow"}])
+    assert Completion.backend.num_requests == 1
+    assert Completion.latency_stats()['{"model": "slow"}'].count == 1
+
+
+def test_cancelled_hedge_does_not_fail_coalesced_request() -> None:
+    Completion.set_backend(
+        MockBackend(latency={"slow": 0.3, "fast": 0.05}, responder=lambda prompt, config, i: "pass")
+    )
+    config_list = [{"model": "slow"}, {"model": "fast"}]
+    hedged = threading.Thread(
+        target=Completion.create,
+        args=({"x": 1},),
+        kwargs=dict(prompt="{x}", config_list=config_list, filter_func=passes, fanout=2),
+    )
+    hedged.start()
+    time.sleep(0.02)
+    # the same request as the slow hedge waits for it, and the hedge is cancelled when the fast one passes
+    response = Completion.create({"x": 1}, prompt="{x}", model="slow")
+    hedged.join()
+    assert Completion.extract_text(response) == ["pass"]
+    assert Completion.backend.num_cancelled == 1 and Completion.backend.num_requests == 3
+
+
+def test_latency_histogram_quantiles() -> None:
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+    for latency in [0.01] * 90 + [1.0] * 10:
+        histogram.record(latency)
+    summary = histogram.summary()
+    assert summary.count == 100
+    assert 0.01 <= summary.p50 < 0.0125
+    assert summary.p99 == summary.max == 1.0
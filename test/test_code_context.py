@@ -0,0 +1,119 @@
+import os
+
+from azentcoder.code_context import CodeContextSlicer
+
+MODULE = '''import json
+import os
+from typing import Dict, List
+
+import re as regex
+
+LIMIT = 10
+UNUSED = [1, 2, 3]
+
+
+def helper(x):
+    """Helper."""
+    return json.dumps(x)[:LIMIT]
+
+
+def unrelated(a, b):
+    return os.path.join(a, b) * 100
+
+
+class Thing:
+    """A thing."""
+
+    size = 3
+
+    def __init__(self):
+        self.items = []
+
+    def other(self):
+        return regex.compile("x")
+
+    def target(self, data: Dict) -> List:
+        return [helper(self.other()) for _ in range(self.size)]
+
+
+def f(y):
+    return helper(y)
+'''
+
+
+def write_module(tmp_path, source=MODULE):
+    path = tmp_path / "module.py"
+    path.write_text(source)
+    return path
+
+
+def test_slice_function(tmp_path) -> None:
+    slicer = CodeContextSlicer()
+    code_slice = slicer.slice(write_module(tmp_path), "f")
+    assert code_slice.symbols == ["json", "LIMIT", "helper", "f"]
+    assert "def unrelated" not in code_slice.text and "UNUSED" not in code_slice.text
+    assert code_slice.tokens_saved > 0
+    assert slicer.num_calls == 1 and slicer.tokens_saved == code_slice.tokens_saved
+
+
+def test_slice_method_with_class_context(tmp_path) -> None:
+    code_slice = CodeContextSlicer().slice(write_module(tmp_path), "Thing.target")
+    assert code_slice.symbols == [
+        "json",
+        "Dict",
+        "regex",
+        "LIMIT",
+        "helper",
+        "Thing",
+        "Thing.size",
+        "Thing.other",
+        "Thing.target",
+    ]
+    assert '    """A thing."""' in code_slice.text
+    assert "__init__" not in code_slice.text
+    compile(code_slice.text, "slice", "exec")
+
+
+def test_decorated_first_method(tmp_path) -> None:
+    source = """class A:
+    @property
+    def unused(self):
+        return 1
+
+    def other(self):
+        return 2
+
+    def target(self):
+        return self.other()
+"""
+    code_slice = CodeContextSlicer().slice(write_module(tmp_path, source), "A.target")
+    # 第一个方法的装饰器不属于类的头部
+    assert "@property" not in code_slice.text and code_slice.text.startswith("class A:\n")
+    assert code_slice.symbols == ["A", "A.other", "A.target"]
+    compile(code_slice.text, "slice", "exec")
+
+
+def test_token_budget(tmp_path) -> None:
+    path = write_module(tmp_path)
+    code_slice = CodeContextSlicer().slice(path, "f", token_budget=1)
+    assert code_slice.symbols == ["f"]
+    assert code_slice.text == "def f(y):\n    return helper(y)"
+
+
+def test_missing_function_returns_whole_file(tmp_path) -> None:
+    code_slice = CodeContextSlicer().slice(write_module(tmp_path), "missing")
+    assert code_slice.text == MODULE and code_slice.tokens_saved == 0
+
+
+def test_parse_cache_is_invalidated_by_mtime(tmp_path) -> None:
+    slicer = CodeContextSlicer()
+    path = write_module(tmp_path)
+    slicer.slice(path, "f")
+    module = slicer._parse(path)
+    assert slicer._parse(path) is module
+
+    path.write_text(MODULE.replace("return helper(y)", "return unrelated(y, y)"))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert slicer._parse(path) is not module
+    assert "unrelated" in slicer.slice(path, "f").symbols
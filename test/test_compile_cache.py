@@ -0,0 +1,57 @@
+import marshal
+
+import pytest
+
+from azentcoder.code_utils import UNKNOWN, infer_lang
+from azentcoder.compile_cache import DEFAULT_COMPILE_CACHE, CompiledCodeCache
+
+
+def test_compile_is_cached() -> None:
+    cache = CompiledCodeCache()
+    code = cache.compile("x = 1")
+    assert cache.compile("x = 1") is code
+    assert cache.compile("x = 1", filename="other.py") is not code
+    stats = cache.stats
+    assert stats.memory_hits == 1 and stats.misses == 2
+
+
+def test_syntax_errors_are_cached() -> None:
+    cache = CompiledCodeCache()
+    for _ in range(2):
+        with pytest.raises(SyntaxError):
+            cache.compile("print('hello'))")
+    assert cache.stats.misses == 1 and cache.stats.memory_hits == 1
+
+
+def test_lru_eviction() -> None:
+    cache = CompiledCodeCache(max_entries=2)
+    cache.compile("a = 1")
+    cache.compile("b = 1")
+    cache.compile("a = 1")
+    cache.compile("c = 1")
+    cache.compile("a = 1")
+    cache.compile("b = 1")
+    assert cache.stats.misses == 4
+
+
+def test_disk_tier(tmp_path) -> None:
+    CompiledCodeCache(cache_dir=tmp_path).compile("y = 2")
+    files = list(tmp_path.glob("*.bin"))
+    assert len(files) == 1
+    assert isinstance(marshal.loads(files[0].read_bytes()), type(compile("", "", "exec")))
+
+    cache = CompiledCodeCache(cache_dir=tmp_path)
+    namespace = {}
+    exec(cache.compile("z = y = 2"), namespace)
+    assert namespace["z"] == 2
+    cache.compile("y = 2")
+    assert cache.stats.disk_hits == 1 and cache.stats.misses == 1
+
+
+def test_infer_lang_shares_the_cache() -> None:
+    source = "result = sum(range(10))"
+    assert infer_lang(source) == "python"
+    hits = DEFAULT_COMPILE_CACHE.stats.memory_hits
+    assert infer_lang(source) == "python"
+    assert DEFAULT_COMPILE_CACHE.stats.memory_hits == hits + 1
+    assert infer_lang("dummy text") == UNKNOWN
@@ -0,0 +1,51 @@
+import gc
+import unittest
+import weakref
+
+from azentcoder.code_utils import content_str
+
+
+class ImagePart(dict):
+    """A content part that can be weakly referenced."""
+
+
+class TestContentView(unittest.TestCase):
+    def test_view_is_cached(self):
+        content = [{"type": "text", "text": "hello"}, {"type": "image_url", "image_url": {"url": "data:..."}}]
+        view = content_str(content)
+        self.assertIsInstance(view, str)
+        self.assertIs(content_str(content), view)
+        content[0]["text"] = "bye"
+        self.assertEqual(content_str(content), "bye<image>")
+        content.append({"type": "text", "text": "!"})
+        self.assertEqual(content_str(content), "bye<image>!")
+        content[1] = {"type": "text", "text": "?"}
+        self.assertEqual(content_str(content), "bye?!")
+
+    def test_view_offsets(self):
+        content = [
+            {"type": "text", "text": "ab"},
+            {"type": "text", "text": ""},
+            {"type": "image_url", "image_url": {"url": "data:..."}},
+            {"type": "text", "text": "cd"},
+        ]
+        view = content_str(content)
+        self.assertEqual([view.part_index(i) for i in (0, 2, 8, 9)], [0, 2, 2, 3])
+        self.assertEqual(view.locate(1, 10), [(1, 2, 0), (0, 7, 2), (0, 1, 3)])
+        self.assertEqual(view.spans[1], (2, 2, 1))
+        with self.assertRaises(IndexError):
+            view.part_index(len(view))
+
+    def test_view_does_not_keep_content_alive(self):
+        image = ImagePart(type="image_url", image_url={"url": "data:" + "A" * 100_000})
+        ref = weakref.ref(image)
+        content = [{"type": "text", "text": "look"}, image]
+        view = content_str(content)
+        del content, image
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(view, "look<image>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import time
+
+from azentcoder.code_utils import eval_function_completions
+
+
+def test_eval_function_completions_parallel():
+    definition = "def add(a, b):\n    \"\"\"Add two numbers.\"\"\"\n"
+    responses = [
+        "    return a - b\n",
+        "    import time; time.sleep(0.5)\n    return a + b\n",
+        "    return a + b\n",
+        "    return a + b\n",
+    ]
+    metrics = eval_function_completions(
+        responses, definition, assertions="assert add(1, 2) == 3", timeout=5, stop_on_first_pass=False
+    )
+    # the lowest-index passing candidate is selected, as if they were checked one at a time
+    assert metrics["index_selected"] == 1 and metrics["succeed_assertions"]
+    assert all(t is not None for t in metrics["run_times"])
+    assert metrics["run_times"][2] == metrics["run_times"][3]
+    assert metrics["cost"] == 0
+
+
+def test_eval_function_completions_stop_on_first_pass(tmp_path):
+    definition = "def add(a, b):\n"
+    marker = tmp_path / "still_running"
+    slow = f"    import time; time.sleep(3); open({str(marker)!r}, 'w').close()\n    return a + b\n"
+    responses = ["    return a + b\n", slow]
+    start_time = time.time()
+    metrics = eval_function_completions(
+        responses, definition, assertions="assert add(1, 2) == 3", timeout=5, max_workers=2
+    )
+    assert metrics["index_selected"] == 0 and metrics["succeed_assertions"]
+    assert metrics["run_times"][0] is not None and metrics["run_times"][1] is None
+    # the slow candidate is terminated instead of running to the end
+    assert time.time() - start_time < 2.5
+    time.sleep(3.5 - (time.time() - start_time))
+    assert not marker.exists()
+
+    metrics = eval_function_completions(responses[:1], definition, assertions="assert add(1, 2) == 4", timeout=5)
+    assert metrics["index_selected"] == 0 and not metrics["succeed_assertions"]
+
+
+def test_eval_function_completions_timeout():
+    definition = "def add(a, b):\n"
+    responses = ["    while True: pass\n", "    return a + b\n"]
+    start_time = time.time()
+    metrics = eval_function_completions(
+        responses, definition, assertions="assert add(1, 2) == 3", timeout=0.5, max_workers=2
+    )
+    assert metrics["index_selected"] == 1 and time.time() - start_time < 3
+
+
+def test_candidates_do_not_share_files():
+    definition = "def add(a, b):\n"
+    # each candidate writes and reads back a file in its working directory
+    responses = [
+        f"    import time; open('out', 'w').write('{i}'); time.sleep(0.2)\n"
+        f"    assert open('out').read() == '{i}' and not os.path.exists('../out')\n    return a + b\n"
+        for i in range(4)
+    ]
+    test = "def check(candidate):\n    assert candidate(1, 2) == 3\n"
+    metrics = eval_function_completions(responses, "import os\n" + definition, test=test, entry_point="add", timeout=5)
+    # every candidate passed
+    assert metrics["expected_success"] == 1 and metrics["success"]
+    assert not os.path.exists("out")